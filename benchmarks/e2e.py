@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+離線端到端吞吐量基準測試
+
+啟動本機媒體伺服器，透過 yt-dlp generic extractor 驅動
+DownloadTask、BatchDownloadManager 與 WebDownloadService，
+回報 MB/s、tasks/s、各階段耗時、CPU 時間與記憶體用量，
+並可儲存為 JSON 基準或與既有基準比較。
+
+用法:
+    python benchmarks/e2e.py
+    python benchmarks/e2e.py --save-baseline benchmarks/baselines/local.json
+    python benchmarks/e2e.py --compare benchmarks/baselines/local.json --tolerance 0.2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from media_server import MediaServer  # noqa: E402
+
+MIB = 1024 * 1024
+
+# 情境名稱 -> 依序號產生 URL 的函式
+SCENARIOS: Dict[str, Callable[[MediaServer, int], str]] = {
+    "progressive": lambda server, i: server.progressive_url(f"progressive-{i}", 32 * MIB),
+    "hls": lambda server, i: server.hls_url(f"hls-{i}", 16, 2 * MIB),
+    "dash": lambda server, i: server.dash_url(f"dash-{i}", 16, 2 * MIB),
+    "throttled": lambda server, i: server.progressive_url(f"throttled-{i}", 4 * MIB, rate=8 * MIB),
+    "flaky": lambda server, i: server.progressive_url(f"flaky-{i}", 16 * MIB, drop_every=6 * MIB),
+}
+
+DRIVERS = ("task", "batch", "web")
+
+# 比較基準時的指標方向
+HIGHER_IS_BETTER = {"mb_per_s", "tasks_per_s"}
+LOWER_IS_BETTER = {"wall_s", "cpu_s", "peak_rss_mb"}
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# batch/web 驅動等待全部任務結束的預設上限（秒）
+DEFAULT_TIMEOUT = 600.0
+
+
+def _rss_mb() -> Optional[float]:
+    """目前常駐記憶體（MB），無法取得時回傳 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / MIB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """行程最高常駐記憶體（MB）"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以位元組回報，Linux 以 KB 回報
+    return peak / MIB if sys.platform == "darwin" else peak / 1024
+
+
+class _Measure:
+    """量測一段執行的耗時、CPU 與記憶體"""
+
+    def __enter__(self) -> "_Measure":
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_s = time.perf_counter() - self.started
+        self.cpu_s = time.process_time() - self.cpu_started
+
+    def metrics(self, total_bytes: int, tasks: int, failures: int = 0) -> Dict[str, Any]:
+        """tasks_per_s 只計算成功的任務，失敗數另以 failures 回報"""
+        return {
+            "wall_s": round(self.wall_s, 4),
+            "mb_per_s": round(total_bytes / MIB / self.wall_s, 2) if self.wall_s else 0.0,
+            "tasks_per_s": round((tasks - failures) / self.wall_s, 3) if self.wall_s else 0.0,
+            "cpu_s": round(self.cpu_s, 3),
+            "rss_mb": _round(_rss_mb()),
+            "peak_rss_mb": _round(_peak_rss_mb()),
+            "bytes": total_bytes,
+            "tasks": tasks,
+            "failures": failures,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def _file_size(path: Optional[str]) -> int:
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+def run_task_driver(server: MediaServer, scenario: str, repeat: int, work_dir: str) -> Dict[str, Any]:
+    """逐一執行 DownloadTask，統計單一任務的吞吐量與各階段耗時"""
+    from core.constants import DOWNLOAD_TYPE_VIDEO
+    from core.downloader import DownloadTask
+
+    runs: List[Dict[str, Any]] = []
+    phases: Dict[str, List[float]] = {}
+    failures = 0
+    for index in range(repeat):
+        task = DownloadTask(
+            url=SCENARIOS[scenario](server, index),
+            download_type=DOWNLOAD_TYPE_VIDEO,
+            output_path=os.path.join(work_dir, f"task-{scenario}-{index}"),
+            format_option="最高畫質",
+        )
+        with _Measure() as measure:
+            success = task.execute()
+        if not success:
+            failures += 1
+            continue
+        runs.append(measure.metrics(_file_size(task.downloaded_file), 1))
+        for phase, seconds in task.timings.items():
+            phases.setdefault(phase, []).append(seconds)
+
+    if not runs:
+        return {"failures": failures}
+
+    result = {
+        key: round(statistics.median(run[key] for run in runs), 4)
+        for key in ("wall_s", "mb_per_s", "cpu_s")
+    }
+    result.update({
+        "rss_mb": runs[-1]["rss_mb"],
+        "peak_rss_mb": runs[-1]["peak_rss_mb"],
+        "bytes": runs[-1]["bytes"],
+        "runs": len(runs),
+        "failures": failures,
+        "phases_s": {phase: round(statistics.median(values), 4) for phase, values in phases.items()},
+    })
+    return result
+
+
+def run_batch_driver(
+    server: MediaServer, scenario: str, tasks: int, work_dir: str, timeout: float = DEFAULT_TIMEOUT
+) -> Dict[str, Any]:
+    """以 BatchDownloadManager 依序下載多個任務，超過 timeout 秒未全部結束時拋出 RuntimeError"""
+    from core.batch_downloader import BatchDownloadManager
+    from core.constants import DOWNLOAD_TYPE_VIDEO
+
+    output_path = os.path.join(work_dir, f"batch-{scenario}")
+    manager = BatchDownloadManager(max_retries=0)
+    done = threading.Event()
+    manager.batch_complete_callback = lambda summary: done.set()
+
+    urls = ",".join(SCENARIOS[scenario](server, index) for index in range(tasks))
+    manager.add_urls_from_text(urls, DOWNLOAD_TYPE_VIDEO, "最高畫質", output_path)
+
+    with _Measure() as measure:
+        manager.start_batch_download()
+        finished = done.wait(timeout)
+
+    if not finished:
+        manager.stop_batch_download(wait=5)
+        raise RuntimeError(f"batch.{scenario} 逾時：{timeout} 秒內未完成 {tasks} 個任務")
+
+    total_bytes = sum(_file_size(task.downloaded_file) for task in manager.tasks)
+    summary = manager.get_task_summary()
+    return measure.metrics(total_bytes, tasks, tasks - summary["completed"])
+
+
+def run_web_driver(
+    server: MediaServer, scenario: str, tasks: int, concurrency: int, work_dir: str,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> Dict[str, Any]:
+    """經由 WebDownloadService 與共享佇列並行下載多個任務，超過 timeout 秒未全部結束時拋出 RuntimeError"""
+    # web.app 匯入時會建立預設服務，先將其儲存位置指向暫存目錄
+    os.environ.setdefault("DOWNLOAD_DIR", os.path.join(work_dir, "web-default"))
+    os.environ.setdefault("TASK_STORE_PATH", os.path.join(work_dir, "web-default.db"))
+    from core.constants import DOWNLOAD_TYPE_VIDEO
+    from core.task_store import SQLiteTaskStore
+    from web.app import DownloadPayload, WebDownloadService
+
+    store = SQLiteTaskStore(os.path.join(work_dir, f"web-{scenario}.db"))
+    service = WebDownloadService(
+        Path(work_dir) / f"web-{scenario}", store=store, max_concurrent=concurrency
+    )
+
+    try:
+        with _Measure() as measure:
+            task_ids = [
+                service.start_task(DownloadPayload(
+                    url=SCENARIOS[scenario](server, index),
+                    download_type=DOWNLOAD_TYPE_VIDEO,
+                    format_option="最高畫質",
+                ))
+                for index in range(tasks)
+            ]
+            deadline = time.monotonic() + timeout
+            states: Dict[str, Dict[str, Any]] = {}
+            while len(states) < len(task_ids):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"web.{scenario} 逾時：{timeout} 秒內只有 {len(states)}/{tasks} 個任務結束"
+                    )
+                for task_id in task_ids:
+                    state = service.get_status(task_id)
+                    if state and state.get("status") in TERMINAL_STATUSES:
+                        states[task_id] = state
+                time.sleep(0.05)
+    finally:
+        service.worker.stop()
+        service.worker.join()
+        store.close()
+
+    total_bytes = sum(_file_size(state.get("file_path")) for state in states.values())
+    failures = sum(1 for state in states.values() if state.get("status") != "completed")
+    result = measure.metrics(total_bytes, tasks, failures)
+    result["concurrency"] = concurrency
+    return result
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    """執行選定的驅動與情境"""
+    results: Dict[str, Any] = {}
+    quiet = open(os.devnull, "w") if not args.verbose else None
+
+    with tempfile.TemporaryDirectory() as work_dir, MediaServer() as server:
+        for driver in args.drivers:
+            for scenario in args.scenarios:
+                name = f"{driver}.{scenario}"
+                print(f"執行 {name} ...", file=sys.stderr)
+                with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+                    if driver == "task":
+                        results[name] = run_task_driver(server, scenario, args.repeat, work_dir)
+                    elif driver == "batch":
+                        results[name] = run_batch_driver(
+                            server, scenario, args.tasks, work_dir, args.timeout
+                        )
+                    else:
+                        results[name] = run_web_driver(
+                            server, scenario, args.tasks, args.concurrency, work_dir, args.timeout
+                        )
+        server_stats = {"requests": server.requests, "dropped_connections": server.drops}
+
+    if quiet:
+        quiet.close()
+
+    return {
+        "meta": _environment_info(),
+        "server": server_stats,
+        "results": results,
+    }
+
+
+def _environment_info() -> Dict[str, Any]:
+    try:
+        from yt_dlp.version import __version__ as yt_dlp_version
+    except ImportError:
+        yt_dlp_version = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "yt_dlp": yt_dlp_version,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    與基準比較，回傳超出容許範圍的退步項目
+
+    Args:
+        report: 本次結果
+        baseline: 基準結果
+        tolerance: 容許的相對退步比例（0.2 表示 20%）
+    """
+    regressions = []
+    for name, metrics in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for key in sorted(HIGHER_IS_BETTER | LOWER_IS_BETTER):
+            current, previous = metrics.get(key), base.get(key)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous
+            worse = -change if key in HIGHER_IS_BETTER else change
+            marker = "退步" if worse > tolerance else ""
+            print(f"{name:24} {key:12} {previous:>10} -> {current:>10} ({change:+.1%}) {marker}")
+            if worse > tolerance:
+                regressions.append(f"{name} {key}: {previous} -> {current} ({change:+.1%})")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    """輸出易讀的結果摘要"""
+    for name, metrics in report["results"].items():
+        if "wall_s" not in metrics:
+            print(f"{name:24} 全部失敗")
+            continue
+        line = (
+            f"{name:24} {metrics['mb_per_s']:>8} MB/s  {metrics.get('tasks_per_s', '-'):>7} tasks/s  "
+            f"CPU {metrics['cpu_s']}s  RSS {metrics['rss_mb']} MB  失敗 {metrics.get('failures', 0)}"
+        )
+        print(line)
+        if metrics.get("phases_s"):
+            phases = "  ".join(f"{phase}={seconds}s" for phase, seconds in metrics["phases_s"].items())
+            print(f"{'':24} {phases}")
+
+
+def main(argv=None) -> int:
+    """主程式"""
+    parser = argparse.ArgumentParser(description="離線端到端下載吞吐量基準測試")
+    parser.add_argument("--drivers", nargs="+", choices=DRIVERS, default=list(DRIVERS))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="task 驅動的重複次數")
+    parser.add_argument("--tasks", type=int, default=8, help="batch/web 驅動的任務數")
+    parser.add_argument("--concurrency", type=int, default=4, help="web 驅動的並行數")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="batch/web 驅動等待全部任務結束的上限秒數，逾時即失敗")
+    parser.add_argument("--output", help="將結果寫入 JSON 檔")
+    parser.add_argument("--save-baseline", help="將結果儲存為基準 JSON")
+    parser.add_argument("--compare", help="與指定的基準 JSON 比較")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="容許的相對退步比例")
+    parser.add_argument("--verbose", action="store_true", help="顯示 yt-dlp 輸出")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} 項指標退步超過 {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
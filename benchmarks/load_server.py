@@ -0,0 +1,56 @@
+"""
+壓力測試用 Web 服務
+
+匯入 `web.app` 後將下載管理器換成使用 FakeEngine 的管理器，
+讓壓力測試只量測 API、任務儲存與佇列本身的負載。
+以 `uvicorn load_server:app` 或直接執行本檔啟動；多 worker 時每個 worker
+匯入本模組時都會套用同樣的替換。
+
+模擬引擎的行為由環境變數控制：
+- `STUB_TASK_DURATION` 每個任務模擬下載的秒數（預設 0.2）
+- `STUB_TASK_STEPS`    期間回報進度的次數（預設 5）
+"""
+
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from core.downloader import DownloadManager  # noqa: E402
+from core.fake_engine import FakeEngine  # noqa: E402
+from web import app as web_app  # noqa: E402
+
+STUB_TOTAL_BYTES = 10 * 1024 * 1024
+
+
+def install_stub(service) -> DownloadManager:
+    """將服務與內建執行者的下載管理器換成使用模擬引擎的管理器"""
+    duration = float(os.getenv("STUB_TASK_DURATION", "0.2"))
+    engine = FakeEngine(
+        size=STUB_TOTAL_BYTES,
+        speed=STUB_TOTAL_BYTES / duration if duration > 0 else 0,
+        progress_steps=max(int(os.getenv("STUB_TASK_STEPS", "5")), 1),
+    )
+    manager = DownloadManager(engine=engine)
+    service.manager = manager
+    if service.worker:
+        service.worker.download_manager = manager
+    return manager
+
+
+install_stub(web_app.service)
+app = web_app.app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "load_server:app",
+        host="127.0.0.1",
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_WORKERS", "1")),
+        log_level="warning",
+    )
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Web 服務壓力測試
+
+在本機啟動 uvicorn（下載引擎換成模擬任務，見 load_server.py），
+以 asyncio + httpx 模擬多個客戶端送出 `/api/download`、輪詢 `/api/status`
+並開啟 `/api/events` 串流，隨累計任務數增加逐段回報
+p50/p95/p99 延遲、錯誤率與伺服器 RSS。
+
+用法:
+    python benchmarks/load_test.py --clients 50 --steps 1000 10000 100000
+    python benchmarks/load_test.py --clients 200 --web-workers 4 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+ENDPOINTS = ("download", "status", "events")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _tree_rss_mb(pid: int) -> Optional[float]:
+    """行程及其子行程（uvicorn 多 worker）的 RSS 總和（MB），僅支援 Linux"""
+    total_kb = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+            for tid in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{tid}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+    except (OSError, ValueError):
+        return None if total_kb == 0 else total_kb / 1024
+    return total_kb / 1024
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class LoadStats:
+    """單一段落的延遲與錯誤統計"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.errors: Dict[str, int] = {name: 0 for name in ENDPOINTS}
+        self.error_samples: List[str] = []
+
+    def record(self, endpoint: str, seconds: float):
+        self.latencies[endpoint].append(seconds)
+
+    def error(self, endpoint: str, detail: str):
+        self.errors[endpoint] += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(f"{endpoint}: {detail}")
+
+    def summary(self) -> Dict[str, Any]:
+        result = {}
+        for name in ENDPOINTS:
+            values = self.latencies[name]
+            requests = len(values) + self.errors[name]
+            if not requests:
+                continue
+            result[name] = {
+                "requests": requests,
+                "error_rate": round(self.errors[name] / requests, 4),
+                **{
+                    f"p{p}_ms": round(_percentile(values, p) * 1000, 2) if values else None
+                    for p in (50, 95, 99)
+                },
+            }
+        return result
+
+
+class LoadClient:
+    """模擬單一客戶端：送出任務後輪詢狀態或開啟事件串流"""
+
+    def __init__(self, client: httpx.AsyncClient, args, stats: LoadStats):
+        self.client = client
+        self.args = args
+        self.stats = stats
+
+    async def run_task(self, index: int):
+        payload = {
+            "url": f"https://example.com/watch?v={index}",
+            "download_type": "video",
+            "format_option": "最高畫質",
+        }
+        task_id = await self._request("download", "POST", "/api/download", json=payload)
+        if not task_id:
+            return
+
+        if self.args.events_every and index % self.args.events_every == 0:
+            await self._open_events(task_id)
+        else:
+            for _ in range(self.args.polls):
+                state = await self._request("status", "GET", f"/api/status/{task_id}")
+                if not state or state.get("status") in TERMINAL_STATUSES:
+                    return
+                await asyncio.sleep(self.args.poll_interval)
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.error(endpoint, type(e).__name__)
+            return None
+        self.stats.record(endpoint, time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.stats.error(endpoint, f"HTTP {response.status_code}")
+            return None
+        data = response.json()
+        return data.get("task_id") if endpoint == "download" else data
+
+    async def _open_events(self, task_id: str):
+        """量測事件串流送出第一筆事件的時間，並讀到任務結束或逾時"""
+        started = time.perf_counter()
+        try:
+            async with self.client.stream("GET", f"/api/events/{task_id}") as response:
+                if response.status_code >= 400:
+                    self.stats.error("events", f"HTTP {response.status_code}")
+                    return
+                first = True
+                deadline = started + self.args.events_timeout
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    if first:
+                        self.stats.record("events", time.perf_counter() - started)
+                        first = False
+                    state = json.loads(line[5:])
+                    if state.get("status") in TERMINAL_STATUSES or time.perf_counter() > deadline:
+                        return
+        except httpx.HTTPError as e:
+            self.stats.error("events", type(e).__name__)
+
+
+async def run_step(base_url: str, args, start_index: int, count: int) -> LoadStats:
+    """以固定客戶端數送出 count 個任務"""
+    stats = LoadStats()
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    timeout = httpx.Timeout(args.request_timeout)
+    next_index = start_index
+    end_index = start_index + count
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        load_client = LoadClient(client, args, stats)
+
+        async def _client_loop():
+            nonlocal next_index
+            while next_index < end_index:
+                index = next_index
+                next_index += 1
+                await load_client.run_task(index)
+
+        await asyncio.gather(*(_client_loop() for _ in range(args.clients)))
+    return stats
+
+
+def start_server(args, work_dir: str) -> subprocess.Popen:
+    """以子行程啟動套用模擬引擎的 uvicorn"""
+    env = dict(
+        os.environ,
+        PORT=str(args.port),
+        WEB_WORKERS=str(args.web_workers),
+        WEB_MAX_CONCURRENT=str(args.web_concurrency),
+        DOWNLOAD_DIR=os.path.join(work_dir, "downloads"),
+        TASK_STORE_PATH=os.path.join(work_dir, "tasks.db"),
+        STUB_TASK_DURATION=str(args.task_duration),
+    )
+    return subprocess.Popen(
+        [sys.executable, str(BENCH_DIR / "load_server.py")],
+        cwd=work_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Web 服務啟動失敗")
+        try:
+            httpx.get(f"{base_url}/api/status/ready-check", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("Web 服務啟動逾時")
+
+
+def print_step(step: Dict[str, Any]):
+    rss = step["server_rss_mb"]
+    print(
+        f"\n== 累計任務 {step['total_tasks']}（本段 {step['tasks']}，"
+        f"{step['tasks_per_s']} tasks/s，伺服器 RSS {rss if rss is not None else '-'} MB）=="
+    )
+    for name, metrics in step["endpoints"].items():
+        print(
+            f"  {name:9} {metrics['requests']:>8} req  "
+            f"p50 {metrics['p50_ms']} ms  p95 {metrics['p95_ms']} ms  p99 {metrics['p99_ms']} ms  "
+            f"錯誤率 {metrics['error_rate']:.2%}"
+        )
+    if step["error_samples"]:
+        print("  錯誤範例: " + "; ".join(step["error_samples"]))
+
+
+async def run_load_test(args) -> Dict[str, Any]:
+    base_url = f"http://127.0.0.1:{args.port}"
+    steps = []
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        server = start_server(args, work_dir)
+        try:
+            wait_until_ready(base_url, server)
+            submitted = 0
+            for target in sorted(args.steps):
+                count = target - submitted
+                if count <= 0:
+                    continue
+                started = time.perf_counter()
+                stats = await run_step(base_url, args, submitted, count)
+                elapsed = time.perf_counter() - started
+                submitted = target
+
+                step = {
+                    "total_tasks": target,
+                    "tasks": count,
+                    "elapsed_s": round(elapsed, 2),
+                    "tasks_per_s": round(count / elapsed, 1),
+                    "server_rss_mb": _round(_tree_rss_mb(server.pid)),
+                    "endpoints": stats.summary(),
+                    "error_samples": stats.error_samples,
+                }
+                steps.append(step)
+                print_step(step)
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "clients", "polls", "poll_interval", "events_every",
+                "task_duration", "web_workers", "web_concurrency",
+            )
+        },
+        "steps": steps,
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def main(argv=None) -> int:
+    """主程式"""
+    parser = argparse.ArgumentParser(description="Web 服務壓力測試（模擬下載引擎）")
+    parser.add_argument("--clients", type=int, default=50, help="同時運作的客戶端數")
+    parser.add_argument("--steps", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="累計任務數的量測點")
+    parser.add_argument("--polls", type=int, default=3, help="每個任務輪詢狀態的次數上限")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="輪詢間隔（秒）")
+    parser.add_argument("--events-every", type=int, default=20,
+                        help="每 N 個任務改用事件串流追蹤（0 表示不使用）")
+    parser.add_argument("--events-timeout", type=float, default=5.0, help="事件串流最長讀取秒數")
+    parser.add_argument("--request-timeout", type=float, default=30.0, help="單一請求逾時（秒）")
+    parser.add_argument("--task-duration", type=float, default=0.2, help="模擬任務的下載秒數")
+    parser.add_argument("--web-workers", type=int, default=1, help="uvicorn worker 數")
+    parser.add_argument("--web-concurrency", type=int, default=4, help="每個 worker 的下載並行數")
+    parser.add_argument("--port", type=int, default=0, help="服務埠號（0 表示自動選擇）")
+    parser.add_argument("--output", help="將結果寫入 JSON 檔")
+    parser.add_argument("--verbose", action="store_true", help="顯示伺服器輸出")
+    args = parser.parse_args(argv)
+    args.port = args.port or _free_port()
+
+    report = asyncio.run(run_load_test(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
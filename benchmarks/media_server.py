@@ -0,0 +1,270 @@
+"""
+基準測試用本機媒體伺服器
+
+提供可重現的合成媒體，讓 yt-dlp 的 generic extractor 在離線環境下載：
+
+- `/progressive/<name>.mp4?size=N`            單一 MP4 檔（支援 Range 續傳）
+- `/hls/<name>/index.m3u8?segments=N&segment_size=B`   HLS 播放清單與 TS 片段
+- `/dash/<name>/manifest.mpd?segments=N&segment_size=B` DASH 清單與 m4s 片段
+
+任何檔案路徑都可加上：
+- `rate=位元組/秒`     限速傳送
+- `drop_every=位元組`  每傳送指定位元組就中斷連線，模擬不穩定的來源
+- `latency=秒`         回應前延遲
+"""
+
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# 合成內容的重複區塊，避免每次請求重新產生資料
+_PATTERN = bytes(range(256)) * 256
+_CHUNK_SIZE = 64 * 1024
+
+_MPD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011"
+     minBufferTime="PT2S" mediaPresentationDuration="PT{duration}S">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="main" codecs="avc1.4d401f,mp4a.40.2" bandwidth="{bandwidth}" width="1280" height="720">
+        <SegmentList duration="{segment_duration}" timescale="1">
+          <Initialization sourceURL="init.mp4{query}"/>
+{segments}
+        </SegmentList>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+# 每個 HLS/DASH 片段宣告的長度（秒）
+SEGMENT_DURATION = 4
+
+
+def _content(offset: int, length: int) -> bytes:
+    """取得合成內容中指定區段的資料"""
+    start = offset % len(_PATTERN)
+    data = _PATTERN[start:start + length]
+    while len(data) < length:
+        data += _PATTERN[:length - len(data)]
+    return data
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """合成媒體請求處理器"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body: bool):
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        self.server.count_request(parsed.path)
+
+        latency = float(params.get("latency", 0))
+        if latency:
+            time.sleep(latency)
+
+        route = self._route(parsed.path, params)
+        if route is None:
+            self.send_error(404)
+            return
+
+        content_type, body, size = route
+        if body is not None:
+            self._send_document(content_type, body.encode("utf-8"), send_body)
+        else:
+            self._send_media(content_type, size, params, send_body)
+
+    def _route(self, path: str, params: dict) -> Optional[Tuple[str, Optional[str], int]]:
+        """回傳 (Content-Type, 文件內容或 None, 媒體大小)"""
+        segments = int(params.get("segments", 8))
+        segment_size = int(params.get("segment_size", 256 * 1024))
+        query = "?" + urlencode(params) if params else ""
+
+        if re.fullmatch(r"/progressive/[\w.-]+\.mp4", path):
+            return "video/mp4", None, int(params.get("size", 4 * 1024 * 1024))
+
+        if re.fullmatch(r"/hls/[\w-]+/index\.m3u8", path):
+            lines = [
+                "#EXTM3U",
+                "#EXT-X-VERSION:3",
+                f"#EXT-X-TARGETDURATION:{SEGMENT_DURATION}",
+                "#EXT-X-MEDIA-SEQUENCE:0",
+                "#EXT-X-PLAYLIST-TYPE:VOD",
+            ]
+            for index in range(segments):
+                lines.append(f"#EXTINF:{SEGMENT_DURATION}.0,")
+                lines.append(f"seg{index}.ts{query}")
+            lines.append("#EXT-X-ENDLIST")
+            return "application/vnd.apple.mpegurl", "\n".join(lines) + "\n", 0
+
+        if re.fullmatch(r"/hls/[\w-]+/seg\d+\.ts", path):
+            return "video/mp2t", None, segment_size
+
+        if re.fullmatch(r"/dash/[\w-]+/manifest\.mpd", path):
+            segment_lines = "\n".join(
+                f'          <SegmentURL media="seg{index}.m4s{query}"/>' for index in range(segments)
+            )
+            manifest = _MPD_TEMPLATE.format(
+                duration=segments * SEGMENT_DURATION,
+                bandwidth=segment_size * 8 // SEGMENT_DURATION,
+                segment_duration=SEGMENT_DURATION,
+                query=query.replace("&", "&amp;"),
+                segments=segment_lines.replace("&", "&amp;"),
+            )
+            return "application/dash+xml", manifest, 0
+
+        if re.fullmatch(r"/dash/[\w-]+/init\.mp4", path):
+            return "video/mp4", None, 1024
+
+        if re.fullmatch(r"/dash/[\w-]+/seg\d+\.m4s", path):
+            return "video/iso.segment", None, segment_size
+
+        return None
+
+    def _send_document(self, content_type: str, body: bytes, send_body: bool):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_media(self, content_type: str, size: int, params: dict, send_body: bool):
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        match = re.match(r"bytes=(\d*)-(\d*)", range_header or "")
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+            end = min(end, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if not send_body:
+            return
+
+        rate = float(params.get("rate", 0))
+        drop_every = int(params.get("drop_every", 0))
+        # 中斷點位於 drop_every 的整數倍，續傳請求會從中斷處繼續並在下一個倍數再次中斷
+        drop_at = (start // drop_every + 1) * drop_every if drop_every else None
+
+        offset = start
+        began = time.monotonic()
+        try:
+            while offset <= end:
+                length = min(_CHUNK_SIZE, end - offset + 1)
+                if drop_at is not None and offset + length > drop_at:
+                    length = drop_at - offset
+                    if length > 0:
+                        self.wfile.write(_content(offset, length))
+                    self.wfile.flush()
+                    self.server.count_drop()
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+
+                self.wfile.write(_content(offset, length))
+                offset += length
+
+                if rate:
+                    expected = (offset - start) / rate
+                    delay = expected - (time.monotonic() - began)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class MediaServer(ThreadingHTTPServer):
+    """在背景執行緒運作的本機媒體伺服器"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MediaRequestHandler)
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.drops = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self, path: str):
+        with self._stats_lock:
+            self.requests += 1
+
+    def count_drop(self):
+        with self._stats_lock:
+            self.drops += 1
+
+    def start(self) -> "MediaServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="media-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MediaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def progressive_url(self, name: str, size: int, **params) -> str:
+        return self._url(f"/progressive/{name}.mp4", size=size, **params)
+
+    def hls_url(self, name: str, segments: int, segment_size: int, **params) -> str:
+        return self._url(f"/hls/{name}/index.m3u8", segments=segments, segment_size=segment_size, **params)
+
+    def dash_url(self, name: str, segments: int, segment_size: int, **params) -> str:
+        return self._url(f"/dash/{name}/manifest.mpd", segments=segments, segment_size=segment_size, **params)
+
+    def _url(self, path: str, **params) -> str:
+        return f"{self.base_url}{path}?{urlencode(params)}"
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("MEDIA_SERVER_PORT", "8765"))
+    with MediaServer(port=port) as server:
+        print(f"媒體伺服器運作中: {server.base_url}")
+        print(server.progressive_url("sample", 8 * 1024 * 1024))
+        print(server.hls_url("sample", 8, 512 * 1024))
+        print(server.dash_url("sample", 8, 512 * 1024))
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
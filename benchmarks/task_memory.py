@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+已完成任務的記憶體基準
+
+以模擬引擎（info dict 含大量格式與分段清單，接近長時間 HLS 影片）依序執行
+大量 DownloadTask，並像批次下載一樣保留任務物件與完成回呼收到的結果，
+比較保留原始 info dict（raw）與只保留精簡結果（compact）時的記憶體增長。
+每個模式在獨立行程中執行，RSS 不會互相影響。
+
+用法:
+    python benchmarks/task_memory.py
+    python benchmarks/task_memory.py --tasks 10000 --formats 20 --output memory.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+MIB = 1024 * 1024
+MODES = ("raw", "compact")
+
+
+def _rss_mb() -> Optional[float]:
+    """目前常駐記憶體（MB），無法取得時回傳 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / MIB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def run_mode(mode: str, tasks: int, formats: int) -> Dict[str, Any]:
+    """在目前行程中執行一個模式並回報記憶體增長"""
+    from core.constants import DOWNLOAD_TYPE_VIDEO
+    from core.downloader import DownloadTask
+    from core.fake_engine import FakeEngine
+
+    engine = FakeEngine(size=1024, info_formats=formats)
+    retained: List[Any] = []
+    results: List[Any] = []
+
+    with tempfile.TemporaryDirectory() as output:
+        gc.collect()
+        rss_before = _rss_mb()
+        tracemalloc.start()
+        started = time.perf_counter()
+        for index in range(tasks):
+            task = DownloadTask(
+                f"https://fake.test/video-{index}", DOWNLOAD_TYPE_VIDEO, output, "最高畫質",
+                complete_callback=lambda path, result: results.append(result),
+                engine=engine, keep_info=(mode == "raw"),
+            )
+            task.execute()
+            retained.append(task)
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        traced, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = _rss_mb()
+
+    return {
+        "mode": mode,
+        "tasks": tasks,
+        "formats": formats,
+        "seconds": round(elapsed, 2),
+        "retained_mb": round(traced / MIB, 2),
+        "bytes_per_task": int(traced / tasks) if tasks else 0,
+        "rss_growth_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+    }
+
+
+def main(argv=None) -> int:
+    """主程式"""
+    parser = argparse.ArgumentParser(description="已完成任務的記憶體基準")
+    parser.add_argument("--tasks", type=int, default=10000, help="執行的任務數")
+    parser.add_argument("--formats", type=int, default=20, help="每個 info dict 的格式數")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--output", help="將結果寫入 JSON 檔")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.tasks, args.formats)))
+        return 0
+
+    report = []
+    for mode in args.modes:
+        completed = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--tasks", str(args.tasks), "--formats", str(args.formats)],
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        result = json.loads(completed.stdout.decode().strip().splitlines()[-1])
+        report.append(result)
+        rss = f"{result['rss_growth_mb']:.1f} MB" if result['rss_growth_mb'] is not None else "N/A"
+        print(
+            f"{mode:8s} {result['tasks']} 個任務  保留 {result['retained_mb']:.1f} MB"
+            f"（每個任務 {result['bytes_per_task']} bytes）  RSS 增長 {rss}  {result['seconds']:.1f}s"
+        )
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
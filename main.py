@@ -4,8 +4,15 @@ Author: Ned Lin
 Version: 2.0.0
 """
 
+import sys
+
 import src.main as src_main
 
 
+def main():
+    """命令列入口（`video-downloader`）"""
+    return src_main.main()
+
+
 if __name__ == "__main__":
-    src_main.main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+啟動時間基準測試
+
+以 `python -X importtime` 量測各入口模組的匯入成本，列出最慢的模組，
+並以多次冷啟動的實際耗時與預算比較，超出預算時以非零狀態碼結束。
+
+用法:
+    python scripts/benchmark_startup.py
+    python scripts/benchmark_startup.py --runs 10 --budget 1.5 --top 15
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# 入口模組（桌面介面、Web 服務、佇列執行者、批次下載）
+ENTRY_MODULES = ["ui.main_window", "web.app", "core.worker", "core.batch_downloader"]
+
+# 啟動時不應載入的重量級模組
+HEAVY_MODULES = ["yt_dlp", "opencc"]
+
+
+def run_import(module, importtime=False):
+    """在新的直譯器中匯入模組，回傳 (耗時秒數, stderr, 已載入的重量級模組)"""
+    code = (
+        f"import sys; import {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", code]
+
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=SRC_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"匯入 {module} 失敗:\n{result.stderr}")
+
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return elapsed, result.stderr, loaded
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 輸出，回傳 [(累計微秒, 模組名稱)]，名稱保留巢狀縮排"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        entries.append((int(cumulative), name[1:].rstrip()))
+    return entries
+
+
+def benchmark(module, runs, top):
+    """量測單一入口模組，回傳冷啟動耗時中位數"""
+    _, stderr, loaded = run_import(module, importtime=True)
+    entries = parse_importtime(stderr)
+    # 只統計頂層模組（縮排最少者），避免重複計算
+    top_level = [(us, name) for us, name in entries if not name.startswith(" ")]
+
+    timings = [run_import(module)[0] for _ in range(runs)]
+    median = statistics.median(timings)
+
+    print(f"\n== {module} ==")
+    print(f"冷啟動耗時: 中位數 {median * 1000:.0f} ms，最小 {min(timings) * 1000:.0f} ms（{runs} 次）")
+    print(f"匯入總計: {sum(us for us, _ in top_level) / 1000:.0f} ms")
+    print(f"已載入重量級模組: {', '.join(loaded) if loaded else '無'}")
+    for us, name in sorted(entries, reverse=True)[:top]:
+        print(f"  {us / 1000:8.1f} ms  {name.strip()}")
+    return median
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description="量測各入口模組的啟動時間")
+    parser.add_argument("modules", nargs="*", default=ENTRY_MODULES, help="要量測的模組")
+    parser.add_argument("--runs", type=int, default=5, help="冷啟動量測次數")
+    parser.add_argument("--top", type=int, default=10, help="列出最慢的模組數")
+    parser.add_argument("--budget", type=float, help="單一模組冷啟動耗時上限（秒）")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        median = benchmark(module, args.runs, args.top)
+        if args.budget is not None and median > args.budget:
+            over_budget.append((module, median))
+
+    if over_budget:
+        print()
+        for module, median in over_budget:
+            print(f"超出預算: {module} {median:.2f}s > {args.budget:.2f}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
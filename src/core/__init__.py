@@ -1,8 +1,28 @@
 """
 核心模組
+
+子模組於第一次存取時才載入，匯入 core.constants 等輕量模組時不會連帶載入下載核心。
 """
 
-from .downloader import DownloadManager, DownloadTask
-from .config import ConfigManager
+import importlib
+
+_EXPORTS = {
+    'DownloadManager': '.downloader',
+    'DownloadTask': '.downloader',
+    'ConfigManager': '.config',
+}
+
+__all__ = ['DownloadManager', 'DownloadTask', 'ConfigManager']
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        module = importlib.import_module(_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-__all__ = ['DownloadManager', 'DownloadTask', 'ConfigManager']
\ No newline at end of file
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,178 @@
+"""
+asyncio 原生下載管理介面
+
+以受管理的執行緒池執行阻塞的 yt-dlp 工作，對外提供
+`await submit(...)`、非同步進度事件迭代與 `await handle.result()`，
+等待端被取消時會一併取消底層下載任務。
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from core.constants import WEB_MAX_CONCURRENT
+from core.downloader import DownloadManager, DownloadTask
+from utils.logger import Logger
+
+
+class DownloadError(Exception):
+    """下載任務失敗"""
+
+
+class AsyncDownloadHandle:
+    """單一非同步下載任務的操作介面"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._subscribers: List[asyncio.Queue] = []
+        self._future: Optional[asyncio.Future] = None
+        self.task: Optional[DownloadTask] = None
+        self.last_event: Optional[Dict[str, Any]] = None
+        self.file_path: Optional[str] = None
+        self.error_message: Optional[str] = None
+
+    def _publish(self, event: Dict[str, Any]):
+        """由下載執行緒呼叫，將事件轉交事件迴圈"""
+        self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Dict[str, Any]):
+        self.last_event = event
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def _on_progress(self, data: Dict[str, Any]):
+        self._publish(dict(data))
+
+    def _on_complete(self, file_path: str, info: Dict[str, Any]):
+        self.file_path = file_path
+        self._publish({'status': 'completed', 'file_path': file_path})
+
+    def _on_error(self, error_msg: str):
+        self.error_message = error_msg
+        self._publish({'status': 'failed', 'message': error_msg})
+
+    def _on_done(self, _future: asyncio.Future):
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    def done(self) -> bool:
+        """任務是否已結束"""
+        return self._future is not None and self._future.done()
+
+    def cancel(self):
+        """取消下載（可在事件迴圈中直接呼叫）"""
+        if self.task:
+            self.task.cancel()
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐一產生進度事件，任務結束後停止
+
+        Yields:
+            Dict: 與 progress_callback 相同格式的進度資料，
+            另有 `completed` / `failed` 終止事件
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            if self.done():
+                return
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._subscribers.remove(queue)
+
+    async def result(self) -> str:
+        """
+        等待任務完成
+
+        Returns:
+            str: 下載完成的檔案路徑
+
+        Raises:
+            DownloadError: 下載失敗或被取消
+            asyncio.CancelledError: 等待端被取消（底層任務同時取消）
+        """
+        try:
+            success = await asyncio.shield(self._future)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+        if not success or not self.file_path:
+            raise DownloadError(self.error_message or "下載失敗")
+        return self.file_path
+
+
+class AsyncDownloadManager:
+    """asyncio 下載管理器"""
+
+    def __init__(self, max_workers: int = WEB_MAX_CONCURRENT, download_manager: Optional[DownloadManager] = None):
+        self.download_manager = download_manager or DownloadManager()
+        self.logger = Logger()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-download")
+        self._handles: List[AsyncDownloadHandle] = []
+
+    async def submit(
+        self,
+        url: str,
+        download_type: str,
+        output_path: str,
+        format_option: str,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        rate_limit: Optional[float] = None,
+        prefetched_info: Optional[Dict[str, Any]] = None,
+    ) -> AsyncDownloadHandle:
+        """建立並排程下載任務（選用參數與 DownloadManager.create_task 相同）"""
+        loop = asyncio.get_running_loop()
+        handle = AsyncDownloadHandle(loop)
+        handle.task = self.download_manager.create_task(
+            url=url,
+            download_type=download_type,
+            output_path=output_path,
+            format_option=format_option,
+            start_time=start_time,
+            end_time=end_time,
+            rate_limit=rate_limit,
+            prefetched_info=prefetched_info,
+            progress_callback=handle._on_progress,
+            complete_callback=handle._on_complete,
+            error_callback=handle._on_error,
+        )
+
+        handle._future = loop.run_in_executor(self._executor, self._execute, handle.task)
+        handle._future.add_done_callback(handle._on_done)
+        handle._future.add_done_callback(lambda _: self._handles.remove(handle))
+        self._handles.append(handle)
+        return handle
+
+    def _execute(self, task: DownloadTask) -> bool:
+        """在執行緒池中執行阻塞的下載工作"""
+        try:
+            return task.execute()
+        finally:
+            self.download_manager.remove_task(task)
+
+    def get_active_count(self) -> int:
+        """取得尚未結束的任務數量"""
+        return len(self._handles)
+
+    async def aclose(self, cancel: bool = True):
+        """關閉管理器，預設取消所有進行中的任務並等待執行緒結束"""
+        handles = list(self._handles)
+        if cancel:
+            for handle in handles:
+                handle.cancel()
+        if handles:
+            await asyncio.gather(*(handle._future for handle in handles), return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "AsyncDownloadManager":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
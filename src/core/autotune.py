@@ -0,0 +1,286 @@
+"""
+下載並行數自動調整
+
+固定的並行數通常不適合：大量以解析為主的小任務需要更多執行槽，
+頻寬已滿或網站限流時則應減少。控制器依每個取樣週期觀察到的
+總傳輸速率、錯誤率、429 比例與 CPU 負載，以 AIMD 方式在上下限內調整
+可同時執行的下載數：
+
+- 出現限流（429）、錯誤率過高或 CPU 滿載時乘法減少
+- 執行槽全數使用中且上次增加確實提高傳輸速率時加一
+- 增加後傳輸速率沒有提升時維持，明顯下降時退回一格
+
+執行者以 acquire / release 取得執行槽；`set_limit` 可在執行期間手動覆寫並停用自動調整。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+from core.constants import (
+    AUTOTUNE_CPU_LOAD,
+    AUTOTUNE_DECREASE_FACTOR,
+    AUTOTUNE_ERROR_RATE,
+    AUTOTUNE_HISTORY,
+    AUTOTUNE_INTERVAL,
+    AUTOTUNE_MAX,
+    AUTOTUNE_MIN,
+    AUTOTUNE_MIN_GAIN,
+)
+from utils.logger import Logger
+
+ACTION_INCREASE = "increase"
+ACTION_DECREASE = "decrease"
+ACTION_HOLD = "hold"
+ACTION_OVERRIDE = "override"
+
+_THROTTLE_MARKERS = ("429", "too many requests", "rate limit", "rate-limit")
+
+
+def is_throttled(message: Optional[str]) -> bool:
+    """錯誤訊息是否表示被網站限流"""
+    text = (message or "").lower()
+    return any(marker in text for marker in _THROTTLE_MARKERS)
+
+
+def cpu_load() -> Optional[float]:
+    """每顆 CPU 的一分鐘平均負載，平台不支援時回傳 None"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class ConcurrencyController:
+    """以 AIMD 調整可同時執行的下載數"""
+
+    def __init__(
+        self,
+        initial: int = AUTOTUNE_MIN,
+        min_limit: int = AUTOTUNE_MIN,
+        max_limit: int = AUTOTUNE_MAX,
+        interval: float = AUTOTUNE_INTERVAL,
+        auto: bool = True,
+        load_probe=cpu_load,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            initial: 初始並行數
+            min_limit: 並行數下限
+            max_limit: 並行數上限（執行者據此建立執行緒）
+            interval: 取樣週期（秒）
+            auto: 是否自動調整，False 時維持固定並行數（仍可手動覆寫）
+            load_probe: 取得 CPU 負載的函式
+            clock: 時間來源（測試用）
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.interval = interval
+        self.auto = auto
+        self._load_probe = load_probe
+        self._clock = clock
+        self._cond = threading.Condition()
+        self.logger = Logger()
+
+        self.active = 0
+        # 執行中任務的累計下載量（record_result 後移除）
+        self._progress: Dict[Hashable, int] = {}
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=AUTOTUNE_HISTORY)
+        self._last_action = ACTION_HOLD
+        self._last_throughput: Optional[float] = None
+        self._last_window: Dict[str, Any] = {}
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = self._clock()
+        self._bytes = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._throttled = 0
+        self._peak_active = len(self._progress)
+
+    # 執行槽
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        取得一個執行槽
+
+        Args:
+            timeout: 最長等待秒數，None 表示一直等待
+
+        Returns:
+            bool: 是否取得（逾時為 False）
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while self.active >= self.limit:
+                self._maybe_adjust()
+                if self.active < self.limit:
+                    break
+                remaining = None if deadline is None else deadline - self._clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, self.interval) if remaining is not None else self.interval)
+            self.active += 1
+            return True
+
+    def release(self):
+        """歸還執行槽"""
+        with self._cond:
+            self.active = max(self.active - 1, 0)
+            self._maybe_adjust()
+            self._cond.notify_all()
+
+    # 觀察值
+
+    def record_progress(self, key: Hashable, downloaded_bytes: int):
+        """記錄任務目前已下載的位元組數（累計值，依 key 換算增量）"""
+        with self._cond:
+            previous = self._progress.get(key, 0)
+            if downloaded_bytes > previous:
+                self._bytes += downloaded_bytes - previous
+            self._progress[key] = downloaded_bytes
+            # 只以實際在下載的執行槽計算使用量，不含正在輪詢佇列的閒置執行槽
+            self._peak_active = max(self._peak_active, len(self._progress))
+            self._maybe_adjust()
+
+    def record_result(self, key: Hashable, success: bool, error_message: Optional[str] = None):
+        """記錄任務結果；錯誤訊息包含 429 等字樣時視為限流"""
+        with self._cond:
+            self._peak_active = max(self._peak_active, len(self._progress))
+            self._progress.pop(key, None)
+            if success:
+                self._succeeded += 1
+            else:
+                self._failed += 1
+                if is_throttled(error_message):
+                    self._throttled += 1
+            self._maybe_adjust()
+
+    def discard(self, key: Hashable):
+        """任務被取消，不計入結果"""
+        with self._cond:
+            self._progress.pop(key, None)
+
+    # 調整
+
+    def _maybe_adjust(self):
+        """取樣週期結束時依觀察值調整並行數（呼叫端須持有鎖）"""
+        now = self._clock()
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return
+
+        completed = self._succeeded + self._failed
+        window = {
+            "throughput": self._bytes / elapsed if elapsed > 0 else 0.0,
+            "completed": completed,
+            "error_rate": self._failed / completed if completed else 0.0,
+            "throttle_rate": self._throttled / completed if completed else 0.0,
+            "cpu_load": self._load_probe() if self._load_probe else None,
+            "peak_active": self._peak_active,
+        }
+        self._last_window = window
+        self._reset_window()
+        if not self.auto:
+            return
+
+        target, reason = self._decide(window)
+        previous = self.limit
+        self.limit = min(max(target, self.min_limit), self.max_limit)
+        if self.limit > previous:
+            action = ACTION_INCREASE
+        elif self.limit < previous:
+            action = ACTION_DECREASE
+        else:
+            action = ACTION_HOLD
+        # 下一個週期與本週期比較，判斷增加執行槽是否帶來提升
+        self._last_throughput = window["throughput"]
+        self._last_action = action
+        if action != ACTION_HOLD:
+            self._record(action, reason, previous, window)
+            self.logger.info(f"並行數調整 {previous} -> {self.limit}（{reason}）")
+            self._cond.notify_all()
+
+    def _decide(self, window: Dict[str, Any]) -> Tuple[int, str]:
+        """回傳新的並行數與原因"""
+        backoff = min(int(self.limit * AUTOTUNE_DECREASE_FACTOR), self.limit - 1)
+        if window["throttle_rate"] > 0:
+            return backoff, "網站限流 (429)"
+        if window["completed"] and window["error_rate"] > AUTOTUNE_ERROR_RATE:
+            return backoff, f"錯誤率 {window['error_rate']:.0%}"
+        load = window["cpu_load"]
+        if load is not None and load > AUTOTUNE_CPU_LOAD:
+            return backoff, f"CPU 負載 {load:.2f}"
+        if window["peak_active"] < self.limit:
+            return self.limit, "執行槽未用滿"
+
+        previous = self._last_throughput
+        if self._last_action == ACTION_INCREASE and previous:
+            if window["throughput"] < previous * (1 - AUTOTUNE_MIN_GAIN):
+                return self.limit - 1, "增加後傳輸速率下降"
+            if window["throughput"] < previous * (1 + AUTOTUNE_MIN_GAIN):
+                return self.limit, "傳輸速率已飽和"
+        return self.limit + 1, "執行槽已滿且仍有提升空間"
+
+    def _record(self, action: str, reason: str, previous: int, window: Dict[str, Any]):
+        self._history.append({
+            "time": time.time(),
+            "action": action,
+            "reason": reason,
+            "from": previous,
+            "to": self.limit,
+            "throughput": round(window.get("throughput", 0.0), 1),
+        })
+
+    # 手動控制
+
+    def set_limit(self, limit: int):
+        """手動設定並行數並停用自動調整"""
+        with self._cond:
+            previous = self.limit
+            self.limit = min(max(limit, self.min_limit), self.max_limit)
+            self.auto = False
+            self._record(ACTION_OVERRIDE, "手動設定", previous, {})
+            self._cond.notify_all()
+
+    def set_auto(self, enabled: bool):
+        """啟用或停用自動調整"""
+        with self._cond:
+            self.auto = enabled
+            self._last_action = ACTION_HOLD
+            self._last_throughput = None
+            self._reset_window()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前狀態：並行數、上下限、使用中的執行槽、最近一次取樣與調整紀錄"""
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "active": self.active,
+                "auto": self.auto,
+                "interval": self.interval,
+                "last_window": dict(self._last_window),
+                "history": list(self._history),
+            }
+
+
+def controller_from_env(prefix: str, initial: int) -> ConcurrencyController:
+    """
+    依環境變數建立控制器
+
+    `{prefix}_AUTOTUNE` 啟用自動調整（預設停用，維持 initial），
+    `{prefix}_AUTOTUNE_MIN` / `{prefix}_AUTOTUNE_MAX` 設定上下限。
+    停用且未設定上限時上限即為 initial，執行者不必多建立用不到的執行緒。
+    """
+    auto = os.getenv(f"{prefix}_AUTOTUNE", "0").lower() in ("1", "true", "yes")
+    min_limit = int(os.getenv(f"{prefix}_AUTOTUNE_MIN", str(AUTOTUNE_MIN)))
+    default_max = max(AUTOTUNE_MAX, initial) if auto else initial
+    max_limit = int(os.getenv(f"{prefix}_AUTOTUNE_MAX", str(default_max)))
+    return ConcurrencyController(initial=initial, min_limit=min_limit, max_limit=max_limit, auto=auto)
@@ -0,0 +1,322 @@
+"""
+下載頻寬預算
+
+所有下載中的任務共用一個總頻寬上限，依權重以 max-min 公平分配：
+設有單一任務上限的任務用不完的部分再分給其他任務，任務開始或結束下載時重新分配。
+每個任務以自己的權杖桶限速，在進度回報時依新增的位元組數等待，
+因此適用任何會回報 downloaded_bytes 的下載引擎。
+
+總上限可依時段排程（例如上班時間 2M、夜間不限），並可在執行期間以
+`set_rate` / `set_schedule` 即時調整（Web API 與設定視窗皆透過此處）。
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.constants import BANDWIDTH_BURST, BANDWIDTH_LIMIT, BANDWIDTH_SCHEDULE_CHECK, CANCEL_POLL_INTERVAL
+
+_RATE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+# (開始分鐘, 結束分鐘, 速率)；速率 None 表示不限制
+ScheduleEntry = Tuple[int, int, Optional[float]]
+
+
+def parse_rate(value: Any) -> Optional[float]:
+    """
+    解析速率（bytes/s），支援 `500K`、`2M`、`1.5MiB/s` 等寫法（以 1024 為單位）
+
+    Returns:
+        Optional[float]: 速率，0、空字串、`unlimited` 或 None 表示不限制
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    text = str(value).strip()
+    if not text or text.lower() in ("0", "none", "unlimited", "off"):
+        return None
+    match = _RATE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"無法解析速率: {value}")
+    rate = float(match.group(1)) * _UNITS[match.group(2).lower()]
+    return rate if rate > 0 else None
+
+
+def _parse_clock(text: str) -> int:
+    hours, _, minutes = text.strip().partition(":")
+    hours, minutes = int(hours), int(minutes or 0)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(f"無效的時間: {text}")
+    return hours * 60 + minutes
+
+
+def parse_schedule(text: Optional[str]) -> List[ScheduleEntry]:
+    """
+    解析時段排程，例如 `09:00-18:00=2M, 18:00-09:00=0`
+
+    以逗號或分號分隔，每段為 `開始-結束=速率`；結束早於開始時表示跨越午夜，
+    多段重疊時以先列出者為準，不在任何時段內時使用基本上限。
+    """
+    entries: List[ScheduleEntry] = []
+    for part in re.split(r"[,;]", text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        span, sep, rate = part.partition("=")
+        start, dash, end = span.partition("-")
+        if not sep or not dash:
+            raise ValueError(f"無效的排程: {part}（格式為 HH:MM-HH:MM=速率）")
+        entries.append((_parse_clock(start), _parse_clock(end), parse_rate(rate)))
+    return entries
+
+
+def format_schedule(entries: List[ScheduleEntry]) -> str:
+    """將排程轉回文字"""
+    def _clock(minutes: int) -> str:
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return ", ".join(
+        f"{_clock(start)}-{_clock(end)}={int(rate) if rate else 0}" for start, end, rate in entries
+    )
+
+
+class BandwidthShare:
+    """單一任務的頻寬額度（權杖桶）"""
+
+    def __init__(self, budget: "BandwidthBudget", weight: float, cap: Optional[float]):
+        self.budget = budget
+        self.weight = max(weight, 0.01)
+        self.cap = cap
+        self.active = False
+        # 目前分配到的速率（bytes/s），None 表示不限制
+        self.allocated: Optional[float] = None
+        self.consumed = 0
+        self._tokens = 0.0
+        self._updated = budget._clock()
+
+    def activate(self):
+        """開始傳輸，加入分配"""
+        if not self.active:
+            self.budget._set_active(self, True)
+
+    def deactivate(self):
+        """暫停傳輸（例如後處理期間），讓出額度給其他任務"""
+        if self.active:
+            self.budget._set_active(self, False)
+
+    def set_cap(self, cap: Optional[float]):
+        """調整此任務的上限"""
+        self.budget._set_cap(self, cap)
+
+    def close(self):
+        """任務結束，移除額度"""
+        self.budget._remove(self)
+
+    def record(self, nbytes: int):
+        """記錄由工作行程依分配速率傳輸的位元組數（不等待，行程隔離模式使用）"""
+        if nbytes > 0:
+            self.budget._record(self, nbytes)
+
+    def consume(self, nbytes: int, cancel_event: Optional[threading.Event] = None):
+        """
+        使用 nbytes 的額度，超出目前分配的速率時等待
+
+        Args:
+            nbytes: 新傳輸的位元組數
+            cancel_event: 設定時提早結束等待
+        """
+        if nbytes <= 0:
+            return
+        self.activate()
+        delay = self.budget._charge(self, nbytes)
+        deadline = self.budget._clock() + delay
+        while delay > 0:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            self.budget._sleep(min(delay, CANCEL_POLL_INTERVAL))
+            delay = deadline - self.budget._clock()
+
+
+class BandwidthBudget:
+    """所有任務共用的頻寬預算"""
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        schedule: Optional[List[ScheduleEntry]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        """
+        Args:
+            rate: 總上限（bytes/s），None 表示不限制
+            schedule: 時段排程，時段內以排程的速率取代 rate
+            clock / sleep / now: 時間來源（測試用）
+        """
+        self.rate = rate
+        self.schedule = list(schedule or [])
+        self._clock = clock
+        self._sleep = sleep
+        self._now = now
+        self._lock = threading.Lock()
+        self._shares: List[BandwidthShare] = []
+        self._effective = self._scheduled_rate()
+        self._checked_at = clock()
+
+    # 設定
+
+    def set_rate(self, rate: Optional[float]):
+        """即時調整總上限"""
+        with self._lock:
+            self.rate = rate
+            self._refresh(force=True)
+
+    def set_schedule(self, schedule: List[ScheduleEntry]):
+        """即時調整時段排程"""
+        with self._lock:
+            self.schedule = list(schedule)
+            self._refresh(force=True)
+
+    def effective_rate(self) -> Optional[float]:
+        """目前生效的總上限（已套用時段排程）"""
+        with self._lock:
+            self._refresh()
+            return self._effective
+
+    def register(self, weight: float = 1.0, cap: Optional[float] = None) -> BandwidthShare:
+        """
+        為任務建立額度（開始傳輸時才參與分配）
+
+        Args:
+            weight: 分配權重，優先的任務可設定較大的值
+            cap: 此任務的上限（bytes/s），None 表示只受總上限限制
+        """
+        share = BandwidthShare(self, weight, cap)
+        with self._lock:
+            self._shares.append(share)
+        return share
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前的上限、排程與各任務分配到的速率"""
+        with self._lock:
+            self._refresh()
+            active = [share for share in self._shares if share.active]
+            return {
+                "rate": self.rate,
+                "effective_rate": self._effective,
+                "schedule": format_schedule(self.schedule),
+                "active_tasks": len(active),
+                "tasks": [
+                    {"weight": share.weight, "cap": share.cap, "allocated": share.allocated,
+                     "consumed": share.consumed}
+                    for share in active
+                ],
+            }
+
+    # 分配
+
+    def _scheduled_rate(self) -> Optional[float]:
+        now = self._now()
+        minutes = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            inside = start <= minutes < end if start <= end else (minutes >= start or minutes < end)
+            if inside:
+                return rate
+        return self.rate
+
+    def _refresh(self, force: bool = False):
+        """排程時段改變時重新分配（呼叫端須持有鎖）"""
+        now = self._clock()
+        if not force and now - self._checked_at < BANDWIDTH_SCHEDULE_CHECK:
+            return
+        self._checked_at = now
+        effective = self._scheduled_rate()
+        if force or effective != self._effective:
+            self._effective = effective
+            self._allocate()
+
+    def _allocate(self):
+        """依權重與各任務上限以 max-min 公平分配總上限（呼叫端須持有鎖）"""
+        active = [share for share in self._shares if share.active]
+        for share in self._shares:
+            if not share.active:
+                share.allocated = None
+        if self._effective is None:
+            for share in active:
+                share.allocated = share.cap
+            return
+
+        remaining = self._effective
+        pending = active
+        while pending:
+            total_weight = sum(share.weight for share in pending)
+            fair = remaining / total_weight
+            capped = [share for share in pending if share.cap is not None and share.cap <= fair * share.weight]
+            if not capped:
+                for share in pending:
+                    share.allocated = fair * share.weight
+                return
+            for share in capped:
+                share.allocated = share.cap
+                remaining -= share.cap
+            pending = [share for share in pending if share not in capped]
+
+    def _set_active(self, share: BandwidthShare, active: bool):
+        with self._lock:
+            share.active = active
+            share._tokens = 0.0
+            share._updated = self._clock()
+            self._allocate()
+
+    def _set_cap(self, share: BandwidthShare, cap: Optional[float]):
+        with self._lock:
+            share.cap = cap
+            self._allocate()
+
+    def _remove(self, share: BandwidthShare):
+        with self._lock:
+            if share in self._shares:
+                self._shares.remove(share)
+                self._allocate()
+
+    def _record(self, share: BandwidthShare, nbytes: int):
+        with self._lock:
+            self._refresh()
+            share.consumed += nbytes
+
+    def _charge(self, share: BandwidthShare, nbytes: int) -> float:
+        """扣除額度，回傳需要等待的秒數"""
+        with self._lock:
+            self._refresh()
+            share.consumed += nbytes
+            rate = share.allocated
+            now = self._clock()
+            if rate is None:
+                share._updated = now
+                return 0.0
+            share._tokens = min(share._tokens + (now - share._updated) * rate, rate * BANDWIDTH_BURST)
+            share._updated = now
+            share._tokens -= nbytes
+            return -share._tokens / rate if share._tokens < 0 else 0.0
+
+
+_default_budget: Optional[BandwidthBudget] = None
+_default_lock = threading.Lock()
+
+
+def get_default_budget() -> BandwidthBudget:
+    """取得行程內共用的頻寬預算（初始值讀取 BANDWIDTH_LIMIT 與 BANDWIDTH_SCHEDULE）"""
+    global _default_budget
+    if _default_budget is None:
+        with _default_lock:
+            if _default_budget is None:
+                _default_budget = BandwidthBudget(
+                    rate=parse_rate(os.getenv("BANDWIDTH_LIMIT", str(BANDWIDTH_LIMIT))),
+                    schedule=parse_schedule(os.getenv("BANDWIDTH_SCHEDULE")),
+                )
+    return _default_budget
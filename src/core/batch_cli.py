@@ -0,0 +1,276 @@
+"""
+無介面批次下載指令（`video-downloader batch`）
+
+從檔案或標準輸入串流讀取網址（每行一個、CSV 或逗號分隔皆可，`#` 開頭為註解），
+邊讀邊交給 BatchDownloadManager 並行下載，不需要 Tk。
+進度與結果以 NDJSON（每行一個 JSON 物件）輸出到標準輸出，日誌寫到標準錯誤：
+
+    {"event": "progress", "url": ..., "percentage": 42.0, "downloaded": ..., "total": ..., "speed": ...}
+    {"event": "result", "url": ..., "status": "completed", "file": ..., "retries": 0, ...}
+    {"event": "skipped", "url": ..., "reason": "archived"}
+    {"event": "summary", "total": ..., "completed": ..., "failed": ..., ...}
+
+結束狀態碼：0 全部成功、1 有任務失敗、2 參數錯誤、130 被中斷。
+"""
+
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional
+
+from core.batch_downloader import BatchDownloadManager, BatchTaskInfo, TaskStatus
+from core.autotune import ConcurrencyController
+from core.bandwidth import BandwidthBudget, parse_rate, parse_schedule
+from core.circuit_breaker import breaker_from_env
+from core.constants import (
+    AUDIO_FORMATS,
+    AUTOTUNE_MAX,
+    DEFAULT_DOWNLOAD_PATH,
+    DOWNLOAD_TYPE_AUDIO,
+    DOWNLOAD_TYPE_VIDEO,
+    ENGINE_FAKE,
+    ENGINE_YTDLP,
+    PREFETCH_LOOKAHEAD,
+    RETRY_ATTEMPTS,
+    VIDEO_FORMATS,
+)
+from core.downloader import DownloadManager
+from core.prefetch import MetadataPrefetcher
+from utils.time_utils import parse_timestamp
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def iter_urls(lines: Iterable[str]) -> Iterator[str]:
+    """
+    逐行解析網址
+
+    每行可為單一網址、CSV 列或逗號分隔的多個網址；不是 http(s) 網址的欄位
+    （例如 CSV 標題列或標題欄）與 `#` 開頭的註解行會被略過。
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        for row in csv.reader([line]):
+            for value in row:
+                value = value.strip()
+                if value.lower().startswith(("http://", "https://")):
+                    yield value
+
+
+def iter_inputs(paths: List[str], stdin: IO[str]) -> Iterator[str]:
+    """依序讀取輸入來源（`-` 表示標準輸入），逐行產生而不一次載入"""
+    for path in paths:
+        if path == "-":
+            yield from iter_urls(stdin)
+        else:
+            with open(path, encoding="utf-8-sig") as f:
+                yield from iter_urls(f)
+
+
+class DownloadArchive:
+    """已完成網址的紀錄檔，重複執行時略過其中的網址"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._urls = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._urls = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._urls
+
+    def add(self, url: str):
+        with self._lock:
+            if url in self._urls:
+                return
+            self._urls.add(url)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(url + "\n")
+
+
+class NdjsonWriter:
+    """執行緒安全的 NDJSON 輸出"""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any):
+        line = json.dumps({"event": event, **fields}, ensure_ascii=False, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def _task_result(task_info: BatchTaskInfo) -> Dict[str, Any]:
+    return {
+        "url": task_info.url,
+        "status": task_info.status.value,
+        "file": task_info.downloaded_file or None,
+        "error": task_info.error_message or None,
+        "retries": task_info.retry_count,
+        "bandwidth_saved": task_info.bandwidth_saved,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="video-downloader batch",
+        description="無介面批次下載，以 NDJSON 輸出進度與結果",
+    )
+    parser.add_argument("inputs", nargs="*", default=["-"],
+                        help="網址清單檔案（每行一個、CSV 或逗號分隔），`-` 或省略時讀取標準輸入")
+    parser.add_argument("--type", dest="download_type", choices=[DOWNLOAD_TYPE_VIDEO, DOWNLOAD_TYPE_AUDIO],
+                        default=DOWNLOAD_TYPE_VIDEO, help="下載類型")
+    parser.add_argument("--format", dest="format_option",
+                        help=f"格式選項（影片: {', '.join(VIDEO_FORMATS)}；音訊: {', '.join(AUDIO_FORMATS)}）")
+    parser.add_argument("--output", default=DEFAULT_DOWNLOAD_PATH, help="輸出目錄")
+    parser.add_argument("--concurrency", type=int, default=1, help="同時執行的下載數（自動調整時為初始值）")
+    parser.add_argument("--autotune", action="store_true", help="依傳輸速率、錯誤率與 CPU 負載自動調整並行數")
+    parser.add_argument("--max-concurrency", type=int, default=AUTOTUNE_MAX, help="自動調整的並行數上限")
+    parser.add_argument("--retries", type=int, default=RETRY_ATTEMPTS, help="每個任務的重試次數")
+    parser.add_argument("--circuit-breaker", action="store_true",
+                        help="網站連續失敗時暫停其任務並定期試探（門檻讀取 CIRCUIT_BREAKER_* 環境變數）")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_LOOKAHEAD,
+                        help="下載期間預先解析的排隊任務數（0 停用）")
+    parser.add_argument("--limit-rate", help="所有任務共用的頻寬上限（例如 500K、2M，預設讀取 BANDWIDTH_LIMIT）")
+    parser.add_argument("--schedule", help="依時段設定頻寬上限，例如 \"09:00-18:00=2M, 18:00-09:00=0\"")
+    parser.add_argument("--archive", help="已完成網址的紀錄檔，其中的網址會被略過")
+    parser.add_argument("--start", help="只下載此時間之後的片段（秒或 HH:MM:SS）")
+    parser.add_argument("--end", help="只下載此時間之前的片段（秒或 HH:MM:SS）")
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="每個任務進度事件的最短間隔秒數，0 表示不輸出進度")
+    parser.add_argument("--engine", choices=[ENGINE_YTDLP, ENGINE_FAKE], help="下載引擎（預設讀取 DOWNLOAD_ENGINE）")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None, stdin: Optional[IO[str]] = None,
+         stdout: Optional[IO[str]] = None) -> int:
+    """`video-downloader batch` 指令入口"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    stdin = stdin or sys.stdin
+    output = NdjsonWriter(stdout or sys.stdout)
+
+    formats = AUDIO_FORMATS if args.download_type == DOWNLOAD_TYPE_AUDIO else VIDEO_FORMATS
+    format_option = args.format_option or next(iter(formats))
+    if format_option not in formats:
+        parser.error(f"不支援的格式: {format_option}")
+    try:
+        start_time = parse_timestamp(args.start) if args.start else None
+        end_time = parse_timestamp(args.end) if args.end else None
+        bandwidth = BandwidthBudget(
+            rate=parse_rate(args.limit_rate if args.limit_rate is not None else os.getenv("BANDWIDTH_LIMIT")),
+            schedule=parse_schedule(args.schedule if args.schedule is not None else os.getenv("BANDWIDTH_SCHEDULE")),
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.engine:
+        # 透過環境變數設定，行程模式的工作行程也會使用同一個引擎
+        os.environ["DOWNLOAD_ENGINE"] = args.engine
+
+    archive = DownloadArchive(args.archive) if args.archive else None
+    autotune = None
+    if args.autotune:
+        autotune = ConcurrencyController(initial=max(1, args.concurrency), max_limit=args.max_concurrency)
+    manager = BatchDownloadManager(
+        max_retries=max(0, args.retries),
+        max_workers=max(1, args.concurrency),
+        download_manager=DownloadManager(
+            max_processes=autotune.max_limit if autotune else max(1, args.concurrency),
+            bandwidth=bandwidth),
+        autotune=autotune,
+        breaker=breaker_from_env() if args.circuit_breaker else None,
+        prefetch=MetadataPrefetcher(lookahead=args.prefetch) if args.prefetch > 0 else None,
+    )
+    done = threading.Event()
+    interrupted = threading.Event()
+    last_progress: Dict[int, float] = {}
+
+    def on_progress(data: Dict[str, Any]):
+        if args.progress_interval <= 0 or data.get('status') != 'downloading':
+            return
+        task_info = data['task_info']
+        now = time.monotonic()
+        if now - last_progress.get(task_info.index, 0.0) < args.progress_interval:
+            return
+        last_progress[task_info.index] = now
+        output.emit(
+            "progress",
+            url=task_info.url,
+            percentage=round(data.get('percentage') or 0.0, 1),
+            downloaded=data.get('downloaded'),
+            total=data.get('total'),
+            speed=data.get('speed'),
+        )
+
+    def on_task_done(task_info: BatchTaskInfo, _summary: Dict[str, Any]):
+        last_progress.pop(task_info.index, None)
+        if archive and task_info.status == TaskStatus.COMPLETED:
+            archive.add(task_info.url)
+        output.emit("result", **_task_result(task_info))
+
+    manager.progress_callback = on_progress
+    manager.task_complete_callback = on_task_done
+    manager.batch_complete_callback = lambda _summary: done.set()
+
+    def stop(*_):
+        interrupted.set()
+        manager.stop_batch_download()
+
+    previous_handler = None
+    if hasattr(signal, "SIGTERM") and threading.current_thread() is threading.main_thread():
+        previous_handler = signal.signal(signal.SIGTERM, stop)
+
+    skipped = 0
+    manager.start_batch_download(streaming=True)
+    try:
+        for url in iter_inputs(args.inputs, stdin):
+            if interrupted.is_set():
+                break
+            if archive and url in archive:
+                skipped += 1
+                output.emit("skipped", url=url, reason="archived")
+                continue
+            manager.add_url(url, args.download_type, format_option, args.output, start_time, end_time)
+        manager.finish_input()
+        while not done.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        stop()
+        manager.worker_thread.join()
+    except OSError as e:
+        output.emit("error", message=str(e))
+        stop()
+        manager.worker_thread.join()
+        return EXIT_USAGE
+    finally:
+        if previous_handler is not None:
+            signal.signal(signal.SIGTERM, previous_handler)
+        if manager.prefetch:
+            manager.prefetch.close()
+        manager.download_manager.shutdown()
+
+    summary = manager.get_task_summary()
+    summary.pop('current_index', None)
+    output.emit("summary", skipped=skipped, **summary)
+
+    if interrupted.is_set():
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if summary['failed'] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,12 +4,21 @@
 
 import threading
 import time
-from typing import List, Dict, Callable, Optional
-from dataclasses import dataclass
+import uuid
+from typing import List, Dict, Callable, Optional, Set, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
-from queue import Queue
+from queue import Empty
 
-from core.downloader import DownloadTask, DownloadManager
+from core.autotune import ConcurrencyController
+from core.circuit_breaker import CircuitBreaker, circuit_key
+from core.constants import PRIORITY_NORMAL, QUEUE_POLL_INTERVAL
+from core.downloader import DownloadTask, DownloadManager, estimate_full_size
+from core.engine import DownloadRequest
+from core.prefetch import MetadataPrefetcher
+from core.scheduler import PriorityTaskQueue, estimate_seconds
+from core.task_store import TaskStore
+from core.worker import build_initial_state, build_job_payload
 from utils.logger import Logger
 
 
@@ -17,6 +26,7 @@ class TaskStatus(Enum):
     """任務狀態"""
     PENDING = "pending"
     DOWNLOADING = "downloading"
+    PARKED = "parked"
     COMPLETED = "completed"
     FAILED = "failed"
     CANCELLED = "cancelled"
@@ -28,25 +38,68 @@ class BatchTaskInfo:
     url: str
     download_type: str
     format_option: str
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
     status: TaskStatus = TaskStatus.PENDING
     retry_count: int = 0
     error_message: str = ""
     downloaded_file: str = ""
+    bandwidth_saved: Optional[int] = None
+    # 優先權（越大越先執行）與預先取得的大小/長度（短任務優先時使用）
+    priority: int = PRIORITY_NORMAL
+    estimated_size: Optional[int] = None
+    duration: Optional[float] = None
+    # 在 tasks 中的位置（避免以 list.index 線性搜尋）
+    index: int = field(default=-1, compare=False)
 
 
 class BatchDownloadManager:
-    """批次下載管理器"""
+    """批次下載管理器
+
+    預設在本行程執行（max_workers 個任務同時下載；提供 autotune 時由控制器在其上下限內
+    調整同時下載數）；提供 task_store 時改為工作產生者，
+    將任務放入共享佇列交由 `video-downloader worker` 執行並追蹤其狀態。
+    以 streaming=True 開始時可在下載期間持續新增任務，呼叫 finish_input 後才會結束。
+    排隊中的任務依優先權（含老化）與 sjf 時的預估長度排序，可用 set_priority / move_to_front 調整。
+    提供 breaker 時，網站的斷路器開啟期間其任務會被擱置（PARKED），恢復後重新排入佇列。
+    提供 prefetch 時，在背景預先解析接下來幾個排隊中的任務，下載時直接使用解析結果。
+    """
     
-    def __init__(self, max_retries: int = 3):
+    def __init__(
+        self,
+        max_retries: int = 3,
+        task_store: Optional[TaskStore] = None,
+        max_workers: int = 1,
+        download_manager: Optional[DownloadManager] = None,
+        autotune: Optional[ConcurrencyController] = None,
+        sjf: bool = False,
+        breaker: Optional[CircuitBreaker] = None,
+        prefetch: Optional[MetadataPrefetcher] = None,
+    ):
         self.max_retries = max_retries
-        self.task_queue = Queue()
+        self.task_store = task_store
+        self.autotune = autotune
+        # 自動調整時依上限建立執行緒，實際同時下載數由控制器的執行槽限制
+        self.max_workers = autotune.max_limit if autotune else max(1, max_workers)
+        self.task_queue = PriorityTaskQueue(sjf=sjf)
+        self.breaker = breaker
+        # 斷路器鍵 -> 擱置的任務
+        self._parked: Dict[str, List[Tuple[BatchTaskInfo, str]]] = {}
         self.tasks: List[BatchTaskInfo] = []
-        self.download_manager = DownloadManager()
+        self.download_manager = download_manager or DownloadManager()
+        self.prefetch = prefetch
+        if prefetch and prefetch.engine is None:
+            prefetch.engine = self.download_manager.engine
         self.logger = Logger()
         
         self.is_running = False
         self.worker_thread = None
         self.current_task_index = -1
+        self._lock = threading.Lock()
+        self._running_tasks: Set[DownloadTask] = set()
+        self._in_progress = 0
+        self._streaming = False
+        self._submitted: Dict[str, Tuple[BatchTaskInfo, str]] = {}
         
         # 回調函數
         self.progress_callback: Optional[Callable] = None
@@ -54,46 +107,137 @@ class BatchDownloadManager:
         self.batch_complete_callback: Optional[Callable] = None
         
     def add_urls_from_text(self, urls_text: str, download_type: str, 
-                          format_option: str, output_path: str) -> int:
-        """從文字新增URL清單（逗號分隔）"""
+                          format_option: str, output_path: str,
+                          start_time: Optional[float] = None,
+                          end_time: Optional[float] = None) -> int:
+        """從文字新增URL清單（逗號分隔）；指定時間範圍時每個網址只下載該片段"""
         urls = [url.strip() for url in urls_text.split(',') if url.strip()]
         
         for url in urls:
-            task_info = BatchTaskInfo(
-                url=url,
-                download_type=download_type,
-                format_option=format_option
-            )
-            self.tasks.append(task_info)
-            self.task_queue.put((task_info, output_path))
+            self.add_url(url, download_type, format_option, output_path, start_time, end_time)
             
         self.logger.info(f"新增 {len(urls)} 個下載任務")
         return len(urls)
+
+    def add_url(self, url: str, download_type: str, format_option: str, output_path: str,
+                start_time: Optional[float] = None, end_time: Optional[float] = None,
+                priority: int = PRIORITY_NORMAL, estimated_size: Optional[int] = None,
+                duration: Optional[float] = None) -> BatchTaskInfo:
+        """
+        新增單一下載任務（批次執行中也可新增）
+
+        priority 越大越先執行；estimated_size / duration 為預先取得的大小與長度，
+        啟用短任務優先時用來估計下載時間。
+        """
+        task_info = BatchTaskInfo(
+            url=url,
+            download_type=download_type,
+            format_option=format_option,
+            start_time=start_time,
+            end_time=end_time,
+            priority=priority,
+            estimated_size=estimated_size,
+            duration=duration,
+        )
+        with self._lock:
+            task_info.index = len(self.tasks)
+            self.tasks.append(task_info)
+        self._enqueue(task_info, output_path)
+        if self.is_running:
+            self._prefetch_ahead()
+        return task_info
+
+    def _enqueue(self, task_info: BatchTaskInfo, output_path: str):
+        cost = estimate_seconds(task_info.estimated_size, task_info.duration,
+                                task_info.start_time, task_info.end_time)
+        self.task_queue.put((task_info, output_path), priority=task_info.priority,
+                            cost_seconds=cost, handle=task_info.index)
+
+    def set_priority(self, index: int, priority: int) -> bool:
+        """調整排隊中任務的優先權，任務已開始或不存在時回傳 False"""
+        if not 0 <= index < len(self.tasks):
+            return False
+        self.tasks[index].priority = priority
+        return self.task_queue.reprioritize(index, priority)
+
+    def move_to_front(self, index: int) -> bool:
+        """將排隊中的任務移到最前面，任務已開始或不存在時回傳 False"""
+        return self.task_queue.move_to_front(index)
+
+    def get_queue_order(self) -> List[BatchTaskInfo]:
+        """依執行順序列出排隊中的任務"""
+        return [self.tasks[entry["handle"]] for entry in self.task_queue.snapshot()]
     
-    def start_batch_download(self):
-        """開始批次下載"""
+    def start_batch_download(self, streaming: bool = False):
+        """
+        開始批次下載
+
+        Args:
+            streaming: 是否持續接收新任務，直到呼叫 finish_input
+        """
         if self.is_running:
             return False
             
-        if not self.tasks:
+        if not self.tasks and not streaming:
             return False
             
+        self._streaming = streaming
         self.is_running = True
-        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+        target = self._remote_loop if self.task_store else self._worker_loop
+        self.worker_thread = threading.Thread(target=target, daemon=True)
         self.worker_thread.start()
         
         self.logger.info("開始批次下載")
         return True
     
-    def stop_batch_download(self):
-        """停止批次下載"""
+    def stop_batch_download(self, wait: Optional[float] = None) -> bool:
+        """
+        停止批次下載
+
+        取消進行中的任務並將尚未開始的任務標記為已取消；
+        共享佇列模式下會要求執行者取消已送出的任務。
+
+        Args:
+            wait: 等待工作執行緒結束的秒數，None 表示不等待
+
+        Returns:
+            bool: 工作執行緒是否已結束
+        """
         self.is_running = False
+
+        for task_info in self.tasks:
+            if task_info.status in (TaskStatus.PENDING, TaskStatus.PARKED):
+                task_info.status = TaskStatus.CANCELLED
+
+        with self._lock:
+            parked = list(self._parked.items())
+            self._parked.clear()
+        for key, entries in parked:
+            self.breaker.unpark(key, len(entries))
+        if self.prefetch:
+            self.prefetch.retain(())
         
-        # 取消當前任務
-        if hasattr(self, '_current_download_task') and self._current_download_task:
-            self._current_download_task.cancel()
+        self._streaming = False
+
+        # 取消進行中的任務
+        with self._lock:
+            running = list(self._running_tasks)
+        for current_task in running:
+            current_task.cancel()
+
+        if self.task_store:
+            for task_id in list(self._submitted):
+                try:
+                    self.task_store.update_task(task_id, cancel_requested=True)
+                except Exception as e:
+                    self.logger.warning(f"無法送出取消要求 {task_id}: {e}")
             
         self.logger.info("停止批次下載")
+
+        if wait is not None and self.worker_thread:
+            self.worker_thread.join(wait)
+            return not self.worker_thread.is_alive()
+        return True
     
     def clear_tasks(self):
         """清除所有任務"""
@@ -106,9 +250,16 @@ class BatchDownloadManager:
                 self.task_queue.get_nowait()
             except:
                 break
+        # 索引會被新任務重新使用，丟棄舊任務的預先解析（包含停止後才送出的）
+        if self.prefetch:
+            self.prefetch.retain(())
                 
         self.current_task_index = -1
         self.logger.info("清除所有任務")
+
+    def finish_input(self):
+        """不再新增任務，佇列中的任務完成後結束批次"""
+        self._streaming = False
     
     def get_task_summary(self) -> Dict:
         """取得任務摘要"""
@@ -117,6 +268,9 @@ class BatchDownloadManager:
         failed = sum(1 for task in self.tasks if task.status == TaskStatus.FAILED)
         pending = sum(1 for task in self.tasks if task.status == TaskStatus.PENDING)
         downloading = sum(1 for task in self.tasks if task.status == TaskStatus.DOWNLOADING)
+        parked = sum(1 for task in self.tasks if task.status == TaskStatus.PARKED)
+        cancelled = sum(1 for task in self.tasks if task.status == TaskStatus.CANCELLED)
+        bandwidth_saved = sum(task.bandwidth_saved or 0 for task in self.tasks)
         
         return {
             'total': total,
@@ -124,24 +278,148 @@ class BatchDownloadManager:
             'failed': failed,
             'pending': pending,
             'downloading': downloading,
+            'parked': parked,
+            'cancelled': cancelled,
+            'bandwidth_saved': bandwidth_saved,
             'current_index': self.current_task_index + 1 if self.current_task_index >= 0 else 0
         }
     
     def _worker_loop(self):
-        """工作執行緒主迴圈"""
-        while self.is_running and not self.task_queue.empty():
+        """工作執行緒主迴圈：啟動 max_workers 個下載執行緒並等待全部結束"""
+        if self.max_workers == 1:
+            self._download_loop()
+        else:
+            workers = [
+                threading.Thread(target=self._download_loop, daemon=True)
+                for _ in range(self.max_workers)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self._finish_batch()
+
+    def _download_loop(self):
+        """依序取出並執行任務；佇列已空且沒有可能重新排入的任務時結束"""
+        while self.is_running:
+            if self.autotune and not self.autotune.acquire(timeout=QUEUE_POLL_INTERVAL):
+                if self._is_idle() and not self._streaming and self.task_queue.empty():
+                    return
+                continue
             try:
-                task_info, output_path = self.task_queue.get(timeout=1)
-                self.current_task_index = self.tasks.index(task_info)
-                
-                if task_info.status == TaskStatus.CANCELLED:
-                    continue
-                    
+                if not self._take_and_process():
+                    return
+            finally:
+                if self.autotune:
+                    self.autotune.release()
+
+    def _is_idle(self) -> bool:
+        """沒有執行中或擱置的任務（不會再有任務重新排入佇列）"""
+        with self._lock:
+            return self._in_progress == 0 and not self._parked
+
+    def _take_and_process(self) -> bool:
+        """取出並執行一個任務，回傳 False 表示下載執行緒應結束"""
+        self._resume_parked()
+        try:
+            task_info, output_path = self.task_queue.get_nowait()
+        except Empty:
+            if self._is_idle() and not self._streaming:
+                return False
+            try:
+                task_info, output_path = self.task_queue.get(timeout=QUEUE_POLL_INTERVAL)
+            except Empty:
+                return True
+
+        if (self.breaker and task_info.status != TaskStatus.CANCELLED
+                and not self.breaker.allow(circuit_key(task_info.url))):
+            self._park(task_info, output_path)
+            return True
+
+        with self._lock:
+            self._in_progress += 1
+        try:
+            self.current_task_index = task_info.index
+
+            if task_info.status != TaskStatus.CANCELLED:
                 self._process_single_task(task_info, output_path)
-                
-            except Exception as e:
-                self.logger.error(f"批次下載工作執行緒錯誤: {e}")
-                
+
+        except Exception as e:
+            self.logger.error(f"批次下載工作執行緒錯誤: {e}")
+        finally:
+            with self._lock:
+                self._in_progress -= 1
+        return True
+
+    def _park(self, task_info: BatchTaskInfo, output_path: str):
+        """網站的斷路器開啟中，擱置任務（不計入重試次數）"""
+        key = circuit_key(task_info.url)
+        task_info.status = TaskStatus.PARKED
+        with self._lock:
+            self._parked.setdefault(key, []).append((task_info, output_path))
+        self.breaker.park(key)
+        self.logger.info(f"網站 {key} 暫時異常，擱置任務: {task_info.url}")
+
+    def _resume_parked(self):
+        """斷路器可試探或已關閉的網站，將擱置的任務重新排入佇列"""
+        if not self.breaker or not self._parked:
+            return
+        resumed = []
+        with self._lock:
+            for key in list(self._parked):
+                if self.breaker.ready(key):
+                    resumed.append((key, self._parked.pop(key)))
+        for key, entries in resumed:
+            self.breaker.unpark(key, len(entries))
+            for task_info, output_path in entries:
+                if task_info.status == TaskStatus.PARKED:
+                    task_info.status = TaskStatus.PENDING
+                    self._enqueue(task_info, output_path)
+
+    def _prefetch_ahead(self):
+        """預先解析接下來 lookahead 個排隊中的任務（略過斷路器開啟中的網站）"""
+        if not self.prefetch:
+            return
+        self.prefetch.expire()
+        upcoming = self.task_queue.peek(self.prefetch.lookahead)
+        ahead = {task_info.index for task_info, _ in upcoming}
+        # 排序已落後或已取消的任務讓出名額；已取出等待執行的任務保留給 _process_single_task
+        # clear_tasks 後舊任務的索引可能已不存在
+        self.prefetch.retain(
+            handle for handle in self.prefetch.handles()
+            if handle in ahead or (handle not in self.task_queue and handle < len(self.tasks)
+                                   and self.tasks[handle].status in (TaskStatus.PENDING, TaskStatus.DOWNLOADING))
+        )
+        for task_info, output_path in upcoming:
+            if task_info.status != TaskStatus.PENDING:
+                continue
+            if self.breaker and not self.breaker.ready(circuit_key(task_info.url)):
+                continue
+            request = DownloadRequest(
+                url=task_info.url,
+                download_type=task_info.download_type,
+                output_path=output_path,
+                format_option=task_info.format_option,
+                start_time=task_info.start_time,
+                end_time=task_info.end_time,
+            )
+            self.prefetch.submit(task_info.index, request,
+                                 on_ready=lambda info, t=task_info: self._on_prefetched(t, info))
+
+    def _on_prefetched(self, task_info: BatchTaskInfo, info: dict):
+        """預先解析完成：補上預估大小與長度，短任務優先時更新排序"""
+        if task_info.estimated_size is None:
+            task_info.estimated_size = estimate_full_size(info) or None
+        if task_info.duration is None:
+            task_info.duration = info.get('duration')
+        if self.task_queue.sjf:
+            cost = estimate_seconds(task_info.estimated_size, task_info.duration,
+                                    task_info.start_time, task_info.end_time)
+            self.task_queue.set_cost(task_info.index, cost)
+
+    def _finish_batch(self):
+        """結束批次並觸發完成回調"""
         self.is_running = False
         
         # 批次完成回調
@@ -149,51 +427,160 @@ class BatchDownloadManager:
             self.batch_complete_callback(self.get_task_summary())
             
         self.logger.info("批次下載完成")
+
+    def _remote_loop(self):
+        """工作產生者模式：將任務送入共享佇列並輪詢狀態"""
+        submitted = self._submitted
+        submitted.clear()
+
+        while self.is_running and (submitted or self._streaming or not self.task_queue.empty()):
+            try:
+                while True:
+                    task_info, output_path = self.task_queue.get_nowait()
+                    if task_info.status == TaskStatus.CANCELLED:
+                        continue
+                    task_id = str(uuid.uuid4())
+                    payload = build_job_payload(
+                        url=task_info.url,
+                        download_type=task_info.download_type,
+                        format_option=task_info.format_option,
+                        output_path=output_path,
+                        start_time=task_info.start_time,
+                        end_time=task_info.end_time,
+                        priority=task_info.priority,
+                        estimated_size=task_info.estimated_size,
+                        duration=task_info.duration,
+                    )
+                    self.task_store.create_task(task_id, build_initial_state(task_id, payload))
+                    self.task_store.enqueue_job(task_id, payload)
+                    submitted[task_id] = (task_info, output_path)
+            except Empty:
+                pass
+
+            for task_id, (task_info, output_path) in list(submitted.items()):
+                try:
+                    state = self.task_store.get_task(task_id)
+                except Exception as e:
+                    self.logger.error(f"查詢共享任務狀態失敗: {e}")
+                    continue
+                if not state:
+                    continue
+
+                status = state.get("status")
+                if status == "parked":
+                    task_info.status = TaskStatus.PARKED
+                elif status in {"downloading", "postprocessing"}:
+                    task_info.status = TaskStatus.DOWNLOADING
+                    self.current_task_index = task_info.index
+                    if status == "downloading":
+                        self._on_task_progress(task_info, {
+                            'status': 'downloading',
+                            'downloaded': state.get("downloaded_bytes") or 0,
+                            'total': state.get("total_bytes") or 0,
+                            'percentage': state.get("progress") or 0.0,
+                            'speed': 0,
+                            'eta': 0,
+                        })
+                elif status == "completed":
+                    del submitted[task_id]
+                    self._on_task_complete(task_info, state.get("file_path") or "", state.get("bandwidth_saved"))
+                elif status == "cancelled":
+                    del submitted[task_id]
+                    task_info.status = TaskStatus.CANCELLED
+                elif status == "failed":
+                    del submitted[task_id]
+                    self._on_task_error(task_info, state.get("message") or "")
+                    self._handle_task_result(task_info, output_path, False)
+
+            time.sleep(QUEUE_POLL_INTERVAL)
+
+        self._finish_batch()
     
     def _process_single_task(self, task_info: BatchTaskInfo, output_path: str):
         """處理單一任務"""
         task_info.status = TaskStatus.DOWNLOADING
+        prefetched_info = None
+        if self.prefetch:
+            prefetched_info = self.prefetch.take(task_info.index)
+            self._prefetch_ahead()
         
         # 建立下載任務
-        self._current_download_task = self.download_manager.create_task(
+        download_task = self.download_manager.create_task(
             url=task_info.url,
             download_type=task_info.download_type,
             output_path=output_path,
             format_option=task_info.format_option,
+            start_time=task_info.start_time,
+            end_time=task_info.end_time,
+            prefetched_info=prefetched_info,
             progress_callback=lambda data: self._on_task_progress(task_info, data),
-            complete_callback=lambda file_path, info: self._on_task_complete(task_info, file_path),
+            complete_callback=lambda file_path, info: self._on_task_complete(
+                task_info, file_path, (info or {}).get('bandwidth_saved')),
             error_callback=lambda error: self._on_task_error(task_info, error)
         )
         
+        with self._lock:
+            self._running_tasks.add(download_task)
+        # 停止批次後才建立的任務直接取消
+        if not self.is_running:
+            download_task.cancel()
+
         # 執行下載
-        success = self._current_download_task.execute()
-        
-        # 清理
-        self.download_manager.remove_task(self._current_download_task)
-        self._current_download_task = None
+        success = False
+        try:
+            success = download_task.execute()
+        finally:
+            # 清理
+            with self._lock:
+                self._running_tasks.discard(download_task)
+            self.download_manager.remove_task(download_task)
+            if self.autotune:
+                if download_task.is_cancelled():
+                    self.autotune.discard(task_info.index)
+                else:
+                    self.autotune.record_result(task_info.index, success, task_info.error_message)
+            if self.breaker:
+                if download_task.is_cancelled():
+                    self.breaker.release(circuit_key(task_info.url))
+                else:
+                    self.breaker.record(circuit_key(task_info.url), success, task_info.error_message)
         
+        self._handle_task_result(task_info, output_path, success)
+
+    def _handle_task_result(self, task_info: BatchTaskInfo, output_path: str, success: bool):
+        """依結果決定重試或標記失敗"""
+        if not success and not self.is_running:
+            task_info.status = TaskStatus.CANCELLED
+            return
+
         # 如果失敗且未達重試上限，重新加入佇列
         if not success and task_info.retry_count < self.max_retries and self.is_running:
             task_info.retry_count += 1
             task_info.status = TaskStatus.PENDING
-            self.task_queue.put((task_info, output_path))
+            self._enqueue(task_info, output_path)
             self.logger.info(f"任務重試 ({task_info.retry_count}/{self.max_retries}): {task_info.url}")
         elif not success:
             task_info.status = TaskStatus.FAILED
             self.logger.error(f"任務最終失敗: {task_info.url}")
+            if self.task_complete_callback:
+                self.task_complete_callback(task_info, self.get_task_summary())
     
     def _on_task_progress(self, task_info: BatchTaskInfo, data: dict):
         """任務進度回調"""
+        if self.autotune and data.get('downloaded') is not None:
+            self.autotune.record_progress(task_info.index, data['downloaded'])
         if self.progress_callback:
             # 加入任務資訊
             data['task_info'] = task_info
             data['batch_summary'] = self.get_task_summary()
             self.progress_callback(data)
     
-    def _on_task_complete(self, task_info: BatchTaskInfo, file_path: str):
+    def _on_task_complete(self, task_info: BatchTaskInfo, file_path: str,
+                          bandwidth_saved: Optional[int] = None):
         """任務完成回調"""
         task_info.status = TaskStatus.COMPLETED
         task_info.downloaded_file = file_path
+        task_info.bandwidth_saved = bandwidth_saved
         
         if self.task_complete_callback:
             self.task_complete_callback(task_info, self.get_task_summary())
@@ -0,0 +1,173 @@
+"""
+下載任務的強制取消範圍
+
+在任務執行緒中登記 yt-dlp 建立的網路連線與子行程（FFmpeg 等），
+取消時直接中斷連線並終止子行程，讓卡在解析、停滯連線或後處理中的任務
+也能在有限時間內結束。
+"""
+
+import glob
+import os
+import re
+import socket
+import subprocess
+import threading
+import weakref
+from typing import List, Optional
+
+from utils.logger import Logger
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+# yt-dlp 下載中途留下的暫存檔樣式
+_PARTIAL_PATTERN = re.compile(
+    r'(\.part(-Frag\d+)?|\.ytdl|\.temp(\.\w+)?|\.f(\d[\w-]*|(hls|dash|http)-[\w-]+)\.\w+(\.part)?)$'
+)
+
+
+class CancelledError(Exception):
+    """任務已被取消"""
+
+
+class CancelScope:
+    """單一任務可被強制中斷的資源集合"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._sockets: "weakref.WeakSet[socket.socket]" = weakref.WeakSet()
+        self._processes: List[subprocess.Popen] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "CancelScope":
+        install_hooks()
+        self._previous = getattr(_local, "scope", None)
+        _local.scope = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.scope = self._previous
+
+    def register_socket(self, sock: socket.socket):
+        with self._lock:
+            self._sockets.add(sock)
+        if self.cancelled.is_set():
+            _shutdown_socket(sock)
+
+    def sockets(self) -> List[socket.socket]:
+        """取得已登記且尚未回收的連線"""
+        with self._lock:
+            return list(self._sockets)
+
+    def register_process(self, process: subprocess.Popen):
+        with self._lock:
+            self._processes = [p for p in self._processes if p.poll() is None]
+            self._processes.append(process)
+        if self.cancelled.is_set():
+            _kill_process(process)
+
+    def cancel(self):
+        """中斷所有已登記的連線並終止子行程"""
+        self.cancelled.set()
+        with self._lock:
+            sockets = list(self._sockets)
+            processes = list(self._processes)
+        for sock in sockets:
+            _shutdown_socket(sock)
+        for process in processes:
+            _kill_process(process)
+
+
+def current_scope() -> Optional[CancelScope]:
+    """取得目前執行緒所屬的取消範圍"""
+    return getattr(_local, "scope", None)
+
+
+def _shutdown_socket(sock: socket.socket):
+    """中斷連線，讓阻塞中的讀取立即返回"""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _kill_process(process: subprocess.Popen):
+    """終止子行程"""
+    if process.poll() is not None:
+        return
+    try:
+        process.terminate()
+        process.wait(1)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    except OSError:
+        pass
+
+
+def install_hooks():
+    """
+    安裝連線與子行程登記掛鉤（僅第一次呼叫時生效）
+
+    未在取消範圍內的執行緒只多一次 thread-local 查詢，不影響其他程式碼。
+    """
+    global _installed
+    if _installed:
+        return
+    with _install_lock:
+        if _installed:
+            return
+
+        original_connect = socket.socket.connect
+
+        def _connect(sock, address):
+            scope = current_scope()
+            if scope is not None:
+                scope.register_socket(sock)
+            return original_connect(sock, address)
+
+        socket.socket.connect = _connect
+
+        try:
+            from yt_dlp.utils import Popen
+        except ImportError:
+            Popen = None
+
+        if Popen is not None:
+            original_init = Popen.__init__
+
+            def _popen_init(process, *args, **kwargs):
+                original_init(process, *args, **kwargs)
+                scope = current_scope()
+                if scope is not None:
+                    scope.register_process(process)
+
+            Popen.__init__ = _popen_init
+
+        _installed = True
+
+
+def cleanup_partial_files(expected_file: Optional[str]) -> int:
+    """
+    刪除指定輸出檔名對應的下載暫存檔
+
+    Args:
+        expected_file: yt-dlp 預計的輸出檔案路徑
+
+    Returns:
+        int: 刪除的檔案數
+    """
+    if not expected_file:
+        return 0
+
+    stem, _ = os.path.splitext(expected_file)
+    removed = 0
+    for path in glob.glob(glob.escape(stem) + ".*"):
+        if not _PARTIAL_PATTERN.search(path[len(stem):]):
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError as e:
+            Logger().warning(f"無法刪除暫存檔 {path}: {e}")
+    return removed
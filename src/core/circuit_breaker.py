@@ -0,0 +1,292 @@
+"""
+網站斷路器
+
+網站改版、故障或封鎖時，佇列中同一網站的每個網址仍會完整跑一次解析、失敗與重試，
+浪費執行時間也可能讓封鎖更嚴重。斷路器依網站（主機名稱）統計最近的結果：
+
+- closed: 正常執行；視窗內至少 min_requests 個結果且失敗比例達 failure_ratio 時開啟
+- open: 執行者擱置該網站的任務（不計為失敗），冷卻時間過後轉為 half_open
+- half_open: 只放行一個試探任務；成功則關閉並恢復擱置的任務，失敗則再次開啟並加倍冷卻時間
+
+個別影片的錯誤（私人影片、已移除、FFmpeg 未安裝等）與取消不計入。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from core.constants import (
+    CIRCUIT_BREAKER_COOLDOWN,
+    CIRCUIT_BREAKER_FAILURE_RATIO,
+    CIRCUIT_BREAKER_MAX_COOLDOWN,
+    CIRCUIT_BREAKER_MIN_REQUESTS,
+    CIRCUIT_BREAKER_WINDOW,
+    ERROR_MESSAGES,
+)
+from utils.logger import Logger
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 同一網站的其他網域
+_HOST_ALIASES = {
+    "youtu.be": "youtube.com",
+    "youtube-nocookie.com": "youtube.com",
+    "b23.tv": "bilibili.com",
+}
+_HOST_PREFIXES = ("www.", "m.", "music.", "mobile.")
+# 只與單一影片或本機環境有關、不代表網站異常的錯誤
+# 驗證失敗也不計入：網站已回應且傳完資料，檔案毀損或截斷只影響該影片，
+# 重試會重新下載同一個檔案，不應讓同網站的其他任務一併被擱置
+_ITEM_ERROR_KEYS = (
+    "invalid_clip_range",
+    "disk_space_error",
+    "permission_error",
+    "ffmpeg_not_found",
+    "encoder_not_found",
+    "clip_requires_ffmpeg",
+    "verification_failed",
+)
+_ITEM_ERROR_MARKERS = (
+    "private video",
+    "video unavailable",
+    "has been removed",
+    "copyright",
+    "members-only",
+    "sign in to confirm your age",
+    "ffmpeg",
+) + tuple(ERROR_MESSAGES[key].split("{")[0].lower() for key in _ITEM_ERROR_KEYS)
+
+
+def circuit_key(url: str) -> str:
+    """網址所屬網站的斷路器鍵（主機名稱，去除 www. 等前綴並合併短網址網域）"""
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return _HOST_ALIASES.get(host, host)
+
+
+def is_site_failure(message: Optional[str]) -> bool:
+    """錯誤是否可能代表網站異常（單一影片的錯誤不計入斷路器）"""
+    text = (message or "").lower()
+    return not any(marker in text for marker in _ITEM_ERROR_MARKERS)
+
+
+@dataclass
+class _Circuit:
+    state: str = STATE_CLOSED
+    results: Deque[Tuple[float, bool]] = field(default_factory=deque)
+    opened_at: float = 0.0
+    cooldown: float = 0.0
+    probing: bool = False
+    trips: int = 0
+    parked: int = 0
+    last_error: str = ""
+
+
+class CircuitBreaker:
+    """依網站開啟/關閉的斷路器（執行緒安全）"""
+
+    def __init__(
+        self,
+        failure_ratio: float = CIRCUIT_BREAKER_FAILURE_RATIO,
+        min_requests: int = CIRCUIT_BREAKER_MIN_REQUESTS,
+        window: float = CIRCUIT_BREAKER_WINDOW,
+        cooldown: float = CIRCUIT_BREAKER_COOLDOWN,
+        max_cooldown: float = CIRCUIT_BREAKER_MAX_COOLDOWN,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            failure_ratio: 開啟斷路器的失敗比例
+            min_requests: 視窗內至少需要的結果數
+            window: 統計視窗（秒）
+            cooldown: 開啟後等待試探的秒數
+            max_cooldown: 試探連續失敗時冷卻時間的上限
+            clock: 時間來源（測試用）
+        """
+        self.failure_ratio = failure_ratio
+        self.min_requests = max(1, min_requests)
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max(cooldown, max_cooldown)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._circuits: Dict[str, _Circuit] = {}
+        self.logger = Logger()
+
+    def _circuit(self, key: str) -> _Circuit:
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = _Circuit()
+        return circuit
+
+    def _remaining(self, circuit: _Circuit) -> float:
+        if circuit.state != STATE_OPEN:
+            return 0.0
+        return max(0.0, circuit.opened_at + circuit.cooldown - self._clock())
+
+    def allow(self, key: str) -> bool:
+        """
+        是否可執行該網站的任務
+
+        開啟中的斷路器冷卻結束後轉為半開並放行一個試探任務；
+        回傳 False 時執行者應擱置任務，待 ready 為 True 後再試。
+        """
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state == STATE_CLOSED:
+                return True
+            if circuit.state == STATE_OPEN:
+                if self._remaining(circuit) > 0:
+                    return False
+                circuit.state = STATE_HALF_OPEN
+                circuit.probing = False
+            if circuit.probing:
+                return False
+            circuit.probing = True
+            self.logger.info(f"斷路器半開，試探網站: {key}")
+            return True
+
+    def ready(self, key: str) -> bool:
+        """擱置的任務是否可以再試（不改變狀態）"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.state == STATE_CLOSED:
+                return True
+            if circuit.state == STATE_OPEN:
+                return self._remaining(circuit) <= 0
+            return not circuit.probing
+
+    def record(self, key: str, success: bool, error_message: Optional[str] = None):
+        """記錄任務結果（單一影片的錯誤不計入）"""
+        if not success and not is_site_failure(error_message):
+            self.release(key)
+            return
+        with self._lock:
+            circuit = self._circuit(key)
+            if not success:
+                circuit.last_error = (error_message or "")[:200]
+            if circuit.state == STATE_HALF_OPEN:
+                if success:
+                    self._close(key, circuit)
+                else:
+                    self._open(key, circuit, min(circuit.cooldown * 2, self.max_cooldown))
+                return
+            if circuit.state == STATE_OPEN:
+                # 開啟前已開始的任務，結果不影響冷卻
+                return
+
+            now = self._clock()
+            circuit.results.append((now, success))
+            self._prune(circuit, now)
+            total = len(circuit.results)
+            failures = sum(1 for _, ok in circuit.results if not ok)
+            if total >= self.min_requests and failures / total >= self.failure_ratio:
+                self._open(key, circuit, self.cooldown)
+
+    def release(self, key: str):
+        """任務被取消或因單一影片錯誤結束，不計入結果；試探任務由下一個任務接替"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None and circuit.state == STATE_HALF_OPEN:
+                circuit.probing = False
+
+    def reset(self, key: str) -> bool:
+        """手動關閉斷路器，不存在時回傳 False"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                return False
+            self._close(key, circuit)
+            return True
+
+    def park(self, key: str):
+        """記錄一個因斷路器而擱置的任務"""
+        with self._lock:
+            self._circuit(key).parked += 1
+
+    def unpark(self, key: str, count: int = 1):
+        """擱置的任務恢復執行或被取消"""
+        with self._lock:
+            circuit = self._circuit(key)
+            circuit.parked = max(0, circuit.parked - count)
+
+    def retry_after(self, key: str) -> float:
+        """距離下次試探的秒數"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return self._remaining(circuit) if circuit else 0.0
+
+    def state(self, key: str) -> str:
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit.state if circuit else STATE_CLOSED
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各網站的狀態、視窗內的結果、開啟次數與擱置的任務數"""
+        with self._lock:
+            now = self._clock()
+            entries = []
+            for key, circuit in sorted(self._circuits.items()):
+                self._prune(circuit, now)
+                total = len(circuit.results)
+                failures = sum(1 for _, ok in circuit.results if not ok)
+                entries.append({
+                    "key": key,
+                    "state": circuit.state,
+                    "requests": total,
+                    "failures": failures,
+                    "failure_ratio": round(failures / total, 3) if total else 0.0,
+                    "retry_after": round(self._remaining(circuit), 1),
+                    "trips": circuit.trips,
+                    "parked": circuit.parked,
+                    "last_error": circuit.last_error,
+                })
+            return entries
+
+    def _prune(self, circuit: _Circuit, now: float):
+        while circuit.results and circuit.results[0][0] < now - self.window:
+            circuit.results.popleft()
+
+    def _open(self, key: str, circuit: _Circuit, cooldown: float):
+        circuit.state = STATE_OPEN
+        circuit.opened_at = self._clock()
+        circuit.cooldown = cooldown
+        circuit.probing = False
+        circuit.trips += 1
+        circuit.results.clear()
+        self.logger.warning(f"斷路器開啟，暫停網站 {key} {cooldown:.0f} 秒: {circuit.last_error}")
+
+    def _close(self, key: str, circuit: _Circuit):
+        if circuit.state != STATE_CLOSED:
+            self.logger.info(f"斷路器關閉，恢復網站: {key}")
+        circuit.state = STATE_CLOSED
+        circuit.cooldown = 0.0
+        circuit.probing = False
+        circuit.results.clear()
+
+
+def breaker_from_env() -> Optional[CircuitBreaker]:
+    """
+    依環境變數建立斷路器
+
+    CIRCUIT_BREAKER_FAILURE_RATIO 設為 0 時停用（回傳 None）；
+    CIRCUIT_BREAKER_MIN_REQUESTS / CIRCUIT_BREAKER_WINDOW / CIRCUIT_BREAKER_COOLDOWN 調整門檻與時間。
+    """
+    ratio = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATIO", str(CIRCUIT_BREAKER_FAILURE_RATIO)))
+    if ratio <= 0:
+        return None
+    return CircuitBreaker(
+        failure_ratio=ratio,
+        min_requests=int(os.getenv("CIRCUIT_BREAKER_MIN_REQUESTS", str(CIRCUIT_BREAKER_MIN_REQUESTS))),
+        window=float(os.getenv("CIRCUIT_BREAKER_WINDOW", str(CIRCUIT_BREAKER_WINDOW))),
+        cooldown=float(os.getenv("CIRCUIT_BREAKER_COOLDOWN", str(CIRCUIT_BREAKER_COOLDOWN))),
+    )
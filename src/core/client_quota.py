@@ -0,0 +1,152 @@
+"""
+用戶端識別與配額
+
+多個團隊共用同一個 Web 服務時，每個請求以 `X-API-Key`（對應設定中的用戶端）
+或 `X-Client-ID` 標頭識別用戶端。用戶端的權重寫入工作內容，由共享佇列依
+「執行中工作數 / 權重」公平領取（見 core.task_store）；配額在接受請求時檢查：
+
+- max_active: 排隊中與執行中的任務數上限
+- max_bytes_per_day: 每日（UTC）下載量上限，由執行者在任務結束時累計
+
+用戶端設定以環境變數 WEB_CLIENTS 指定 JSON 檔路徑或 JSON 字串，鍵為 API key：
+
+    {"team-a-key": {"name": "team-a", "weight": 2, "max_active": 100, "max_bytes_per_day": "200G"}}
+"""
+
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+from core.bandwidth import parse_rate
+from core.task_store import TaskStore
+
+ANONYMOUS_CLIENT = "anonymous"
+_CLIENT_ID_PATTERN = re.compile(r"[^A-Za-z0-9_.@-]")
+
+
+def usage_day(timestamp: Optional[float] = None) -> str:
+    """下載量統計使用的日期（UTC）"""
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+class ClientAuthError(Exception):
+    """API key 無效或缺少必要的 API key"""
+
+
+class QuotaExceeded(Exception):
+    """用戶端超過配額"""
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class ClientPolicy:
+    """用戶端的權重與配額（0 表示不限制）"""
+    name: str
+    weight: float = 1.0
+    max_active: int = 0
+    max_bytes_per_day: int = 0
+
+
+def _policy_from_dict(name: str, data: Dict[str, Any], default: ClientPolicy) -> ClientPolicy:
+    return ClientPolicy(
+        name=str(data.get("name") or name),
+        weight=float(data.get("weight", default.weight)),
+        max_active=int(data.get("max_active", default.max_active)),
+        max_bytes_per_day=int(parse_rate(data.get("max_bytes_per_day", default.max_bytes_per_day)) or 0),
+    )
+
+
+class ClientRegistry:
+    """依請求標頭識別用戶端並檢查配額"""
+
+    def __init__(
+        self,
+        clients: Optional[Dict[str, ClientPolicy]] = None,
+        default: Optional[ClientPolicy] = None,
+        require_key: bool = False,
+    ):
+        """
+        Args:
+            clients: API key 對應的用戶端設定
+            default: 未使用 API key 的用戶端套用的設定
+            require_key: 是否拒絕沒有 API key 的請求
+        """
+        self.clients = dict(clients or {})
+        self.default = default or ClientPolicy(ANONYMOUS_CLIENT)
+        self.require_key = require_key
+
+    @classmethod
+    def from_env(cls) -> "ClientRegistry":
+        """依 WEB_CLIENTS、WEB_CLIENT_MAX_ACTIVE、WEB_CLIENT_MAX_BYTES_PER_DAY 與 WEB_REQUIRE_API_KEY 建立"""
+        default = ClientPolicy(
+            ANONYMOUS_CLIENT,
+            max_active=int(os.getenv("WEB_CLIENT_MAX_ACTIVE", "0")),
+            max_bytes_per_day=int(parse_rate(os.getenv("WEB_CLIENT_MAX_BYTES_PER_DAY")) or 0),
+        )
+        raw = os.getenv("WEB_CLIENTS", "").strip()
+        config: Dict[str, Any] = {}
+        if raw:
+            if raw.startswith("{"):
+                config = json.loads(raw)
+            else:
+                with open(raw, encoding="utf-8") as f:
+                    config = json.load(f)
+        clients = {key: _policy_from_dict(key, value or {}, default) for key, value in config.items()}
+        require_key = os.getenv("WEB_REQUIRE_API_KEY", "0").lower() in ("1", "true", "yes")
+        return cls(clients, default, require_key)
+
+    def identify(self, api_key: Optional[str] = None, client_id: Optional[str] = None) -> ClientPolicy:
+        """
+        識別用戶端
+
+        Args:
+            api_key: X-API-Key 標頭，必須是設定中的 key
+            client_id: X-Client-ID 標頭，未使用 API key 時作為用戶端名稱（套用預設配額）
+
+        Raises:
+            ClientAuthError: API key 無效，或要求 API key 但未提供
+        """
+        if api_key:
+            policy = self.clients.get(api_key)
+            if policy is None:
+                raise ClientAuthError("無效的 API key")
+            return policy
+        if self.require_key:
+            raise ClientAuthError("此服務需要 X-API-Key")
+        name = _CLIENT_ID_PATTERN.sub("", client_id or "")[:64]
+        return replace(self.default, name=name) if name else self.default
+
+    def admit(self, store: TaskStore, policy: ClientPolicy, estimated_size: Optional[int] = None):
+        """
+        檢查用戶端是否可再送出任務
+
+        Raises:
+            QuotaExceeded: 超過同時任務數或當日下載量
+        """
+        if policy.max_active and store.count_client_jobs(policy.name) >= policy.max_active:
+            raise QuotaExceeded(f"用戶端 {policy.name} 已有 {policy.max_active} 個任務排隊或執行中", retry_after=30)
+        if policy.max_bytes_per_day:
+            used = store.get_client_usage(policy.name, usage_day())
+            if used + (estimated_size or 0) > policy.max_bytes_per_day:
+                now = time.time()
+                raise QuotaExceeded(
+                    f"用戶端 {policy.name} 已達每日下載量上限",
+                    retry_after=int(86400 - now % 86400) + 1,
+                )
+
+    def usage(self, store: TaskStore, policy: ClientPolicy) -> Dict[str, Any]:
+        """用戶端目前的用量與配額"""
+        return {
+            "client_id": policy.name,
+            "weight": policy.weight,
+            "active": store.count_client_jobs(policy.name),
+            "max_active": policy.max_active or None,
+            "bytes_today": store.get_client_usage(policy.name, usage_day()),
+            "max_bytes_per_day": policy.max_bytes_per_day or None,
+        }
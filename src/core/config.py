@@ -49,6 +49,9 @@ class ConfigManager:
             "audio_format": list(AUDIO_FORMATS.keys())[0],
             "auto_convert_filename": True,
             "auto_open_directory": True,
+            # 頻寬上限（例如 2M，空字串表示不限制）與時段排程；None 表示未設定，沿用環境變數
+            "bandwidth_limit": None,
+            "bandwidth_schedule": None,
         }
 
     def get(self, key: str, default: Any = None) -> Any:
@@ -32,6 +32,19 @@ AUDIO_FORMATS = {
     "OPUS": {"codec": "opus", "quality": "0"},
 }
 
+# 音訊轉檔所需的 FFmpeg 編碼器
+AUDIO_CODEC_ENCODERS = {
+    "mp3": "libmp3lame",
+    "m4a": "aac",
+    "opus": "libopus",
+}
+
+# 優先選擇與目標編碼相同的來源音軌，讓 FFmpeg 直接複製串流而不重新編碼
+AUDIO_COPY_FORMATS = {
+    "m4a": "bestaudio[ext=m4a]/bestaudio/best",
+    "opus": "bestaudio[acodec=opus]/bestaudio/best",
+}
+
 # 檔案路徑
 DEFAULT_DOWNLOAD_PATH = "./downloads"
 CONFIG_FILE = "config.json"
@@ -46,6 +59,10 @@ ERROR_MESSAGES = {
     "permission_error": "檔案權限不足，請檢查儲存路徑",
     "disk_space_error": "磁碟空間不足",
     "ffmpeg_not_found": "FFmpeg 未安裝，音訊轉換功能無法使用",
+    "encoder_not_found": "FFmpeg 缺少 {encoder} 編碼器，無法轉換為 {codec}",
+    "clip_requires_ffmpeg": "FFmpeg 未安裝，無法只下載指定時間範圍",
+    "invalid_clip_range": "結束時間必須晚於開始時間",
+    "verification_failed": "下載檔案驗證失敗: {reason}",
 }
 
 # 成功訊息
@@ -59,6 +76,128 @@ SUCCESS_MESSAGES = {
 DOWNLOAD_TIMEOUT = 300
 RETRY_ATTEMPTS = 3
 
+# 取消相關設定（秒）
+CANCEL_POLL_INTERVAL = 0.1
+CANCEL_GRACE_PERIOD = 2.0
+
+# 任務狀態儲存（Web 多 worker 共享）
+TASK_STORE_BACKEND = "sqlite"
+TASK_STORE_FILE = "tasks.db"
+REDIS_KEY_PREFIX = "video-downloader"
+
+# 共享佇列工作租約
+JOB_LEASE_SECONDS = 60
+JOB_HEARTBEAT_INTERVAL = 15
+JOB_MAX_ATTEMPTS = 3
+
+# 已結束任務狀態的保留時間（秒，之後由執行者清除；0 表示不清除）與清除間隔
+TASK_RETENTION_SECONDS = 7 * 24 * 3600
+TASK_PRUNE_INTERVAL = 600
+
+# Web 服務執行設定
+WEB_MAX_CONCURRENT = 4
+QUEUE_POLL_INTERVAL = 0.5
+
+# 下載引擎
+ENGINE_YTDLP = "yt-dlp"
+ENGINE_FAKE = "fake"
+
+# YoutubeDL 實例池（0 表示不重複使用）
+YTDLP_POOL_SIZE = 4
+YTDLP_POOL_MAX_USES = 100
+YTDLP_POOL_IDLE_TIMEOUT = 300
+
+# yt-dlp 快取預熱時解析的網址（涵蓋需要播放器/簽章快取的網站）
+YTDLP_CACHE_WARM_URLS = [
+    "https://www.youtube.com/watch?v=jNQXAC9IVRw",
+    "https://www.youtube.com/shorts/tPEE9ZwTmy0",
+]
+
+# 下載結果儲存（local 或 s3）
+STORAGE_BACKEND = "local"
+STORAGE_PART_SIZE = 8 * 1024 * 1024
+STORAGE_UPLOAD_CONCURRENCY = 4
+STORAGE_EAGER_POLL_INTERVAL = 0.5
+STORAGE_CLEANUP_KEEP = "keep"
+STORAGE_CLEANUP_DELETE = "delete"
+STORAGE_CLEANUP_POLICIES = (STORAGE_CLEANUP_KEEP, STORAGE_CLEANUP_DELETE)
+STORAGE_CLEANUP = STORAGE_CLEANUP_KEEP
+
+# 下載結果驗證（strict 驗證失敗時任務失敗 / report 僅記錄 / off 停用）
+VERIFY_MODE_STRICT = "strict"
+VERIFY_MODE_REPORT = "report"
+VERIFY_MODE_OFF = "off"
+VERIFY_MODE = VERIFY_MODE_STRICT
+VERIFY_CHUNK_SIZE = 1024 * 1024
+VERIFY_PROBE_TIMEOUT = 30
+# 長度誤差容許比例與最小秒數
+VERIFY_DURATION_TOLERANCE = 0.02
+VERIFY_MIN_DURATION_TOLERANCE = 2.0
+
+# 下載暫存區（環境變數 STAGING_DIR 啟用；上限 0 表示不限制）
+STAGING_MAX_BYTES = 0
+# 預留容量為預估大小的倍數（合併影音時分段檔與輸出同時存在）
+STAGING_SIZE_FACTOR = 2.0
+STAGING_WAIT_INTERVAL = 0.5
+
+# 輸出檔名索引保留的目錄數
+NAMING_INDEX_MAX_DIRS = 128
+
+# 並行數自動調整（AIMD）
+AUTOTUNE_MIN = 1
+AUTOTUNE_MAX = 16
+AUTOTUNE_INTERVAL = 5.0
+AUTOTUNE_DECREASE_FACTOR = 0.7
+# 錯誤率與每顆 CPU 負載超過此值時減少並行數
+AUTOTUNE_ERROR_RATE = 0.2
+AUTOTUNE_CPU_LOAD = 0.9
+# 增加執行槽後傳輸速率至少需提升的比例
+AUTOTUNE_MIN_GAIN = 0.05
+AUTOTUNE_HISTORY = 20
+
+# 下載頻寬預算（環境變數 BANDWIDTH_LIMIT / BANDWIDTH_SCHEDULE；0 表示不限制）
+BANDWIDTH_LIMIT = 0
+# 閒置後最多累積的傳輸額度（秒數 × 分配速率）
+BANDWIDTH_BURST = 1.0
+# 重新檢查時段排程的間隔（秒）
+BANDWIDTH_SCHEDULE_CHECK = 30.0
+
+# 佇列排程：優先權越大越先執行，每一級相當於多等待 SCHEDULER_AGING_SECONDS 秒
+PRIORITY_INTERACTIVE = 10
+PRIORITY_NORMAL = 0
+PRIORITY_BATCH = -10
+SCHEDULER_AGING_SECONDS = 300.0
+# 短任務優先（SJF）時以此速率（bytes/s）換算預估大小，無大小時以影片長度乘上倍數估計
+SCHEDULER_REFERENCE_RATE = 2 * 1024 * 1024
+SCHEDULER_DURATION_FACTOR = 0.5
+# 長任務最多延後的秒數，確保最終仍會執行
+SCHEDULER_SJF_MAX_PENALTY = 3600.0
+
+# 網站斷路器：視窗（秒）內至少 MIN_REQUESTS 個結果且失敗比例達 FAILURE_RATIO 時暫停該網站
+CIRCUIT_BREAKER_FAILURE_RATIO = 0.5
+CIRCUIT_BREAKER_MIN_REQUESTS = 5
+CIRCUIT_BREAKER_WINDOW = 300.0
+# 開啟後等待試探的秒數，試探失敗時加倍至上限
+CIRCUIT_BREAKER_COOLDOWN = 60.0
+CIRCUIT_BREAKER_MAX_COOLDOWN = 1800.0
+
+# 批次下載預先解析：同時解析的任務數、同一網站的上限、結果有效秒數
+PREFETCH_LOOKAHEAD = 2
+PREFETCH_PER_SITE = 1
+PREFETCH_TTL = 300.0
+# 簽章網址在 expire 前保留的緩衝秒數，與取用時等待解析完成的最長秒數
+PREFETCH_EXPIRY_MARGIN = 60.0
+PREFETCH_WAIT = 30.0
+
+# 下載執行模式
+EXECUTION_MODE_THREAD = "thread"
+EXECUTION_MODE_PROCESS = "process"
+PROCESS_MAX_WORKERS = 4
+PROCESS_MAX_TASKS_PER_CHILD = 50
+PROCESS_PROGRESS_INTERVAL = 0.2
+# 工作行程開始傳輸時等待主行程分配頻寬的最長秒數
+PROCESS_BANDWIDTH_WAIT = 1.0
+
 # 日誌等級
 LOG_LEVEL = "INFO"
 
@@ -3,23 +3,36 @@
 """
 
 import os
-import yt_dlp
-from typing import Dict, Callable, Optional
+import threading
+import time
+from typing import Any, Dict, Callable, Optional
 from threading import Event
 
 from core.constants import (
-    DOWNLOAD_TYPE_VIDEO,
-    DOWNLOAD_TYPE_AUDIO,
-    VIDEO_FORMATS,
-    AUDIO_FORMATS,
     ERROR_MESSAGES,
-    DOWNLOAD_TIMEOUT,
-    RETRY_ATTEMPTS,
+    SUCCESS_MESSAGES,
+    EXECUTION_MODE_THREAD,
+    EXECUTION_MODE_PROCESS,
+    PROCESS_MAX_WORKERS,
+    CANCEL_POLL_INTERVAL,
+    CANCEL_GRACE_PERIOD,
+    VERIFY_MODE,
+    VERIFY_MODE_OFF,
+    VERIFY_MODE_STRICT,
 )
+from core.bandwidth import BandwidthBudget, BandwidthShare, get_default_budget
+from core.engine import DownloadEngine, DownloadRequest, EngineSession, get_default_engine
+from core.cancellation import CancelScope, CancelledError, cleanup_partial_files
+from core.naming import output_names
+from core.staging import StagingArea, StagingSlot, finalize, get_default_staging
+from core.task_result import TaskResult
+from core.storage import EagerUpload, StorageBackend, get_default_storage
+from core.verification import StreamingChecksum, VerificationResult, check_container, finalize_checksum
 from utils.logger import Logger
+from utils.capabilities import get_capabilities
 from utils.file_utils import sanitize_filename, convert_to_traditional_chinese
 from utils.validators import validate_url
-from utils.system_utils import check_disk_space
+from utils.system_utils import check_disk_space, format_size
 
 
 class DownloadTask:
@@ -34,6 +47,16 @@ class DownloadTask:
         progress_callback: Optional[Callable] = None,
         complete_callback: Optional[Callable] = None,
         error_callback: Optional[Callable] = None,
+        engine: Optional[DownloadEngine] = None,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        storage: Optional[StorageBackend] = None,
+        staging: Optional[StagingArea] = None,
+        keep_info: bool = False,
+        bandwidth: Optional[BandwidthBudget] = None,
+        rate_limit: Optional[float] = None,
+        bandwidth_weight: float = 1.0,
+        prefetched_info: Optional[Dict[str, Any]] = None,
     ):
         self.url = url
         self.download_type = download_type
@@ -42,25 +65,96 @@ class DownloadTask:
         self.progress_callback = progress_callback
         self.complete_callback = complete_callback
         self.error_callback = error_callback
-
+        # 只下載的時間範圍（秒）
+        self.start_time = start_time
+        self.end_time = end_time
+
+        self.engine = engine or get_default_engine()
+        self.storage = storage or get_default_storage()
+        # 下載、合併與轉檔都在暫存區進行，完成後才移到 output_path；None 時直接寫入
+        self.staging = staging or get_default_staging()
+        # 與其他任務共用的頻寬預算；rate_limit 為此任務的上限（bytes/s），
+        # bandwidth_weight 為分配總頻寬時的權重
+        self.bandwidth = bandwidth or get_default_budget()
+        self.rate_limit = rate_limit
+        self.bandwidth_weight = bandwidth_weight
+        self._bandwidth_share: Optional[BandwidthShare] = None
+        # 各輸出檔已回報的下載量（影音分開下載時各自從 0 起算）
+        self._reported_bytes: Dict[Any, int] = {}
         self.cancel_event = Event()
+        self.cancel_scope = CancelScope()
+        # 執行下載的背景執行緒；取消後超過寬限時間仍未結束時，由它結束時清除暫存檔
+        self._runner: Optional[threading.Thread] = None
+        self._runner_lock = threading.Lock()
+        self._runner_done = False
+        self._cleanup_on_exit = False
+        self._session: Optional[EngineSession] = None
         self.logger = Logger()
         self.downloaded_file = None
+        # 儲存後端回報的位置（本機路徑或 s3:// URI）
+        self.storage_uri: Optional[str] = None
+        # 輸出驗證結果（雜湊、長度、串流），未驗證時為 None；
+        # 未指定時讀取環境變數 DOWNLOAD_VERIFY（strict / report / off）
+        self.verification: Optional[Dict[str, Any]] = None
+        self.verify_mode = os.getenv("DOWNLOAD_VERIFY", VERIFY_MODE)
+        # 下載期間的 yt-dlp info dict；結束後只保留 result，keep_info 為 True 時才保留原始資料
         self.info = None
+        self.keep_info = keep_info
+        # 預先解析的影片資訊（見 core.prefetch），有值時略過解析步驟
+        self.prefetched_info = prefetched_info
+        self.result: Optional[TaskResult] = None
+        self._expected_file: Optional[str] = None
+        # 各階段耗時（秒）：extract / download / postprocess / convert / verify / finalize / upload
+        self.timings: Dict[str, float] = {}
+        self._download_finished_at: Optional[float] = None
+        # 片段下載相較完整影片省下的位元組數（估計值），非片段任務為 None
+        self.bandwidth_saved: Optional[int] = None
 
     def cancel(self):
-        """取消下載"""
+        """取消下載：中斷進行中的連線與子行程，不必等待下一個進度回報"""
         self.cancel_event.set()
+        self.cancel_scope.cancel()
+        session = self._session
+        if session is not None:
+            session.cancel()
         self.logger.info(f"取消下載: {self.url}")
 
+    def set_rate_limit(self, rate_limit: Optional[float]):
+        """即時調整此任務的頻寬上限（bytes/s，None 表示只受總上限限制）"""
+        self.rate_limit = rate_limit
+        share = self._bandwidth_share
+        if share is not None:
+            share.set_cap(rate_limit)
+
     def is_cancelled(self) -> bool:
         """檢查是否已取消"""
         return self.cancel_event.is_set()
 
+    def is_stopping(self) -> bool:
+        """已取消並回報結果，但下載執行緒仍在結束中（可能仍在傳輸或寫入暫存檔）"""
+        runner = self._runner
+        return self.is_cancelled() and runner is not None and runner.is_alive()
+
     def _progress_hook(self, d: Dict):
         """下載進度回調"""
         if self.is_cancelled():
-            raise Exception("下載已被使用者取消")
+            raise CancelledError(SUCCESS_MESSAGES['cancel_success'])
+
+        if d.get('status') == 'finished':
+            self._download_finished_at = time.perf_counter()
+
+        share = self._bandwidth_share
+        if share is not None:
+            if d.get('status') == 'downloading':
+                key = d.get('filename')
+                downloaded = d.get('downloaded_bytes') or 0
+                previous = self._reported_bytes.get(key, 0)
+                self._reported_bytes[key] = downloaded
+                # 在下載執行緒中等待，超出分配的速率時暫停讀取
+                share.consume(downloaded - previous if downloaded >= previous else downloaded,
+                              self.cancel_event)
+            elif d.get('status') == 'finished':
+                share.deactivate()
 
         if self.progress_callback:
             status = d.get('status')
@@ -84,79 +178,234 @@ class DownloadTask:
             elif status == 'finished':
                 self.progress_callback({'status': 'finished'})
 
-    def _get_ydl_options(self) -> Dict:
-        """取得 yt-dlp 選項"""
-        base_options = {
-            'outtmpl': os.path.join(self.output_path, '%(title)s.%(ext)s'),
-            'progress_hooks': [self._progress_hook],
-            'socket_timeout': DOWNLOAD_TIMEOUT,
-            'retries': RETRY_ATTEMPTS,
-            'quiet': False,
-            'no_warnings': False,
-        }
-
-        if self.download_type == DOWNLOAD_TYPE_VIDEO:
-            video_format = VIDEO_FORMATS.get(self.format_option, VIDEO_FORMATS["最高畫質"])
-            base_options.update({
-                'format': video_format,
-                'merge_output_format': 'mp4',
-            })
-
-        elif self.download_type == DOWNLOAD_TYPE_AUDIO:
-            audio_config = AUDIO_FORMATS.get(
-                self.format_option,
-                AUDIO_FORMATS["MP3 (192kbps)"]
-            )
-            base_options.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': audio_config['codec'],
-                    'preferredquality': audio_config['quality'],
-                }],
-            })
-
-        return base_options
-
     def execute(self) -> bool:
-        """執行下載任務"""
-        try:
-            if not validate_url(self.url):
-                raise ValueError(ERROR_MESSAGES['invalid_url'])
+        """
+        執行下載任務
+
+        下載引擎在獨立執行緒中執行，呼叫端執行緒只負責等待；
+        取消時會中斷該執行緒的連線與子行程，並在寬限時間後直接返回；
+        執行緒仍未結束時（is_stopping），暫存檔改由它結束時清除，避免清除後又被寫回。
+        """
+        outcome: Dict[str, Any] = {}
+        runner = threading.Thread(target=self._run_in_scope, args=(outcome,), daemon=True)
+        self._runner = runner
+        runner.start()
+
+        while runner.is_alive():
+            runner.join(CANCEL_POLL_INTERVAL)
+            if self.is_cancelled():
+                runner.join(CANCEL_GRACE_PERIOD)
+                break
 
-            os.makedirs(self.output_path, exist_ok=True)
-            options = self._get_ydl_options()
+        if self.is_cancelled():
+            with self._runner_lock:
+                self._cleanup_on_exit = not self._runner_done
+            if self._cleanup_on_exit:
+                self.logger.warning(f"下載執行緒仍在結束中，暫存檔將於結束後清除: {self.url}")
+            else:
+                self._cleanup_partial()
+            return self._report_error(SUCCESS_MESSAGES['cancel_success'])
+
+        if 'error' in outcome:
+            return self._report_error(str(outcome['error']))
+
+        if not outcome.get('completed'):
+            return False
 
-            with yt_dlp.YoutubeDL(options) as ydl:
-                self.info = ydl.extract_info(self.url, download=False)
+        self.logger.info(f"下載完成: {self.downloaded_file}")
 
-                estimated_size = self.info.get('filesize', 0) or self.info.get('filesize_approx', 0)
-                if estimated_size > 0:
-                    if not check_disk_space(self.output_path, estimated_size * 1.5):
-                        raise Exception(ERROR_MESSAGES['disk_space_error'])
+        if self.complete_callback:
+            self.complete_callback(self.downloaded_file, self.result)
 
-                if not self.is_cancelled():
-                    self.info = ydl.extract_info(self.url, download=True)
-                    self.downloaded_file = ydl.prepare_filename(self.info)
-                    self._convert_filename()
+        return True
 
-                    self.logger.info(f"下載完成: {self.downloaded_file}")
+    def _run_in_scope(self, outcome: Dict[str, Any]):
+        """在取消範圍內執行下載流程（於背景執行緒）"""
+        try:
+            with self.cancel_scope:
+                self._run()
+            outcome['completed'] = not self.is_cancelled()
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            if not self.keep_info:
+                self.info = None
+            with self._runner_lock:
+                self._runner_done = True
+                cleanup = self._cleanup_on_exit
+            if cleanup:
+                self._cleanup_partial()
+
+    def _cleanup_partial(self):
+        """清除取消的任務留下的下載暫存檔"""
+        removed = cleanup_partial_files(self._expected_file)
+        if removed:
+            self.logger.info(f"已清除 {removed} 個暫存檔")
+
+    def _run(self):
+        """實際的解析與下載流程"""
+        if not validate_url(self.url):
+            raise ValueError(ERROR_MESSAGES['invalid_url'])
+        if self.start_time is not None and self.end_time is not None and self.end_time <= self.start_time:
+            raise ValueError(ERROR_MESSAGES['invalid_clip_range'])
+
+        os.makedirs(self.output_path, exist_ok=True)
+        slot: Optional[StagingSlot] = self.staging.open_slot() if self.staging else None
+        work_path = slot.path if slot else self.output_path
+        request = DownloadRequest(
+            url=self.url,
+            download_type=self.download_type,
+            output_path=work_path,
+            format_option=self.format_option,
+            progress_hook=self._progress_hook,
+            start_time=self.start_time,
+            end_time=self.end_time,
+        )
 
-                    if self.complete_callback:
-                        self.complete_callback(self.downloaded_file, self.info)
+        eager_upload: Optional[EagerUpload] = None
+        self._bandwidth_share = self.bandwidth.register(self.bandwidth_weight, self.rate_limit)
+        try:
+            with self.engine.open(request) as session:
+                self._session = session
+                if self.is_cancelled():
+                    session.cancel()
+                    return
+
+                started = time.perf_counter()
+                if self.prefetched_info is not None:
+                    self.info, self.prefetched_info = self.prefetched_info, None
+                else:
+                    self.info = session.extract()
+                self._expected_file = session.expected_filename(self.info)
+                self.timings['extract'] = time.perf_counter() - started
+
+                full_size = estimate_full_size(self.info)
+                estimated_size = full_size * self._clip_fraction() if request.is_clip else full_size
+                if slot and not slot.reserve(estimated_size, self.cancel_event):
+                    return
+                if estimated_size > 0:
+                    if not check_disk_space(work_path, estimated_size * 1.5):
+                        raise Exception(ERROR_MESSAGES['disk_space_error'])
 
-                    return True
+                if self.is_cancelled():
+                    return
 
-            return False
+                eager_upload = self.storage.begin_upload(
+                    self._expected_file, os.path.basename(self._expected_file)
+                )
+                started = time.perf_counter()
+                self.info, self.downloaded_file = session.download(self.info)
+                finished = time.perf_counter()
+                download_end = self._download_finished_at or finished
+                self.timings['download'] = download_end - started
+                self.timings['postprocess'] = finished - download_end
+
+                if request.is_clip:
+                    self._record_bandwidth_saved(full_size)
+
+                started = time.perf_counter()
+                self._convert_filename()
+                self.timings['convert'] = time.perf_counter() - started
+
+            # 引擎工作階段已歸還，驗證與上傳期間不佔用 YoutubeDL 實例
+            started = time.perf_counter()
+            verification = self._check_output()
+            self.timings['verify'] = time.perf_counter() - started
+
+            if slot:
+                started = time.perf_counter()
+                self.downloaded_file = finalize(self.downloaded_file, self.output_path)
+                self.timings['finalize'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            checksum = StreamingChecksum() if verification is not None else None
+            upload, eager_upload = eager_upload, None
+            self.storage_uri = self.storage.store(self.downloaded_file, eager=upload, checksum=checksum)
+            self.info['storage_uri'] = self.storage_uri
+            self.timings['upload'] = time.perf_counter() - started
+
+            if verification is not None:
+                started = time.perf_counter()
+                finalize_checksum(verification, checksum, self.downloaded_file)
+                self.verification = verification.to_dict()
+                self.info['verification'] = self.verification
+                self.timings['verify'] += time.perf_counter() - started
+
+            self.result = TaskResult.from_info(self.info, self.downloaded_file, keep_raw=self.keep_info)
+        finally:
+            # 不保留已歸還的工作階段（yt-dlp 工作階段引用池中的 YoutubeDL 實例）
+            self._session = None
+            self._bandwidth_share.close()
+            self._bandwidth_share = None
+            self._reported_bytes.clear()
+            if eager_upload is not None:
+                eager_upload.abort()
+            if slot:
+                slot.release()
+
+    def _check_output(self) -> Optional[VerificationResult]:
+        """
+        以 ffprobe 快速檢查輸出容器（雜湊於上傳時一併計算）
+
+        strict 模式下驗證失敗會刪除損毀的檔案並讓任務失敗，重試時重新下載。
+        """
+        if self.verify_mode == VERIFY_MODE_OFF or not self.downloaded_file \
+                or not os.path.exists(self.downloaded_file):
+            return None
+
+        capabilities = get_capabilities()
+        ffprobe_path = capabilities.ffprobe_path if capabilities.ffprobe_available else None
+        result = check_container(
+            self.downloaded_file,
+            self.info,
+            self.download_type,
+            ffprobe_path if self.engine.produces_media else None,
+            expected_duration=self._expected_duration(),
+        )
+        if result.failed:
+            reason = "；".join(result.errors)
+            self.logger.warning(f"輸出驗證失敗 {self.downloaded_file}: {reason}")
+            if self.verify_mode == VERIFY_MODE_STRICT:
+                self.verification = result.to_dict()
+                os.remove(self.downloaded_file)
+                raise RuntimeError(ERROR_MESSAGES['verification_failed'].format(reason=reason))
+        return result
+
+    def _expected_duration(self) -> Optional[float]:
+        """輸出檔案應有的長度；片段下載時為範圍長度"""
+        duration = (self.info or {}).get('duration')
+        if self.start_time is None and self.end_time is None:
+            return duration
+        end = self.end_time
+        if duration:
+            end = min(end, duration) if end is not None else duration
+        return end - (self.start_time or 0) if end is not None else None
+
+    def _clip_fraction(self) -> float:
+        """片段長度佔影片總長的比例，無法得知總長時視為 1"""
+        duration = (self.info or {}).get('duration') or 0
+        if duration <= 0:
+            return 1.0
+        start = self.start_time or 0
+        end = min(self.end_time, duration) if self.end_time is not None else duration
+        return max(end - start, 0) / duration
+
+    def _record_bandwidth_saved(self, full_size: int):
+        """以完整影片的估計大小與實際檔案大小計算省下的傳輸量"""
+        if full_size <= 0 or not self.downloaded_file or not os.path.exists(self.downloaded_file):
+            return
+        self.bandwidth_saved = max(full_size - os.path.getsize(self.downloaded_file), 0)
+        self.info['bandwidth_saved'] = self.bandwidth_saved
+        self.logger.info(f"片段下載節省約 {format_size(self.bandwidth_saved)}")
 
-        except Exception as e:
-            error_msg = str(e)
-            self.logger.error(f"下載失敗: {error_msg}")
+    def _report_error(self, error_msg: str) -> bool:
+        """記錄錯誤並呼叫錯誤回調"""
+        self.logger.error(f"下載失敗: {error_msg}")
 
-            if self.error_callback:
-                self.error_callback(error_msg)
+        if self.error_callback:
+            self.error_callback(error_msg)
 
-            return False
+        return False
 
     def _convert_filename(self):
         """轉換檔名為繁體中文"""
@@ -175,32 +424,75 @@ class DownloadTask:
 
             if converted_name and converted_name != base_name:
                 converted_name = sanitize_filename(converted_name)
-                new_path = os.path.join(
-                    os.path.dirname(self.downloaded_file),
-                    converted_name
+                new_path = output_names.move(
+                    self.downloaded_file, os.path.dirname(self.downloaded_file), converted_name
                 )
-
-                counter = 1
-                original_new_path = new_path
-                while os.path.exists(new_path):
-                    name, ext = os.path.splitext(original_new_path)
-                    new_path = f"{name}_{counter}{ext}"
-                    counter += 1
-
-                os.rename(self.downloaded_file, new_path)
                 self.downloaded_file = new_path
-                self.logger.info(f"檔名已轉換為繁體: {converted_name}")
+                self.logger.info(f"檔名已轉換為繁體: {os.path.basename(new_path)}")
 
         except Exception as e:
             self.logger.warning(f"檔名轉換失敗（非致命）: {e}")
 
 
+def estimate_full_size(info: Dict[str, Any]) -> int:
+    """
+    估計完整影片的大小（位元組）
+
+    依序使用 filesize、filesize_approx、合併格式的大小總和，
+    最後以位元率乘上長度推算；無法估計時回傳 0。
+    """
+    size = info.get('filesize') or info.get('filesize_approx')
+    if size:
+        return int(size)
+
+    formats = info.get('requested_formats') or []
+    size = sum(fmt.get('filesize') or fmt.get('filesize_approx') or 0 for fmt in formats)
+    if size:
+        return int(size)
+
+    # tbr 單位為 kbit/s
+    if info.get('tbr') and info.get('duration'):
+        return int(info['tbr'] * 125 * info['duration'])
+    return 0
+
+
 class DownloadManager:
-    """下載管理器"""
+    """下載管理器
+
+    execution_mode 為 `thread`（預設）時任務在呼叫端執行緒執行；
+    為 `process` 時每個任務交由常駐工作行程執行，可設定記憶體/時間上限，
+    取消時直接終止行程。未指定時讀取環境變數 DOWNLOAD_EXECUTION_MODE、
+    DOWNLOAD_MEMORY_LIMIT_MB 與 DOWNLOAD_TIME_LIMIT。
+    engine 未指定時使用 DOWNLOAD_ENGINE 選擇的預設引擎，storage 未指定時使用
+    STORAGE_BACKEND 選擇的儲存後端，staging 未指定時使用 STAGING_DIR 設定的暫存區，
+    bandwidth 未指定時使用行程內共用的頻寬預算（行程隔離模式同樣由主行程的預算分配）。
+    行程隔離模式下工作行程依環境變數建立引擎、儲存後端與暫存區，不接受自訂的 engine/storage/staging。
+    """
 
-    def __init__(self):
+    def __init__(
+        self,
+        execution_mode: Optional[str] = None,
+        max_processes: int = PROCESS_MAX_WORKERS,
+        memory_limit_mb: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        engine: Optional[DownloadEngine] = None,
+        storage: Optional[StorageBackend] = None,
+        staging: Optional[StagingArea] = None,
+        bandwidth: Optional[BandwidthBudget] = None,
+    ):
         self.active_tasks: Dict[str, DownloadTask] = {}
+        self.engine = engine
+        self.storage = storage
+        self.staging = staging
+        self.bandwidth = bandwidth
         self.logger = Logger()
+        self.execution_mode = execution_mode or os.getenv("DOWNLOAD_EXECUTION_MODE", EXECUTION_MODE_THREAD)
+        if self.execution_mode not in (EXECUTION_MODE_THREAD, EXECUTION_MODE_PROCESS):
+            raise ValueError(f"不支援的執行模式: {self.execution_mode}")
+        self.max_processes = max_processes
+        self.memory_limit_mb = memory_limit_mb or int(os.getenv("DOWNLOAD_MEMORY_LIMIT_MB", "0")) or None
+        self.time_limit = time_limit or float(os.getenv("DOWNLOAD_TIME_LIMIT", "0")) or None
+        self._process_pool = None
 
     def create_task(
         self,
@@ -208,10 +500,17 @@ class DownloadManager:
         download_type: str,
         output_path: str,
         format_option: str,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        rate_limit: Optional[float] = None,
+        prefetched_info: Optional[Dict[str, Any]] = None,
         **callbacks
     ) -> DownloadTask:
-        """建立下載任務"""
-        task = DownloadTask(
+        """
+        建立下載任務（start_time/end_time 指定時只下載該時間範圍，rate_limit 為此任務的頻寬上限，
+        prefetched_info 為預先解析的影片資訊）
+        """
+        task_kwargs = dict(
             url=url,
             download_type=download_type,
             output_path=output_path,
@@ -219,13 +518,47 @@ class DownloadManager:
             progress_callback=callbacks.get('progress_callback'),
             complete_callback=callbacks.get('complete_callback'),
             error_callback=callbacks.get('error_callback'),
+            engine=self.engine,
+            storage=self.storage,
+            staging=self.staging,
+            bandwidth=self.bandwidth,
+            start_time=start_time,
+            end_time=end_time,
+            rate_limit=rate_limit,
+            prefetched_info=prefetched_info,
         )
 
+        if self.execution_mode == EXECUTION_MODE_PROCESS:
+            from core.process_executor import ProcessDownloadTask
+            task = ProcessDownloadTask(
+                pool=self._get_process_pool(),
+                time_limit=self.time_limit,
+                **task_kwargs,
+            )
+        else:
+            task = DownloadTask(**task_kwargs)
+
         task_id = f"{download_type}_{id(task)}"
         self.active_tasks[task_id] = task
 
         return task
 
+    def _get_process_pool(self):
+        """延遲建立工作行程池"""
+        if self._process_pool is None:
+            from core.process_executor import ProcessWorkerPool
+            self._process_pool = ProcessWorkerPool(
+                max_workers=self.max_processes,
+                memory_limit_mb=self.memory_limit_mb,
+            )
+        return self._process_pool
+
+    def shutdown(self):
+        """關閉工作行程池"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
     def remove_task(self, task: DownloadTask):
         """移除任務"""
         task_id = f"{task.download_type}_{id(task)}"
@@ -0,0 +1,433 @@
+"""
+下載引擎介面
+
+DownloadTask 透過引擎完成解析、下載與後處理，預設使用 yt-dlp；
+測試與基準測試可改用不連網的 FakeEngine（見 core.fake_engine），
+也可在此接上其他高吞吐量的下載實作。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.constants import (
+    AUDIO_CODEC_ENCODERS,
+    AUDIO_COPY_FORMATS,
+    AUDIO_FORMATS,
+    DOWNLOAD_TIMEOUT,
+    DOWNLOAD_TYPE_AUDIO,
+    DOWNLOAD_TYPE_VIDEO,
+    ENGINE_FAKE,
+    ENGINE_YTDLP,
+    ERROR_MESSAGES,
+    RETRY_ATTEMPTS,
+    VIDEO_FORMATS,
+    YTDLP_POOL_IDLE_TIMEOUT,
+    YTDLP_POOL_MAX_USES,
+    YTDLP_POOL_SIZE,
+)
+from core.cancellation import current_scope
+from core.ytdlp_cache import get_cache_dir, install_shared_cache
+from utils.capabilities import get_capabilities
+from utils.logger import Logger
+
+
+@dataclass
+class DownloadRequest:
+    """交給引擎的下載參數"""
+
+    url: str
+    download_type: str
+    output_path: str
+    format_option: str
+    # 接收 yt-dlp 格式的進度字典（status / downloaded_bytes / total_bytes / speed / eta）
+    progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None
+    # 只下載的時間範圍（秒），皆為 None 時下載完整影片
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+    @property
+    def is_clip(self) -> bool:
+        return self.start_time is not None or self.end_time is not None
+
+    def clip_label(self) -> str:
+        """片段檔名後綴，例如 `90s-120s`"""
+        start = f"{self.start_time or 0:g}s"
+        end = f"{self.end_time:g}s" if self.end_time is not None else "end"
+        return f"{start}-{end}"
+
+
+class EngineSession(ABC):
+    """單一任務的引擎工作階段"""
+
+    def __enter__(self) -> "EngineSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 發生錯誤或被取消的工作階段不再重複使用
+        self.close(discard=exc_type is not None)
+
+    @abstractmethod
+    def extract(self) -> Dict[str, Any]:
+        """解析影片資訊（不下載）"""
+
+    @abstractmethod
+    def expected_filename(self, info: Dict[str, Any]) -> str:
+        """依解析結果推算輸出檔案路徑"""
+
+    @abstractmethod
+    def download(self, info: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        """
+        下載並執行後處理
+
+        info 為 extract 的結果，可能由同一請求的另一個工作階段預先解析（見 core.prefetch）。
+
+        Returns:
+            Tuple[Dict, str]: (最終影片資訊, 輸出檔案路徑)
+        """
+
+    def cancel(self):
+        """要求中止（可由其他執行緒呼叫）"""
+
+    def close(self, discard: bool = False):
+        """釋放資源；discard 為 True 時表示工作階段狀態不可再利用"""
+
+
+class DownloadEngine(ABC):
+    """下載引擎"""
+
+    name = ""
+    # 輸出是否為實際的媒體檔案（模擬引擎為 False，不做容器驗證）
+    produces_media = True
+
+    @abstractmethod
+    def open(self, request: DownloadRequest) -> EngineSession:
+        """為單一任務建立工作階段"""
+
+    def close(self):
+        """釋放引擎持有的資源"""
+
+
+# 每個任務各自設定、不影響實例分組的選項
+PER_TASK_OPTIONS = ('outtmpl', 'progress_hooks', 'download_ranges', 'force_keyframes_at_cuts')
+
+
+class _PooledYoutubeDL:
+    """可重複使用的 YoutubeDL，輸出樣板、下載範圍與進度回調可依任務替換"""
+
+    def __init__(self, key: str, options: Dict[str, Any]):
+        import yt_dlp
+
+        self.key = key
+        self.hook: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.uses = 0
+        self.idle_since = time.monotonic()
+        # 曾建立的連線；重複使用時登記到新任務的取消範圍，取消時才能中斷保持中的連線
+        self.sockets: "weakref.WeakSet" = weakref.WeakSet()
+
+        options = dict(options, progress_hooks=[self._dispatch])
+        self.ydl = yt_dlp.YoutubeDL(options)
+        install_shared_cache(self.ydl)
+
+    def _dispatch(self, data: Dict[str, Any]):
+        if self.hook:
+            self.hook(data)
+
+    def prepare(self, options: Dict[str, Any], hook: Optional[Callable[[Dict[str, Any]], None]]):
+        """套用本次任務的輸出樣板、下載範圍與進度回調"""
+        self.ydl.params['outtmpl']['default'] = options['outtmpl']
+        for key in ('download_ranges', 'force_keyframes_at_cuts'):
+            if key in options:
+                self.ydl.params[key] = options[key]
+            else:
+                self.ydl.params.pop(key, None)
+        self.hook = hook
+
+    def close(self):
+        self.hook = None
+        self.ydl.close()
+
+
+class YoutubeDLPool:
+    """依相容選項分組的 YoutubeDL 實例池
+
+    保留 extractor 實例、cookie 與 HTTP 連線池，同一網站的批次下載不必
+    每個任務重新建立實例與 TLS 連線。實例一次只借給一個任務使用。
+    """
+
+    def __init__(
+        self,
+        max_idle_per_key: int = YTDLP_POOL_SIZE,
+        max_uses: int = YTDLP_POOL_MAX_USES,
+        idle_timeout: float = YTDLP_POOL_IDLE_TIMEOUT,
+    ):
+        self.max_idle_per_key = max_idle_per_key
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[str, List[_PooledYoutubeDL]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def make_key(options: Dict[str, Any]) -> str:
+        """以每任務替換的欄位以外的選項作為分組鍵"""
+        shared = {k: v for k, v in options.items() if k not in PER_TASK_OPTIONS}
+        return json.dumps(shared, sort_keys=True, default=repr)
+
+    def acquire(self, options: Dict[str, Any]) -> _PooledYoutubeDL:
+        """取得與選項相容的閒置實例，沒有時建立新實例"""
+        key = self.make_key(options)
+        expired: List[_PooledYoutubeDL] = []
+        entry = None
+        with self._lock:
+            now = time.monotonic()
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate = idle.pop()
+                if now - candidate.idle_since > self.idle_timeout:
+                    expired.append(candidate)
+                    continue
+                entry = candidate
+                self.reused += 1
+                break
+            if entry is None:
+                self.created += 1
+
+        for stale in expired:
+            stale.close()
+        return entry or _PooledYoutubeDL(key, options)
+
+    def release(self, entry: _PooledYoutubeDL, reusable: bool = True):
+        """歸還實例；任務失敗、被取消或已達使用上限時直接關閉"""
+        entry.hook = None
+        entry.uses += 1
+        if reusable and entry.uses < self.max_uses:
+            entry.idle_since = time.monotonic()
+            with self._lock:
+                idle = self._idle.setdefault(entry.key, [])
+                if len(idle) < self.max_idle_per_key:
+                    idle.append(entry)
+                    return
+        entry.close()
+
+    def close(self):
+        """關閉所有閒置實例"""
+        with self._lock:
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle.clear()
+        for entry in entries:
+            entry.close()
+
+    def stats(self) -> Dict[str, int]:
+        """建立數、重複使用數與目前閒置數"""
+        with self._lock:
+            idle = sum(len(entries) for entries in self._idle.values())
+        return {'created': self.created, 'reused': self.reused, 'idle': idle}
+
+
+# 簽章網址過期時 CDN 回應的 HTTP 狀態碼
+_EXPIRED_URL_STATUSES = (403, 410)
+_EXPIRED_URL_PATTERN = re.compile(r"HTTP Error (%s)\b" % "|".join(map(str, _EXPIRED_URL_STATUSES)))
+
+
+def _is_expired_url_error(error: Exception) -> bool:
+    """以預先解析的資訊下載失敗的原因是否可能為格式網址過期（重新解析可解決）"""
+    exc_info = getattr(error, 'exc_info', None)
+    cause = exc_info[1] if exc_info else None
+    if getattr(cause, 'status', None) in _EXPIRED_URL_STATUSES:
+        return True
+    return bool(_EXPIRED_URL_PATTERN.search(str(error)))
+
+
+class YtDlpSession(EngineSession):
+    """yt-dlp 工作階段"""
+
+    def __init__(self, entry: _PooledYoutubeDL, request: DownloadRequest, pool: Optional[YoutubeDLPool]):
+        self.entry = entry
+        self.ydl = entry.ydl
+        self.request = request
+        self.pool = pool
+
+        scope = current_scope()
+        if scope is not None:
+            for sock in list(entry.sockets):
+                scope.register_socket(sock)
+
+    def extract(self) -> Dict[str, Any]:
+        return self.ydl.extract_info(self.request.url, download=False)
+
+    def expected_filename(self, info: Dict[str, Any]) -> str:
+        return self.ydl.prepare_filename(info)
+
+    def download(self, info: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        from yt_dlp.utils import DownloadError, ReExtractInfo
+
+        if info.get('_type', 'video') != 'video':
+            # 播放清單的項目需要各自解析，沿用完整流程
+            info = self.ydl.extract_info(self.request.url, download=True)
+            return info, self.ydl.prepare_filename(info)
+        try:
+            # 沿用已解析的結果（同 yt-dlp --load-info-json），不再重新解析一次
+            info = self.ydl.process_ie_result(self.ydl.sanitize_info(info, remove_private_keys=True), download=True)
+        except (DownloadError, ReExtractInfo) as e:
+            scope = current_scope()
+            if scope is not None and scope.cancelled.is_set():
+                raise
+            # 只有簽章網址過期時重新解析後下載，其他錯誤（私人影片、磁碟已滿、後處理失敗等）直接回報
+            if not isinstance(e, ReExtractInfo) and not _is_expired_url_error(e):
+                raise
+            Logger().warning(f"以解析結果下載失敗，重新解析: {e}")
+            info = self.ydl.extract_info(self.request.url, download=True)
+        return info, self.ydl.prepare_filename(info)
+
+    def close(self, discard: bool = False):
+        scope = current_scope()
+        if scope is not None:
+            self.entry.sockets.update(scope.sockets())
+            # 取消時連線已被中斷，實例不再重複使用
+            discard = discard or scope.cancelled.is_set()
+
+        if self.pool is None:
+            self.entry.close()
+        else:
+            self.pool.release(self.entry, reusable=not discard)
+
+
+class YtDlpEngine(DownloadEngine):
+    """以 yt-dlp 下載（預設引擎）
+
+    取消由 DownloadTask 的 CancelScope 中斷連線與子行程，
+    並在進度回調中拋出例外，因此工作階段不需另外處理。
+    YoutubeDL 實例在同一引擎的任務間重複使用（pool_size 為 0 時停用），
+    未指定時讀取環境變數 YTDLP_POOL_SIZE。
+    """
+
+    name = ENGINE_YTDLP
+
+    def __init__(self, pool_size: Optional[int] = None):
+        self.logger = Logger()
+        if pool_size is None:
+            pool_size = int(os.getenv("YTDLP_POOL_SIZE", str(YTDLP_POOL_SIZE)))
+        self.pool = YoutubeDLPool(max_idle_per_key=pool_size) if pool_size > 0 else None
+
+    def open(self, request: DownloadRequest) -> EngineSession:
+        options = self.build_options(request)
+        if self.pool is None:
+            entry = _PooledYoutubeDL(YoutubeDLPool.make_key(options), options)
+        else:
+            entry = self.pool.acquire(options)
+        entry.prepare(options, request.progress_hook)
+        return YtDlpSession(entry, request, self.pool)
+
+    def close(self):
+        """關閉實例池"""
+        if self.pool is not None:
+            self.pool.close()
+
+    def build_options(self, request: DownloadRequest) -> Dict:
+        """取得 yt-dlp 選項（依快取的環境能力選擇格式，不另外啟動 FFmpeg 偵測）"""
+        capabilities = get_capabilities()
+        filename = f"%(title)s_{request.clip_label()}.%(ext)s" if request.is_clip else '%(title)s.%(ext)s'
+        base_options = {
+            'outtmpl': os.path.join(request.output_path, filename),
+            'progress_hooks': [request.progress_hook] if request.progress_hook else [],
+            'socket_timeout': DOWNLOAD_TIMEOUT,
+            'cachedir': get_cache_dir(),
+            'retries': RETRY_ATTEMPTS,
+            'quiet': False,
+            'no_warnings': False,
+        }
+        if capabilities.ffmpeg_path:
+            base_options['ffmpeg_location'] = capabilities.ffmpeg_path
+
+        if request.is_clip:
+            # yt-dlp 以 FFmpeg 讀取片段：HLS/DASH 只抓涵蓋範圍的分段，
+            # 單一檔案以 HTTP Range 跳轉，並在切點強制插入關鍵影格以精準裁切
+            if not capabilities.ffmpeg_available:
+                raise RuntimeError(ERROR_MESSAGES['clip_requires_ffmpeg'])
+            from yt_dlp.utils import download_range_func
+
+            end_time = request.end_time if request.end_time is not None else float('inf')
+            base_options['download_ranges'] = download_range_func(None, [(request.start_time or 0, end_time)])
+            base_options['force_keyframes_at_cuts'] = True
+
+        if request.download_type == DOWNLOAD_TYPE_VIDEO:
+            video_format = VIDEO_FORMATS.get(request.format_option, VIDEO_FORMATS["最高畫質"])
+            if capabilities.ffmpeg_available:
+                base_options.update({
+                    'format': video_format,
+                    'merge_output_format': 'mp4',
+                })
+            else:
+                # 無 FFmpeg 無法合併影音，只取格式字串最後的單一檔案備援
+                self.logger.warning("FFmpeg 未安裝，改下載不需合併的單一檔案格式")
+                base_options['format'] = video_format.split('/')[-1]
+
+        elif request.download_type == DOWNLOAD_TYPE_AUDIO:
+            if not capabilities.ffmpeg_available:
+                raise RuntimeError(ERROR_MESSAGES['ffmpeg_not_found'])
+
+            audio_config = AUDIO_FORMATS.get(
+                request.format_option,
+                AUDIO_FORMATS["MP3 (192kbps)"]
+            )
+            codec = audio_config['codec']
+            encoder = AUDIO_CODEC_ENCODERS.get(codec)
+            if capabilities.encoders and encoder and not capabilities.has_encoder(encoder):
+                if codec not in AUDIO_COPY_FORMATS:
+                    raise RuntimeError(
+                        ERROR_MESSAGES['encoder_not_found'].format(encoder=encoder, codec=codec)
+                    )
+                self.logger.warning(f"FFmpeg 缺少 {encoder} 編碼器，僅能直接複製 {codec} 音軌")
+
+            base_options.update({
+                'format': AUDIO_COPY_FORMATS.get(codec, 'bestaudio/best'),
+                'postprocessors': [{
+                    'key': 'FFmpegExtractAudio',
+                    'preferredcodec': codec,
+                    'preferredquality': audio_config['quality'],
+                }],
+            })
+
+        return base_options
+
+
+def create_engine(name: Optional[str] = None, **options: Any) -> DownloadEngine:
+    """
+    依名稱建立下載引擎
+
+    Args:
+        name: `yt-dlp` 或 `fake`，未指定時讀取環境變數 DOWNLOAD_ENGINE
+        **options: 傳給引擎建構子的參數
+
+    Returns:
+        DownloadEngine: 引擎實例
+    """
+    name = (name or os.getenv("DOWNLOAD_ENGINE", ENGINE_YTDLP)).lower()
+    if name == ENGINE_YTDLP:
+        return YtDlpEngine(**options)
+    if name == ENGINE_FAKE:
+        from core.fake_engine import FakeEngine
+        return FakeEngine(**options)
+    raise ValueError(f"不支援的下載引擎: {name}")
+
+
+_default_engine: Optional[DownloadEngine] = None
+_default_lock = threading.Lock()
+
+
+def get_default_engine() -> DownloadEngine:
+    """取得行程共用的預設引擎（依 DOWNLOAD_ENGINE 建立一次）"""
+    global _default_engine
+    if _default_engine is None:
+        with _default_lock:
+            if _default_engine is None:
+                _default_engine = create_engine()
+    return _default_engine
@@ -0,0 +1,194 @@
+"""
+不連網的模擬下載引擎
+
+以固定的大小、速度、延遲與失敗規則模擬解析、下載與後處理，
+讓批次下載、Web 服務與介面可以在毫秒內進行大量任務的壓力測試。
+同一組參數與 URL 的行為固定（失敗注入以 seed 與 URL 決定）。
+
+個別 URL 可用查詢參數覆寫引擎設定，例如：
+    https://fake.test/video?size=1048576&speed=0&fail=download
+支援 size、duration、speed、latency、postprocess_latency 與 fail（extract/download/postprocess）。
+指定時間範圍時只「下載」對應比例的大小。
+"""
+
+import os
+import random
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from core.cancellation import CancelledError
+from core.constants import DOWNLOAD_TYPE_AUDIO, SUCCESS_MESSAGES
+from core.engine import DownloadEngine, DownloadRequest, EngineSession
+
+FAIL_PHASES = ("extract", "download", "postprocess")
+
+
+def _fake_format(url: str, index: int) -> Dict[str, Any]:
+    """與 yt-dlp HLS 格式相近大小的格式項目"""
+    return {
+        'format_id': f"hls-{index}",
+        'url': f"{url}/{index}/index.m3u8",
+        'ext': 'mp4',
+        'tbr': 500.0 + index * 100,
+        'http_headers': {'User-Agent': 'Mozilla/5.0', 'Accept': '*/*'},
+        'fragments': [{'url': f"{url}/{index}/seg-{n}.ts", 'duration': 6.0} for n in range(50)],
+    }
+
+
+class FakeSession(EngineSession):
+    """模擬工作階段"""
+
+    def __init__(self, engine: "FakeEngine", request: DownloadRequest):
+        self.engine = engine
+        self.request = request
+        self._cancelled = threading.Event()
+
+        params = {key: values[-1] for key, values in parse_qs(urlparse(request.url).query).items()}
+        self.size = int(params.get("size", engine.size))
+        self.duration = float(params.get("duration", engine.duration))
+        self.speed = float(params.get("speed", engine.speed))
+        self.latency = float(params.get("latency", engine.latency))
+        self.postprocess_latency = float(params.get("postprocess_latency", engine.postprocess_latency))
+        self.fail = params.get("fail") or engine.failure_for(request.url)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _wait(self, seconds: float):
+        """等待指定時間，期間被取消時立即中止"""
+        if seconds > 0 and self._cancelled.wait(seconds):
+            raise CancelledError(SUCCESS_MESSAGES['cancel_success'])
+        if self._cancelled.is_set():
+            raise CancelledError(SUCCESS_MESSAGES['cancel_success'])
+
+    def _report(self, data: Dict[str, Any]):
+        if self.request.progress_hook:
+            self.request.progress_hook(data)
+
+    def extract(self) -> Dict[str, Any]:
+        self._wait(self.latency)
+        if self.fail == "extract":
+            raise RuntimeError(f"模擬解析失敗: {self.request.url}")
+
+        path = urlparse(self.request.url).path.strip("/") or "video"
+        video_id = path.replace("/", "_")
+        info = {
+            'id': video_id,
+            'title': f"fake-{video_id}",
+            'ext': 'mp3' if self.request.download_type == DOWNLOAD_TYPE_AUDIO else 'mp4',
+            'filesize': self.size,
+            'duration': self.duration,
+            'webpage_url': self.request.url,
+            'extractor_key': 'Fake',
+        }
+        if self.engine.info_formats:
+            info['formats'] = [_fake_format(self.request.url, index) for index in range(self.engine.info_formats)]
+            info['format_id'] = info['formats'][-1]['format_id']
+        return info
+
+    def expected_filename(self, info: Dict[str, Any]) -> str:
+        name = info['title']
+        if self.request.is_clip:
+            name = f"{name}_{self.request.clip_label()}"
+        return os.path.join(self.request.output_path, f"{name}.{info['ext']}")
+
+    def _download_size(self) -> int:
+        """片段下載時只取對應比例的大小"""
+        if not self.request.is_clip or self.duration <= 0:
+            return self.size
+        start = min(self.request.start_time or 0, self.duration)
+        end = min(self.request.end_time if self.request.end_time is not None else self.duration, self.duration)
+        return int(self.size * max(end - start, 0) / self.duration)
+
+    def download(self, info: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        size = self._download_size()
+        steps = max(self.engine.progress_steps, 1)
+        chunk_seconds = size / self.speed / steps if self.speed > 0 else 0
+
+        for step in range(1, steps + 1):
+            self._wait(chunk_seconds)
+            if self.fail == "download" and step > steps // 2:
+                raise RuntimeError(f"模擬下載中斷: {self.request.url}")
+            downloaded = size * step // steps
+            remaining = (size - downloaded) / self.speed if self.speed > 0 else 0
+            self._report({
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': size,
+                'speed': self.speed or None,
+                'eta': remaining,
+            })
+        self._report({'status': 'finished'})
+
+        self._wait(self.postprocess_latency)
+        if self.fail == "postprocess":
+            raise RuntimeError(f"模擬後處理失敗: {self.request.url}")
+
+        file_path = self.expected_filename(info)
+        if self.engine.write_files:
+            os.makedirs(self.request.output_path, exist_ok=True)
+            # 以稀疏檔案建立指定大小，不實際寫入內容
+            with open(file_path, "wb") as f:
+                f.truncate(size)
+        return info, file_path
+
+
+class FakeEngine(DownloadEngine):
+    """可設定大小、速度、延遲與失敗率的模擬引擎"""
+
+    name = "fake"
+    produces_media = False
+
+    def __init__(
+        self,
+        size: int = 1024 * 1024,
+        duration: float = 60,
+        speed: float = 0,
+        latency: float = 0,
+        postprocess_latency: float = 0,
+        failure_rate: float = 0,
+        fail_phase: str = "download",
+        progress_steps: int = 10,
+        write_files: bool = False,
+        seed: int = 0,
+        info_formats: int = 0,
+    ):
+        """
+        Args:
+            size: 模擬檔案大小（位元組）
+            duration: 模擬影片長度（秒）
+            speed: 下載速度（位元組/秒），0 表示不等待
+            latency: 解析延遲（秒）
+            postprocess_latency: 後處理延遲（秒）
+            failure_rate: 失敗比例（0~1），依 seed 與 URL 決定哪些任務失敗
+            fail_phase: 注入失敗的階段
+            progress_steps: 下載期間回報進度的次數
+            write_files: 是否在輸出目錄建立對應大小的檔案
+            seed: 失敗注入的亂數種子
+            info_formats: info dict 中模擬的格式數（各含分段清單），用於記憶體基準
+        """
+        if fail_phase not in FAIL_PHASES:
+            raise ValueError(f"不支援的失敗階段: {fail_phase}")
+        self.size = size
+        self.duration = duration
+        self.speed = speed
+        self.latency = latency
+        self.postprocess_latency = postprocess_latency
+        self.failure_rate = failure_rate
+        self.fail_phase = fail_phase
+        self.progress_steps = progress_steps
+        self.write_files = write_files
+        self.seed = seed
+        self.info_formats = info_formats
+
+    def failure_for(self, url: str) -> Optional[str]:
+        """回傳此 URL 注入失敗的階段，不失敗時回傳 None"""
+        if self.failure_rate <= 0:
+            return None
+        if random.Random(f"{self.seed}:{url}").random() < self.failure_rate:
+            return self.fail_phase
+        return None
+
+    def open(self, request: DownloadRequest) -> EngineSession:
+        return FakeSession(self, request)
@@ -0,0 +1,169 @@
+"""
+輸出檔名保留
+
+多個任務同時寫入同一目錄時，先檢查 `os.path.exists` 再改名會讓兩個任務選到相同檔名，
+後者覆寫前者。這裡在記憶體中維護各輸出目錄已使用的檔名（首次使用時掃描目錄一次），
+保留檔名與記錄在同一把鎖內完成，並記住每個檔名下一個可用的 `_N` 後綴，
+同名檔案很多時也不必逐一探測檔案系統。
+
+實際搬移以不覆寫的原子操作（硬連結、Windows rename，或先以 O_EXCL 建立
+空檔保留檔名再 replace）完成，其他行程
+或外部程式先建立了同名檔案時改用下一個後綴。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from core.constants import NAMING_INDEX_MAX_DIRS
+
+
+class _DirectoryIndex:
+    """單一目錄已使用的檔名與各檔名的下一個後綴"""
+
+    def __init__(self, directory: str):
+        self.taken: Set[str] = set()
+        self.next_suffix: Dict[str, int] = {}
+        self.pending = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    self.taken.add(os.path.normcase(entry.name))
+        except FileNotFoundError:
+            pass
+
+
+class NameIndex:
+    """各輸出目錄的檔名保留索引"""
+
+    def __init__(self, max_dirs: int = NAMING_INDEX_MAX_DIRS):
+        """
+        Args:
+            max_dirs: 記憶體中保留索引的目錄數，超過時捨棄最久未使用且沒有進行中保留的目錄
+        """
+        self.max_dirs = max_dirs
+        self._dirs: "OrderedDict[str, _DirectoryIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, directory: str) -> _DirectoryIndex:
+        index = self._dirs.get(directory)
+        if index is None:
+            index = self._dirs[directory] = _DirectoryIndex(directory)
+            self._evict()
+        else:
+            self._dirs.move_to_end(directory)
+        return index
+
+    def _evict(self):
+        for directory in list(self._dirs):
+            if len(self._dirs) <= self.max_dirs:
+                break
+            if self._dirs[directory].pending == 0:
+                del self._dirs[directory]
+
+    def reserve(self, directory: str, filename: str) -> str:
+        """
+        保留 directory 中不重複的檔名
+
+        Args:
+            directory: 輸出目錄
+            filename: 想要的檔名，已使用時依序加上 `_1`、`_2`… 後綴
+
+        Returns:
+            str: 保留的完整路徑，使用完畢須呼叫 commit 或 release
+        """
+        directory = os.path.abspath(directory)
+        stem, ext = os.path.splitext(filename)
+        with self._lock:
+            index = self._index(directory)
+            candidate = filename
+            if os.path.normcase(candidate) in index.taken:
+                key = os.path.normcase(filename)
+                suffix = index.next_suffix.get(key, 1)
+                while os.path.normcase(f"{stem}_{suffix}{ext}") in index.taken:
+                    suffix += 1
+                index.next_suffix[key] = suffix + 1
+                candidate = f"{stem}_{suffix}{ext}"
+            index.taken.add(os.path.normcase(candidate))
+            index.pending += 1
+        return os.path.join(directory, candidate)
+
+    def commit(self, path: str):
+        """檔案已寫入保留的路徑"""
+        with self._lock:
+            index = self._dirs.get(os.path.dirname(path))
+            if index is not None:
+                index.pending = max(index.pending - 1, 0)
+
+    def release(self, path: str):
+        """放棄保留的路徑（檔案未寫入或已刪除）"""
+        directory, name = os.path.split(path)
+        with self._lock:
+            index = self._dirs.get(directory)
+            if index is not None:
+                index.taken.discard(os.path.normcase(name))
+                index.pending = max(index.pending - 1, 0)
+
+    def forget(self, path: str):
+        """檔案已移走或刪除，檔名可再使用"""
+        directory, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            index = self._dirs.get(directory)
+            if index is not None:
+                index.taken.discard(os.path.normcase(name))
+
+    def move(self, src: str, directory: str, filename: Optional[str] = None) -> str:
+        """
+        將 src 以不重複的檔名移到 directory（須與 src 位於同一檔案系統）
+
+        Args:
+            src: 來源檔案
+            directory: 目的目錄
+            filename: 目的檔名，未指定時沿用來源檔名
+
+        Returns:
+            str: 最終檔案路徑
+        """
+        filename = filename or os.path.basename(src)
+        while True:
+            target = self.reserve(directory, filename)
+            try:
+                _place(src, target)
+            except FileExistsError:
+                # 其他行程已建立此檔名，保持為已使用並改用下一個後綴
+                self.commit(target)
+                continue
+            except BaseException:
+                self.release(target)
+                raise
+            self.commit(target)
+            self.forget(src)
+            return target
+
+
+def _place(src: str, dst: str):
+    """將同一檔案系統內的檔案放到 dst，dst 已存在時拋出 FileExistsError（不覆寫）"""
+    if os.name == "nt":
+        # Windows 的 rename 在目標存在時失敗，本身即為不覆寫的原子操作
+        os.rename(src, dst)
+        return
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        # 不支援硬連結的檔案系統：先以 O_EXCL 建立空檔保留檔名（已存在時拋出 FileExistsError），
+        # 再以 replace 覆蓋自己建立的空檔，避免檢查與改名之間被其他行程搶先
+        os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        try:
+            os.replace(src, dst)
+        except BaseException:
+            os.unlink(dst)
+            raise
+        return
+    os.unlink(src)
+
+
+# 行程內共用的檔名索引
+output_names = NameIndex()
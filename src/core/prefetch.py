@@ -0,0 +1,223 @@
+"""
+批次任務的影片資訊預先解析
+
+批次下載時，排在後面的任務要等到執行槽空出才開始數秒的解析（extract_info）。
+MetadataPrefetcher 在背景解析接下來 lookahead 個排隊中的任務，
+下載時直接使用已解析的結果，解析時間與前一個任務的傳輸時間重疊：
+
+- 同時解析的數量受 lookahead 限制，同一網站另有 per_site 上限，避免對網站送出大量請求
+- 解析結果在 ttl 秒後過期；格式網址帶有 expire 參數（簽章網址）時提早過期
+- 取用時解析仍在進行則等待完成；失敗、逾時或過期時由下載任務自行解析，
+  逾時或被丟棄的解析會中斷連線，不與下載時的解析重複請求網站
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from core.cancellation import CancelledError, CancelScope
+from core.circuit_breaker import circuit_key
+from core.constants import (
+    PREFETCH_EXPIRY_MARGIN,
+    PREFETCH_LOOKAHEAD,
+    PREFETCH_PER_SITE,
+    PREFETCH_TTL,
+    PREFETCH_WAIT,
+)
+from core.engine import DownloadEngine, DownloadRequest, EngineSession, get_default_engine
+from utils.logger import Logger
+
+
+def signed_url_expiry(info: Dict[str, Any]) -> Optional[float]:
+    """所選格式網址中最早的 expire 參數（Unix 時間），沒有時回傳 None"""
+    formats = info.get('requested_formats') or [info]
+    expiries = []
+    for fmt in formats:
+        values = parse_qs(urlparse(fmt.get('url') or '').query).get('expire')
+        if values and values[0].isdigit():
+            expiries.append(float(values[0]))
+    return min(expiries) if expiries else None
+
+
+class _Entry:
+    """一個任務的預先解析：背景工作、進行中的引擎工作階段與其連線"""
+
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self.session: Optional[EngineSession] = None
+        self.scope = CancelScope()
+        self.dropped = False
+
+    def drop(self):
+        """不再需要結果：取消尚未開始的解析，進行中的中斷連線"""
+        self.dropped = True
+        if self.future is not None and self.future.cancel():
+            return
+        self.scope.cancel()
+        session = self.session
+        if session is not None:
+            session.cancel()
+
+
+class MetadataPrefetcher:
+    """在背景預先解析排隊中任務的影片資訊"""
+
+    def __init__(
+        self,
+        engine: Optional[DownloadEngine] = None,
+        lookahead: int = PREFETCH_LOOKAHEAD,
+        per_site: int = PREFETCH_PER_SITE,
+        ttl: float = PREFETCH_TTL,
+        wait: float = PREFETCH_WAIT,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            engine: 解析使用的引擎（應與下載相同），None 時使用預設引擎
+            lookahead: 預先解析的任務數上限
+            per_site: 同一網站同時解析的數量上限
+            ttl: 解析結果的有效秒數
+            wait: 取用時等待進行中解析的最長秒數
+            clock: 時間來源（測試用）
+        """
+        self.engine = engine
+        self.lookahead = max(1, lookahead)
+        self.per_site = max(1, per_site)
+        self.ttl = ttl
+        self.wait = wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._site_slots: Dict[str, threading.Semaphore] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {"submitted": 0, "hits": 0, "misses": 0, "expired": 0, "failed": 0}
+        self.logger = Logger()
+
+    def submit(self, handle: Hashable, request: DownloadRequest,
+               on_ready: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
+        """
+        開始預先解析
+
+        Args:
+            handle: 任務識別值（取用時使用）
+            request: 與下載相同的請求（不需進度回調）
+            on_ready: 解析完成時以影片資訊呼叫（於背景執行緒）
+
+        Returns:
+            bool: 是否開始（已在解析或已達 lookahead 上限時為 False）
+        """
+        with self._lock:
+            if handle in self._entries or len(self._entries) >= self.lookahead:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.lookahead, thread_name_prefix="prefetch")
+            entry = _Entry()
+            entry.future = self._executor.submit(self._extract, entry, request, on_ready)
+            self._entries[handle] = entry
+            self.stats["submitted"] += 1
+            return True
+
+    @contextmanager
+    def _site_slot(self, site: str):
+        with self._lock:
+            slot = self._site_slots.setdefault(site, threading.Semaphore(self.per_site))
+        with slot:
+            yield
+
+    def _extract(self, entry: _Entry, request: DownloadRequest,
+                 on_ready: Optional[Callable[[Dict[str, Any]], None]]) -> Tuple[Dict[str, Any], float]:
+        with entry.scope, self._site_slot(circuit_key(request.url)):
+            engine = self.engine or get_default_engine()
+            with engine.open(request) as session:
+                entry.session = session
+                # 等待網站名額期間已被丟棄時不送出請求
+                if entry.dropped:
+                    raise CancelledError("預先解析已取消")
+                try:
+                    info = session.extract()
+                finally:
+                    entry.session = None
+        expires_at = self._clock() + self.ttl
+        expiry = signed_url_expiry(info)
+        if expiry is not None:
+            expires_at = min(expires_at, self._clock() + expiry - time.time() - PREFETCH_EXPIRY_MARGIN)
+        if on_ready and not entry.dropped:
+            try:
+                on_ready(info)
+            except Exception as e:
+                self.logger.warning(f"預先解析回調錯誤: {e}")
+        return info, expires_at
+
+    def take(self, handle: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        取出預先解析的影片資訊
+
+        尚未開始的解析會被取消；進行中的最多等待 wait 秒，逾時則中斷。
+        沒有、失敗或已過期時回傳 None，由下載任務自行解析。
+        """
+        with self._lock:
+            entry = self._entries.pop(handle, None)
+        if entry is None or entry.future.cancel():
+            self._count("misses")
+            return None
+        try:
+            info, expires_at = entry.future.result(timeout=self.wait)
+        except Exception as e:
+            # 逾時時中斷仍在進行的解析，避免與下載時的解析同時請求網站
+            entry.drop()
+            self.logger.debug(f"預先解析未完成或失敗，改由下載時解析: {e}")
+            self._count("failed")
+            return None
+        if self._clock() >= expires_at:
+            self._count("expired")
+            return None
+        self._count("hits")
+        return info
+
+    def retain(self, handles: Iterable[Hashable]):
+        """只保留指定任務的預先解析，其餘取消或中斷（排隊順序改變或任務已取消時）"""
+        keep = set(handles)
+        with self._lock:
+            dropped = [self._entries.pop(handle) for handle in list(self._entries) if handle not in keep]
+        for entry in dropped:
+            entry.drop()
+
+    def expire(self):
+        """丟棄已過期的解析結果，空出 lookahead 名額（解析失敗的保留至取用，不重複解析）"""
+        now = self._clock()
+        with self._lock:
+            for handle, entry in list(self._entries.items()):
+                future = entry.future
+                if future.done() and not future.cancelled() and not future.exception() and future.result()[1] <= now:
+                    del self._entries[handle]
+                    self.stats["expired"] += 1
+
+    def handles(self) -> List[Hashable]:
+        """預先解析中或已完成尚未取用的任務"""
+        with self._lock:
+            return list(self._entries)
+
+    def pending(self) -> int:
+        """預先解析中或已完成尚未取用的任務數"""
+        with self._lock:
+            return len(self._entries)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """命中、過期與失敗次數"""
+        with self._lock:
+            return dict(self.stats, pending=len(self._entries), lookahead=self.lookahead)
+
+    def close(self):
+        """取消所有預先解析並結束背景執行緒"""
+        self.retain(())
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
@@ -0,0 +1,333 @@
+"""
+行程隔離的下載執行模式
+
+每個 DownloadTask 交由常駐的工作行程執行，避免多個任務的解析工作
+（簽章/JS 解譯、大型 JSON）互相爭奪 GIL，並可在取消或逾時時強制終止。
+進度與結果透過 Pipe 傳回主行程。頻寬由主行程的預算分配：
+工作行程回報傳輸量，主行程將分配到的速率傳給工作行程限速。
+"""
+
+import multiprocessing
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from core.bandwidth import BandwidthBudget
+from core.constants import (
+    CANCEL_POLL_INTERVAL,
+    ERROR_MESSAGES,
+    PROCESS_BANDWIDTH_WAIT,
+    PROCESS_MAX_TASKS_PER_CHILD,
+    PROCESS_PROGRESS_INTERVAL,
+    SUCCESS_MESSAGES,
+)
+from core.downloader import DownloadTask
+from core.task_result import TaskResult
+from utils.logger import Logger
+
+# 尚未傳送頻寬分配給工作行程
+_NOT_SENT = object()
+
+# 無法傳給工作行程的任務設定（工作行程依環境變數建立自己的引擎、儲存後端與暫存區）
+_UNSUPPORTED_OPTIONS = ("engine", "storage", "staging", "keep_info")
+
+
+def _apply_memory_limit(memory_limit_mb: Optional[int]):
+    """在工作行程中設定記憶體上限（僅支援 POSIX）"""
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        Logger().warning("此平台不支援工作行程記憶體上限設定")
+
+
+def _receive_rates(conn, task: DownloadTask, allocated: threading.Event, stop: threading.Event):
+    """任務執行期間接收主行程分配的頻寬（('rate', bytes/s)），套用為任務上限"""
+    while not stop.is_set():
+        try:
+            if not conn.poll(CANCEL_POLL_INTERVAL):
+                continue
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if isinstance(message, tuple) and message[0] == 'rate':
+            task.set_rate_limit(message[1])
+            allocated.set()
+
+
+def _worker_main(conn, memory_limit_mb: Optional[int]):
+    """工作行程主迴圈：接收任務參數、執行並回報事件"""
+    _apply_memory_limit(memory_limit_mb)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        if not isinstance(job, dict):
+            # 上一個任務結束後才送達的頻寬分配
+            continue
+
+        last_sent = [0.0]
+        allocated = threading.Event()
+
+        def _progress(data: Dict[str, Any]):
+            now = time.monotonic()
+            if data.get('status') == 'downloading' and now - last_sent[0] < PROCESS_PROGRESS_INTERVAL:
+                return
+            last_sent[0] = now
+            conn.send(('progress', data))
+            if data.get('status') == 'downloading' and not allocated.is_set():
+                # 開始傳輸時等待主行程分配頻寬，之後依分配的速率限速
+                allocated.wait(PROCESS_BANDWIDTH_WAIT)
+                allocated.set()
+
+        def _complete(file_path: str, result: Optional[TaskResult]):
+            # 只傳回精簡結果，不在行程間傳遞整份 yt-dlp info dict
+            conn.send(('complete', file_path, result.to_dict() if result else {}, task.timings))
+
+        def _error(message: str):
+            conn.send(('error', message))
+
+        # 總上限與權重由主行程分配，工作行程只以自己的額度套用分配到的速率
+        task = DownloadTask(
+            progress_callback=_progress,
+            complete_callback=_complete,
+            error_callback=_error,
+            bandwidth=BandwidthBudget(),
+            **job,
+        )
+        stop = threading.Event()
+        receiver = threading.Thread(target=_receive_rates, args=(conn, task, allocated, stop), daemon=True)
+        receiver.start()
+        try:
+            success = task.execute()
+        except MemoryError:
+            conn.send(('error', "工作行程記憶體不足"))
+            success = False
+        finally:
+            stop.set()
+            receiver.join()
+        conn.send(('done', success))
+
+
+class _ProcessWorker:
+    """單一工作行程與其通訊管道"""
+
+    def __init__(self, context, memory_limit_mb: Optional[int]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks_run = 0
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        """強制終止工作行程"""
+        try:
+            self.process.terminate()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(1)
+        finally:
+            self.conn.close()
+
+    def shutdown(self):
+        """正常關閉工作行程"""
+        try:
+            self.conn.send(None)
+            self.process.join(2)
+        except (OSError, EOFError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ProcessWorkerPool:
+    """常駐工作行程池"""
+
+    def __init__(
+        self,
+        max_workers: int,
+        memory_limit_mb: Optional[int] = None,
+        max_tasks_per_child: int = PROCESS_MAX_TASKS_PER_CHILD,
+    ):
+        self.max_workers = max_workers
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        # spawn 在各平台行為一致，也避免 fork 複製執行緒鎖的問題
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: List[_ProcessWorker] = []
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> Optional[_ProcessWorker]:
+        """取得可用的工作行程，等待期間被取消時回傳 None"""
+        with self._condition:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.is_alive():
+                        return worker
+                    self._size -= 1
+                if self._size < self.max_workers:
+                    self._size += 1
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                self._condition.wait(0.2)
+
+        try:
+            return _ProcessWorker(self._context, self.memory_limit_mb)
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, worker: _ProcessWorker, healthy: bool = True):
+        """歸還工作行程；不健康或已達任務上限者直接終止"""
+        worker.tasks_run += 1
+        recycle = not healthy or worker.tasks_run >= self.max_tasks_per_child
+        if recycle:
+            if healthy:
+                worker.shutdown()
+            else:
+                worker.kill()
+
+        with self._condition:
+            if recycle:
+                self._size -= 1
+            else:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def shutdown(self):
+        """關閉所有閒置的工作行程"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for worker in idle:
+            worker.shutdown()
+
+
+class ProcessDownloadTask(DownloadTask):
+    """在工作行程中執行的下載任務"""
+
+    def __init__(self, *args, pool: ProcessWorkerPool, time_limit: Optional[float] = None, **kwargs):
+        """
+        Raises:
+            ValueError: 指定了無法在工作行程中套用的 engine、storage、staging 或 keep_info
+        """
+        unsupported = [name for name in _UNSUPPORTED_OPTIONS if kwargs.get(name)]
+        if unsupported:
+            raise ValueError(
+                f"行程隔離模式不支援自訂 {', '.join(unsupported)}，"
+                "請改以環境變數（DOWNLOAD_ENGINE、STORAGE_BACKEND、STAGING_DIR）設定"
+            )
+        super().__init__(*args, **kwargs)
+        self.pool = pool
+        self.time_limit = time_limit
+
+    def execute(self) -> bool:
+        """將任務交給工作行程並轉送事件；取消或逾時時強制終止行程"""
+        worker = self.pool.acquire(self.cancel_event)
+        if worker is None:
+            return self._fail(SUCCESS_MESSAGES['cancel_success'])
+
+        healthy = True
+        # 額度登記在主行程的預算，與其他任務共用總上限、權重與即時調整
+        self._bandwidth_share = self.bandwidth.register(self.bandwidth_weight, self.rate_limit)
+        self._relayed_rate = _NOT_SENT
+        try:
+            worker.conn.send({
+                'url': self.url,
+                'download_type': self.download_type,
+                'output_path': self.output_path,
+                'format_option': self.format_option,
+                'start_time': self.start_time,
+                'end_time': self.end_time,
+                'rate_limit': self.rate_limit,
+                'prefetched_info': self.prefetched_info,
+            })
+            deadline = time.monotonic() + self.time_limit if self.time_limit else None
+
+            while True:
+                if self.is_cancelled():
+                    healthy = False
+                    return self._fail(SUCCESS_MESSAGES['cancel_success'])
+                if deadline is not None and time.monotonic() > deadline:
+                    healthy = False
+                    return self._fail(f"下載逾時（超過 {self.time_limit:.0f} 秒）")
+
+                self._relay_bandwidth(worker.conn)
+                if not worker.conn.poll(0.1):
+                    continue
+
+                message = worker.conn.recv()
+                kind = message[0]
+                if kind == 'progress':
+                    self._relay_bandwidth(worker.conn, message[1])
+                    if self.progress_callback:
+                        self.progress_callback(message[1])
+                elif kind == 'complete':
+                    self.downloaded_file = message[1]
+                    self.result = TaskResult(**message[2])
+                    self.timings = message[3]
+                    self.bandwidth_saved = self.result.bandwidth_saved
+                    self.storage_uri = self.result.storage_uri
+                    self.verification = self.result.verification
+                    if self.complete_callback:
+                        self.complete_callback(self.downloaded_file, self.result)
+                elif kind == 'error':
+                    if self.error_callback:
+                        self.error_callback(message[1])
+                elif kind == 'done':
+                    return bool(message[1])
+
+        except (EOFError, OSError):
+            healthy = False
+            return self._fail("下載工作行程異常結束（可能超過記憶體上限）")
+        finally:
+            self._bandwidth_share.close()
+            self._bandwidth_share = None
+            self._reported_bytes.clear()
+            self.pool.release(worker, healthy)
+
+    def _relay_bandwidth(self, conn, data: Optional[Dict[str, Any]] = None):
+        """記錄工作行程回報的傳輸量，分配到的速率改變時傳給工作行程"""
+        share = self._bandwidth_share
+        if data is not None:
+            if data.get('status') == 'downloading':
+                # 影音分開下載時 downloaded 會從 0 重新計算
+                downloaded = data.get('downloaded') or 0
+                previous = self._reported_bytes.get(None, 0)
+                self._reported_bytes[None] = downloaded
+                share.activate()
+                share.record(downloaded - previous if downloaded >= previous else downloaded)
+            elif data.get('status') == 'finished':
+                share.deactivate()
+        if share.active and share.allocated != self._relayed_rate:
+            conn.send(('rate', share.allocated))
+            self._relayed_rate = share.allocated
+
+    def _fail(self, error_msg: str) -> bool:
+        """回報錯誤並回傳失敗"""
+        self.logger.error(f"下載失敗: {error_msg}")
+        if self.error_callback:
+            self.error_callback(error_msg or ERROR_MESSAGES['download_error'])
+        return False
@@ -0,0 +1,286 @@
+"""
+下載佇列排程
+
+每個排隊中的任務有一個排序鍵（越小越先執行）：
+
+    排序鍵 = 加入時間 - 優先權 × SCHEDULER_AGING_SECONDS + 短任務優先的延後秒數
+
+優先權每高一級相當於提早 SCHEDULER_AGING_SECONDS 秒加入，因此互動式的單一網址
+會排在長時間批次項目之前；但排序鍵在加入時即固定，等待越久的任務相對越前面，
+低優先權的任務最多等待「優先權差距 × SCHEDULER_AGING_SECONDS」後就會執行（老化）。
+啟用短任務優先（SJF）時，依預先取得的大小或長度估計下載秒數並加到排序鍵，
+延後量上限為 SCHEDULER_SJF_MAX_PENALTY，長任務不會無限期被插隊。
+
+同一個排序鍵同時用於行程內的 PriorityTaskQueue 與共享佇列（TaskStore）的 SQL 排序。
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from queue import Empty
+from typing import Any, Dict, Hashable, List, Optional
+
+from core.constants import (
+    PRIORITY_NORMAL,
+    SCHEDULER_AGING_SECONDS,
+    SCHEDULER_DURATION_FACTOR,
+    SCHEDULER_REFERENCE_RATE,
+    SCHEDULER_SJF_MAX_PENALTY,
+)
+
+
+def sjf_enabled() -> bool:
+    """是否依環境變數 SCHEDULER_SJF 啟用短任務優先"""
+    return os.getenv("SCHEDULER_SJF", "0").lower() in ("1", "true", "yes")
+
+
+def estimate_seconds(
+    estimated_size: Optional[float] = None,
+    duration: Optional[float] = None,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+) -> Optional[float]:
+    """
+    由預先取得的大小或影片長度估計下載秒數
+
+    片段下載時只計算範圍內的比例；兩者皆未知時回傳 None（不延後）。
+    """
+    fraction = 1.0
+    if duration and (start_time is not None or end_time is not None):
+        start = min(start_time or 0.0, duration)
+        end = min(end_time if end_time is not None else duration, duration)
+        fraction = max(end - start, 0.0) / duration
+    if estimated_size:
+        return estimated_size * fraction / SCHEDULER_REFERENCE_RATE
+    if duration:
+        return duration * fraction * SCHEDULER_DURATION_FACTOR
+    return None
+
+
+def schedule_key(
+    priority: int = PRIORITY_NORMAL,
+    enqueued_at: Optional[float] = None,
+    cost_seconds: Optional[float] = None,
+    sjf: bool = False,
+    aging_seconds: float = SCHEDULER_AGING_SECONDS,
+) -> float:
+    """
+    計算排序鍵（越小越先執行）
+
+    Args:
+        priority: 優先權，越大越先執行
+        enqueued_at: 加入佇列的時間（epoch 秒），未指定時為現在
+        cost_seconds: 預估下載秒數，僅在 sjf 為 True 時使用
+        sjf: 是否短任務優先
+        aging_seconds: 每一級優先權相當的等待秒數
+    """
+    key = (time.time() if enqueued_at is None else enqueued_at) - priority * aging_seconds
+    if sjf and cost_seconds:
+        key += min(cost_seconds, SCHEDULER_SJF_MAX_PENALTY)
+    return key
+
+
+def payload_cost(payload: Dict[str, Any]) -> Optional[float]:
+    """依工作內容（build_job_payload）估計下載秒數"""
+    return estimate_seconds(
+        payload.get("estimated_size"),
+        payload.get("duration"),
+        payload.get("start_time"),
+        payload.get("end_time"),
+    )
+
+
+class _Entry:
+    __slots__ = ("key", "seq", "handle", "item", "priority", "enqueued_at", "cost", "front", "valid")
+
+    def __init__(self, key, seq, handle, item, priority, enqueued_at, cost, front=False):
+        self.key = key
+        self.seq = seq
+        self.handle = handle
+        self.item = item
+        self.priority = priority
+        self.enqueued_at = enqueued_at
+        self.cost = cost
+        # 已手動移到最前面：之後調整優先權或預估秒數時保留排序鍵
+        self.front = front
+        self.valid = True
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return (self.key, self.seq) < (other.key, other.seq)
+
+
+class PriorityTaskQueue:
+    """
+    依排序鍵取出的執行緒安全佇列
+
+    介面與 queue.Queue 的 get / get_nowait / empty 相容（佇列為空時拋出 queue.Empty），
+    另提供以 handle 調整優先權、移到最前面或移除排隊中項目的方法。
+    """
+
+    def __init__(self, sjf: bool = False, aging_seconds: float = SCHEDULER_AGING_SECONDS,
+                 clock=time.time):
+        """
+        Args:
+            sjf: 是否短任務優先
+            aging_seconds: 每一級優先權相當的等待秒數
+            clock: 時間來源（測試用）
+        """
+        self.sjf = sjf
+        self.aging_seconds = aging_seconds
+        self._clock = clock
+        self._heap: List[_Entry] = []
+        self._entries: Dict[Hashable, _Entry] = {}
+        # 有效項目數（堆積中另有調整或移除後失效、尚未取出的項目）
+        self._size = 0
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def _key(self, priority: int, enqueued_at: float, cost: Optional[float]) -> float:
+        return schedule_key(priority, enqueued_at, cost, self.sjf, self.aging_seconds)
+
+    def put(self, item: Any, priority: int = PRIORITY_NORMAL, cost_seconds: Optional[float] = None,
+            handle: Optional[Hashable] = None):
+        """
+        加入項目
+
+        Args:
+            item: 佇列項目
+            priority: 優先權，越大越先執行
+            cost_seconds: 預估下載秒數（短任務優先時使用）
+            handle: 之後調整此項目時使用的識別值，已存在時取代原本的項目
+        """
+        enqueued_at = self._clock()
+        with self._cond:
+            if handle is not None and handle in self._entries:
+                self._invalidate(self._entries.pop(handle))
+            entry = _Entry(self._key(priority, enqueued_at, cost_seconds), next(self._counter),
+                           handle, item, priority, enqueued_at, cost_seconds)
+            if handle is not None:
+                self._entries[handle] = entry
+            heapq.heappush(self._heap, entry)
+            self._size += 1
+            self._cond.notify()
+
+    def _invalidate(self, entry: _Entry):
+        """標記項目失效（呼叫端須持有鎖），失效項目過多時重建堆積"""
+        entry.valid = False
+        self._size -= 1
+        if len(self._heap) > 2 * self._size + 64:
+            self._heap = [e for e in self._heap if e.valid]
+            heapq.heapify(self._heap)
+
+    def _prune(self):
+        """丟棄堆積頂端的失效項目，使 _heap[0] 為排序鍵最小的有效項目（呼叫端須持有鎖）"""
+        while self._heap and not self._heap[0].valid:
+            heapq.heappop(self._heap)
+
+    def _pop(self) -> Any:
+        """取出排序鍵最小的有效項目（呼叫端須持有鎖），沒有時拋出 Empty"""
+        self._prune()
+        if not self._heap:
+            raise Empty
+        entry = heapq.heappop(self._heap)
+        self._size -= 1
+        if entry.handle is not None:
+            self._entries.pop(entry.handle, None)
+        return entry.item
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """取出下一個項目，逾時或非阻塞且佇列為空時拋出 queue.Empty"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                try:
+                    return self._pop()
+                except Empty:
+                    if not block:
+                        raise
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._cond.wait(remaining)
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        with self._cond:
+            return self._size
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def __contains__(self, handle: Hashable) -> bool:
+        with self._cond:
+            return handle in self._entries
+
+    def _replace(self, old: _Entry, priority: int, cost: Optional[float], key: Optional[float] = None,
+                 front: bool = False):
+        """
+        以新的優先權與預估秒數取代項目（呼叫端須持有鎖）
+
+        未指定 key 時重新計算排序鍵；已移到最前面的項目保留原本的排序鍵。
+        """
+        front = front or old.front
+        if key is None:
+            key = old.key if front else self._key(priority, old.enqueued_at, cost)
+        self._invalidate(old)
+        self._size += 1
+        entry = _Entry(key, next(self._counter), old.handle, old.item, priority, old.enqueued_at, cost, front)
+        self._entries[old.handle] = entry
+        heapq.heappush(self._heap, entry)
+
+    def set_cost(self, handle: Hashable, cost_seconds: Optional[float]) -> bool:
+        """更新排隊中項目的預估下載秒數（例如預先解析取得大小後）"""
+        with self._cond:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return False
+            self._replace(entry, entry.priority, cost_seconds)
+            return True
+
+    def reprioritize(self, handle: Hashable, priority: int) -> bool:
+        """調整排隊中項目的優先權（保留原本的加入時間，老化不受影響；已移到最前面者維持在最前面）"""
+        with self._cond:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return False
+            self._replace(entry, priority, entry.cost)
+            return True
+
+    def move_to_front(self, handle: Hashable) -> bool:
+        """將排隊中的項目移到最前面"""
+        with self._cond:
+            entry = self._entries.get(handle)
+            if entry is None:
+                return False
+            self._prune()
+            self._replace(entry, entry.priority, entry.cost,
+                          key=min(self._heap[0].key, entry.key) - 1.0, front=True)
+            return True
+
+    def remove(self, handle: Hashable) -> bool:
+        """移除排隊中的項目"""
+        with self._cond:
+            entry = self._entries.pop(handle, None)
+            if entry is None:
+                return False
+            self._invalidate(entry)
+            return True
+
+    def peek(self, count: int) -> List[Any]:
+        """依執行順序取得前 count 個項目（不取出）"""
+        with self._cond:
+            entries = heapq.nsmallest(count, (entry for entry in self._heap if entry.valid))
+        return [entry.item for entry in entries]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """依執行順序列出排隊中的項目（handle、優先權與排序鍵）"""
+        with self._cond:
+            entries = sorted(entry for entry in self._heap if entry.valid)
+        return [
+            {"handle": entry.handle, "priority": entry.priority, "key": entry.key}
+            for entry in entries
+        ]
@@ -0,0 +1,179 @@
+"""
+下載暫存區
+
+yt-dlp 的 `.part` 分段、合併中間檔與轉檔輸出都先寫在本機高速磁碟（SSD 或 tmpfs）
+上的暫存區，完成並通過驗證後才移到輸出目錄；輸出目錄位於網路磁碟時，
+合併 DASH 影音與轉檔不必在網路上反覆讀寫，讀取輸出目錄的程式也不會看到未完成的檔案。
+
+暫存區有容量上限，任務解析完成後依預估大小預留空間，超過上限時等待其他任務完成。
+由 STAGING_DIR 啟用，STAGING_MAX_BYTES 設定上限（0 表示不限制）。
+"""
+
+import os
+import shutil
+import threading
+import uuid
+from typing import Optional
+
+from core.constants import STAGING_MAX_BYTES, STAGING_SIZE_FACTOR, STAGING_WAIT_INTERVAL
+from core.naming import output_names
+from utils.logger import Logger
+
+
+class StagingSlot:
+    """單一任務在暫存區的工作目錄"""
+
+    def __init__(self, area: "StagingArea", path: str):
+        self.area = area
+        self.path = path
+        self.reserved = 0
+
+    def reserve(self, estimated_size: int, cancel_event: Optional[threading.Event] = None) -> bool:
+        """
+        依預估大小預留容量，超過上限時等待其他任務釋放
+
+        暫存區沒有其他預留時一律放行，避免大於上限的單一檔案永遠等不到空間。
+
+        Args:
+            estimated_size: 預估的輸出大小，依 STAGING_SIZE_FACTOR 預留合併所需的額外空間
+            cancel_event: 設定後停止等待
+
+        Returns:
+            bool: 是否預留成功（等待期間被取消時為 False）
+        """
+        return self.area._reserve(self, int(estimated_size * STAGING_SIZE_FACTOR), cancel_event)
+
+    def release(self):
+        """刪除工作目錄（含殘留的暫存檔）並歸還預留容量"""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.area._release(self)
+
+
+class StagingArea:
+    """有容量上限的暫存區"""
+
+    def __init__(self, root: str, max_bytes: int = STAGING_MAX_BYTES):
+        """
+        Args:
+            root: 暫存目錄（建議位於本機 SSD 或 tmpfs）
+            max_bytes: 同時預留的容量上限（位元組），0 表示不限制
+        """
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.reserved = 0
+        self._cond = threading.Condition()
+        self.logger = Logger()
+        os.makedirs(self.root, exist_ok=True)
+        self.cleanup_orphans()
+
+    def open_slot(self) -> StagingSlot:
+        """建立任務的工作目錄（尚未預留容量）"""
+        path = os.path.join(self.root, f"{os.getpid()}-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        return StagingSlot(self, path)
+
+    def _reserve(self, slot: StagingSlot, size: int, cancel_event: Optional[threading.Event]) -> bool:
+        with self._cond:
+            while self.max_bytes and self.reserved > 0 and self.reserved + size > self.max_bytes:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                self._cond.wait(STAGING_WAIT_INTERVAL)
+            self.reserved += size
+            slot.reserved += size
+        return True
+
+    def _release(self, slot: StagingSlot):
+        with self._cond:
+            self.reserved = max(self.reserved - slot.reserved, 0)
+            slot.reserved = 0
+            self._cond.notify_all()
+
+    def cleanup_orphans(self):
+        """刪除已結束行程遺留的工作目錄"""
+        for name in os.listdir(self.root):
+            pid = name.split("-", 1)[0]
+            if not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            self.logger.info(f"已清除遺留的暫存目錄: {name}")
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def finalize(src: str, dest_dir: str) -> str:
+    """
+    將暫存區完成的檔案移到輸出目錄
+
+    同一檔案系統時直接原子搬移；跨檔案系統時先複製為輸出目錄中的隱藏暫存檔，
+    再原子改名為正式檔名，因此輸出目錄中不會出現寫到一半的檔案。
+    檔名由 output_names 保留，已存在時加上 `_1`、`_2`… 後綴，不覆寫既有檔案。
+
+    Returns:
+        str: 最終檔案路徑
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    name, ext = os.path.splitext(os.path.basename(src))
+
+    source = src
+    copied = None
+    if not same_filesystem(src, dest_dir):
+        copied = os.path.join(dest_dir, f".{name}{ext}.{uuid.uuid4().hex}.partial")
+        _copy_durable(src, copied)
+        source = copied
+
+    try:
+        target = output_names.move(source, dest_dir, f"{name}{ext}")
+    except BaseException:
+        if copied and os.path.exists(copied):
+            os.remove(copied)
+        raise
+
+    if copied:
+        os.remove(src)
+    return target
+
+
+def same_filesystem(path: str, directory: str) -> bool:
+    """path 與 directory 是否位於同一檔案系統（可直接原子改名）"""
+    return os.stat(path).st_dev == os.stat(directory).st_dev
+
+
+def _copy_durable(src: str, dst: str):
+    """複製檔案並寫回磁碟，確保改名後讀到的是完整內容"""
+    try:
+        shutil.copyfile(src, dst)
+        with open(dst, "rb+") as f:
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(dst):
+            os.remove(dst)
+        raise
+
+
+_default_staging: Optional[StagingArea] = None
+_default_lock = threading.Lock()
+_default_checked = False
+
+
+def get_default_staging() -> Optional[StagingArea]:
+    """取得依 STAGING_DIR 建立的共用暫存區，未設定時回傳 None"""
+    global _default_staging, _default_checked
+    if not _default_checked:
+        with _default_lock:
+            if not _default_checked:
+                root = os.getenv("STAGING_DIR")
+                if root:
+                    max_bytes = int(os.getenv("STAGING_MAX_BYTES", str(STAGING_MAX_BYTES)))
+                    _default_staging = StagingArea(root, max_bytes)
+                _default_checked = True
+    return _default_staging
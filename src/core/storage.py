@@ -0,0 +1,429 @@
+"""
+下載結果儲存後端
+
+下載完成的檔案預設留在輸出目錄（LocalStorage）；設定 STORAGE_BACKEND=s3 時
+改為上傳到 S3 相容的物件儲存（AWS S3、MinIO 等，需安裝 boto3）。
+
+上傳一律直接從磁碟分段讀取，同時最多只有 `max_concurrency` 個分段在記憶體中。
+啟用 eager upload 時會在下載期間追蹤寫入中的檔案，已完成的分段先行上傳，
+下載結束後只需補傳剩餘部分；若後處理改寫了檔案（例如合併影音），
+會核對內容後放棄先行上傳的分段並重新上傳。
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional
+
+from core.constants import (
+    STORAGE_BACKEND,
+    STORAGE_CLEANUP,
+    STORAGE_CLEANUP_DELETE,
+    STORAGE_CLEANUP_POLICIES,
+    STORAGE_EAGER_POLL_INTERVAL,
+    STORAGE_PART_SIZE,
+    STORAGE_UPLOAD_CONCURRENCY,
+)
+from core.naming import output_names
+from utils.logger import Logger
+
+if TYPE_CHECKING:
+    from core.verification import StreamingChecksum
+
+# S3 單一上傳最多 10000 個分段
+S3_MAX_PARTS = 10000
+
+
+class StorageBackend(ABC):
+    """儲存後端"""
+
+    name = ""
+
+    def __init__(self, cleanup: Optional[str] = None, eager_upload: bool = False):
+        """
+        Args:
+            cleanup: 上傳成功後本機檔案的處理方式（keep 保留 / delete 刪除），
+                     未指定時讀取環境變數 STORAGE_CLEANUP
+            eager_upload: 是否在下載期間先行上傳已完成的分段
+        """
+        cleanup = cleanup or os.getenv("STORAGE_CLEANUP", STORAGE_CLEANUP)
+        if cleanup not in STORAGE_CLEANUP_POLICIES:
+            raise ValueError(f"不支援的清理策略: {cleanup}")
+        self.cleanup = cleanup
+        self.eager_upload = eager_upload
+        self.logger = Logger()
+
+    @abstractmethod
+    def upload(self, local_path: str, key: str, checksum: Optional["StreamingChecksum"] = None) -> str:
+        """
+        儲存已完成的檔案
+
+        讀取檔案時順便更新 checksum，完整讀過一次的檔案不必再為了雜湊重讀。
+
+        Returns:
+            str: 儲存位置（本機路徑或 s3:// URI）
+        """
+
+    def begin_upload(self, local_path: str, key: str) -> Optional["EagerUpload"]:
+        """開始在下載期間先行上傳；後端不支援或未啟用時回傳 None"""
+        return None
+
+    def store(
+        self,
+        local_path: str,
+        key: Optional[str] = None,
+        eager: Optional["EagerUpload"] = None,
+        checksum: Optional["StreamingChecksum"] = None,
+    ) -> str:
+        """
+        儲存下載結果並依清理策略處理本機檔案
+
+        Args:
+            local_path: 下載完成的檔案
+            key: 物件名稱，預設為檔名
+            eager: begin_upload 回傳的先行上傳
+            checksum: 上傳時同步計算的雜湊
+        """
+        key = key or os.path.basename(local_path)
+        if eager is not None:
+            location = eager.finish(local_path, key, checksum)
+        else:
+            location = self.upload(local_path, key, checksum)
+        if self.cleanup == STORAGE_CLEANUP_DELETE and location != os.path.abspath(local_path):
+            os.remove(local_path)
+            self.logger.info(f"已刪除本機檔案: {local_path}")
+        return location
+
+    def close(self):
+        """釋放後端持有的資源"""
+
+
+class LocalStorage(StorageBackend):
+    """本機檔案系統（預設）
+
+    未指定 root 時檔案留在下載目錄；指定時複製到 root 之下，
+    root 中已有同名檔案時加上 `_N` 後綴（回傳實際路徑）。
+    """
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None, cleanup: Optional[str] = None):
+        super().__init__(cleanup)
+        self.root = os.path.abspath(root) if root else None
+
+    def upload(self, local_path: str, key: str, checksum: Optional["StreamingChecksum"] = None) -> str:
+        source = os.path.abspath(local_path)
+        if self.root is None:
+            return source
+
+        target = os.path.join(self.root, key)
+        if target == source:
+            return target
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        # 暫存檔名不重複，完成後以檔名保留移入，不覆寫 root 中同名的既有檔案
+        fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".uploading", dir=directory)
+        try:
+            with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+                while True:
+                    chunk = src.read(STORAGE_PART_SIZE)
+                    if not chunk:
+                        break
+                    if checksum is not None:
+                        checksum.update(chunk)
+                    dst.write(chunk)
+            return output_names.move(tmp_path, directory, os.path.basename(target))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+class S3Storage(StorageBackend):
+    """S3 相容物件儲存（選用，需安裝 boto3）"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        part_size: int = STORAGE_PART_SIZE,
+        max_concurrency: int = STORAGE_UPLOAD_CONCURRENCY,
+        cleanup: Optional[str] = None,
+        eager_upload: bool = False,
+        client: Any = None,
+    ):
+        """
+        Args:
+            bucket: 儲存桶名稱
+            prefix: 物件名稱前綴
+            endpoint_url: 自訂端點（例如本機 MinIO `http://localhost:9000`）
+            part_size: 分段大小（位元組，S3 規定至少 5 MiB）
+            max_concurrency: 同時上傳的分段數，亦為記憶體中最多的分段數
+            client: 已建立的 S3 client，未提供時以 boto3 建立
+        """
+        super().__init__(cleanup, eager_upload)
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("使用 S3 儲存後端需先安裝 boto3 套件") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = part_size
+        self.max_concurrency = max(1, max_concurrency)
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self.object_key(key)}"
+
+    def upload(self, local_path: str, key: str, checksum: Optional["StreamingChecksum"] = None) -> str:
+        size = os.path.getsize(local_path)
+        object_key = self.object_key(key)
+
+        with open(local_path, "rb") as f:
+            if size <= self.part_size:
+                data = f.read()
+                if checksum is not None:
+                    checksum.update(data)
+                self.client.put_object(Bucket=self.bucket, Key=object_key, Body=data)
+            else:
+                part_size = max(self.part_size, -(-size // S3_MAX_PARTS))
+                upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=object_key)["UploadId"]
+                try:
+                    parts = self.upload_parts(f, object_key, upload_id, part_size, checksum=checksum)
+                    self.complete(object_key, upload_id, parts)
+                except BaseException:
+                    self.abort(object_key, upload_id)
+                    raise
+
+        self.logger.info(f"已上傳 {local_path} -> {self.uri(key)}")
+        return self.uri(key)
+
+    def upload_parts(
+        self,
+        f: BinaryIO,
+        object_key: str,
+        upload_id: str,
+        part_size: int,
+        first_part: int = 1,
+        checksum: Optional["StreamingChecksum"] = None,
+    ) -> List[Dict[str, Any]]:
+        """自檔案目前位置分段上傳到結尾，同時最多 max_concurrency 個分段在記憶體中"""
+        parts: List[Dict[str, Any]] = []
+        pending = set()
+        number = first_part
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while True:
+                data = f.read(part_size)
+                if not data:
+                    break
+                if checksum is not None:
+                    checksum.update(data)
+                pending.add(executor.submit(self.upload_part, object_key, upload_id, number, data))
+                number += 1
+                del data
+                if len(pending) >= self.max_concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    parts.extend(future.result() for future in done)
+            parts.extend(future.result() for future in pending)
+        return parts
+
+    def upload_part(self, object_key: str, upload_id: str, number: int, data: bytes) -> Dict[str, Any]:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=object_key, UploadId=upload_id, PartNumber=number, Body=data
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def complete(self, object_key: str, upload_id: str, parts: List[Dict[str, Any]]):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])},
+        )
+
+    def abort(self, object_key: str, upload_id: str):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+        except Exception as e:
+            self.logger.warning(f"取消分段上傳失敗 {object_key}: {e}")
+
+    def rename(self, source_key: str, target_key: str):
+        """伺服器端複製後刪除原物件（大型物件由 client.copy 自動分段複製）"""
+        source = {"Bucket": self.bucket, "Key": self.object_key(source_key)}
+        self.client.copy(source, self.bucket, self.object_key(target_key))
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(source_key))
+
+    def begin_upload(self, local_path: str, key: str) -> Optional["EagerUpload"]:
+        if not self.eager_upload:
+            return None
+        return EagerUpload(self, local_path, key)
+
+
+class EagerUpload:
+    """下載期間追蹤寫入中的檔案（`<檔名>.part` 或最終檔名），已寫完的分段先行上傳"""
+
+    def __init__(self, storage: S3Storage, local_path: str, key: str,
+                 poll_interval: float = STORAGE_EAGER_POLL_INTERVAL):
+        self.storage = storage
+        self.local_path = local_path
+        self.key = key
+        self.poll_interval = poll_interval
+        self.object_key = storage.object_key(key)
+        self.upload_id: Optional[str] = None
+        self.parts: List[Dict[str, Any]] = []
+        self.offset = 0
+        self._hasher = hashlib.sha256()
+        self._error: Optional[BaseException] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def uploaded_bytes(self) -> int:
+        return self.offset
+
+    def _source(self) -> Optional[str]:
+        for path in (f"{self.local_path}.part", self.local_path):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _run(self):
+        part_size = self.storage.part_size
+        try:
+            while not self._stop.wait(self.poll_interval):
+                path = self._source()
+                if path is None:
+                    continue
+                with open(path, "rb") as f:
+                    while not self._stop.is_set() and os.fstat(f.fileno()).st_size - self.offset >= part_size:
+                        f.seek(self.offset)
+                        data = f.read(part_size)
+                        self._upload(data)
+        except Exception as e:
+            self._error = e
+
+    def _upload(self, data: bytes):
+        if self.upload_id is None:
+            self.upload_id = self.storage.client.create_multipart_upload(
+                Bucket=self.storage.bucket, Key=self.object_key
+            )["UploadId"]
+        part = self.storage.upload_part(self.object_key, self.upload_id, len(self.parts) + 1, data)
+        self.parts.append(part)
+        self._hasher.update(data)
+        self.offset += len(data)
+
+    def _matches(self, f: BinaryIO, checksum: Optional["StreamingChecksum"]) -> bool:
+        """最終檔案的開頭是否與已上傳的分段相同（後處理可能改寫檔案）"""
+        if os.fstat(f.fileno()).st_size < self.offset:
+            return False
+        hasher = hashlib.sha256()
+        remaining = self.offset
+        while remaining > 0:
+            chunk = f.read(min(self.storage.part_size, remaining))
+            if not chunk:
+                return False
+            hasher.update(chunk)
+            if checksum is not None:
+                checksum.update(chunk)
+            remaining -= len(chunk)
+        return hasher.digest() == self._hasher.digest()
+
+    def finish(self, final_path: str, key: str, checksum: Optional["StreamingChecksum"] = None) -> str:
+        """補傳剩餘部分並完成上傳；無法沿用已上傳的分段時改為完整上傳"""
+        self._stop.set()
+        self._thread.join()
+
+        if self.upload_id is None:
+            return self.storage.upload(final_path, key, checksum)
+
+        try:
+            with open(final_path, "rb") as f:
+                if self._error is not None or not self._matches(f, checksum):
+                    self.storage.logger.warning(f"先行上傳的內容與最終檔案不同，改為完整上傳: {self.key}")
+                    self.abort()
+                    if checksum is not None:
+                        checksum.reset()
+                    return self.storage.upload(final_path, key, checksum)
+
+                # 核對時已讀到 offset，接著補傳剩餘部分
+                self.parts.extend(self.storage.upload_parts(
+                    f, self.object_key, self.upload_id, self.storage.part_size,
+                    first_part=len(self.parts) + 1, checksum=checksum,
+                ))
+            self.storage.complete(self.object_key, self.upload_id, self.parts)
+        except BaseException:
+            self.abort()
+            raise
+
+        if key != self.key:
+            # 下載後檔名經過轉換，於伺服器端改名
+            self.storage.rename(self.key, key)
+        self.storage.logger.info(
+            f"已上傳 {final_path} -> {self.storage.uri(key)}（下載期間先行上傳 {self.offset} 位元組）"
+        )
+        return self.storage.uri(key)
+
+    def abort(self):
+        """停止追蹤並取消已開始的分段上傳"""
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self.upload_id is not None:
+            self.storage.abort(self.object_key, self.upload_id)
+            self.upload_id = None
+
+
+def create_storage(backend: Optional[str] = None, **options: Any) -> StorageBackend:
+    """
+    依設定建立儲存後端
+
+    Args:
+        backend: 後端名稱（local 或 s3），未指定時讀取環境變數 STORAGE_BACKEND
+        **options: 傳給後端建構子的參數
+
+    Raises:
+        ValueError: 不支援的後端名稱或缺少必要設定
+    """
+    name = (backend or os.getenv("STORAGE_BACKEND", STORAGE_BACKEND)).lower()
+
+    if name == "local":
+        options.setdefault("root", os.getenv("STORAGE_LOCAL_ROOT") or None)
+        return LocalStorage(**options)
+    if name == "s3":
+        options.setdefault("bucket", os.getenv("STORAGE_S3_BUCKET", ""))
+        if not options["bucket"]:
+            raise ValueError("S3 儲存後端需設定 STORAGE_S3_BUCKET")
+        options.setdefault("prefix", os.getenv("STORAGE_S3_PREFIX", ""))
+        options.setdefault("endpoint_url", os.getenv("STORAGE_S3_ENDPOINT") or None)
+        options.setdefault("part_size", int(os.getenv("STORAGE_PART_SIZE", str(STORAGE_PART_SIZE))))
+        options.setdefault("eager_upload", os.getenv("STORAGE_EAGER_UPLOAD", "0").lower() in ("1", "true", "yes"))
+        return S3Storage(**options)
+
+    raise ValueError(f"不支援的儲存後端: {name}")
+
+
+_default_storage: Optional[StorageBackend] = None
+_default_lock = threading.Lock()
+
+
+def get_default_storage() -> StorageBackend:
+    """取得依 STORAGE_BACKEND 建立的共用儲存後端（每個行程一個，重複使用連線）"""
+    global _default_storage
+    if _default_storage is None:
+        with _default_lock:
+            if _default_storage is None:
+                _default_storage = create_storage()
+    return _default_storage
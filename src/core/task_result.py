@@ -0,0 +1,74 @@
+"""
+下載任務結果
+
+yt-dlp 的 info dict 包含所有格式、縮圖、字幕網址與分段清單，長時間的 HLS 影片
+常達數 MB。任務完成後只保留實際用到的欄位，原始 info dict 除非明確要求否則不保留，
+長時間批次下載的記憶體用量不會隨完成的任務數增長。
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+
+class TaskResult:
+    """精簡的任務結果（可用 `result['title']` / `result.get('title')` 以 dict 方式讀取）"""
+
+    __slots__ = (
+        'id', 'title', 'duration', 'ext', 'format_id', 'filesize', 'filepath',
+        'extractor_key', 'webpage_url', 'bandwidth_saved', 'storage_uri', 'verification', 'raw',
+    )
+
+    # 序列化（例如由工作行程傳回）時包含的欄位，不含 raw
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, raw: Optional[Dict[str, Any]] = None, **fields: Any):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        self.raw = raw
+
+    @classmethod
+    def from_info(
+        cls,
+        info: Optional[Dict[str, Any]],
+        filepath: Optional[str] = None,
+        keep_raw: bool = False,
+    ) -> "TaskResult":
+        """
+        由 yt-dlp info dict 建立
+
+        Args:
+            info: yt-dlp 影片資訊
+            filepath: 輸出檔案路徑，存在時以實際大小作為 filesize
+            keep_raw: 是否保留原始 info dict（存於 raw）
+        """
+        info = info or {}
+        fields = {name: info.get(name) for name in cls.FIELDS}
+        if not fields['format_id'] and info.get('requested_formats'):
+            fields['format_id'] = "+".join(str(fmt.get('format_id')) for fmt in info['requested_formats'])
+        fields['filepath'] = filepath or info.get('filepath')
+        if filepath and os.path.exists(filepath):
+            fields['filesize'] = os.path.getsize(filepath)
+        else:
+            fields['filesize'] = info.get('filesize') or info.get('filesize_approx')
+        return cls(raw=info if keep_raw else None, **fields)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS and getattr(self, key) is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可序列化的欄位（不含 raw）"""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"TaskResult(id={self.id!r}, title={self.title!r}, filepath={self.filepath!r})"
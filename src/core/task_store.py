@@ -0,0 +1,881 @@
+"""
+任務狀態與工作佇列儲存後端
+
+提供可在多個行程（例如多個 uvicorn worker）之間共享的任務狀態與佇列，
+預設使用 SQLite，亦可選用 Redis 相容服務。佇列依 core.scheduler 的排序鍵
+（優先權、老化與短任務優先）取出，而非單純先進先出；多個用戶端（payload 的 client_id）
+同時排隊時，先選出「執行中工作數 / 權重」最小的用戶端，再取該用戶端排序鍵最小的工作，
+單一用戶端大量送出工作時不會佔滿所有執行者。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from core.constants import (
+    TASK_STORE_BACKEND,
+    TASK_STORE_FILE,
+    REDIS_KEY_PREFIX,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    PRIORITY_NORMAL,
+    TASK_RETENTION_SECONDS,
+)
+from core.scheduler import payload_cost, schedule_key, sjf_enabled
+
+# 已結束的任務狀態
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+@dataclass
+class QueuedJob:
+    """從佇列領取的工作"""
+    job_id: str
+    task_id: str
+    payload: Dict[str, Any]
+    attempts: int = 1
+
+
+class TaskStore(ABC):
+    """任務狀態與工作佇列的抽象介面"""
+
+    @abstractmethod
+    def create_task(self, task_id: str, state: Dict[str, Any]) -> None:
+        """建立任務狀態"""
+
+    @abstractmethod
+    def update_task(self, task_id: str, **fields: Any) -> bool:
+        """更新任務狀態欄位，任務不存在時回傳 False"""
+
+    @abstractmethod
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """取得任務狀態"""
+
+    @abstractmethod
+    def enqueue_job(self, task_id: str, payload: Dict[str, Any]) -> None:
+        """將工作加入共享佇列（payload 的 priority、estimated_size、duration 決定順序）"""
+
+    @abstractmethod
+    def reprioritize_job(self, task_id: str, priority: int) -> bool:
+        """調整排隊中工作的優先權（保留原本的加入時間），工作不在佇列中時回傳 False"""
+
+    @abstractmethod
+    def move_job_to_front(self, task_id: str) -> bool:
+        """
+        將排隊中的工作移到最前面，工作不在佇列中時回傳 False
+
+        只調整排序鍵：領取時仍先依公平分配選出用戶端，因此只保證此工作是該用戶端下一個執行的工作。
+        """
+
+    @abstractmethod
+    def list_queued_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """依排序鍵列出排隊中的工作（task_id、client_id、priority、position）"""
+
+    @abstractmethod
+    def count_client_jobs(self, client_id: str) -> int:
+        """用戶端排隊中與執行中的工作數"""
+
+    @abstractmethod
+    def add_client_usage(self, client_id: str, day: str, nbytes: int) -> None:
+        """累計用戶端當日的下載量"""
+
+    @abstractmethod
+    def get_client_usage(self, client_id: str, day: str) -> int:
+        """取得用戶端當日的下載量（位元組）"""
+
+    @abstractmethod
+    def claim_job(
+        self, worker_id: str = "", lease_seconds: float = JOB_LEASE_SECONDS
+    ) -> Optional[QueuedJob]:
+        """以租約方式領取下一個工作，佇列為空時回傳 None"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """延長租約，租約已被回收或轉移時回傳 False"""
+
+    @abstractmethod
+    def complete_job(self, job_id: str, worker_id: str) -> None:
+        """工作結束（不論成功或失敗），自佇列移除"""
+
+    @abstractmethod
+    def release_job(self, job_id: str, worker_id: str, delay: float = 0.0, executed: bool = True) -> None:
+        """
+        放棄租約並將工作立即交還佇列
+
+        Args:
+            delay: 大於 0 時排序延後到相當於 delay 秒後才加入（斷路器開啟時），不會重複累加
+            executed: False 表示工作未執行即交還（斷路器擱置），不計入嘗試次數
+        """
+
+    @abstractmethod
+    def reclaim_expired(self, max_attempts: int = JOB_MAX_ATTEMPTS) -> List[str]:
+        """
+        回收租約過期的工作
+
+        未達嘗試上限者重新排入佇列，超過上限者丟棄並將任務標記為失敗。
+
+        Returns:
+            List[str]: 重新排入佇列的任務 ID
+        """
+
+    def _fail_abandoned(self, task_id: str, attempts: int):
+        """將多次租約過期的任務標記為失敗"""
+        self.update_task(
+            task_id,
+            status="failed",
+            message=f"工作執行者多次失去回應（{attempts} 次），已放棄此任務",
+        )
+
+    def prune_finished(self, ttl: float = TASK_RETENTION_SECONDS) -> int:
+        """
+        刪除已結束（完成、失敗、取消）超過 ttl 秒的任務狀態與其殘留的工作
+
+        Returns:
+            int: 刪除的任務數（不支援的後端回傳 0）
+        """
+        return 0
+
+    def close(self) -> None:
+        """釋放資源"""
+
+
+class SQLiteTaskStore(TaskStore):
+    """以 SQLite 檔案實作的共享儲存（預設）"""
+
+    def __init__(self, db_path: str = TASK_STORE_FILE, timeout: float = 30.0, sjf: Optional[bool] = None):
+        self.db_path = db_path
+        self.timeout = timeout
+        # 短任務優先，未指定時讀取環境變數 SCHEDULER_SJF
+        self.sjf = sjf_enabled() if sjf is None else sjf
+        self._local = threading.local()
+        # 各執行緒建立的連線，close 時一併關閉（連線只由建立它的執行緒使用）
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """取得目前執行緒專用的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 允許 close 由其他執行緒關閉此連線
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                # 順便關閉已結束執行緒留下的連線
+                for thread in [t for t in self._connections if not t.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def _init_schema(self):
+        """建立資料表"""
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " task_id TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'queued',"
+            " created_at REAL NOT NULL,"
+            " worker_id TEXT,"
+            " lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " sort_key REAL,"
+            " client_id TEXT NOT NULL DEFAULT '',"
+            " client_weight REAL NOT NULL DEFAULT 1)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_schedule ON jobs (status, sort_key, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_client ON jobs (status, client_id, sort_key)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS client_usage ("
+            " client_id TEXT NOT NULL,"
+            " day TEXT NOT NULL,"
+            " bytes INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (client_id, day))"
+        )
+
+    def create_task(self, task_id: str, state: Dict[str, Any]) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO tasks (id, state, updated_at) VALUES (?, ?, ?)",
+            (task_id, json.dumps(state, ensure_ascii=False), time.time()),
+        )
+
+    def update_task(self, task_id: str, **fields: Any) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            state = json.loads(row[0])
+            state.update(fields)
+            conn.execute(
+                "UPDATE tasks SET state = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(state, ensure_ascii=False), time.time(), task_id),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT state FROM tasks WHERE id = ?", (task_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def enqueue_job(self, task_id: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        priority = int(payload.get("priority", PRIORITY_NORMAL))
+        self._connect().execute(
+            "INSERT INTO jobs (task_id, payload, created_at, priority, sort_key, client_id, client_weight)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task_id, json.dumps(payload, ensure_ascii=False), now, priority,
+             schedule_key(priority, now, payload_cost(payload), self.sjf),
+             payload.get("client_id") or "", float(payload.get("client_weight") or 1.0)),
+        )
+
+    def reprioritize_job(self, task_id: str, priority: int) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload, created_at FROM jobs WHERE task_id = ? AND status = 'queued'",
+                (task_id,),
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            job_id, payload, created_at = row
+            payload = dict(json.loads(payload), priority=priority)
+            conn.execute(
+                "UPDATE jobs SET payload = ?, priority = ?, sort_key = ? WHERE id = ?",
+                (json.dumps(payload, ensure_ascii=False), priority,
+                 schedule_key(priority, created_at, payload_cost(payload), self.sjf), job_id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.update_task(task_id, priority=priority)
+        return True
+
+    def move_job_to_front(self, task_id: str) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE jobs SET sort_key = (SELECT MIN(sort_key) FROM jobs WHERE status = 'queued') - 1"
+            " WHERE task_id = ? AND status = 'queued'",
+            (task_id,),
+        )
+        return cursor.rowcount > 0
+
+    def list_queued_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT task_id, client_id, priority FROM jobs WHERE status = 'queued'"
+            " ORDER BY sort_key, id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {"task_id": task_id, "client_id": client_id, "priority": priority, "position": position}
+            for position, (task_id, client_id, priority) in enumerate(rows, start=1)
+        ]
+
+    def count_client_jobs(self, client_id: str) -> int:
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE client_id = ?", (client_id,)
+        ).fetchone()
+        return row[0]
+
+    def add_client_usage(self, client_id: str, day: str, nbytes: int) -> None:
+        self._connect().execute(
+            "INSERT INTO client_usage (client_id, day, bytes) VALUES (?, ?, ?)"
+            " ON CONFLICT (client_id, day) DO UPDATE SET bytes = bytes + excluded.bytes",
+            (client_id, day, int(nbytes)),
+        )
+
+    def get_client_usage(self, client_id: str, day: str) -> int:
+        row = self._connect().execute(
+            "SELECT bytes FROM client_usage WHERE client_id = ? AND day = ?", (client_id, day)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _next_client(self, conn: sqlite3.Connection) -> Optional[str]:
+        """選出「執行中工作數 / 權重」最小的用戶端，相同時取排序鍵較小者"""
+        heads = conn.execute(
+            "SELECT client_id, MIN(sort_key), MAX(client_weight) FROM jobs"
+            " WHERE status = 'queued' GROUP BY client_id"
+        ).fetchall()
+        if len(heads) <= 1:
+            return heads[0][0] if heads else None
+        running = dict(conn.execute(
+            "SELECT client_id, COUNT(*) FROM jobs WHERE status = 'claimed' GROUP BY client_id"
+        ).fetchall())
+        client_id, _, _ = min(
+            heads, key=lambda head: ((running.get(head[0], 0) + 1) / max(head[2], 0.01), head[1])
+        )
+        return client_id
+
+    def claim_job(
+        self, worker_id: str = "", lease_seconds: float = JOB_LEASE_SECONDS
+    ) -> Optional[QueuedJob]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            client_id = self._next_client(conn)
+            row = None if client_id is None else conn.execute(
+                "SELECT id, task_id, payload, attempts FROM jobs"
+                " WHERE status = 'queued' AND client_id = ? ORDER BY sort_key, id LIMIT 1",
+                (client_id,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            job_id, task_id, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = 'claimed', worker_id = ?, lease_expires = ?,"
+                " attempts = attempts + 1 WHERE id = ?",
+                (worker_id, time.time() + lease_seconds, job_id),
+            )
+            conn.execute("COMMIT")
+            return QueuedJob(str(job_id), task_id, json.loads(payload), attempts + 1)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_expires = ?"
+            " WHERE id = ? AND worker_id = ? AND status = 'claimed'",
+            (time.time() + lease_seconds, int(job_id), worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete_job(self, job_id: str, worker_id: str) -> None:
+        self._connect().execute(
+            "DELETE FROM jobs WHERE id = ? AND worker_id = ?", (int(job_id), worker_id)
+        )
+
+    def release_job(self, job_id: str, worker_id: str, delay: float = 0.0, executed: bool = True) -> None:
+        conn = self._connect()
+        sort_key = None
+        if delay > 0:
+            row = conn.execute("SELECT priority, payload FROM jobs WHERE id = ?", (int(job_id),)).fetchone()
+            if row is not None:
+                sort_key = schedule_key(row[0], time.time() + delay, payload_cost(json.loads(row[1])), self.sjf)
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires = NULL,"
+            " sort_key = MAX(sort_key, COALESCE(?, sort_key)), attempts = MAX(attempts - ?, 0)"
+            " WHERE id = ? AND worker_id = ? AND status = 'claimed'",
+            (sort_key, 0 if executed else 1, int(job_id), worker_id),
+        )
+
+    def reclaim_expired(self, max_attempts: int = JOB_MAX_ATTEMPTS) -> List[str]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, task_id, attempts FROM jobs"
+                " WHERE status = 'claimed' AND lease_expires < ?",
+                (time.time(),),
+            ).fetchall()
+            requeued, abandoned = [], []
+            for job_id, task_id, attempts in rows:
+                if attempts >= max_attempts:
+                    conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                    abandoned.append((task_id, attempts))
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', worker_id = NULL,"
+                        " lease_expires = NULL WHERE id = ?",
+                        (job_id,),
+                    )
+                    requeued.append(task_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for task_id, attempts in abandoned:
+            self._fail_abandoned(task_id, attempts)
+        return requeued
+
+    def prune_finished(self, ttl: float = TASK_RETENTION_SECONDS) -> int:
+        conn = self._connect()
+        finished = (
+            "SELECT id FROM tasks WHERE updated_at < ?"
+            f" AND json_extract(state, '$.status') IN ({', '.join('?' * len(FINISHED_STATUSES))})"
+        )
+        params = (time.time() - ttl, *FINISHED_STATUSES)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM jobs WHERE task_id IN ({finished})", params)
+            cursor = conn.execute(f"DELETE FROM tasks WHERE id IN ({finished})", params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = list(self._connections.values()), {}
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class RedisTaskStore(TaskStore):
+    """以 Redis 相容服務實作的共享儲存（選用，需安裝 redis 套件）
+
+    所有排隊中的工作放在以排序鍵為分數的 sorted set，另依用戶端各有一個 sorted set
+    供公平領取。
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        prefix: str = REDIS_KEY_PREFIX,
+        sjf: Optional[bool] = None,
+        client: Any = None,
+    ):
+        """
+        Args:
+            url: 連線位址
+            prefix: 鍵名前綴
+            sjf: 是否短任務優先，None 時讀取環境變數
+            client: 已建立的 Redis 用戶端（例如測試用的 fakeredis），指定時忽略 url
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("使用 Redis 儲存後端需先安裝 redis 套件") from e
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+        self.sjf = sjf_enabled() if sjf is None else sjf
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.prefix}:task:{task_id}"
+
+    @property
+    def _queue_key(self) -> str:
+        return f"{self.prefix}:queue"
+
+    @property
+    def _client_queue_prefix(self) -> str:
+        return f"{self.prefix}:queue:"
+
+    def _client_queue_key(self, client_id: str) -> str:
+        return f"{self._client_queue_prefix}{client_id}"
+
+    @property
+    def _clients_key(self) -> str:
+        return f"{self.prefix}:clients"
+
+    @property
+    def _running_key(self) -> str:
+        return f"{self.prefix}:running"
+
+    @property
+    def _weights_key(self) -> str:
+        return f"{self.prefix}:weights"
+
+    @property
+    def _task_jobs_key(self) -> str:
+        return f"{self.prefix}:task_jobs"
+
+    @property
+    def _job_key(self) -> str:
+        return f"{self.prefix}:job"
+
+    @property
+    def _lease_key(self) -> str:
+        return f"{self.prefix}:leases"
+
+    @property
+    def _owner_key(self) -> str:
+        return f"{self.prefix}:owners"
+
+    @property
+    def _finished_key(self) -> str:
+        # 已結束任務的結束時間，供 prune_finished 清除
+        return f"{self.prefix}:finished"
+
+    def _usage_key(self, day: str) -> str:
+        return f"{self.prefix}:usage:{day}"
+
+    def create_task(self, task_id: str, state: Dict[str, Any]) -> None:
+        key = self._task_key(task_id)
+        mapping = {name: json.dumps(value, ensure_ascii=False) for name, value in state.items()}
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        if state.get("status") in FINISHED_STATUSES:
+            pipe.zadd(self._finished_key, {task_id: time.time()})
+        else:
+            pipe.zrem(self._finished_key, task_id)
+        pipe.execute()
+
+    def update_task(self, task_id: str, **fields: Any) -> bool:
+        key = self._task_key(task_id)
+        if not fields:
+            return bool(self.client.exists(key))
+        mapping = {name: json.dumps(value, ensure_ascii=False) for name, value in fields.items()}
+        # 以 Lua 確保「存在才更新」為原子操作，避免替已刪除的任務重建殘缺狀態；
+        # 狀態改變時一併登記或移除結束時間
+        script = (
+            "if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end "
+            "redis.call('HSET', KEYS[1], unpack(ARGV, 4)) "
+            "if ARGV[1] == 'finished' then redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3]) "
+            "elseif ARGV[1] == 'active' then redis.call('ZREM', KEYS[2], ARGV[3]) end "
+            "return 1"
+        )
+        if "status" not in fields:
+            transition = ""
+        else:
+            transition = "finished" if fields["status"] in FINISHED_STATUSES else "active"
+        args = [item for pair in mapping.items() for item in pair]
+        return bool(self.client.eval(
+            script, 2, key, self._finished_key, transition, time.time(), task_id, *args,
+        ))
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.hgetall(self._task_key(task_id))
+        if not raw:
+            return None
+        return {
+            (name.decode() if isinstance(name, bytes) else name): json.loads(value)
+            for name, value in raw.items()
+        }
+
+    def enqueue_job(self, task_id: str, payload: Dict[str, Any]) -> None:
+        job_id = str(self.client.incr(f"{self.prefix}:job_seq"))
+        now = time.time()
+        priority = int(payload.get("priority", PRIORITY_NORMAL))
+        client_id = payload.get("client_id") or ""
+        score = schedule_key(priority, now, payload_cost(payload), self.sjf)
+        job = json.dumps(
+            {"task_id": task_id, "payload": payload, "attempts": 0, "client_id": client_id,
+             "created_at": now, "priority": priority, "score": score},
+            ensure_ascii=False,
+        )
+        pipe = self.client.pipeline()
+        pipe.hset(self._job_key, job_id, job)
+        pipe.hset(self._task_jobs_key, task_id, job_id)
+        pipe.hset(self._weights_key, client_id, float(payload.get("client_weight") or 1.0))
+        pipe.zadd(self._queue_key, {job_id: score})
+        pipe.zadd(self._client_queue_key(client_id), {job_id: score})
+        pipe.sadd(self._clients_key, client_id)
+        pipe.execute()
+
+    def _set_score(self, job_id: str, job: Dict[str, Any]) -> bool:
+        """工作仍排隊中時更新分數與內容"""
+        script = (
+            "if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end "
+            "redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1]) "
+            "redis.call('ZADD', KEYS[2], 'XX', ARGV[2], ARGV[1]) "
+            "redis.call('HSET', KEYS[3], ARGV[1], ARGV[3]) return 1"
+        )
+        return bool(self.client.eval(
+            script, 3, self._queue_key, self._client_queue_key(job.get("client_id") or ""), self._job_key,
+            job_id, job["score"], json.dumps(job, ensure_ascii=False),
+        ))
+
+    @staticmethod
+    def _decode_job(raw) -> Dict[str, Any]:
+        """解析工作內容（Lua 的 cjson 會將空物件重新編碼為 []）"""
+        job = json.loads(raw)
+        job["payload"] = job.get("payload") or {}
+        return job
+
+    def _queued_job(self, task_id: str):
+        job_id = self.client.hget(self._task_jobs_key, task_id)
+        raw = self.client.hget(self._job_key, job_id) if job_id else None
+        if not raw:
+            return None, None
+        return (job_id.decode() if isinstance(job_id, bytes) else job_id), self._decode_job(raw)
+
+    def reprioritize_job(self, task_id: str, priority: int) -> bool:
+        job_id, job = self._queued_job(task_id)
+        if job is None:
+            return False
+        job["priority"] = priority
+        job["payload"] = dict(job["payload"], priority=priority)
+        job["score"] = schedule_key(priority, job.get("created_at"), payload_cost(job["payload"]), self.sjf)
+        updated = self._set_score(job_id, job)
+        if updated:
+            self.update_task(task_id, priority=priority)
+        return updated
+
+    def move_job_to_front(self, task_id: str) -> bool:
+        job_id, job = self._queued_job(task_id)
+        if job is None:
+            return False
+        first = self.client.zrange(self._queue_key, 0, 0, withscores=True)
+        if not first:
+            return False
+        job["score"] = min(first[0][1], job["score"]) - 1
+        return self._set_score(job_id, job)
+
+    def list_queued_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        ids = self.client.zrange(self._queue_key, 0, limit - 1)
+        if not ids:
+            return []
+        jobs = self.client.hmget(self._job_key, ids)
+        result = []
+        for raw in jobs:
+            if not raw:
+                continue
+            job = self._decode_job(raw)
+            result.append({
+                "task_id": job["task_id"],
+                "client_id": job.get("client_id", ""),
+                "priority": job.get("priority", PRIORITY_NORMAL),
+                "position": len(result) + 1,
+            })
+        return result
+
+    def count_client_jobs(self, client_id: str) -> int:
+        pipe = self.client.pipeline()
+        pipe.zcard(self._client_queue_key(client_id))
+        pipe.hget(self._running_key, client_id)
+        queued, running = pipe.execute()
+        return int(queued or 0) + max(int(running or 0), 0)
+
+    def add_client_usage(self, client_id: str, day: str, nbytes: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.hincrby(self._usage_key(day), client_id, int(nbytes))
+        # 只需要當日的累計，保留兩天即可
+        pipe.expire(self._usage_key(day), 2 * 86400)
+        pipe.execute()
+
+    def get_client_usage(self, client_id: str, day: str) -> int:
+        return int(self.client.hget(self._usage_key(day), client_id) or 0)
+
+    def claim_job(
+        self, worker_id: str = "", lease_seconds: float = JOB_LEASE_SECONDS
+    ) -> Optional[QueuedJob]:
+        # 選擇用戶端、取出工作與登記租約必須為同一原子操作，否則 worker 中途終止會遺失工作
+        script = (
+            "local best, best_id, best_share, best_score "
+            "for _, c in ipairs(redis.call('SMEMBERS', KEYS[5])) do "
+            "  local head = redis.call('ZRANGE', ARGV[3] .. c, 0, 0, 'WITHSCORES') "
+            "  if #head == 0 then "
+            "    redis.call('SREM', KEYS[5], c) "
+            "  else "
+            "    local running = tonumber(redis.call('HGET', KEYS[6], c)) or 0 "
+            "    local weight = tonumber(redis.call('HGET', KEYS[7], c)) or 1 "
+            "    local share = (math.max(running, 0) + 1) / math.max(weight, 0.01) "
+            "    local score = tonumber(head[2]) "
+            "    if not best or share < best_share or (share == best_share and score < best_score) then "
+            "      best, best_id, best_share, best_score = c, head[1], share, score "
+            "    end "
+            "  end "
+            "end "
+            "if not best then return nil end "
+            "local id = best_id "
+            "redis.call('ZREM', ARGV[3] .. best, id) "
+            "redis.call('ZREM', KEYS[1], id) "
+            "redis.call('HINCRBY', KEYS[6], best, 1) "
+            "redis.call('ZADD', KEYS[2], ARGV[1], id) "
+            "redis.call('HSET', KEYS[3], id, ARGV[2]) "
+            "local raw = redis.call('HGET', KEYS[4], id) "
+            "local job = cjson.decode(raw) "
+            "job['attempts'] = job['attempts'] + 1 "
+            "raw = cjson.encode(job) "
+            "redis.call('HSET', KEYS[4], id, raw) "
+            "return {id, raw}"
+        )
+        result = self.client.eval(
+            script, 7,
+            self._queue_key, self._lease_key, self._owner_key, self._job_key,
+            self._clients_key, self._running_key, self._weights_key,
+            time.time() + lease_seconds, worker_id, self._client_queue_prefix,
+        )
+        if not result:
+            return None
+        job_id, raw = (item.decode() if isinstance(item, bytes) else item for item in result)
+        job = self._decode_job(raw)
+        return QueuedJob(job_id, job["task_id"], job["payload"], job["attempts"])
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        script = (
+            "if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end "
+            "redis.call('ZADD', KEYS[1], 'XX', ARGV[3], ARGV[1]) return 1"
+        )
+        return bool(self.client.eval(
+            script, 2, self._lease_key, self._owner_key,
+            job_id, worker_id, time.time() + lease_seconds,
+        ))
+
+    def complete_job(self, job_id: str, worker_id: str) -> None:
+        script = (
+            "if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end "
+            "redis.call('ZREM', KEYS[1], ARGV[1]) "
+            "redis.call('HDEL', KEYS[2], ARGV[1]) "
+            "local raw = redis.call('HGET', KEYS[3], ARGV[1]) "
+            "if raw then "
+            "  local job = cjson.decode(raw) "
+            "  redis.call('HDEL', KEYS[4], job['task_id']) "
+            "  redis.call('HINCRBY', KEYS[5], job['client_id'] or '', -1) "
+            "end "
+            "redis.call('HDEL', KEYS[3], ARGV[1]) return 1"
+        )
+        self.client.eval(
+            script, 5, self._lease_key, self._owner_key, self._job_key, self._task_jobs_key, self._running_key,
+            job_id, worker_id,
+        )
+
+    def release_job(self, job_id: str, worker_id: str, delay: float = 0.0, executed: bool = True) -> None:
+        # 交還時沿用原本的排序鍵，不會排到後來加入的工作之後（指定 delay 時至少延後到該時間）
+        delayed = ""
+        if delay > 0:
+            raw = self.client.hget(self._job_key, job_id)
+            if raw:
+                job = self._decode_job(raw)
+                delayed = schedule_key(job.get("priority", PRIORITY_NORMAL), time.time() + delay,
+                                       payload_cost(job["payload"]), self.sjf)
+        script = (
+            "if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end "
+            "redis.call('ZREM', KEYS[1], ARGV[1]) "
+            "redis.call('HDEL', KEYS[2], ARGV[1]) "
+            "local job = cjson.decode(redis.call('HGET', KEYS[4], ARGV[1])) "
+            "local client = job['client_id'] or '' "
+            "local score = job['score'] or 0 "
+            "if ARGV[4] ~= '' and tonumber(ARGV[4]) > score then "
+            "  score = tonumber(ARGV[4]) job['score'] = score "
+            "end "
+            "job['attempts'] = math.max(job['attempts'] - tonumber(ARGV[5]), 0) "
+            "redis.call('HSET', KEYS[4], ARGV[1], cjson.encode(job)) "
+            "redis.call('ZADD', KEYS[3], score, ARGV[1]) "
+            "redis.call('ZADD', ARGV[3] .. client, score, ARGV[1]) "
+            "redis.call('SADD', KEYS[5], client) "
+            "redis.call('HINCRBY', KEYS[6], client, -1) return 1"
+        )
+        self.client.eval(
+            script, 6, self._lease_key, self._owner_key, self._queue_key, self._job_key,
+            self._clients_key, self._running_key,
+            job_id, worker_id, self._client_queue_prefix, delayed, 0 if executed else 1,
+        )
+
+    def reclaim_expired(self, max_attempts: int = JOB_MAX_ATTEMPTS) -> List[str]:
+        script = (
+            "local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1]) "
+            "local result = {} "
+            "for _, id in ipairs(expired) do "
+            "  redis.call('ZREM', KEYS[1], id) "
+            "  redis.call('HDEL', KEYS[2], id) "
+            "  local raw = redis.call('HGET', KEYS[3], id) "
+            "  if raw then "
+            "    local job = cjson.decode(raw) "
+            "    local client = job['client_id'] or '' "
+            "    redis.call('HINCRBY', KEYS[6], client, -1) "
+            "    if job['attempts'] >= tonumber(ARGV[2]) then "
+            "      redis.call('HDEL', KEYS[3], id) "
+            "      redis.call('HDEL', KEYS[5], job['task_id']) "
+            "      table.insert(result, 'dead:' .. job['attempts'] .. ':' .. job['task_id']) "
+            "    else "
+            "      redis.call('ZADD', KEYS[4], job['score'] or 0, id) "
+            "      redis.call('ZADD', ARGV[3] .. client, job['score'] or 0, id) "
+            "      redis.call('SADD', KEYS[7], client) "
+            "      table.insert(result, 'requeued:' .. job['task_id']) "
+            "    end "
+            "  end "
+            "end "
+            "return result"
+        )
+        entries = self.client.eval(
+            script, 7,
+            self._lease_key, self._owner_key, self._job_key, self._queue_key, self._task_jobs_key,
+            self._running_key, self._clients_key,
+            time.time(), max_attempts, self._client_queue_prefix,
+        )
+        requeued = []
+        for entry in entries or []:
+            entry = entry.decode() if isinstance(entry, bytes) else entry
+            kind, _, rest = entry.partition(":")
+            if kind == "dead":
+                attempts, _, task_id = rest.partition(":")
+                self._fail_abandoned(task_id, int(attempts))
+            else:
+                requeued.append(rest)
+        return requeued
+
+    def prune_finished(self, ttl: float = TASK_RETENTION_SECONDS) -> int:
+        # 未被領取的殘留工作一併自佇列移除；租約中的工作由持有者完成後自行清除
+        script = (
+            "local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1]) "
+            "for _, id in ipairs(ids) do "
+            "  redis.call('DEL', ARGV[2] .. id) "
+            "  redis.call('ZREM', KEYS[1], id) "
+            "  local job_id = redis.call('HGET', KEYS[2], id) "
+            "  if job_id and redis.call('HEXISTS', KEYS[4], job_id) == 0 then "
+            "    local raw = redis.call('HGET', KEYS[3], job_id) "
+            "    if raw then "
+            "      local job = cjson.decode(raw) "
+            "      redis.call('ZREM', KEYS[5], job_id) "
+            "      redis.call('ZREM', ARGV[3] .. (job['client_id'] or ''), job_id) "
+            "      redis.call('HDEL', KEYS[3], job_id) "
+            "    end "
+            "    redis.call('HDEL', KEYS[2], id) "
+            "  end "
+            "end "
+            "return #ids"
+        )
+        return int(self.client.eval(
+            script, 5,
+            self._finished_key, self._task_jobs_key, self._job_key, self._owner_key, self._queue_key,
+            time.time() - ttl, self._task_key(""), self._client_queue_prefix,
+        ))
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def create_task_store(backend: Optional[str] = None, **options: Any) -> TaskStore:
+    """
+    依設定建立儲存後端
+
+    Args:
+        backend: 後端名稱（sqlite 或 redis），未指定時讀取環境變數 TASK_STORE_BACKEND
+        **options: 傳給後端建構子的參數
+
+    Returns:
+        TaskStore: 儲存後端實例
+
+    Raises:
+        ValueError: 不支援的後端名稱
+    """
+    name = (backend or os.getenv("TASK_STORE_BACKEND", TASK_STORE_BACKEND)).lower()
+
+    if name == "sqlite":
+        options.setdefault("db_path", os.getenv("TASK_STORE_PATH", TASK_STORE_FILE))
+        return SQLiteTaskStore(**options)
+    if name == "redis":
+        options.setdefault("url", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisTaskStore(**options)
+
+    raise ValueError(f"不支援的任務儲存後端: {name}")
@@ -0,0 +1,192 @@
+"""
+下載結果完整性驗證
+
+- 串流雜湊：優先使用 BLAKE3（需安裝 blake3），否則使用 SHA-256。
+  上傳到物件儲存時在讀取分段的同時計算，不另外重讀檔案；
+  檔案未被讀取過（例如留在本機）時才讀取一次。
+- 容器檢查：以 ffprobe 只讀取檔頭與索引，確認串流存在且長度與
+  `info['duration']` 相符，攔截合併中斷等被截斷的輸出。
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import subprocess
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from core.constants import (
+    DOWNLOAD_TYPE_AUDIO,
+    VERIFY_CHUNK_SIZE,
+    VERIFY_DURATION_TOLERANCE,
+    VERIFY_MIN_DURATION_TOLERANCE,
+    VERIFY_PROBE_TIMEOUT,
+)
+
+VERIFY_PASSED = "passed"
+VERIFY_FAILED = "failed"
+VERIFY_SKIPPED = "skipped"
+
+
+class StreamingChecksum:
+    """可逐段更新的檔案雜湊"""
+
+    def __init__(self, algorithm: Optional[str] = None):
+        """
+        Args:
+            algorithm: `blake3` 或 `sha256`，未指定時有安裝 blake3 就使用 blake3
+        """
+        if algorithm is None:
+            algorithm = "blake3" if importlib.util.find_spec("blake3") else "sha256"
+        self.algorithm = algorithm
+        self.reset()
+
+    def reset(self):
+        """捨棄目前內容重新計算"""
+        if self.algorithm == "blake3":
+            import blake3
+            self._hasher = blake3.blake3()
+        else:
+            self._hasher = hashlib.new(self.algorithm)
+        self.size = 0
+
+    def update(self, data: bytes):
+        self._hasher.update(data)
+        self.size += len(data)
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+    def update_from_file(self, path: str, chunk_size: int = VERIFY_CHUNK_SIZE):
+        """從頭讀取檔案計算雜湊"""
+        self.reset()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                self.update(chunk)
+
+
+@dataclass
+class VerificationResult:
+    """驗證結果"""
+
+    status: str = VERIFY_SKIPPED
+    algorithm: Optional[str] = None
+    checksum: Optional[str] = None
+    size: Optional[int] = None
+    duration: Optional[float] = None
+    expected_duration: Optional[float] = None
+    streams: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def failed(self) -> bool:
+        return self.status == VERIFY_FAILED
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def probe_media(path: str, ffprobe_path: str) -> Optional[Dict[str, Any]]:
+    """以 ffprobe 讀取長度與串流類型，無法解析時回傳 None"""
+    try:
+        result = subprocess.run(
+            [
+                ffprobe_path, "-v", "error",
+                "-show_entries", "format=duration:stream=codec_type",
+                "-of", "json", path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=VERIFY_PROBE_TIMEOUT,
+            check=True,
+        )
+        data = json.loads(result.stdout or b"{}")
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return None
+
+    duration = (data.get("format") or {}).get("duration")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "streams": [stream.get("codec_type") for stream in data.get("streams") or []],
+    }
+
+
+def expected_streams(info: Dict[str, Any], download_type: str) -> List[str]:
+    """依下載類型與選到的格式推算輸出應包含的串流"""
+    if download_type == DOWNLOAD_TYPE_AUDIO:
+        return ["audio"]
+
+    formats = info.get("requested_formats") or [info]
+    expected = []
+    if any((fmt.get("vcodec") or "") != "none" for fmt in formats):
+        expected.append("video")
+    if any(fmt.get("acodec") not in (None, "none") for fmt in formats):
+        expected.append("audio")
+    return expected
+
+
+def check_container(
+    path: str,
+    info: Dict[str, Any],
+    download_type: str,
+    ffprobe_path: Optional[str],
+    expected_duration: Optional[float] = None,
+) -> VerificationResult:
+    """
+    快速檢查輸出容器
+
+    Args:
+        path: 輸出檔案
+        info: yt-dlp 影片資訊
+        download_type: 下載類型
+        ffprobe_path: ffprobe 路徑，None 時略過容器檢查
+        expected_duration: 預期長度（秒），未指定時使用 info['duration']
+    """
+    result = VerificationResult(size=os.path.getsize(path))
+    result.expected_duration = expected_duration if expected_duration is not None else info.get("duration")
+    if result.size == 0:
+        result.status = VERIFY_FAILED
+        result.errors.append("輸出檔案為空")
+        return result
+    if not ffprobe_path:
+        return result
+
+    probe = probe_media(path, ffprobe_path)
+    if probe is None:
+        result.status = VERIFY_FAILED
+        result.errors.append("ffprobe 無法解析輸出檔案")
+        return result
+
+    result.duration = probe["duration"]
+    result.streams = probe["streams"]
+    for stream in expected_streams(info, download_type):
+        if stream not in result.streams:
+            result.errors.append(f"缺少{'影像' if stream == 'video' else '音訊'}串流")
+
+    if result.duration is not None and result.expected_duration:
+        tolerance = max(result.expected_duration * VERIFY_DURATION_TOLERANCE, VERIFY_MIN_DURATION_TOLERANCE)
+        if abs(result.duration - result.expected_duration) > tolerance:
+            result.errors.append(
+                f"長度 {result.duration:.1f} 秒與預期 {result.expected_duration:.1f} 秒不符"
+            )
+
+    result.status = VERIFY_FAILED if result.errors else VERIFY_PASSED
+    return result
+
+
+def finalize_checksum(result: VerificationResult, checksum: StreamingChecksum, path: str):
+    """
+    記錄雜湊；上傳時已讀過完整檔案就直接使用，否則讀取一次計算
+
+    本機檔案已依清理策略刪除且上傳未經過雜湊時不記錄。
+    """
+    if result.size is not None and checksum.size != result.size:
+        if not os.path.exists(path):
+            return
+        checksum.update_from_file(path)
+    result.algorithm = checksum.algorithm
+    result.checksum = checksum.hexdigest()
@@ -0,0 +1,556 @@
+"""
+共享佇列下載執行者
+
+從 TaskStore 以租約領取下載工作並執行，執行期間定期送出心跳；
+租約過期的工作會被任一執行者回收並重新排入佇列。
+指定斷路器時，網站異常期間領取到的工作會標記為擱置並交還佇列（不保留租約、不計入嘗試次數），
+排序延後到冷卻結束，待斷路器試探成功後再執行。
+可在多台主機上同時執行，只要指向同一個佇列儲存與輸出目錄即可。
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.constants import (
+    AUTOTUNE_MAX,
+    ENGINE_FAKE,
+    ENGINE_YTDLP,
+    ERROR_MESSAGES,
+    EXECUTION_MODE_PROCESS,
+    EXECUTION_MODE_THREAD,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_LEASE_SECONDS,
+    PRIORITY_NORMAL,
+    QUEUE_POLL_INTERVAL,
+    SUCCESS_MESSAGES,
+    TASK_PRUNE_INTERVAL,
+    TASK_RETENTION_SECONDS,
+)
+from core.autotune import ConcurrencyController
+from core.circuit_breaker import CircuitBreaker, breaker_from_env, circuit_key
+from core.client_quota import usage_day
+from core.downloader import DownloadManager, DownloadTask
+from core.task_store import QueuedJob, TaskStore, create_task_store
+from utils.capabilities import CapabilityRegistry
+from utils.logger import Logger
+from utils.system_utils import format_size, format_time
+
+
+def build_job_payload(
+    url: str,
+    download_type: str,
+    format_option: str,
+    output_path: str,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    rate_limit: Optional[float] = None,
+    priority: int = PRIORITY_NORMAL,
+    estimated_size: Optional[int] = None,
+    duration: Optional[float] = None,
+    client_id: Optional[str] = None,
+    client_weight: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    建立放入共享佇列的工作內容
+
+    指定時間範圍時只下載該片段，rate_limit 為此任務的頻寬上限；
+    priority 與預先取得的 estimated_size / duration 決定在佇列中的順序，
+    client_id / client_weight 用於多個用戶端之間的公平領取與下載量統計。
+    """
+    payload = {
+        "url": url,
+        "download_type": download_type,
+        "format_option": format_option,
+        "output_path": output_path,
+    }
+    if start_time is not None or end_time is not None:
+        payload["start_time"] = start_time
+        payload["end_time"] = end_time
+    if rate_limit:
+        payload["rate_limit"] = rate_limit
+    if priority != PRIORITY_NORMAL:
+        payload["priority"] = priority
+    if estimated_size:
+        payload["estimated_size"] = estimated_size
+    if duration:
+        payload["duration"] = duration
+    if client_id:
+        payload["client_id"] = client_id
+        payload["client_weight"] = client_weight
+    return payload
+
+
+def build_initial_state(task_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """建立任務的初始狀態"""
+    return {
+        "id": task_id,
+        "url": payload["url"],
+        "download_type": payload["download_type"],
+        "format_option": payload["format_option"],
+        "start_time": payload.get("start_time"),
+        "end_time": payload.get("end_time"),
+        "priority": payload.get("priority", PRIORITY_NORMAL),
+        "client_id": payload.get("client_id"),
+        "status": "pending",
+        "progress": 0.0,
+        "message": "排隊中",
+        "speed": None,
+        "eta": None,
+        "downloaded_bytes": 0,
+        "total_bytes": 0,
+        "file_path": None,
+        "bandwidth_saved": None,
+        "storage_uri": None,
+        "checksum": None,
+        "verification": None,
+    }
+
+
+class DownloadWorker:
+    """從共享佇列領取並執行下載工作"""
+
+    def __init__(
+        self,
+        store: TaskStore,
+        concurrency: int = 1,
+        worker_id: Optional[str] = None,
+        output_path: Optional[str] = None,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL,
+        poll_interval: float = QUEUE_POLL_INTERVAL,
+        download_manager: Optional[DownloadManager] = None,
+        autotune: Optional[ConcurrencyController] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        task_retention: Optional[float] = None,
+    ):
+        self.store = store
+        self.concurrency = concurrency
+        # 指定時建立 autotune.max_limit 個執行槽，由控制器決定同時執行的數量
+        self.autotune = autotune
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.output_path = output_path
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.download_manager = download_manager or DownloadManager()
+        self.breaker = breaker
+        # 已結束任務狀態的保留秒數，未指定時讀取 TASK_RETENTION_SECONDS（0 表示不清除）
+        if task_retention is None:
+            task_retention = float(os.getenv("TASK_RETENTION_SECONDS", str(TASK_RETENTION_SECONDS)))
+        self.task_retention = task_retention
+        self.logger = Logger()
+
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._active: Dict[str, Tuple[QueuedJob, DownloadTask]] = {}
+        # 被中止的工作：job_id -> 是否交還佇列（False 表示租約已被他人接手）
+        self._released: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """啟動執行槽與心跳執行緒（不阻塞，可重複呼叫）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop_event.clear()
+            # 先在背景偵測 FFmpeg 等能力，第一個任務不必等待偵測
+            CapabilityRegistry().refresh_async()
+            slots = self.autotune.max_limit if self.autotune else self.concurrency
+            for index in range(slots):
+                thread = threading.Thread(
+                    target=self._slot_loop, name=f"worker-slot-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)
+            heartbeat.start()
+            self._threads.append(heartbeat)
+
+        if self.autotune:
+            limit = f"{self.autotune.limit}，上限 {self.autotune.max_limit}"
+        else:
+            limit = str(self.concurrency)
+        self.logger.info(f"下載執行者啟動: {self.worker_id}（並行數 {limit}）")
+
+    def run(self):
+        """啟動並阻塞至停止"""
+        self.start()
+        try:
+            while not self._stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            self.stop(release_active=True)
+        self.join()
+
+    def stop(self, release_active: bool = False):
+        """
+        停止領取新工作
+
+        Args:
+            release_active: 是否中止進行中的工作並交還佇列，讓其他執行者接手
+        """
+        self._stop_event.set()
+        if release_active:
+            with self._lock:
+                active = list(self._active.items())
+                self._released.update((job_id, True) for job_id, _ in active)
+            for _, (_, task) in active:
+                task.cancel()
+        self.logger.info(f"下載執行者停止: {self.worker_id}")
+
+    def join(self, timeout: Optional[float] = None):
+        """等待所有執行緒結束"""
+        for thread in list(self._threads):
+            thread.join(timeout)
+        self._threads.clear()
+
+    def get_active_count(self) -> int:
+        """取得執行中的工作數量"""
+        with self._lock:
+            return len(self._active)
+
+    def _slot_loop(self):
+        """單一執行槽：領取並執行工作"""
+        while not self._stop_event.is_set():
+            if self.autotune and not self.autotune.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                job = self._claim_and_execute()
+            finally:
+                if self.autotune:
+                    self.autotune.release()
+
+            if job is None:
+                self._stop_event.wait(self.poll_interval)
+
+    def _claim_and_execute(self) -> Optional[QueuedJob]:
+        """領取並執行一個工作，佇列為空或只剩斷路器開啟中的網站時回傳 None"""
+        deferred = set()
+        while True:
+            try:
+                job = self.store.claim_job(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                self.logger.error(f"領取工作失敗: {e}")
+                return None
+
+            if job is None:
+                return None
+
+            if not self.breaker or self.breaker.allow(circuit_key(job.payload.get("url", ""))):
+                break
+            state = self.store.get_task(job.task_id)
+            if state and state.get("cancel_requested"):
+                # 已要求取消的工作不再延後，由 execute_job 結束
+                break
+            self._defer(job)
+            # 再次領到延後過的工作表示佇列中只剩開啟中網站的工作
+            if job.job_id in deferred:
+                return None
+            deferred.add(job.job_id)
+
+        try:
+            self.execute_job(job)
+        except Exception as e:
+            self.logger.error(f"工作執行錯誤 {job.task_id}: {e}")
+            self._update_state(job.task_id, status="failed", message=str(e))
+            self.store.complete_job(job.job_id, self.worker_id)
+        return job
+
+    def _defer(self, job: QueuedJob):
+        """
+        網站的斷路器開啟中：標記為擱置並交還佇列，排序延後到冷卻結束
+
+        不保留租約，其他網站的工作與其他執行者不受影響；未執行的領取不計入嘗試次數。
+        """
+        key = circuit_key(job.payload.get("url", ""))
+        # 半開試探進行中時 retry_after 為 0，仍延後一個冷卻時間，避免卡在佇列最前面
+        wait = self.breaker.retry_after(key) or self.breaker.cooldown
+        self._update_state(
+            job.task_id,
+            status="parked",
+            message=f"網站 {key} 暫時異常，等待恢復（約 {format_time(int(wait))} 後試探）",
+        )
+        try:
+            self.store.release_job(job.job_id, self.worker_id, delay=wait, executed=False)
+        except Exception as e:
+            self.logger.warning(f"無法交還擱置的工作 {job.task_id}: {e}")
+
+    def _heartbeat_loop(self):
+        """
+        監控進行中的工作
+
+        每個輪詢週期檢查取消要求；每個心跳週期延長租約並回收其他執行者遺留的過期工作，
+        並每 TASK_PRUNE_INTERVAL 秒清除超過保留時間的已結束任務。
+        """
+        last_heartbeat = time.monotonic()
+        last_prune: Optional[float] = None
+        tick = min(self.poll_interval, self.heartbeat_interval)
+
+        while not self._stop_event.wait(tick):
+            with self._lock:
+                active = list(self._active.items())
+
+            for job_id, (job, task) in active:
+                try:
+                    state = self.store.get_task(job.task_id)
+                    if state and state.get("cancel_requested") and not task.is_cancelled():
+                        self.logger.info(f"收到取消要求: {job.task_id}")
+                        task.cancel()
+                except Exception as e:
+                    self.logger.warning(f"檢查取消要求失敗 {job.task_id}: {e}")
+
+            if time.monotonic() - last_heartbeat < self.heartbeat_interval:
+                continue
+            last_heartbeat = time.monotonic()
+
+            for job_id, (job, task) in active:
+                try:
+                    if not self.store.heartbeat(job_id, self.worker_id, self.lease_seconds):
+                        # 租約已被回收（例如長時間停頓），由接手者負責，這裡停止重複下載
+                        self.logger.warning(f"租約遺失，中止工作: {job.task_id}")
+                        with self._lock:
+                            self._released[job_id] = False
+                        task.cancel()
+                except Exception as e:
+                    self.logger.warning(f"心跳送出失敗 {job.task_id}: {e}")
+
+            try:
+                requeued = self.store.reclaim_expired()
+                if requeued:
+                    self.logger.info(f"回收 {len(requeued)} 個過期工作")
+            except Exception as e:
+                self.logger.warning(f"回收過期工作失敗: {e}")
+
+            if self.task_retention > 0 and (last_prune is None or time.monotonic() - last_prune >= TASK_PRUNE_INTERVAL):
+                last_prune = time.monotonic()
+                try:
+                    pruned = self.store.prune_finished(self.task_retention)
+                    if pruned:
+                        self.logger.info(f"清除 {pruned} 個已結束的任務")
+                except Exception as e:
+                    self.logger.warning(f"清除已結束任務失敗: {e}")
+
+    def execute_job(self, job: QueuedJob) -> bool:
+        """執行單一工作並將進度寫回共享狀態"""
+        payload = job.payload
+        task_id = job.task_id
+
+        state = self.store.get_task(task_id)
+        if state and state.get("cancel_requested"):
+            self._update_state(task_id, status="cancelled", message=SUCCESS_MESSAGES["cancel_success"])
+            self.store.complete_job(job.job_id, self.worker_id)
+            return False
+
+        # 實際傳輸量（影音分開下載時 downloaded 會從 0 重新計算），計入用戶端的每日下載量
+        transferred = {"done": 0, "current": 0}
+
+        def _progress_callback(data: Dict[str, Any]):
+            status = data.get("status")
+            if status == "downloading":
+                downloaded = data.get("downloaded") or 0
+                if downloaded < transferred["current"]:
+                    transferred["done"] += transferred["current"]
+                transferred["current"] = downloaded
+                total = data.get("total") or 0
+                percentage = float(data.get("percentage") or 0.0)
+                speed = data.get("speed") or 0
+                eta = data.get("eta") or 0
+                if self.autotune:
+                    self.autotune.record_progress(job.job_id, downloaded)
+
+                self._update_state(
+                    task_id,
+                    status="downloading",
+                    progress=max(0.0, min(100.0, percentage)),
+                    speed=format_size(speed) + "/s" if speed else None,
+                    eta=format_time(int(eta)) if eta else None,
+                    downloaded_bytes=downloaded,
+                    total_bytes=total,
+                    message=f"已下載 {format_size(downloaded)} / {format_size(total) if total else '未知'}",
+                )
+            elif status == "finished":
+                self._update_state(
+                    task_id,
+                    status="postprocessing",
+                    progress=100.0,
+                    message="後處理中...",
+                )
+
+        def _complete_callback(file_path: str, info: Dict[str, Any]):
+            if not transferred["done"] + transferred["current"]:
+                transferred["current"] = (info or {}).get("filesize") or 0
+            self._update_state(
+                task_id,
+                status="completed",
+                progress=100.0,
+                message="下載完成",
+                file_path=file_path,
+                bandwidth_saved=(info or {}).get("bandwidth_saved"),
+                storage_uri=(info or {}).get("storage_uri"),
+                checksum=((info or {}).get("verification") or {}).get("checksum"),
+                verification=(info or {}).get("verification"),
+            )
+
+        errors: List[str] = []
+
+        def _error_callback(error_msg: str):
+            errors.append(error_msg)
+            if job.job_id in self._released or download_task.is_cancelled():
+                return
+            self._update_state(
+                task_id,
+                status="failed",
+                message=error_msg or ERROR_MESSAGES.get("download_error", "下載失敗"),
+            )
+
+        download_task = self.download_manager.create_task(
+            url=payload["url"],
+            download_type=payload["download_type"],
+            output_path=self.output_path or payload["output_path"],
+            format_option=payload["format_option"],
+            start_time=payload.get("start_time"),
+            end_time=payload.get("end_time"),
+            rate_limit=payload.get("rate_limit"),
+            progress_callback=_progress_callback,
+            complete_callback=_complete_callback,
+            error_callback=_error_callback,
+        )
+
+        with self._lock:
+            self._active[job.job_id] = (job, download_task)
+
+        self._update_state(
+            task_id, status="downloading", message="開始下載...", worker_id=self.worker_id
+        )
+
+        success = False
+        try:
+            success = download_task.execute()
+        finally:
+            self.download_manager.remove_task(download_task)
+            with self._lock:
+                self._active.pop(job.job_id, None)
+                requeue = self._released.pop(job.job_id, None)
+            if self.autotune:
+                if download_task.is_cancelled():
+                    self.autotune.discard(job.job_id)
+                else:
+                    self.autotune.record_result(job.job_id, success, errors[-1] if errors else None)
+            if self.breaker:
+                key = circuit_key(payload.get("url", ""))
+                if download_task.is_cancelled():
+                    self.breaker.release(key)
+                else:
+                    self.breaker.record(key, success, errors[-1] if errors else None)
+            self._record_usage(payload, transferred["done"] + transferred["current"])
+
+        if requeue is not None:
+            if requeue:
+                self.store.release_job(job.job_id, self.worker_id)
+                self._update_state(task_id, status="pending", message="等待重新分派")
+            return False
+
+        if download_task.is_cancelled():
+            self._update_state(task_id, status="cancelled", message=SUCCESS_MESSAGES["cancel_success"])
+            self.store.complete_job(job.job_id, self.worker_id)
+            return False
+
+        state = self.store.get_task(task_id)
+        if state and state["status"] not in {"completed", "failed"}:
+            final_fields: Dict[str, Any] = {
+                "status": "completed" if success else "failed",
+                "progress": 100.0 if success else state.get("progress", 0.0),
+            }
+            if not state.get("message"):
+                final_fields["message"] = "下載完成" if success else ERROR_MESSAGES.get("download_error", "下載失敗")
+            self.store.update_task(task_id, **final_fields)
+
+        self.store.complete_job(job.job_id, self.worker_id)
+        return success
+
+    def _record_usage(self, payload: Dict[str, Any], nbytes: int):
+        """累計用戶端當日的下載量（失敗或取消的任務也計入已傳輸的部分）"""
+        client_id = payload.get("client_id")
+        if not client_id or nbytes <= 0:
+            return
+        try:
+            self.store.add_client_usage(client_id, usage_day(), nbytes)
+        except Exception as e:
+            self.logger.warning(f"無法記錄用戶端下載量 {client_id}: {e}")
+
+    def _update_state(self, task_id: str, **fields: Any):
+        """更新共享狀態，忽略值為 None 的欄位"""
+        fields = {name: value for name, value in fields.items() if value is not None}
+        if fields:
+            self.store.update_task(task_id, **fields)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """`video-downloader worker` 指令入口"""
+    parser = argparse.ArgumentParser(
+        prog="video-downloader worker",
+        description="從共享佇列領取並執行下載工作",
+    )
+    parser.add_argument("--store", choices=["sqlite", "redis"], help="佇列儲存後端（預設讀取 TASK_STORE_BACKEND）")
+    parser.add_argument("--store-path", help="SQLite 檔案路徑")
+    parser.add_argument("--redis-url", help="Redis 連線位址")
+    parser.add_argument("--concurrency", type=int, default=1, help="同時執行的下載數（自動調整時為初始值）")
+    parser.add_argument("--autotune", action="store_true", help="依傳輸速率、錯誤率與 CPU 負載自動調整並行數")
+    parser.add_argument("--max-concurrency", type=int, default=AUTOTUNE_MAX, help="自動調整的並行數上限")
+    parser.add_argument("--output", help="覆寫工作指定的輸出目錄")
+    parser.add_argument("--worker-id", help="執行者識別名稱")
+    parser.add_argument("--lease", type=float, default=JOB_LEASE_SECONDS, help="工作租約秒數")
+    parser.add_argument("--execution-mode", choices=[EXECUTION_MODE_THREAD, EXECUTION_MODE_PROCESS],
+                        help="任務執行模式（預設讀取 DOWNLOAD_EXECUTION_MODE）")
+    parser.add_argument("--memory-limit", type=int, help="行程模式下每個任務的記憶體上限（MB）")
+    parser.add_argument("--time-limit", type=float, help="行程模式下每個任務的時間上限（秒）")
+    parser.add_argument("--engine", choices=[ENGINE_YTDLP, ENGINE_FAKE],
+                        help="下載引擎（預設讀取 DOWNLOAD_ENGINE）")
+    parser.add_argument("--no-circuit-breaker", action="store_true",
+                        help="停用網站斷路器（預設依 CIRCUIT_BREAKER_* 環境變數啟用）")
+    args = parser.parse_args(argv)
+
+    if args.engine:
+        # 透過環境變數設定，行程模式的工作行程也會使用同一個引擎
+        os.environ["DOWNLOAD_ENGINE"] = args.engine
+
+    options: Dict[str, Any] = {}
+    if args.store_path:
+        options["db_path"] = args.store_path
+    if args.redis_url:
+        options["url"] = args.redis_url
+
+    store = create_task_store(args.store, **options)
+    autotune = None
+    if args.autotune:
+        autotune = ConcurrencyController(initial=max(1, args.concurrency), max_limit=args.max_concurrency)
+    worker = DownloadWorker(
+        store,
+        concurrency=max(1, args.concurrency),
+        worker_id=args.worker_id,
+        output_path=args.output,
+        lease_seconds=args.lease,
+        heartbeat_interval=min(JOB_HEARTBEAT_INTERVAL, args.lease / 3),
+        download_manager=DownloadManager(
+            execution_mode=args.execution_mode,
+            max_processes=max(1, args.max_concurrency if autotune else args.concurrency),
+            memory_limit_mb=args.memory_limit,
+            time_limit=args.time_limit,
+        ),
+        autotune=autotune,
+        breaker=None if args.no_circuit_breaker else breaker_from_env(),
+    )
+
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop(release_active=True))
+
+    worker.run()
+    worker.download_manager.shutdown()
+    store.close()
+    return 0
@@ -0,0 +1,236 @@
+"""
+共享的 yt-dlp 快取目錄
+
+yt-dlp 會把播放器 JS、簽章解密函式等解析結果存到快取目錄，未設定時
+落在各環境自己的家目錄（PyInstaller 打包版與短命容器每次部署都是空的），
+每個 URL 都要重新下載並解析播放器。這裡統一指定快取目錄（環境變數
+YTDLP_CACHE_DIR 可覆寫，例如指向容器掛載的共享磁碟），以原子替換寫入
+讓多個執行者同時存取，並統計命中與未命中次數。
+
+`video-downloader cache warm` 可在部署後預先解析常用網站填入快取。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from core.constants import YTDLP_CACHE_WARM_URLS
+from utils.logger import Logger
+from utils.system_utils import format_size
+
+_MISSING = object()
+
+
+def get_cache_dir() -> str:
+    """取得共享快取目錄（YTDLP_CACHE_DIR > 使用者快取目錄）"""
+    configured = os.getenv("YTDLP_CACHE_DIR")
+    if configured:
+        return os.path.abspath(os.path.expanduser(configured))
+
+    if os.name == "nt":
+        root = os.getenv("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        root = os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(root, "video-downloader", "yt-dlp")
+
+
+class CacheStats:
+    """各快取區段的命中、未命中與寫入次數（行程內累計）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sections: Dict[str, Dict[str, int]] = {}
+
+    def record(self, section: str, field: str):
+        with self._lock:
+            counters = self._sections.setdefault(section, {"hits": 0, "misses": 0, "stores": 0})
+            counters[field] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            sections = {name: dict(counters) for name, counters in self._sections.items()}
+        totals = {
+            field: sum(counters[field] for counters in sections.values())
+            for field in ("hits", "misses", "stores")
+        }
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = totals["hits"] / lookups if lookups else 0.0
+        totals["sections"] = sections
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._sections.clear()
+
+
+stats = CacheStats()
+
+_cache_class = None
+_cache_class_lock = threading.Lock()
+
+
+def _shared_cache_class():
+    """建立 yt_dlp.cache.Cache 的子類別（延後匯入 yt-dlp）"""
+    global _cache_class
+    if _cache_class is not None:
+        return _cache_class
+
+    with _cache_class_lock:
+        if _cache_class is not None:
+            return _cache_class
+
+        from yt_dlp.cache import Cache
+        from yt_dlp.version import __version__ as ytdlp_version
+
+        class SharedCache(Cache):
+            """統計命中率並以原子替換寫入的 yt-dlp 快取"""
+
+            def load(self, section, key, dtype='json', default=None, *, min_ver=None):
+                if not self.enabled:
+                    return default
+                data = super().load(section, key, dtype, default=_MISSING, min_ver=min_ver)
+                # 版本過舊的項目會回傳 None，同樣視為未命中
+                if data is _MISSING or data is None:
+                    stats.record(section, "misses")
+                    return default
+                stats.record(section, "hits")
+                return data
+
+            def store(self, section, key, data, dtype='json'):
+                if not self.enabled:
+                    return
+
+                path = self._get_cache_fn(section, key, dtype)
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    fd, tmp_path = tempfile.mkstemp(
+                        prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path)
+                    )
+                    try:
+                        with os.fdopen(fd, "w", encoding="utf-8") as f:
+                            json.dump({'yt-dlp_version': ytdlp_version, 'data': data}, f, ensure_ascii=False)
+                        os.chmod(tmp_path, 0o644)
+                        _replace(tmp_path, path)
+                    except BaseException:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        raise
+                    stats.record(section, "stores")
+                except Exception as e:
+                    self._ydl.report_warning(f"寫入快取 {path!r} 失敗: {e}")
+
+        _cache_class = SharedCache
+        return _cache_class
+
+
+def _replace(src: str, dst: str, attempts: int = 5):
+    """原子替換檔案；Windows 上目標被其他行程開啟時短暫重試"""
+    for attempt in range(attempts):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def install_shared_cache(ydl) -> None:
+    """將 YoutubeDL 的快取換成共享快取（需以 cachedir 選項建立）"""
+    ydl.cache = _shared_cache_class()(ydl)
+
+
+def describe_cache(cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """快取目錄內容與本行程的命中統計"""
+    cache_dir = cache_dir or get_cache_dir()
+    files = 0
+    size = 0
+    for root, _dirs, names in os.walk(cache_dir):
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            files += 1
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return {"cache_dir": cache_dir, "files": files, "bytes": size, **stats.snapshot()}
+
+
+def warm_cache(urls: Optional[List[str]] = None, cache_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    解析指定網址（不下載）以預先填入快取
+
+    Args:
+        urls: 要解析的網址，未指定時使用各常用網站的預設網址
+        cache_dir: 快取目錄，未指定時使用共享快取目錄
+
+    Returns:
+        List[Dict]: 每個網址的結果（url、ok、seconds、error）
+    """
+    import yt_dlp
+
+    logger = Logger()
+    options = {
+        'cachedir': cache_dir or get_cache_dir(),
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+    }
+    results = []
+    with yt_dlp.YoutubeDL(options) as ydl:
+        install_shared_cache(ydl)
+        for url in urls or YTDLP_CACHE_WARM_URLS:
+            started = time.perf_counter()
+            try:
+                ydl.extract_info(url, download=False)
+                results.append({"url": url, "ok": True, "seconds": time.perf_counter() - started, "error": None})
+            except Exception as e:
+                logger.warning(f"預熱快取失敗 {url}: {e}")
+                results.append({"url": url, "ok": False, "seconds": time.perf_counter() - started, "error": str(e)})
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """`video-downloader cache` 指令入口"""
+    parser = argparse.ArgumentParser(prog="video-downloader cache", description="管理共享的 yt-dlp 快取")
+    parser.add_argument("--cache-dir", help="快取目錄（預設讀取 YTDLP_CACHE_DIR）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="預先解析常用網站填入快取")
+    warm.add_argument("urls", nargs="*", help="要解析的網址（預設使用內建清單）")
+    commands.add_parser("stats", help="顯示快取目錄內容")
+    commands.add_parser("clear", help="清除快取")
+    args = parser.parse_args(argv)
+
+    cache_dir = args.cache_dir or get_cache_dir()
+
+    if args.command == "warm":
+        results = warm_cache(args.urls or None, cache_dir)
+        for result in results:
+            status = "成功" if result["ok"] else f"失敗: {result['error']}"
+            print(f"{result['url']}  {result['seconds']:.2f}s  {status}")
+        summary = describe_cache(cache_dir)
+        print(f"命中 {summary['hits']} / 未命中 {summary['misses']} / 寫入 {summary['stores']}")
+        print(f"{summary['cache_dir']}: {summary['files']} 個檔案, {format_size(summary['bytes'])}")
+        return 0 if any(result["ok"] for result in results) else 1
+
+    if args.command == "clear":
+        import shutil
+
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        print(f"已清除 {cache_dir}")
+        return 0
+
+    summary = describe_cache(cache_dir)
+    print(f"{summary['cache_dir']}: {summary['files']} 個檔案, {format_size(summary['bytes'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,16 +6,41 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import tkinter as tk
-from ui.main_window import VideoDownloaderUI
 
+def run_gui():
+    """啟動桌面介面"""
+    import tkinter as tk
+    from ui.main_window import VideoDownloaderUI
 
-def main():
-    """主程式入口"""
     root = tk.Tk()
     app = VideoDownloaderUI(root)
     root.mainloop()
 
 
+def main(argv=None):
+    """
+    主程式入口
+
+    不帶參數時啟動桌面介面；`worker` 子指令啟動共享佇列下載執行者，
+    `cache` 子指令管理共享的 yt-dlp 快取，`batch` 子指令以無介面方式批次下載。
+    """
+    args = sys.argv[1:] if argv is None else argv
+
+    if args and args[0] == "worker":
+        from core.worker import main as worker_main
+        return worker_main(args[1:])
+
+    if args and args[0] == "cache":
+        from core.ytdlp_cache import main as cache_main
+        return cache_main(args[1:])
+
+    if args and args[0] == "batch":
+        from core.batch_cli import main as batch_main
+        return batch_main(args[1:])
+
+    run_gui()
+    return 0
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
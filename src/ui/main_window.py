@@ -21,12 +21,14 @@ from core.constants import (
     DOWNLOAD_TYPE_AUDIO,
     ERROR_MESSAGES,
 )
+from core.bandwidth import format_schedule, get_default_budget, parse_rate, parse_schedule
 from core.config import ConfigManager
 from core.downloader import DownloadManager, DownloadTask
 from core.batch_downloader import BatchDownloadManager, TaskStatus
+from core.prefetch import MetadataPrefetcher
 from utils import (
     Logger, get_timestamp, format_size, format_time,
-    open_directory, is_ffmpeg_installed
+    open_directory, CapabilityRegistry
 )
 
 
@@ -41,8 +43,10 @@ class VideoDownloaderUI:
         # 初始化管理器
         self.config = ConfigManager()
         self.download_manager = DownloadManager()
-        self.batch_manager = BatchDownloadManager(max_retries=3)
+        self.batch_manager = BatchDownloadManager(max_retries=3, prefetch=MetadataPrefetcher())
+        self.bandwidth = get_default_budget()
         self.logger = Logger()
+        self._apply_bandwidth_config()
         self.message_queue = queue.Queue()
 
         # 當前任務
@@ -58,7 +62,7 @@ class VideoDownloaderUI:
         self._create_widgets()
         self._setup_bindings()
 
-        # 檢查 FFmpeg
+        # 背景偵測 FFmpeg 等執行環境能力
         self._check_ffmpeg()
 
         # 開始處理訊息佇列
@@ -302,8 +306,14 @@ class VideoDownloaderUI:
             self._update_batch_progress()
 
     def _check_ffmpeg(self):
-        """檢查 FFmpeg 是否安裝"""
-        if not is_ffmpeg_installed():
+        """在背景檢查 FFmpeg 是否安裝，結果經由訊息佇列回到主執行緒"""
+        CapabilityRegistry().refresh_async(
+            lambda capabilities: self.message_queue.put(('capabilities', capabilities))
+        )
+
+    def _handle_capabilities(self, capabilities):
+        """依偵測結果更新介面"""
+        if not capabilities.ffmpeg_available:
             self.log_message("⚠️ 警告: FFmpeg 未安裝，音訊轉換功能將無法使用", "warning")
             self.download_audio_btn.config(state=tk.DISABLED)
 
@@ -460,6 +470,8 @@ class VideoDownloaderUI:
                     self._handle_batch_task_complete(task_info, summary)
                 elif msg_type == 'batch_complete':
                     self._handle_batch_complete(data)
+                elif msg_type == 'capabilities':
+                    self._handle_capabilities(data)
         except queue.Empty:
             pass
 
@@ -619,7 +631,7 @@ class VideoDownloaderUI:
         """顯示設定視窗"""
         settings_window = tk.Toplevel(self.master)
         settings_window.title("設定")
-        settings_window.geometry("400x300")
+        settings_window.geometry("400x380")
         settings_window.transient(self.master)
         settings_window.grab_set()
 
@@ -643,15 +655,53 @@ class VideoDownloaderUI:
             variable=auto_open
         ).pack(anchor=tk.W, pady=5)
 
+        # 頻寬上限（下載中的任務立即套用）
+        rate = self.bandwidth.rate
+        initial_limit = format_size(rate) if rate else ""
+        bandwidth_limit = tk.StringVar(value=initial_limit)
+        ttk.Label(frame, text="頻寬上限（例如 500K、2M，空白表示不限制）:").pack(anchor=tk.W, pady=(10, 0))
+        ttk.Entry(frame, textvariable=bandwidth_limit).pack(fill=tk.X, pady=2)
+
+        initial_schedule = format_schedule(self.bandwidth.schedule)
+        bandwidth_schedule = tk.StringVar(value=initial_schedule)
+        ttk.Label(frame, text="時段排程（例如 09:00-18:00=2M, 18:00-09:00=0）:").pack(anchor=tk.W, pady=(5, 0))
+        ttk.Entry(frame, textvariable=bandwidth_schedule).pack(fill=tk.X, pady=2)
+
         # 儲存按鈕
         def save_settings():
+            try:
+                rate_value = parse_rate(bandwidth_limit.get())
+                schedule_value = parse_schedule(bandwidth_schedule.get())
+            except ValueError as e:
+                messagebox.showerror("錯誤", str(e), parent=settings_window)
+                return
             self.config.set("auto_convert_filename", auto_convert.get())
             self.config.set("auto_open_directory", auto_open.get())
+            # 未修改的欄位不寫入設定檔，維持沿用環境變數
+            if bandwidth_limit.get().strip() != initial_limit:
+                self.config.set("bandwidth_limit", bandwidth_limit.get().strip())
+            if bandwidth_schedule.get().strip() != initial_schedule:
+                self.config.set("bandwidth_schedule", bandwidth_schedule.get().strip())
+            self.bandwidth.set_rate(rate_value)
+            self.bandwidth.set_schedule(schedule_value)
             settings_window.destroy()
             messagebox.showinfo("提示", "設定已儲存")
 
         ttk.Button(frame, text="儲存", command=save_settings).pack(pady=10)
 
+    def _apply_bandwidth_config(self):
+        """套用設定檔中的頻寬上限與排程（未設定時沿用 BANDWIDTH_LIMIT / BANDWIDTH_SCHEDULE）"""
+        limit = self.config.get("bandwidth_limit")
+        schedule = self.config.get("bandwidth_schedule")
+        try:
+            # 只有在設定視窗儲存過才會是字串（空字串表示使用者選擇不限制）
+            if limit is not None:
+                self.bandwidth.set_rate(parse_rate(limit))
+            if schedule is not None:
+                self.bandwidth.set_schedule(parse_schedule(schedule))
+        except ValueError as e:
+            self.logger.warning(f"頻寬設定無效，已略過: {e}")
+
     def _on_closing(self):
         """視窗關閉處理"""
         if (self.current_task or self.batch_manager.is_running) and \
@@ -1,17 +1,46 @@
 """
 工具模組
+
+子模組於第一次存取時才載入，避免匯入 utils 就連帶載入所有工具
+（並打破 utils.logger 與 core 之間的循環匯入）。
 """
 
-from .logger import Logger
-from .file_utils import sanitize_filename, convert_to_traditional_chinese
-from .system_utils import open_directory, format_size, format_time, check_disk_space, is_ffmpeg_installed
-from .validators import validate_url
-from .time_utils import get_timestamp
+import importlib
+
+_EXPORTS = {
+    'Logger': '.logger',
+    'sanitize_filename': '.file_utils',
+    'convert_to_traditional_chinese': '.file_utils',
+    'open_directory': '.system_utils',
+    'format_size': '.system_utils',
+    'format_time': '.system_utils',
+    'check_disk_space': '.system_utils',
+    'is_ffmpeg_installed': '.system_utils',
+    'validate_url': '.validators',
+    'get_timestamp': '.time_utils',
+    'parse_timestamp': '.time_utils',
+    'CapabilityRegistry': '.capabilities',
+    'get_capabilities': '.capabilities',
+}
 
 __all__ = [
     'Logger',
     'sanitize_filename', 'convert_to_traditional_chinese',
     'open_directory', 'format_size', 'format_time', 'check_disk_space', 'is_ffmpeg_installed',
     'validate_url',
-    'get_timestamp'
-]
\ No newline at end of file
+    'get_timestamp', 'parse_timestamp',
+    'CapabilityRegistry', 'get_capabilities'
+]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        module = importlib.import_module(_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
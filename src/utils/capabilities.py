@@ -0,0 +1,209 @@
+"""
+執行環境能力偵測
+
+偵測 FFmpeg/ffprobe 版本、可用編碼器與可載入的 OpenCC 設定檔，
+結果快取於行程內，PATH 變更時自動重新偵測。
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, FrozenSet, Optional, Tuple
+
+from core.constants import OPENCC_CONFIG, OPENCC_FALLBACK_CONFIGS
+from utils.logger import Logger
+
+# 外部程式偵測逾時（秒）
+PROBE_TIMEOUT = 5
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """執行環境能力快照"""
+
+    ffmpeg_path: Optional[str] = None
+    ffmpeg_version: Optional[str] = None
+    ffprobe_path: Optional[str] = None
+    ffprobe_version: Optional[str] = None
+    encoders: FrozenSet[str] = field(default_factory=frozenset)
+    opencc_configs: Tuple[str, ...] = ()
+
+    @property
+    def ffmpeg_available(self) -> bool:
+        return self.ffmpeg_version is not None
+
+    @property
+    def ffprobe_available(self) -> bool:
+        return self.ffprobe_version is not None
+
+    @property
+    def opencc_available(self) -> bool:
+        return bool(self.opencc_configs)
+
+    def has_encoder(self, name: str) -> bool:
+        """FFmpeg 是否支援指定編碼器"""
+        return name in self.encoders
+
+
+def _run_tool(args) -> Optional[str]:
+    """執行外部程式並回傳 stdout，失敗時回傳 None"""
+    try:
+        result = subprocess.run(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=PROBE_TIMEOUT,
+            check=True,
+            text=True,
+            errors='replace',
+        )
+        return result.stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+def _probe_version(path: Optional[str]) -> Optional[str]:
+    """解析 `-version` 輸出的版本字串"""
+    if not path:
+        return None
+    output = _run_tool([path, "-version"])
+    if output is None:
+        return None
+    # 第一行格式: "ffmpeg version 6.1.1 Copyright ..."
+    parts = output.split(None, 3)
+    return parts[2] if len(parts) > 2 and parts[1] == "version" else "unknown"
+
+
+def _probe_encoders(ffmpeg_path: str) -> FrozenSet[str]:
+    """解析 `ffmpeg -encoders` 輸出的編碼器名稱"""
+    output = _run_tool([ffmpeg_path, "-hide_banner", "-encoders"])
+    if not output:
+        return frozenset()
+
+    encoders = set()
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = line.strip().startswith("---")
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+
+def _probe_opencc() -> Tuple[str, ...]:
+    """找出可載入的 OpenCC 設定檔"""
+    try:
+        import opencc
+    except ImportError:
+        return ()
+
+    configs = []
+    for config in [OPENCC_CONFIG] + OPENCC_FALLBACK_CONFIGS:
+        try:
+            opencc.OpenCC(config)
+            configs.append(config)
+        except Exception:
+            continue
+    return tuple(configs)
+
+
+def probe_capabilities() -> Capabilities:
+    """
+    偵測目前執行環境的能力（會啟動外部程式，成本較高）
+
+    Returns:
+        Capabilities: 偵測結果
+    """
+    ffmpeg_path = shutil.which("ffmpeg")
+    ffprobe_path = shutil.which("ffprobe")
+    ffmpeg_version = _probe_version(ffmpeg_path)
+
+    capabilities = Capabilities(
+        ffmpeg_path=ffmpeg_path,
+        ffmpeg_version=ffmpeg_version,
+        ffprobe_path=ffprobe_path,
+        ffprobe_version=_probe_version(ffprobe_path),
+        encoders=_probe_encoders(ffmpeg_path) if ffmpeg_version else frozenset(),
+        opencc_configs=_probe_opencc(),
+    )
+    Logger().debug(
+        f"環境偵測: FFmpeg={capabilities.ffmpeg_version}, "
+        f"ffprobe={capabilities.ffprobe_version}, "
+        f"編碼器={len(capabilities.encoders)} 個, OpenCC={capabilities.opencc_configs}"
+    )
+    return capabilities
+
+
+class CapabilityRegistry:
+    """環境能力快取（單例）"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._lock = threading.Lock()
+                    instance._cached = None
+                    instance._fingerprint = None
+                    cls._instance = instance
+        return cls._instance
+
+    def get(self) -> Capabilities:
+        """
+        取得環境能力，尚未偵測或 PATH 已變更時才重新偵測
+
+        多個執行緒同時呼叫時只會偵測一次，其餘等待結果。
+        """
+        fingerprint = os.environ.get("PATH", "")
+        cached = self._cached
+        if cached is not None and self._fingerprint == fingerprint:
+            return cached
+
+        with self._lock:
+            if self._cached is None or self._fingerprint != fingerprint:
+                self._cached = probe_capabilities()
+                self._fingerprint = fingerprint
+            return self._cached
+
+    def peek(self) -> Optional[Capabilities]:
+        """取得已快取的結果，不觸發偵測"""
+        if self._fingerprint != os.environ.get("PATH", ""):
+            return None
+        return self._cached
+
+    def refresh_async(self, callback: Optional[Callable[[Capabilities], None]] = None) -> threading.Thread:
+        """
+        在背景執行緒偵測，完成後呼叫 callback
+
+        Args:
+            callback: 接收偵測結果的回調（在背景執行緒中呼叫）
+
+        Returns:
+            threading.Thread: 偵測執行緒
+        """
+        def _run():
+            capabilities = self.get()
+            if callback:
+                callback(capabilities)
+
+        thread = threading.Thread(target=_run, name="capability-probe", daemon=True)
+        thread.start()
+        return thread
+
+    def invalidate(self):
+        """清除快取，下次取得時重新偵測"""
+        with self._lock:
+            self._cached = None
+            self._fingerprint = None
+
+
+def get_capabilities() -> Capabilities:
+    """取得目前執行環境的能力（快取）"""
+    return CapabilityRegistry().get()
@@ -4,10 +4,14 @@
 
 import re
 import os
+import threading
 from typing import Optional
 from utils.logger import Logger
 from core.constants import OPENCC_CONFIG, OPENCC_FALLBACK_CONFIGS
 
+_opencc_converter = None
+_opencc_lock = threading.Lock()
+
 
 def sanitize_filename(filename: str) -> str:
     """
@@ -34,6 +38,34 @@ def sanitize_filename(filename: str) -> str:
     return filename
 
 
+def _get_opencc_converter():
+    """
+    取得快取的 OpenCC 轉換器（第一次呼叫時才載入字典）
+
+    Returns:
+        轉換器實例，所有設定檔都無法使用時返回 None
+
+    Raises:
+        ImportError: OpenCC 未安裝
+    """
+    global _opencc_converter
+    if _opencc_converter is not None:
+        return _opencc_converter
+
+    with _opencc_lock:
+        if _opencc_converter is None:
+            import opencc
+
+            # 嘗試主要設定，失敗再嘗試備用設定
+            for config in [OPENCC_CONFIG] + OPENCC_FALLBACK_CONFIGS:
+                try:
+                    _opencc_converter = opencc.OpenCC(config)
+                    break
+                except Exception:
+                    continue
+    return _opencc_converter
+
+
 def convert_to_traditional_chinese(text: str) -> Optional[str]:
     """
     將簡體中文轉換為繁體中文
@@ -45,20 +77,9 @@ def convert_to_traditional_chinese(text: str) -> Optional[str]:
         Optional[str]: 轉換後的文字，失敗則返回 None
     """
     try:
-        import opencc
-        
-        # 嘗試使用主要設定
-        try:
-            converter = opencc.OpenCC(OPENCC_CONFIG)
+        converter = _get_opencc_converter()
+        if converter is not None:
             return converter.convert(text)
-        except:
-            # 嘗試備用設定
-            for config in OPENCC_FALLBACK_CONFIGS:
-                try:
-                    converter = opencc.OpenCC(config)
-                    return converter.convert(text)
-                except:
-                    continue
         
         Logger().warning("所有 OpenCC 設定檔都無法使用")
         return None
@@ -67,4 +88,4 @@ def convert_to_traditional_chinese(text: str) -> Optional[str]:
         return None
     except Exception as e:
         Logger().error(f"繁簡轉換失敗: {e}")
-        return None
\ No newline at end of file
+        return None
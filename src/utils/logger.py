@@ -3,6 +3,7 @@
 """
 
 import logging
+import os
 from core.constants import LOG_FILE, LOG_LEVEL
 
 
@@ -22,8 +23,8 @@ class Logger:
         self.logger = logging.getLogger("VideoDownloader")
         self.logger.setLevel(getattr(logging, LOG_LEVEL))
 
-        # 檔案處理器
-        fh = logging.FileHandler(LOG_FILE, encoding='utf-8')
+        # 檔案處理器（環境變數 LOG_FILE 可改變位置）
+        fh = logging.FileHandler(os.getenv("LOG_FILE", LOG_FILE), encoding='utf-8')
         fh.setLevel(logging.DEBUG)
 
         # 控制台處理器
@@ -6,6 +6,7 @@ import os
 import platform
 import subprocess
 from utils.logger import Logger
+from utils.capabilities import get_capabilities
 
 
 def open_directory(path: str) -> bool:
@@ -103,18 +104,9 @@ def check_disk_space(path: str, required_bytes: int) -> bool:
 
 def is_ffmpeg_installed() -> bool:
     """
-    檢查 FFmpeg 是否已安裝
+    檢查 FFmpeg 是否已安裝（使用快取的環境偵測結果）
     
     Returns:
         bool: FFmpeg 是否可用
     """
-    try:
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
\ No newline at end of file
+    return get_capabilities().ffmpeg_available
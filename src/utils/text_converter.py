@@ -3,27 +3,24 @@
 """
 
 import os
-from typing import Optional
+import threading
+from typing import Any, Optional
 from utils.logger import Logger
 
-try:
-    import opencc
-    OPENCC_AVAILABLE = True
-except ImportError:
-    OPENCC_AVAILABLE = False
-
 
 class TextConverter:
     """繁簡轉換器"""
     
     def __init__(self):
-        self.converter: Optional[opencc.OpenCC] = None
+        self.converter: Optional[Any] = None
         self.logger = Logger()
         self._init_converter()
     
     def _init_converter(self):
         """初始化轉換器"""
-        if not OPENCC_AVAILABLE:
+        try:
+            import opencc
+        except ImportError:
             self.logger.warning("OpenCC 未安裝，繁簡轉換功能無法使用")
             return
             
@@ -86,17 +83,27 @@ class TextConverter:
             return filename
 
 
-# 全域實例
-_converter = TextConverter()
+# 全域實例（第一次使用時才建立，避免匯入時載入 OpenCC 字典）
+_converter: Optional[TextConverter] = None
+_converter_lock = threading.Lock()
+
+def get_converter() -> TextConverter:
+    """取得全域轉換器"""
+    global _converter
+    if _converter is None:
+        with _converter_lock:
+            if _converter is None:
+                _converter = TextConverter()
+    return _converter
 
 def convert_text(text: str) -> str:
     """轉換文字（簡體轉繁體）"""
-    return _converter.convert(text)
+    return get_converter().convert(text)
 
 def convert_filename(filename: str) -> str:
     """轉換檔名（簡體轉繁體）"""
-    return _converter.convert_filename(filename)
+    return get_converter().convert_filename(filename)
 
 def is_converter_available() -> bool:
     """檢查轉換器是否可用"""
-    return _converter.is_available()
\ No newline at end of file
+    return get_converter().is_available()
\ No newline at end of file
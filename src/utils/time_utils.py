@@ -12,4 +12,30 @@ def get_timestamp() -> str:
     Returns:
         str: 格式化的時間戳記
     """
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
\ No newline at end of file
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_timestamp(value) -> float:
+    """
+    解析影片時間點
+
+    Args:
+        value: 秒數，或 `SS`、`MM:SS`、`HH:MM:SS`（秒可含小數）格式的字串
+
+    Returns:
+        float: 秒數
+
+    Raises:
+        ValueError: 格式錯誤或為負值
+    """
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        parts = str(value).strip().split(":")
+        if not parts or len(parts) > 3 or any(not part.strip() for part in parts):
+            raise ValueError(f"無效的時間格式: {value}")
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"時間不可為負值: {value}")
+    return seconds
@@ -5,18 +5,21 @@ Bootstrap 5 Web UI，提供影片/音訊下載服務。
 
 from __future__ import annotations
 
+import asyncio
+import json
 import os
 import sys
-import threading
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 
 # 確保 src/ 在 sys.path 中，讓 core/utils 模組可被匯入
 SRC_ROOT = Path(__file__).resolve().parents[1]
@@ -29,10 +32,20 @@ from core.constants import (  # noqa: E402
     DOWNLOAD_TYPE_AUDIO,
     DOWNLOAD_TYPE_VIDEO,
     ERROR_MESSAGES,
+    PRIORITY_INTERACTIVE,
     VIDEO_FORMATS,
+    WEB_MAX_CONCURRENT,
 )
+from core.autotune import ConcurrencyController, controller_from_env  # noqa: E402
+from core.bandwidth import BandwidthBudget, get_default_budget, parse_rate, parse_schedule  # noqa: E402
+from core.circuit_breaker import CircuitBreaker, breaker_from_env  # noqa: E402
+from core.client_quota import ClientAuthError, ClientPolicy, ClientRegistry, QuotaExceeded  # noqa: E402
 from core.downloader import DownloadManager  # noqa: E402
-from utils import Logger, format_size, format_time  # noqa: E402
+from core.task_store import TaskStore, create_task_store  # noqa: E402
+from core.worker import DownloadWorker, build_initial_state, build_job_payload  # noqa: E402
+from utils import Logger  # noqa: E402
+from utils.capabilities import CapabilityRegistry  # noqa: E402
+from utils.time_utils import parse_timestamp  # noqa: E402
 from utils.validators import validate_url  # noqa: E402
 
 PROJECT_ROOT = SRC_ROOT.parent
@@ -45,21 +58,46 @@ if not DOWNLOAD_ROOT.is_absolute():
     DOWNLOAD_ROOT = (PROJECT_ROOT / DOWNLOAD_ROOT).resolve()
 DOWNLOAD_ROOT.mkdir(parents=True, exist_ok=True)
 
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+EVENT_STREAM_INTERVAL = 0.5
+
 templates = Jinja2Templates(directory=str(Path(__file__).resolve().parent / "templates"))
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """啟動時即開始領取共享佇列中的工作，讓閒置 worker 也能分擔其他 worker 接收的任務"""
+    CapabilityRegistry().refresh_async()
+    service.start()
+    yield
+
+
 app = FastAPI(
     title="Video Downloader Web UI",
     description="基於 FastAPI 的影片/音訊下載服務，使用 yt-dlp",
     version="2.2.0",
+    lifespan=lifespan,
 )
 
 
 class DownloadPayload(BaseModel):
-    """下載請求的驗證模型"""
+    """下載請求的驗證模型
+
+    start_time/end_time 可為秒數或 `HH:MM:SS` 字串，指定時只下載該片段。
+    rate_limit 為此任務的頻寬上限，可為 bytes/s 或 `500K`、`2M` 等寫法。
+    priority 越大越先執行（預設為互動式請求的優先權，排在批次項目之前）；
+    estimated_size / duration 為已知的大小與長度，短任務優先時用於排序。
+    """
 
     url: str
     download_type: str
     format_option: str
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    rate_limit: Optional[float] = None
+    priority: int = PRIORITY_INTERACTIVE
+    estimated_size: Optional[int] = None
+    duration: Optional[float] = None
 
     @field_validator("url")
     @classmethod
@@ -85,148 +123,211 @@ class DownloadPayload(BaseModel):
             raise ValueError("格式選項不可為空")
         return value
 
+    @field_validator("start_time", "end_time", mode="before")
+    @classmethod
+    def _parse_time(cls, value: Any) -> Optional[float]:
+        if value is None or value == "":
+            return None
+        return parse_timestamp(value)
 
-class WebDownloadService:
-    """提供 Web 版下載任務管理"""
+    @field_validator("rate_limit", mode="before")
+    @classmethod
+    def _parse_rate(cls, value: Any) -> Optional[float]:
+        return parse_rate(value)
 
-    def __init__(self, download_root: Path):
-        self.download_root = download_root
-        self.manager = DownloadManager()
-        self.tasks: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.Lock()
-        self.logger = Logger()
+    @model_validator(mode="after")
+    def _validate_range(self) -> "DownloadPayload":
+        if self.start_time is not None and self.end_time is not None and self.end_time <= self.start_time:
+            raise ValueError(ERROR_MESSAGES["invalid_clip_range"])
+        return self
 
-    def start_task(self, payload: DownloadPayload) -> str:
-        task_id = str(uuid.uuid4())
-        initial_state = {
-            "id": task_id,
-            "url": payload.url,
-            "download_type": payload.download_type,
-            "format_option": payload.format_option,
-            "status": "pending",
-            "progress": 0.0,
-            "message": "排隊中",
-            "speed": None,
-            "eta": None,
-            "file_path": None,
-        }
-        with self.lock:
-            self.tasks[task_id] = initial_state
-
-        thread = threading.Thread(
-            target=self._run_task,
-            args=(task_id, payload),
-            daemon=True,
-        )
-        thread.start()
-        return task_id
 
-    def _run_task(self, task_id: str, payload: DownloadPayload):
-        def _progress_callback(data: Dict[str, Any]):
-            status = data.get("status")
-            if status == "downloading":
-                downloaded = data.get("downloaded") or 0
-                total = data.get("total") or 0
-                percentage = float(data.get("percentage") or 0.0)
-                speed = data.get("speed") or 0
-                eta = data.get("eta") or 0
-
-                self._update_task(
-                    task_id,
-                    status="downloading",
-                    progress=max(0.0, min(100.0, percentage)),
-                    speed=format_size(speed) + "/s" if speed else None,
-                    eta=format_time(int(eta)) if eta else None,
-                    message=f"已下載 {format_size(downloaded)} / {format_size(total) if total else '未知'}",
-                )
-            elif status == "finished":
-                self._update_task(
-                    task_id,
-                    status="postprocessing",
-                    progress=100.0,
-                    message="後處理中...",
-                )
-
-        def _complete_callback(file_path: str, info: Dict[str, Any]):
-            self._update_task(
-                task_id,
-                status="completed",
-                progress=100.0,
-                message="下載完成",
-                file_path=file_path,
-            )
+class ConcurrencyPayload(BaseModel):
+    """手動調整並行數：指定 limit 時固定為該值並停用自動調整，auto 可重新啟用或停用"""
 
-        def _error_callback(error_msg: str):
-            self._update_task(
-                task_id,
-                status="failed",
-                message=error_msg or ERROR_MESSAGES.get("download_error", "下載失敗"),
-            )
+    limit: Optional[int] = None
+    auto: Optional[bool] = None
 
-        download_task = self.manager.create_task(
-            url=payload.url,
-            download_type=payload.download_type,
-            output_path=str(self.download_root),
-            format_option=payload.format_option,
-            progress_callback=_progress_callback,
-            complete_callback=_complete_callback,
-            error_callback=_error_callback,
-        )
+    @field_validator("limit")
+    @classmethod
+    def _validate_limit(cls, value: Optional[int]) -> Optional[int]:
+        if value is not None and value < 1:
+            raise ValueError("limit 必須大於 0")
+        return value
 
-        self._update_task(task_id, status="downloading", message="開始下載...")
 
-        success = download_task.execute()
-        self.manager.remove_task(download_task)
+class PriorityPayload(BaseModel):
+    """調整排隊中任務的優先權"""
 
-        with self.lock:
-            state = self.tasks.get(task_id)
-            if not state:
-                return
-            if state["status"] not in {"completed", "failed"}:
-                state["status"] = "completed" if success else "failed"
-                state["progress"] = 100.0 if success else state.get("progress", 0.0)
-                if not state.get("message"):
-                    state["message"] = "下載完成" if success else ERROR_MESSAGES.get("download_error", "下載失敗")
-                self.tasks[task_id] = state
-
-    def _update_task(
+    priority: int
+
+
+class BandwidthPayload(BaseModel):
+    """即時調整頻寬預算：rate 為總上限（`0` 表示不限制），schedule 為時段排程（空字串清除）"""
+
+    rate: Optional[str] = None
+    schedule: Optional[str] = None
+
+    @field_validator("rate", mode="before")
+    @classmethod
+    def _validate_rate(cls, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        parse_rate(value)
+        return str(value)
+
+    @field_validator("schedule")
+    @classmethod
+    def _validate_schedule(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            parse_schedule(value)
+        return value
+
+
+class WebDownloadService:
+    """提供 Web 版下載任務管理
+
+    任務狀態與待執行工作皆存放於共享的 TaskStore，
+    因此多個 uvicorn worker 可各自接受請求並查詢任何任務。
+    Web 服務本身是工作的產生者；內建的 DownloadWorker 負責執行，
+    並行數設為 0 時僅產生工作，交由獨立的 `video-downloader worker` 執行。
+    每個請求依標頭識別用戶端，接受前檢查其配額，佇列依用戶端權重公平分配執行者。
+    內建執行者的並行數由 ConcurrencyController 管理（WEB_AUTOTUNE=1 時自動調整），
+    網站連續失敗時由斷路器擱置該網站的任務（CIRCUIT_BREAKER_FAILURE_RATIO=0 停用）。
+    """
+
+    def __init__(
         self,
-        task_id: str,
-        *,
-        status: Optional[str] = None,
-        progress: Optional[float] = None,
-        message: Optional[str] = None,
-        speed: Optional[str] = None,
-        eta: Optional[str] = None,
-        file_path: Optional[str] = None,
+        download_root: Path,
+        store: Optional[TaskStore] = None,
+        max_concurrent: int = WEB_MAX_CONCURRENT,
+        bandwidth: Optional[BandwidthBudget] = None,
+        clients: Optional[ClientRegistry] = None,
+        breaker: Optional[CircuitBreaker] = None,
     ):
-        with self.lock:
-            state = self.tasks.get(task_id)
-            if not state:
-                return
-            if status:
-                state["status"] = status
-            if progress is not None:
-                state["progress"] = progress
-            if message is not None:
-                state["message"] = message
-            if speed is not None:
-                state["speed"] = speed
-            if eta is not None:
-                state["eta"] = eta
-            if file_path is not None:
-                state["file_path"] = file_path
-            self.tasks[task_id] = state
+        self.download_root = download_root
+        self.clients = clients or ClientRegistry.from_env()
+        # 內建執行者的任務共用此預算（未指定時為行程內共用的預算）
+        self.bandwidth = bandwidth or get_default_budget()
+        self.manager = DownloadManager(bandwidth=self.bandwidth)
+        self.store = store or create_task_store()
+        self.max_concurrent = max_concurrent
+        self.logger = Logger()
+        self.worker: Optional[DownloadWorker] = None
+        self.concurrency: Optional[ConcurrencyController] = None
+        self.breaker: Optional[CircuitBreaker] = None
+        if max_concurrent > 0:
+            self.concurrency = controller_from_env("WEB", max_concurrent)
+            self.breaker = breaker or breaker_from_env()
+            self.worker = DownloadWorker(
+                self.store,
+                concurrency=max_concurrent,
+                download_manager=self.manager,
+                autotune=self.concurrency,
+                breaker=self.breaker,
+            )
 
-    def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
-        with self.lock:
-            state = self.tasks.get(task_id)
-            if not state:
-                return None
-            return dict(state)
+    def identify(self, api_key: Optional[str], client_id: Optional[str]) -> ClientPolicy:
+        """依 X-API-Key / X-Client-ID 標頭識別用戶端"""
+        return self.clients.identify(api_key, client_id)
 
+    def get_quota(self, client: ClientPolicy) -> Dict[str, Any]:
+        """用戶端目前的用量與配額"""
+        return self.clients.usage(self.store, client)
 
-service = WebDownloadService(DOWNLOAD_ROOT)
+    def start_task(self, payload: DownloadPayload, client: Optional[ClientPolicy] = None) -> str:
+        """建立任務，用戶端超過配額時拋出 QuotaExceeded"""
+        client = client or self.clients.default
+        self.clients.admit(self.store, client, payload.estimated_size)
+        task_id = str(uuid.uuid4())
+        job_payload = build_job_payload(
+            url=payload.url,
+            download_type=payload.download_type,
+            format_option=payload.format_option,
+            output_path=str(self.download_root),
+            start_time=payload.start_time,
+            end_time=payload.end_time,
+            rate_limit=payload.rate_limit,
+            priority=payload.priority,
+            estimated_size=payload.estimated_size,
+            duration=payload.duration,
+            client_id=client.name,
+            client_weight=client.weight,
+        )
+        self.store.create_task(task_id, build_initial_state(task_id, job_payload))
+        self.store.enqueue_job(task_id, job_payload)
+        self.start()
+        return task_id
+
+    def start(self):
+        """啟動內建的下載執行者（可重複呼叫）"""
+        if self.worker:
+            self.worker.start()
+
+    def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get_task(task_id)
+
+    def cancel_task(self, task_id: str) -> bool:
+        """要求取消任務，由持有該任務的執行者（任何 worker）負責中止"""
+        return self.store.update_task(task_id, cancel_requested=True)
+
+    def list_queue(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """依執行順序列出排隊中的任務"""
+        return self.store.list_queued_jobs(limit)
+
+    def set_priority(self, task_id: str, priority: int) -> bool:
+        """調整排隊中任務的優先權，任務已開始或不存在時回傳 False"""
+        return self.store.reprioritize_job(task_id, priority)
+
+    def move_to_front(self, task_id: str) -> bool:
+        """將排隊中的任務移到最前面"""
+        return self.store.move_job_to_front(task_id)
+
+    def get_bandwidth(self) -> Dict[str, Any]:
+        """頻寬預算目前的上限、排程與各任務的分配"""
+        return self.bandwidth.snapshot()
+
+    def set_bandwidth(self, payload: BandwidthPayload) -> Dict[str, Any]:
+        """即時調整總上限或時段排程"""
+        if payload.rate is not None:
+            self.bandwidth.set_rate(parse_rate(payload.rate))
+        if payload.schedule is not None:
+            self.bandwidth.set_schedule(parse_schedule(payload.schedule))
+        return self.bandwidth.snapshot()
+
+    def get_circuits(self) -> Optional[List[Dict[str, Any]]]:
+        """內建執行者各網站的斷路器狀態，未啟用時回傳 None"""
+        if not self.breaker:
+            return None
+        # 共享佇列的擱置工作交還佇列而非留在斷路器，parked 計數只適用於批次下載，這裡不回傳
+        return [
+            {name: value for name, value in entry.items() if name != "parked"}
+            for entry in self.breaker.snapshot()
+        ]
+
+    def reset_circuit(self, key: str) -> bool:
+        """手動關閉網站的斷路器，擱置的任務隨即恢復"""
+        return bool(self.breaker and self.breaker.reset(key))
+
+    def get_concurrency(self) -> Optional[Dict[str, Any]]:
+        """內建執行者的並行數狀態，沒有內建執行者時回傳 None"""
+        return self.concurrency.snapshot() if self.concurrency else None
+
+    def set_concurrency(self, payload: ConcurrencyPayload) -> Optional[Dict[str, Any]]:
+        """手動調整並行數或切換自動調整"""
+        if not self.concurrency:
+            return None
+        if payload.limit is not None:
+            self.concurrency.set_limit(payload.limit)
+        if payload.auto is not None:
+            self.concurrency.set_auto(payload.auto)
+        return self.concurrency.snapshot()
+
+
+service = WebDownloadService(
+    DOWNLOAD_ROOT,
+    max_concurrent=int(os.getenv("WEB_MAX_CONCURRENT", str(WEB_MAX_CONCURRENT))),
+)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -243,29 +344,171 @@ async def index(request: Request):
     )
 
 
+def _identify(api_key: Optional[str], client_id: Optional[str]) -> ClientPolicy:
+    try:
+        return service.identify(api_key, client_id)
+    except ClientAuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
 @app.post("/api/download")
-async def start_download(payload: DownloadPayload):
-    """新增下載任務"""
-    task_id = service.start_task(payload)
-    Logger().info(f"Web 任務建立: {payload.url} -> {task_id}")
+async def start_download(
+    payload: DownloadPayload,
+    x_api_key: Optional[str] = Header(None),
+    x_client_id: Optional[str] = Header(None),
+):
+    """新增下載任務（超過用戶端配額時回傳 429）"""
+    client = _identify(x_api_key, x_client_id)
+    try:
+        task_id = await run_in_threadpool(service.start_task, payload, client)
+    except QuotaExceeded as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
+    Logger().info(f"Web 任務建立: {payload.url} -> {task_id}（用戶端 {client.name}）")
     return {"task_id": task_id, "status": "queued"}
 
 
+@app.get("/api/quota")
+async def get_quota(x_api_key: Optional[str] = Header(None), x_client_id: Optional[str] = Header(None)):
+    """查詢目前用戶端的用量與配額"""
+    client = _identify(x_api_key, x_client_id)
+    return await run_in_threadpool(service.get_quota, client)
+
+
 @app.get("/api/status/{task_id}")
 async def get_status(task_id: str):
     """查詢任務狀態"""
-    status = service.get_status(task_id)
+    status = await run_in_threadpool(service.get_status, task_id)
     if not status:
         raise HTTPException(status_code=404, detail="找不到指定任務")
     return status
 
 
+@app.post("/api/cancel/{task_id}")
+async def cancel_download(task_id: str):
+    """取消任務"""
+    if not await run_in_threadpool(service.cancel_task, task_id):
+        raise HTTPException(status_code=404, detail="找不到指定任務")
+    return {"task_id": task_id, "status": "cancelling"}
+
+
+def _require_single_process():
+    """
+    並行數、斷路器與頻寬預算只存在於各 Web 行程的內建執行者；
+    WEB_WORKERS>1 時請求會分到任意一個行程，查詢與調整都不代表整個服務，因此拒絕
+    """
+    if int(os.getenv("WEB_WORKERS", "1")) > 1:
+        raise HTTPException(status_code=409, detail="此設定只存在於單一行程，WEB_WORKERS>1 時無法使用")
+
+
+@app.get("/api/concurrency")
+async def get_concurrency():
+    """查詢內建執行者的並行數、最近一次取樣與調整紀錄（僅限單一 Web worker）"""
+    _require_single_process()
+    snapshot = service.get_concurrency()
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="未啟用內建下載執行者")
+    return snapshot
+
+
+@app.post("/api/concurrency")
+async def set_concurrency(payload: ConcurrencyPayload):
+    """手動覆寫並行數或切換自動調整（僅限單一 Web worker）"""
+    _require_single_process()
+    snapshot = service.set_concurrency(payload)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="未啟用內建下載執行者")
+    return snapshot
+
+
+@app.get("/api/circuits")
+async def get_circuits():
+    """查詢內建執行者各網站的斷路器狀態與失敗比例（僅限單一 Web worker）"""
+    _require_single_process()
+    circuits = service.get_circuits()
+    if circuits is None:
+        raise HTTPException(status_code=404, detail="未啟用斷路器")
+    return {"circuits": circuits}
+
+
+@app.post("/api/circuits/{key}/reset")
+async def reset_circuit(key: str):
+    """手動關閉內建執行者中網站的斷路器（僅限單一 Web worker）"""
+    _require_single_process()
+    if not service.reset_circuit(key):
+        raise HTTPException(status_code=404, detail="找不到指定網站的斷路器")
+    return {"key": key, "state": "closed"}
+
+
+@app.get("/api/queue")
+async def list_queue(limit: int = 100):
+    """依執行順序列出排隊中的任務"""
+    return {"queued": await run_in_threadpool(service.list_queue, limit)}
+
+
+@app.post("/api/priority/{task_id}")
+async def set_priority(task_id: str, payload: PriorityPayload):
+    """調整排隊中任務的優先權"""
+    if not await run_in_threadpool(service.set_priority, task_id, payload.priority):
+        raise HTTPException(status_code=404, detail="找不到排隊中的任務")
+    return {"task_id": task_id, "priority": payload.priority}
+
+
+@app.post("/api/move/{task_id}")
+async def move_to_front(task_id: str):
+    """
+    將排隊中的任務移到最前面
+
+    多用戶端時仍依公平分配輪流領取：任務成為其用戶端下一個執行的工作，不會插到其他用戶端之前。
+    """
+    if not await run_in_threadpool(service.move_to_front, task_id):
+        raise HTTPException(status_code=404, detail="找不到排隊中的任務")
+    return {"task_id": task_id, "position": 1}
+
+
+@app.get("/api/bandwidth")
+async def get_bandwidth():
+    """查詢頻寬預算與各任務分配到的速率（僅限單一 Web worker）"""
+    _require_single_process()
+    return service.get_bandwidth()
+
+
+@app.post("/api/bandwidth")
+async def set_bandwidth(payload: BandwidthPayload):
+    """即時調整頻寬上限或時段排程（只影響本行程的內建執行者，僅限單一 Web worker）"""
+    _require_single_process()
+    return service.set_bandwidth(payload)
+
+
+@app.get("/api/events/{task_id}")
+async def stream_events(task_id: str):
+    """以 Server-Sent Events 推送任務狀態變化，任務結束後關閉串流"""
+    status = await run_in_threadpool(service.get_status, task_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="找不到指定任務")
+
+    async def _event_source():
+        last = None
+        state = status
+        while True:
+            if state and state != last:
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+                last = state
+            if not state or state.get("status") in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(EVENT_STREAM_INTERVAL)
+            state = await run_in_threadpool(service.get_status, task_id)
+
+    return StreamingResponse(_event_source(), media_type="text/event-stream")
+
+
 def run():
     """提供直接執行的入口"""
     import uvicorn
 
     port = int(os.getenv("PORT", "8000"))
-    uvicorn.run("src.web.app:app", host="0.0.0.0", port=port, reload=False)
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    uvicorn.run("src.web.app:app", host="0.0.0.0", port=port, reload=False, workers=workers)
 
 
 if __name__ == "__main__":
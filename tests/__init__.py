@@ -1,3 +1,9 @@
 """
 測試模組
-"""
\ No newline at end of file
+"""
+
+import os
+import tempfile
+
+# 測試的日誌寫到暫存目錄，不在工作目錄留下 downloader.log（工作行程會繼承此設定）
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.gettempdir(), "video-downloader-tests.log"))
@@ -0,0 +1,115 @@
+"""
+asyncio 下載管理器測試
+"""
+
+import unittest
+import sys
+import os
+import asyncio
+import threading
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.async_downloader import AsyncDownloadManager, DownloadError
+
+
+class _StubTask:
+    """模擬下載任務：`slow` 會阻塞至取消，`fail` 會失敗"""
+
+    def __init__(self, url, output_path, progress_callback, complete_callback, error_callback, **options):
+        self.url = url
+        self.options = options
+        self.output_path = output_path
+        self.progress_callback = progress_callback
+        self.complete_callback = complete_callback
+        self.error_callback = error_callback
+        self.cancel_event = threading.Event()
+
+    def execute(self):
+        for percentage in (25.0, 50.0, 100.0):
+            self.progress_callback({'status': 'downloading', 'percentage': percentage})
+        if "slow" in self.url:
+            self.cancel_event.wait(5)
+            self.error_callback("下載已被使用者取消")
+            return False
+        if "fail" in self.url:
+            self.error_callback("模擬失敗")
+            return False
+        self.complete_callback(os.path.join(self.output_path, "video.mp4"), {})
+        return True
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class _StubManager:
+    """模擬下載管理器"""
+
+    def create_task(self, **kwargs):
+        return _StubTask(**kwargs)
+
+    def remove_task(self, task):
+        pass
+
+
+class TestAsyncDownloadManager(unittest.TestCase):
+    """asyncio 下載管理器測試"""
+
+    def _run(self, coro):
+        return asyncio.run(coro)
+
+    def test_result_and_events(self):
+        """測試事件串流與完成結果"""
+        async def scenario():
+            async with AsyncDownloadManager(max_workers=2, download_manager=_StubManager()) as manager:
+                handle = await manager.submit("https://example.com/ok", "video", "/tmp", "最高畫質")
+                events = [event async for event in handle.events()]
+                return events, await handle.result()
+
+        events, file_path = self._run(scenario())
+        self.assertEqual(events[-1]['status'], 'completed')
+        self.assertEqual(file_path, os.path.join("/tmp", "video.mp4"))
+
+    def test_submit_forwards_task_options(self):
+        """測試片段範圍、頻寬上限與預先解析的資訊傳給下載任務"""
+        async def scenario():
+            async with AsyncDownloadManager(download_manager=_StubManager()) as manager:
+                handle = await manager.submit("https://example.com/ok", "video", "/tmp", "最高畫質",
+                                              start_time=10, end_time=20, rate_limit=1024,
+                                              prefetched_info={'id': 'ok'})
+                await handle.result()
+                return handle.task.options
+
+        options = self._run(scenario())
+        self.assertEqual(options['start_time'], 10)
+        self.assertEqual(options['end_time'], 20)
+        self.assertEqual(options['rate_limit'], 1024)
+        self.assertEqual(options['prefetched_info'], {'id': 'ok'})
+
+    def test_failure_raises(self):
+        """測試下載失敗時 result() 拋出 DownloadError"""
+        async def scenario():
+            async with AsyncDownloadManager(download_manager=_StubManager()) as manager:
+                handle = await manager.submit("https://example.com/fail", "video", "/tmp", "最高畫質")
+                await handle.result()
+
+        with self.assertRaises(DownloadError):
+            self._run(scenario())
+
+    def test_cancelled_await_cancels_task(self):
+        """測試等待端被取消時底層任務同時取消"""
+        async def scenario():
+            manager = AsyncDownloadManager(download_manager=_StubManager())
+            handle = await manager.submit("https://example.com/slow", "video", "/tmp", "最高畫質")
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(handle.result(), timeout=0.2)
+            self.assertTrue(handle.task.cancel_event.is_set())
+            await manager.aclose(cancel=False)
+            return manager.get_active_count()
+
+        self.assertEqual(self._run(scenario()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
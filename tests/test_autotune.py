@@ -0,0 +1,158 @@
+"""
+並行數自動調整測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.autotune import ConcurrencyController, controller_from_env, is_throttled
+from core.batch_downloader import BatchDownloadManager, TaskStatus
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadManager
+from core.fake_engine import FakeEngine
+
+
+class _Clock:
+    """可手動推進的時間來源"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestConcurrencyController(unittest.TestCase):
+    """AIMD 調整邏輯測試"""
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.load = None
+        self.controller = ConcurrencyController(
+            initial=2, min_limit=1, max_limit=8, interval=1.0,
+            load_probe=lambda: self.load, clock=self.clock,
+        )
+
+    def _window(self, throughput, results=(), active=None):
+        """模擬一個取樣週期：active 個任務共傳輸 throughput bytes，最後記錄 results"""
+        active = self.controller.limit if active is None else active
+        for key in range(active):
+            self.controller.record_progress(("w", self.clock.now, key), throughput // active)
+        for index, (success, message) in enumerate(results):
+            self.controller.record_result(("r", self.clock.now, index), success, message)
+        for key in range(active):
+            self.controller.discard(("w", self.clock.now, key))
+        self.clock.now += 1.0
+        self.controller.record_progress(("tick", self.clock.now), 0)
+        self.controller.discard(("tick", self.clock.now))
+        return self.controller.limit
+
+    def test_increase_while_throughput_grows_then_hold(self):
+        """測試執行槽用滿且傳輸速率提升時逐步增加，速率飽和後維持"""
+        self.assertEqual(self._window(1000), 3)
+        self.assertEqual(self._window(1500), 4)
+        self.assertEqual(self._window(1520), 4)
+        self.assertEqual(self.controller.snapshot()["history"][-1]["action"], "increase")
+
+    def test_step_back_when_throughput_drops(self):
+        """測試增加後傳輸速率下降時退回一格"""
+        self.assertEqual(self._window(1000), 3)
+        self.assertEqual(self._window(800), 2)
+
+    def test_hold_when_slots_not_saturated(self):
+        """測試執行槽未用滿時不增加"""
+        self.assertEqual(self._window(1000, active=1), 2)
+
+    def test_backoff_on_throttling(self):
+        """測試出現 429 時乘法減少"""
+        self.controller.set_auto(True)
+        self.controller.limit = 8
+        self.assertEqual(self._window(1000, results=[(False, "HTTP Error 429: Too Many Requests")]), 5)
+        self.assertIn("429", self.controller.snapshot()["history"][-1]["reason"])
+
+    def test_backoff_on_error_rate_and_cpu(self):
+        """測試錯誤率過高或 CPU 滿載時減少"""
+        self.assertEqual(self._window(1000, results=[(False, "timeout"), (True, None)]), 1)
+        self.controller.limit = 4
+        self.load = 1.5
+        self.assertEqual(self._window(1000), 2)
+
+    def test_manual_override_disables_auto(self):
+        """測試手動設定並行數後停用自動調整，並限制在上下限內"""
+        self.controller.set_limit(20)
+        snapshot = self.controller.snapshot()
+        self.assertEqual(snapshot["limit"], 8)
+        self.assertFalse(snapshot["auto"])
+        self.assertEqual(snapshot["history"][-1]["action"], "override")
+        self.assertEqual(self._window(1000), 8)
+
+    def test_acquire_respects_limit(self):
+        """測試執行槽數量受限，逾時回傳 False"""
+        self.assertTrue(self.controller.acquire(timeout=0))
+        self.assertTrue(self.controller.acquire(timeout=0))
+        self.assertFalse(self.controller.acquire(timeout=0))
+        self.controller.release()
+        self.assertTrue(self.controller.acquire(timeout=0))
+
+    def test_throttle_detection_and_env(self):
+        """測試限流訊息判斷與環境變數設定"""
+        self.assertTrue(is_throttled("ERROR: HTTP Error 429"))
+        self.assertFalse(is_throttled("HTTP Error 404: Not Found"))
+        with mock.patch.dict(os.environ, {"WEB_AUTOTUNE": "1", "WEB_AUTOTUNE_MAX": "6"}):
+            controller = controller_from_env("WEB", 3)
+        self.assertTrue(controller.auto)
+        self.assertEqual((controller.limit, controller.max_limit), (3, 6))
+        with mock.patch.dict(os.environ, {"WEB_AUTOTUNE": "0"}):
+            controller = controller_from_env("WEB", 2)
+        self.assertFalse(controller.auto)
+        self.assertEqual((controller.limit, controller.max_limit), (2, 2))
+
+
+class TestBatchAutotune(unittest.TestCase):
+    """批次下載搭配並行數控制器（模擬引擎）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch("core.downloader.get_default_engine",
+                             return_value=FakeEngine(size=4096, speed=0, progress_steps=4))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_batch_respects_controller_limit(self):
+        """測試同時下載數不超過控制器的並行數，並記錄結果"""
+        controller = ConcurrencyController(initial=2, max_limit=4, interval=60.0)
+        manager = BatchDownloadManager(max_retries=0, download_manager=DownloadManager(), autotune=controller)
+        peak = []
+        original = manager._process_single_task
+
+        def tracked(task_info, output_path):
+            peak.append(controller.active)
+            original(task_info, output_path)
+
+        manager._process_single_task = tracked
+        done = threading.Event()
+        manager.batch_complete_callback = lambda _summary: done.set()
+        for index in range(6):
+            manager.add_url(f"https://fake.test/video-{index}", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager.start_batch_download()
+        self.assertTrue(done.wait(10))
+
+        self.assertEqual(manager.max_workers, 4)
+        self.assertLessEqual(max(peak), 2)
+        self.assertTrue(all(task.status == TaskStatus.COMPLETED for task in manager.tasks))
+        self.assertEqual(controller.active, 0)
+        self.assertEqual(controller._succeeded, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
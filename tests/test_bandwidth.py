@@ -0,0 +1,147 @@
+"""
+下載頻寬預算測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.bandwidth import BandwidthBudget, format_schedule, parse_rate, parse_schedule
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadTask
+from core.fake_engine import FakeEngine
+
+
+class _Clock:
+    """可手動推進的時間來源，sleep 直接推進時間"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+class TestParsing(unittest.TestCase):
+    """速率與排程解析測試"""
+
+    def test_parse_rate(self):
+        """測試速率單位與不限制的寫法"""
+        self.assertEqual(parse_rate("500K"), 500 * 1024)
+        self.assertEqual(parse_rate("1.5MiB/s"), 1.5 * 1024 ** 2)
+        self.assertEqual(parse_rate(2048), 2048)
+        for value in (None, "", "0", "unlimited", 0):
+            self.assertIsNone(parse_rate(value))
+        with self.assertRaises(ValueError):
+            parse_rate("fast")
+
+    def test_parse_schedule(self):
+        """測試時段排程解析與轉回文字"""
+        schedule = parse_schedule("09:00-18:00=2M; 18:00-09:00=0")
+        self.assertEqual(schedule, [(540, 1080, 2 * 1024 ** 2), (1080, 540, None)])
+        self.assertEqual(format_schedule(schedule), "09:00-18:00=2097152, 18:00-09:00=0")
+        with self.assertRaises(ValueError):
+            parse_schedule("09:00=2M")
+
+
+class TestBandwidthBudget(unittest.TestCase):
+    """頻寬分配與限速測試"""
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.hour = 12
+
+    def _budget(self, rate=None, schedule=None):
+        return BandwidthBudget(rate=rate, schedule=schedule, clock=self.clock, sleep=self.clock.sleep,
+                               now=lambda: datetime(2025, 1, 1, self.hour, 0))
+
+    def test_fair_share_redistributed_on_start_and_finish(self):
+        """測試任務開始與結束時重新平分總上限"""
+        budget = self._budget(rate=1000)
+        first, second = budget.register(), budget.register()
+        first.activate()
+        self.assertEqual(first.allocated, 1000)
+        second.activate()
+        self.assertEqual((first.allocated, second.allocated), (500, 500))
+        second.close()
+        self.assertEqual(first.allocated, 1000)
+
+    def test_weights_and_caps(self):
+        """測試權重分配，有上限的任務用不完的額度分給其他任務"""
+        budget = self._budget(rate=1200)
+        capped = budget.register(cap=100)
+        heavy = budget.register(weight=2)
+        light = budget.register()
+        for share in (capped, heavy, light):
+            share.activate()
+        self.assertEqual(capped.allocated, 100)
+        self.assertAlmostEqual(heavy.allocated, 1100 * 2 / 3)
+        self.assertAlmostEqual(light.allocated, 1100 / 3)
+
+        # 不限總頻寬時只套用任務本身的上限
+        budget.set_rate(None)
+        self.assertEqual((capped.allocated, heavy.allocated), (100, None))
+
+    def test_consume_waits_at_allocated_rate(self):
+        """測試超出分配的速率時等待"""
+        budget = self._budget(rate=1000)
+        share = budget.register()
+        for _ in range(4):
+            share.consume(500)
+        self.assertAlmostEqual(self.clock.slept, 2.0)
+
+    def test_schedule_overrides_base_rate(self):
+        """測試時段排程取代基本上限，跨越午夜的時段也能比對"""
+        budget = self._budget(rate=1000, schedule=parse_schedule("09:00-18:00=100, 22:00-06:00=0"))
+        self.assertEqual(budget.effective_rate(), 100)
+        self.hour = 23
+        budget.set_schedule(budget.schedule)
+        self.assertIsNone(budget.effective_rate())
+        self.hour = 19
+        budget.set_schedule(budget.schedule)
+        self.assertEqual(budget.effective_rate(), 1000)
+
+    def test_snapshot_lists_active_tasks(self):
+        """測試狀態只列出傳輸中的任務"""
+        budget = self._budget(rate=1000)
+        share = budget.register(cap=300)
+        budget.register()
+        share.activate()
+        snapshot = budget.snapshot()
+        self.assertEqual(snapshot["active_tasks"], 1)
+        self.assertEqual(snapshot["tasks"][0]["allocated"], 300)
+
+
+class TestTaskBandwidth(unittest.TestCase):
+    """下載任務套用頻寬上限（模擬引擎）"""
+
+    def test_task_throttled_by_rate_limit(self):
+        """測試任務下載速率受上限限制，結束後移除額度"""
+        budget = BandwidthBudget()
+        with tempfile.TemporaryDirectory() as output:
+            task = DownloadTask(
+                "https://fake.test/video", DOWNLOAD_TYPE_VIDEO, output, "最高畫質",
+                engine=FakeEngine(size=40 * 1024, progress_steps=8),
+                bandwidth=budget, rate_limit=100 * 1024,
+            )
+            started = time.monotonic()
+            self.assertTrue(task.execute())
+            elapsed = time.monotonic() - started
+        self.assertGreaterEqual(elapsed, 0.35)
+        self.assertEqual(budget.snapshot()["active_tasks"], 0)
+        self.assertEqual(budget._shares, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+無介面批次下載指令測試
+"""
+
+import unittest
+import sys
+import os
+import io
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.batch_cli import EXIT_FAILED, EXIT_OK, EXIT_USAGE, iter_urls, main
+from core.batch_downloader import BatchDownloadManager, TaskStatus
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadManager
+from core.fake_engine import FakeEngine
+
+
+class TestIterUrls(unittest.TestCase):
+    """網址清單解析測試"""
+
+    def test_mixed_formats(self):
+        """測試每行一個、CSV（含標題列）與逗號分隔混用"""
+        lines = [
+            "url,title\n",
+            "https://a.test/1,第一部\n",
+            "# 註解 https://ignored.test\n",
+            "\n",
+            "https://a.test/2, https://a.test/3,\n",
+            '"https://a.test/4?x=1,2",標題\n',
+        ]
+        self.assertEqual(list(iter_urls(lines)), [
+            "https://a.test/1", "https://a.test/2", "https://a.test/3", "https://a.test/4?x=1,2",
+        ])
+
+
+class TestBatchCli(unittest.TestCase):
+    """`video-downloader batch` 測試（模擬引擎）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch("core.downloader.get_default_engine", return_value=FakeEngine(size=1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _run(self, text, *extra):
+        stdout = io.StringIO()
+        code = main(["--output", self.tmp_dir.name, "--retries", "0", *extra],
+                    stdin=io.StringIO(text), stdout=stdout)
+        events = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        return code, events
+
+    def test_ndjson_results_and_exit_code(self):
+        """測試輸出每個任務的結果與摘要，有失敗時以狀態碼 1 結束"""
+        code, events = self._run(
+            "https://fake.test/a\nhttps://fake.test/b,https://fake.test/c?fail=extract\n",
+            "--concurrency", "2",
+        )
+
+        self.assertEqual(code, EXIT_FAILED)
+        results = {event["url"]: event for event in events if event["event"] == "result"}
+        self.assertEqual(results["https://fake.test/a"]["status"], "completed")
+        self.assertEqual(results["https://fake.test/c?fail=extract"]["status"], "failed")
+        self.assertIn("模擬解析失敗", results["https://fake.test/c?fail=extract"]["error"])
+        summary = events[-1]
+        self.assertEqual(summary["event"], "summary")
+        self.assertEqual((summary["total"], summary["completed"], summary["failed"]), (3, 2, 1))
+
+    def test_archive_skips_completed(self):
+        """測試紀錄檔中已完成的網址在下次執行時略過"""
+        archive = os.path.join(self.tmp_dir.name, "archive.txt")
+        self.assertEqual(self._run("https://fake.test/a\n", "--archive", archive)[0], EXIT_OK)
+
+        code, events = self._run("https://fake.test/a\nhttps://fake.test/b\n", "--archive", archive)
+        self.assertEqual(code, EXIT_OK)
+        kinds = [event["event"] for event in events if event["event"] != "progress"]
+        self.assertEqual(kinds, ["skipped", "result", "summary"])
+        with open(archive, encoding="utf-8") as f:
+            self.assertEqual(f.read().split(), ["https://fake.test/a", "https://fake.test/b"])
+
+    def test_missing_input_file(self):
+        """測試輸入檔案不存在時以狀態碼 2 結束"""
+        code, events = self._run("", os.path.join(self.tmp_dir.name, "missing.txt"))
+        self.assertEqual(code, EXIT_USAGE)
+        self.assertEqual(events[-1]["event"], "error")
+
+
+class TestConcurrentBatch(unittest.TestCase):
+    """批次並行下載測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_max_workers_runs_tasks_in_parallel(self):
+        """測試 max_workers 個任務同時下載"""
+        manager = BatchDownloadManager(
+            max_retries=0, max_workers=4,
+            download_manager=DownloadManager(engine=FakeEngine(size=1024, latency=0.2)),
+        )
+        done = threading.Event()
+        manager.batch_complete_callback = lambda summary: done.set()
+        urls = ",".join(f"https://fake.test/{i}" for i in range(8))
+        manager.add_urls_from_text(urls, DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+
+        started = time.monotonic()
+        manager.start_batch_download()
+        self.assertTrue(done.wait(5))
+        self.assertLess(time.monotonic() - started, 1.2)
+        self.assertTrue(all(task.status == TaskStatus.COMPLETED for task in manager.tasks))
+
+    def test_streaming_waits_for_finish_input(self):
+        """測試串流模式在 finish_input 之前持續接收新任務"""
+        manager = BatchDownloadManager(
+            max_retries=0, download_manager=DownloadManager(engine=FakeEngine(size=1024)),
+        )
+        done = threading.Event()
+        manager.batch_complete_callback = lambda summary: done.set()
+        manager.start_batch_download(streaming=True)
+
+        manager.add_url("https://fake.test/first", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        time.sleep(0.3)
+        self.assertFalse(done.is_set())
+        manager.add_url("https://fake.test/second", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager.finish_input()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(manager.get_task_summary()["completed"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
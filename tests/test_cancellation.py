@@ -0,0 +1,168 @@
+"""
+任務取消延遲測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.downloader import DownloadTask
+from core.batch_downloader import BatchDownloadManager, TaskStatus
+from core.fake_engine import FakeEngine, FakeSession
+
+# 取消後必須在此時間內返回（秒）
+CANCEL_LATENCY_BUDGET = 1.5
+
+_release = threading.Event()
+
+
+class _StallingHandler(BaseHTTPRequestHandler):
+    """`/hang` 永不回應；`/video.mp4` 送出部分內容後停滯"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/hang"):
+            _release.wait(30)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(10 * 1024 * 1024))
+        self.end_headers()
+        try:
+            self.wfile.write(b"\0" * 256 * 1024)
+            self.wfile.flush()
+        except OSError:
+            return
+        _release.wait(30)
+
+
+class _StubbornSession(FakeSession):
+    """忽略取消、在寬限時間之後仍繼續寫入暫存檔的工作階段"""
+
+    def download(self, info):
+        part = self.expected_filename(info) + ".part"
+        for _ in range(3):
+            open(part, "wb").close()
+            time.sleep(0.2)
+        raise RuntimeError("連線中斷")
+
+
+class _StubbornEngine(FakeEngine):
+    def open(self, request):
+        return _StubbornSession(self, request)
+
+
+class TestCancelLatency(unittest.TestCase):
+    """取消延遲測試"""
+
+    @classmethod
+    def setUpClass(cls):
+        _release.clear()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StallingHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        _release.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _measure_cancel(self, task, wait_until):
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(ok=task.execute()))
+        thread.start()
+
+        deadline = time.monotonic() + 15
+        while not wait_until() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        cancelled_at = time.monotonic()
+        task.cancel()
+        thread.join(10)
+        latency = time.monotonic() - cancelled_at
+
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(result["ok"])
+        return latency
+
+    def _create_task(self, path, errors):
+        return DownloadTask(
+            url=f"{self.base_url}{path}",
+            download_type="video",
+            output_path=self.tmp_dir.name,
+            format_option="最高畫質",
+            error_callback=errors.append,
+        )
+
+    def test_cancel_during_extraction(self):
+        """測試解析階段卡住時可即時取消"""
+        errors = []
+        task = self._create_task("/hang/video.mp4", errors)
+        started = time.monotonic()
+        latency = self._measure_cancel(task, lambda: time.monotonic() - started > 1)
+
+        self.assertLess(latency, CANCEL_LATENCY_BUDGET)
+        self.assertEqual(len(errors), 1)
+
+    def test_cancel_stalled_transfer_removes_partial_file(self):
+        """測試連線停滯時可即時取消並清除暫存檔"""
+        errors = []
+        task = self._create_task("/video.mp4", errors)
+
+        def _has_partial():
+            return any(name.endswith(".part") for name in os.listdir(self.tmp_dir.name))
+
+        latency = self._measure_cancel(task, _has_partial)
+
+        self.assertLess(latency, CANCEL_LATENCY_BUDGET)
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+    def test_stop_batch_cancels_all_tasks(self):
+        """測試停止批次時目前任務與等待中任務都會被取消"""
+        manager = BatchDownloadManager(max_retries=0)
+        urls = ",".join(f"{self.base_url}/hang/{i}.mp4" for i in range(3))
+        manager.add_urls_from_text(urls, "video", "最高畫質", self.tmp_dir.name)
+        manager.start_batch_download()
+        time.sleep(1)
+
+        stopped_at = time.monotonic()
+        self.assertTrue(manager.stop_batch_download(wait=5))
+        self.assertLess(time.monotonic() - stopped_at, CANCEL_LATENCY_BUDGET)
+        self.assertTrue(all(task.status == TaskStatus.CANCELLED for task in manager.tasks))
+
+
+    def test_partial_files_removed_after_slow_runner_exits(self):
+        """測試下載執行緒超過寬限時間才結束時，暫存檔於其結束後清除"""
+        errors = []
+        task = DownloadTask(url="https://fake.test/stubborn", download_type="video",
+                            output_path=self.tmp_dir.name, format_option="最高畫質",
+                            error_callback=errors.append, engine=_StubbornEngine())
+        with mock.patch("core.downloader.CANCEL_GRACE_PERIOD", 0.05):
+            self._measure_cancel(task, lambda: os.listdir(self.tmp_dir.name))
+        self.assertTrue(task.is_stopping())
+
+        task._runner.join(5)
+        self.assertFalse(task.is_stopping())
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+        self.assertEqual(len(errors), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+執行環境能力偵測測試
+"""
+
+import unittest
+import sys
+import os
+import stat
+import tempfile
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.constants import DOWNLOAD_TYPE_AUDIO, DOWNLOAD_TYPE_VIDEO
+from core.engine import DownloadRequest, YtDlpEngine
+from utils import capabilities as capabilities_module
+from utils.capabilities import Capabilities, CapabilityRegistry
+
+FAKE_FFMPEG = """#!/bin/sh
+if [ "$1" = "-version" ]; then
+    echo "ffmpeg version 6.1.1 Copyright (c) 2000-2023 the FFmpeg developers"
+    exit 0
+fi
+echo "Encoders:"
+echo " A..... = Audio"
+echo " ------"
+echo " A....D aac                  AAC (Advanced Audio Coding)"
+echo " A....D libopus              libopus Opus"
+"""
+
+
+@unittest.skipIf(os.name == 'nt', "測試用假 FFmpeg 為 shell script")
+class TestCapabilityRegistry(unittest.TestCase):
+    """能力偵測與快取測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bin_dir = os.path.join(self.tmp_dir.name, "bin")
+        self.empty_dir = os.path.join(self.tmp_dir.name, "empty")
+        os.makedirs(self.bin_dir)
+        os.makedirs(self.empty_dir)
+
+        fake = os.path.join(self.bin_dir, "ffmpeg")
+        with open(fake, "w") as f:
+            f.write(FAKE_FFMPEG)
+        os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+
+        self.registry = CapabilityRegistry()
+        self.registry.invalidate()
+
+    def tearDown(self):
+        self.registry.invalidate()
+        self.tmp_dir.cleanup()
+
+    def test_probe_ffmpeg_version_and_encoders(self):
+        """測試解析 FFmpeg 版本與編碼器"""
+        with mock.patch.dict(os.environ, {"PATH": self.bin_dir}):
+            capabilities = self.registry.get()
+
+        self.assertTrue(capabilities.ffmpeg_available)
+        self.assertEqual(capabilities.ffmpeg_version, "6.1.1")
+        self.assertTrue(capabilities.has_encoder("aac"))
+        self.assertFalse(capabilities.has_encoder("libmp3lame"))
+        self.assertFalse(capabilities.ffprobe_available)
+
+    def test_result_cached_until_path_changes(self):
+        """測試結果快取，PATH 變更後重新偵測"""
+        with mock.patch.object(
+            capabilities_module, "probe_capabilities", wraps=capabilities_module.probe_capabilities
+        ) as probe:
+            with mock.patch.dict(os.environ, {"PATH": self.empty_dir}):
+                self.assertFalse(self.registry.get().ffmpeg_available)
+                self.registry.get()
+                self.assertEqual(probe.call_count, 1)
+
+            with mock.patch.dict(os.environ, {"PATH": self.bin_dir}):
+                self.assertIsNone(self.registry.peek())
+                self.assertTrue(self.registry.get().ffmpeg_available)
+                self.assertEqual(probe.call_count, 2)
+
+    def test_refresh_async_invokes_callback(self):
+        """測試背景偵測完成後呼叫回調"""
+        results = []
+        with mock.patch.dict(os.environ, {"PATH": self.bin_dir}):
+            self.registry.refresh_async(results.append).join(10)
+            self.assertIs(self.registry.peek(), results[0])
+
+
+class TestDownloaderUsesCapabilities(unittest.TestCase):
+    """下載選項依環境能力調整測試"""
+
+    def _options(self, capabilities, download_type, format_option):
+        request = DownloadRequest("https://example.com/v", download_type, "/tmp", format_option)
+        with mock.patch("core.engine.get_capabilities", return_value=capabilities):
+            return YtDlpEngine().build_options(request)
+
+    def test_video_without_ffmpeg_uses_single_file(self):
+        """測試無 FFmpeg 時影片改用不需合併的格式"""
+        options = self._options(Capabilities(), DOWNLOAD_TYPE_VIDEO, "720p")
+        self.assertEqual(options["format"], "best[height<=720]")
+        self.assertNotIn("merge_output_format", options)
+
+    def test_audio_prefers_stream_copy_source(self):
+        """測試音訊優先選擇可直接複製的來源格式"""
+        capabilities = Capabilities(
+            ffmpeg_path="/usr/bin/ffmpeg", ffmpeg_version="6.1", encoders=frozenset({"aac"})
+        )
+        options = self._options(capabilities, DOWNLOAD_TYPE_AUDIO, "M4A (高品質)")
+        self.assertEqual(options["format"], "bestaudio[ext=m4a]/bestaudio/best")
+        self.assertEqual(options["ffmpeg_location"], "/usr/bin/ffmpeg")
+
+    def test_audio_missing_encoder_fails_early(self):
+        """測試缺少編碼器時在下載前失敗"""
+        capabilities = Capabilities(ffmpeg_version="6.1", encoders=frozenset({"aac"}))
+        with self.assertRaises(RuntimeError):
+            self._options(capabilities, DOWNLOAD_TYPE_AUDIO, "MP3 (192kbps)")
+
+    def test_audio_without_ffmpeg_fails_early(self):
+        """測試無 FFmpeg 時音訊下載在下載前失敗"""
+        with self.assertRaises(RuntimeError):
+            self._options(Capabilities(), DOWNLOAD_TYPE_AUDIO, "MP3 (192kbps)")
+
+
+if __name__ == '__main__':
+    unittest.main()
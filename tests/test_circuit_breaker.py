@@ -0,0 +1,239 @@
+"""
+網站斷路器測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.batch_downloader import BatchDownloadManager, TaskStatus
+from core.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    breaker_from_env,
+    circuit_key,
+    is_site_failure,
+)
+from core.constants import DOWNLOAD_TYPE_VIDEO, ERROR_MESSAGES
+from core.downloader import DownloadManager
+from core.fake_engine import FakeEngine
+from core.task_store import SQLiteTaskStore
+from core.worker import DownloadWorker, build_initial_state, build_job_payload
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """斷路器狀態轉換測試"""
+
+    def setUp(self):
+        self.clock = _Clock()
+        self.breaker = CircuitBreaker(failure_ratio=0.5, min_requests=4, window=60, cooldown=30,
+                                      max_cooldown=100, clock=self.clock)
+
+    def _trip(self, key="site.test"):
+        for _ in range(4):
+            self.breaker.record(key, False, "HTTP Error 403: Forbidden")
+
+    def test_opens_after_failure_ratio(self):
+        """測試失敗比例達門檻且結果數足夠時開啟"""
+        self.breaker.record("site.test", True)
+        self.breaker.record("site.test", False, "HTTP Error 503")
+        self.breaker.record("site.test", True)
+        self.assertEqual(self.breaker.state("site.test"), STATE_CLOSED)
+        self.breaker.record("site.test", False, "HTTP Error 503")
+        self.assertEqual(self.breaker.state("site.test"), STATE_OPEN)
+        self.assertFalse(self.breaker.allow("site.test"))
+        self.assertTrue(self.breaker.allow("other.test"))
+        self.assertEqual(self.breaker.retry_after("site.test"), 30)
+
+    def test_old_results_leave_window(self):
+        """測試超出統計視窗的失敗不計入"""
+        for _ in range(3):
+            self.breaker.record("site.test", False, "timeout")
+        self.clock.now += 61
+        self.breaker.record("site.test", False, "timeout")
+        self.assertEqual(self.breaker.state("site.test"), STATE_CLOSED)
+
+    def test_half_open_probe(self):
+        """測試冷卻後只放行一個試探，失敗時加倍冷卻，成功時關閉"""
+        self._trip()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.ready("site.test"))
+        self.assertTrue(self.breaker.allow("site.test"))
+        self.assertEqual(self.breaker.state("site.test"), STATE_HALF_OPEN)
+        self.assertFalse(self.breaker.allow("site.test"))
+        self.assertFalse(self.breaker.ready("site.test"))
+
+        self.breaker.record("site.test", False, "HTTP Error 403")
+        self.assertEqual(self.breaker.retry_after("site.test"), 60)
+        self.clock.now += 60
+        self.assertTrue(self.breaker.allow("site.test"))
+        self.breaker.record("site.test", True)
+        self.assertEqual(self.breaker.state("site.test"), STATE_CLOSED)
+        self.assertEqual(self.breaker.snapshot()[0]["trips"], 2)
+
+    def test_item_errors_and_cancellation_do_not_count(self):
+        """測試單一影片的錯誤與取消不影響斷路器，試探名額交給下一個任務"""
+        for _ in range(4):
+            self.breaker.record("site.test", False, "ERROR: Private video")
+        self.assertEqual(self.breaker.state("site.test"), STATE_CLOSED)
+
+        self._trip()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow("site.test"))
+        self.breaker.release("site.test")
+        self.assertTrue(self.breaker.allow("site.test"))
+
+    def test_item_error_messages(self):
+        """測試程式產生的本機與單一影片錯誤訊息不視為網站異常"""
+        messages = [
+            ERROR_MESSAGES['invalid_clip_range'],
+            ERROR_MESSAGES['disk_space_error'],
+            ERROR_MESSAGES['permission_error'],
+            ERROR_MESSAGES['encoder_not_found'].format(encoder="libopus", codec="opus"),
+            ERROR_MESSAGES['verification_failed'].format(reason="檔案大小不符"),
+        ]
+        for message in messages:
+            self.assertFalse(is_site_failure(f"下載失敗: {message}"), message)
+        self.assertTrue(is_site_failure("HTTP Error 429: Too Many Requests"))
+
+    def test_keys_and_env(self):
+        """測試依主機名稱分組與環境變數設定"""
+        self.assertEqual(circuit_key("https://www.youtube.com/watch?v=1"), "youtube.com")
+        self.assertEqual(circuit_key("https://youtu.be/1"), "youtube.com")
+        self.assertEqual(circuit_key("https://m.bilibili.com/video/1"), "bilibili.com")
+        with mock.patch.dict(os.environ, {"CIRCUIT_BREAKER_FAILURE_RATIO": "0"}):
+            self.assertIsNone(breaker_from_env())
+        with mock.patch.dict(os.environ, {"CIRCUIT_BREAKER_MIN_REQUESTS": "9"}):
+            self.assertEqual(breaker_from_env().min_requests, 9)
+
+
+class TestBatchParking(unittest.TestCase):
+    """批次下載在斷路器開啟時擱置任務（模擬引擎）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch("core.downloader.get_default_engine",
+                             return_value=FakeEngine(size=4096, speed=0, progress_steps=2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_broken_site_is_parked_then_resumed(self):
+        """測試異常網站的任務被擱置而非失敗，其他網站照常執行，冷卻後試探並恢復"""
+        breaker = CircuitBreaker(failure_ratio=0.5, min_requests=2, cooldown=0.2)
+        manager = BatchDownloadManager(max_retries=0, download_manager=DownloadManager(), breaker=breaker)
+        done = threading.Event()
+        manager.batch_complete_callback = lambda _summary: done.set()
+        # 前兩個任務失敗後斷路器開啟，其餘同網站任務被擱置
+        manager.add_url("https://broken.test/a?fail=download", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager.add_url("https://broken.test/b?fail=download", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        for index in range(3):
+            manager.add_url(f"https://broken.test/ok-{index}", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager.add_url("https://fine.test/video", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+
+        parked_seen = []
+        original = manager._park
+
+        def tracked(task_info, output_path):
+            parked_seen.append(task_info.url)
+            original(task_info, output_path)
+
+        manager._park = tracked
+        manager.start_batch_download()
+        self.assertTrue(done.wait(10))
+
+        statuses = [task.status for task in manager.tasks]
+        self.assertEqual(statuses[:2], [TaskStatus.FAILED, TaskStatus.FAILED])
+        self.assertTrue(all(status == TaskStatus.COMPLETED for status in statuses[2:]))
+        self.assertIn("https://broken.test/ok-0", parked_seen)
+        self.assertNotIn("https://fine.test/video", parked_seen)
+        self.assertEqual(breaker.state("broken.test"), STATE_CLOSED)
+        self.assertEqual(breaker.snapshot()[0]["parked"], 0)
+
+
+class TestWorkerParking(unittest.TestCase):
+    """共享佇列執行者擱置工作測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteTaskStore(os.path.join(self.tmp_dir.name, "tasks.db"))
+        self.clock = _Clock()
+        self.breaker = CircuitBreaker(min_requests=1, cooldown=30, clock=self.clock)
+        self.worker = DownloadWorker(self.store, worker_id="w", breaker=self.breaker,
+                                     download_manager=DownloadManager(engine=FakeEngine(size=1024)))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _submit(self, task_id, url):
+        payload = build_job_payload(url, DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        self.store.create_task(task_id, build_initial_state(task_id, payload))
+        self.store.enqueue_job(task_id, payload)
+
+    def test_park_and_probe(self):
+        """測試開啟期間領取的工作標記為擱置並交還佇列，冷卻後由試探工作恢復"""
+        self._submit("bad", "https://site.test/bad?fail=extract")
+        self._submit("parked", "https://site.test/good")
+        self.assertEqual(self.worker._claim_and_execute().task_id, "bad")
+        self.assertEqual(self.breaker.state("site.test"), STATE_OPEN)
+
+        self.assertIsNone(self.worker._claim_and_execute())
+        self.assertEqual(self.store.get_task("parked")["status"], "parked")
+        self.assertEqual([job["task_id"] for job in self.store.list_queued_jobs()], ["parked"])
+
+        self.clock.now += 30
+        self.assertEqual(self.worker._claim_and_execute().task_id, "parked")
+        self.assertEqual(self.store.get_task("parked")["status"], "completed")
+        self.assertEqual(self.breaker.state("site.test"), STATE_CLOSED)
+
+    def test_parking_does_not_count_attempts(self):
+        """測試多次擱置的工作在執行者中斷後仍重新排入佇列，不被視為多次失去回應"""
+        self.breaker.record("site.test", False, "HTTP Error 503")
+        self._submit("parked", "https://site.test/video")
+        for _ in range(3):
+            self.assertIsNone(self.worker._claim_and_execute())
+
+        crashed = self.store.claim_job("crashed", lease_seconds=-1)
+        self.assertEqual(crashed.attempts, 1)
+        self.assertEqual(self.store.reclaim_expired(), ["parked"])
+        self.assertEqual(self.store.get_task("parked")["status"], "parked")
+
+    def test_open_circuit_does_not_hold_jobs(self):
+        """測試斷路器開啟的執行者不佔住工作，另一個執行者仍領到正常網站的工作"""
+        self.breaker.record("site.test", False, "HTTP Error 503")
+        for index in range(3):
+            self._submit(f"parked-{index}", f"https://site.test/{index}")
+        self.assertIsNone(self.worker._claim_and_execute())
+        self._submit("healthy-0", "https://other.test/0")
+        self._submit("healthy-1", "https://other.test/1")
+
+        other = DownloadWorker(self.store, worker_id="w2",
+                               download_manager=DownloadManager(engine=FakeEngine(size=1024)))
+        self.assertEqual(other._claim_and_execute().task_id, "healthy-0")
+        self.assertEqual(self.worker._claim_and_execute().task_id, "healthy-1")
+        self.assertEqual(self.store.get_task("healthy-0")["status"], "completed")
+        queued = [job["task_id"] for job in self.store.list_queued_jobs()]
+        self.assertEqual(sorted(queued), ["parked-0", "parked-1", "parked-2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
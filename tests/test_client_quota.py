@@ -0,0 +1,167 @@
+"""
+用戶端公平分配與配額測試
+"""
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.client_quota import (
+    ANONYMOUS_CLIENT,
+    ClientAuthError,
+    ClientPolicy,
+    ClientRegistry,
+    QuotaExceeded,
+    usage_day,
+)
+from core.task_store import SQLiteTaskStore
+from core.worker import DownloadWorker, build_initial_state, build_job_payload
+
+
+class _StubTask:
+    """回報 1000 bytes 後完成的下載任務"""
+
+    def __init__(self, progress_callback, complete_callback, **_):
+        self.progress_callback = progress_callback
+        self.complete_callback = complete_callback
+
+    def execute(self):
+        self.progress_callback({'status': 'downloading', 'downloaded': 600, 'total': 600})
+        self.progress_callback({'status': 'downloading', 'downloaded': 400, 'total': 400})
+        self.complete_callback("/tmp/video.mp4", {})
+        return True
+
+    def is_cancelled(self):
+        return False
+
+
+class _StubManager:
+    def create_task(self, **kwargs):
+        return _StubTask(**kwargs)
+
+    def remove_task(self, task):
+        pass
+
+
+class TestFairClaim(unittest.TestCase):
+    """共享佇列依用戶端公平領取測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteTaskStore(os.path.join(self.tmp_dir.name, "tasks.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _submit(self, task_id, client_id, weight=1.0):
+        payload = build_job_payload(f"https://example.com/{task_id}", "video", "最高畫質",
+                                    self.tmp_dir.name, client_id=client_id, client_weight=weight)
+        self.store.create_task(task_id, build_initial_state(task_id, payload))
+        self.store.enqueue_job(task_id, payload)
+
+    def test_clients_share_workers(self):
+        """測試大量送出的用戶端不會佔滿所有執行者"""
+        for index in range(10):
+            self._submit(f"bulk-{index}", "bulk")
+        self._submit("small-0", "small")
+        self._submit("small-1", "small")
+
+        claimed = [self.store.claim_job("w").task_id for _ in range(4)]
+        self.assertEqual(claimed, ["bulk-0", "small-0", "bulk-1", "small-1"])
+        self.assertEqual(self.store.count_client_jobs("bulk"), 10)
+        self.assertEqual(self.store.count_client_jobs("small"), 2)
+
+    def test_weights(self):
+        """測試權重較高的用戶端同時執行較多工作"""
+        for index in range(6):
+            self._submit(f"a-{index}", "a", weight=2.0)
+            self._submit(f"b-{index}", "b", weight=1.0)
+
+        claimed = [self.store.claim_job("w").task_id[0] for _ in range(6)]
+        self.assertEqual(claimed.count("a"), 4)
+        self.assertEqual(claimed.count("b"), 2)
+
+    def test_completed_jobs_free_share(self):
+        """測試工作完成後該用戶端的執行中數量減少"""
+        self._submit("a-0", "a")
+        self._submit("a-1", "a")
+        self._submit("b-0", "b")
+        self._submit("b-1", "b")
+        first = self.store.claim_job("w")
+        self.assertEqual(first.task_id, "a-0")
+        self.store.complete_job(first.job_id, "w")
+        self.assertEqual(self.store.claim_job("w").task_id, "a-1")
+
+
+class TestClientRegistry(unittest.TestCase):
+    """用戶端識別與配額測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteTaskStore(os.path.join(self.tmp_dir.name, "tasks.db"))
+        self.team = ClientPolicy("team-a", weight=2, max_active=2, max_bytes_per_day=1500)
+        self.registry = ClientRegistry({"secret": self.team}, ClientPolicy(ANONYMOUS_CLIENT, max_active=1))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _enqueue(self, task_id, client):
+        payload = build_job_payload(f"https://example.com/{task_id}", "video", "最高畫質",
+                                    self.tmp_dir.name, client_id=client.name)
+        self.store.create_task(task_id, build_initial_state(task_id, payload))
+        self.store.enqueue_job(task_id, payload)
+
+    def test_identify(self):
+        """測試以 API key 或 X-Client-ID 識別，無效的 key 被拒絕"""
+        self.assertEqual(self.registry.identify("secret"), self.team)
+        self.assertEqual(self.registry.identify(None, "team b!").name, "teamb")
+        self.assertEqual(self.registry.identify().name, ANONYMOUS_CLIENT)
+        with self.assertRaises(ClientAuthError):
+            self.registry.identify("wrong")
+        self.registry.require_key = True
+        with self.assertRaises(ClientAuthError):
+            self.registry.identify(None, "team-b")
+
+    def test_active_quota(self):
+        """測試同時任務數上限"""
+        self.registry.admit(self.store, self.team)
+        self._enqueue("t1", self.team)
+        self._enqueue("t2", self.team)
+        with self.assertRaises(QuotaExceeded):
+            self.registry.admit(self.store, self.team)
+
+    def test_daily_bytes_recorded_by_worker(self):
+        """測試執行者累計下載量，超過每日上限時拒絕"""
+        self._enqueue("t1", self.team)
+        worker = DownloadWorker(self.store, worker_id="w", download_manager=_StubManager())
+        self.assertTrue(worker.execute_job(self.store.claim_job("w")))
+        self.assertEqual(self.store.get_client_usage("team-a", usage_day()), 1000)
+        self.assertEqual(self.store.count_client_jobs("team-a"), 0)
+
+        self.registry.admit(self.store, self.team, estimated_size=400)
+        with self.assertRaises(QuotaExceeded) as ctx:
+            self.registry.admit(self.store, self.team, estimated_size=600)
+        self.assertGreater(ctx.exception.retry_after, 0)
+        self.assertEqual(self.registry.usage(self.store, self.team)["bytes_today"], 1000)
+
+    def test_from_env(self):
+        """測試由環境變數讀取用戶端設定"""
+        config = {"k1": {"name": "team-a", "weight": 3, "max_bytes_per_day": "1G"}}
+        with mock.patch.dict(os.environ, {"WEB_CLIENTS": json.dumps(config), "WEB_CLIENT_MAX_ACTIVE": "5"}):
+            registry = ClientRegistry.from_env()
+        policy = registry.identify("k1")
+        self.assertEqual((policy.name, policy.weight, policy.max_active), ("team-a", 3.0, 5))
+        self.assertEqual(policy.max_bytes_per_day, 1024 ** 3)
+        self.assertEqual(registry.default.max_active, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+時間範圍片段下載測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.batch_downloader import BatchDownloadManager
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadManager, DownloadTask
+from core.engine import DownloadRequest, YoutubeDLPool, YtDlpEngine
+from core.fake_engine import FakeEngine
+from utils.capabilities import Capabilities
+
+MIB = 1024 * 1024
+
+
+class TestClipDownload(unittest.TestCase):
+    """片段下載流程測試（模擬引擎）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = FakeEngine(size=4 * MIB, duration=60, write_files=True)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_clip_downloads_range_and_reports_savings(self):
+        """測試只下載指定範圍並回報節省的傳輸量"""
+        completed = []
+        task = DownloadTask("https://fake.test/live", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            complete_callback=lambda path, info: completed.append((path, info)),
+                            engine=self.engine, start_time=15, end_time=30)
+
+        self.assertTrue(task.execute())
+        path, info = completed[0]
+        self.assertTrue(path.endswith("fake-live_15s-30s.mp4"))
+        self.assertEqual(os.path.getsize(path), MIB)
+        self.assertEqual(task.bandwidth_saved, 3 * MIB)
+        self.assertEqual(info['bandwidth_saved'], 3 * MIB)
+
+    def test_invalid_range_rejected(self):
+        """測試結束時間早於開始時間時失敗"""
+        errors = []
+        task = DownloadTask("https://fake.test/live", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            error_callback=errors.append, engine=self.engine, start_time=30, end_time=10)
+
+        self.assertFalse(task.execute())
+        self.assertIn("結束時間", errors[0])
+
+    def test_batch_passes_range_and_sums_savings(self):
+        """測試批次下載套用時間範圍並彙總節省量"""
+        manager = BatchDownloadManager(max_retries=0)
+        manager.download_manager = DownloadManager(engine=self.engine)
+        manager.add_urls_from_text("https://fake.test/a,https://fake.test/b", DOWNLOAD_TYPE_VIDEO,
+                                   "最高畫質", self.tmp_dir.name, start_time=0, end_time=30)
+        manager.is_running = True
+        manager._worker_loop()
+
+        summary = manager.get_task_summary()
+        self.assertEqual(summary['completed'], 2)
+        self.assertEqual(summary['bandwidth_saved'], 4 * MIB)
+
+
+class TestClipOptions(unittest.TestCase):
+    """片段下載的 yt-dlp 選項測試"""
+
+    def _options(self, capabilities, **times):
+        request = DownloadRequest("https://example.com/v", DOWNLOAD_TYPE_VIDEO, "/tmp", "720p", **times)
+        with mock.patch("core.engine.get_capabilities", return_value=capabilities):
+            return YtDlpEngine(pool_size=0).build_options(request)
+
+    def test_clip_maps_to_download_ranges(self):
+        """測試時間範圍轉為 download_ranges 並在切點插入關鍵影格"""
+        capabilities = Capabilities(ffmpeg_path="/usr/bin/ffmpeg", ffmpeg_version="6.1")
+        options = self._options(capabilities, start_time=90, end_time=120)
+        ranges = list(options['download_ranges']({}, None))
+
+        self.assertEqual(ranges, [{'start_time': 90, 'end_time': 120}])
+        self.assertTrue(options['force_keyframes_at_cuts'])
+        self.assertTrue(options['outtmpl'].endswith("_90s-120s.%(ext)s"))
+        # 片段設定不影響實例分組，可與完整下載共用同一個 YoutubeDL
+        self.assertEqual(YoutubeDLPool.make_key(options), YoutubeDLPool.make_key(self._options(capabilities)))
+
+    def test_clip_without_ffmpeg_fails_early(self):
+        """測試無 FFmpeg 時片段下載在下載前失敗"""
+        with self.assertRaises(RuntimeError):
+            self._options(Capabilities(), start_time=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
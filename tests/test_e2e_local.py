@@ -0,0 +1,63 @@
+"""
+本機媒體伺服器端到端測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+# 添加 src 與 benchmarks 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadTask
+from media_server import MediaServer
+
+MIB = 1024 * 1024
+
+
+class TestLocalMediaDownload(unittest.TestCase):
+    """透過本機媒體伺服器離線下載"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MediaServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _download(self, url):
+        errors = []
+        task = DownloadTask(url, DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質", error_callback=errors.append)
+        self.assertTrue(task.execute(), errors)
+        return task
+
+    def test_progressive_resumes_after_dropped_connection(self):
+        """測試連線中斷後以 Range 續傳完成下載"""
+        drops_before = self.server.drops
+        task = self._download(self.server.progressive_url("flaky", 2 * MIB, drop_every=MIB + 1))
+
+        self.assertEqual(os.path.getsize(task.downloaded_file), 2 * MIB)
+        self.assertGreater(self.server.drops, drops_before)
+        self.assertEqual(set(task.timings), {"extract", "download", "postprocess", "convert", "verify", "upload"})
+
+    def test_segmented_manifests(self):
+        """測試 HLS 與 DASH 片段下載"""
+        hls = self._download(self.server.hls_url("hls", 3, 64 * 1024))
+        self.assertEqual(os.path.getsize(hls.downloaded_file), 3 * 64 * 1024)
+
+        dash = self._download(self.server.dash_url("dash", 3, 64 * 1024))
+        self.assertGreaterEqual(os.path.getsize(dash.downloaded_file), 3 * 64 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+下載引擎介面與模擬引擎測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+# 添加 src 與 benchmarks 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from core.batch_downloader import BatchDownloadManager
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadManager, DownloadTask
+from core.engine import DownloadRequest, YtDlpEngine, YtDlpSession, create_engine
+from core.fake_engine import FakeEngine
+from media_server import MediaServer
+
+
+class TestFakeEngine(unittest.TestCase):
+    """模擬引擎測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _task(self, url, engine, **callbacks):
+        return DownloadTask(url, DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質", engine=engine, **callbacks)
+
+    def test_download_reports_progress_and_writes_file(self):
+        """測試模擬下載回報進度並建立指定大小的檔案"""
+        progress = []
+        completed = []
+        engine = FakeEngine(size=4096, progress_steps=4, write_files=True)
+        task = self._task("https://fake.test/clip", engine,
+                          progress_callback=progress.append,
+                          complete_callback=lambda path, info: completed.append(path))
+
+        self.assertTrue(task.execute())
+        self.assertEqual([p['downloaded'] for p in progress if p['status'] == 'downloading'],
+                         [1024, 2048, 3072, 4096])
+        self.assertEqual(os.path.getsize(completed[0]), 4096)
+        self.assertEqual(task.result['extractor_key'], 'Fake')
+
+    def test_failure_injection_is_deterministic(self):
+        """測試相同 seed 與 URL 的失敗結果固定"""
+        urls = [f"https://fake.test/v{i}" for i in range(200)]
+        first = [FakeEngine(failure_rate=0.3, seed=7).failure_for(url) for url in urls]
+        second = [FakeEngine(failure_rate=0.3, seed=7).failure_for(url) for url in urls]
+
+        self.assertEqual(first, second)
+        self.assertTrue(40 < first.count("download") < 80)
+
+    def test_url_parameters_override_engine(self):
+        """測試以 URL 參數指定失敗階段"""
+        errors = []
+        task = self._task("https://fake.test/v?fail=postprocess", FakeEngine(),
+                          error_callback=errors.append)
+
+        self.assertFalse(task.execute())
+        self.assertIn("後處理", errors[0])
+
+    def test_cancel_interrupts_slow_download(self):
+        """測試取消會立即中止等待中的模擬下載"""
+        task = self._task("https://fake.test/slow", FakeEngine(size=10 * 1024 * 1024, speed=1024))
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(ok=task.execute()))
+        thread.start()
+        time.sleep(0.2)
+
+        started = time.monotonic()
+        task.cancel()
+        thread.join(5)
+        self.assertFalse(result["ok"])
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_batch_download_at_scale(self):
+        """測試批次下載可在短時間內處理大量模擬任務"""
+        manager = BatchDownloadManager(max_retries=0)
+        manager.download_manager = DownloadManager(engine=FakeEngine(failure_rate=0.1, seed=1))
+        done = threading.Event()
+        manager.batch_complete_callback = lambda summary: done.set()
+
+        urls = ",".join(f"https://fake.test/v{i}" for i in range(200))
+        manager.add_urls_from_text(urls, DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager.start_batch_download()
+
+        self.assertTrue(done.wait(30))
+        summary = manager.get_task_summary()
+        self.assertEqual(summary["completed"] + summary["failed"], 200)
+        self.assertGreater(summary["failed"], 0)
+
+
+class TestYoutubeDLPool(unittest.TestCase):
+    """YoutubeDL 實例重複使用測試"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MediaServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = YtDlpEngine(pool_size=2)
+
+    def tearDown(self):
+        self.engine.close()
+        self.tmp_dir.cleanup()
+
+    def _download(self, name, **callbacks):
+        output_path = os.path.join(self.tmp_dir.name, name)
+        task = DownloadTask(self.server.progressive_url(name, 64 * 1024), DOWNLOAD_TYPE_VIDEO,
+                            output_path, "最高畫質", engine=self.engine, **callbacks)
+        return task, task.execute()
+
+    def test_instance_reused_with_per_task_settings(self):
+        """測試實例重複使用，且輸出路徑與進度回調依任務替換"""
+        first_progress, second_progress = [], []
+        first, ok1 = self._download("first", progress_callback=first_progress.append)
+        second, ok2 = self._download("second", progress_callback=second_progress.append)
+
+        self.assertTrue(ok1 and ok2)
+        self.assertEqual(os.path.dirname(first.downloaded_file), os.path.join(self.tmp_dir.name, "first"))
+        self.assertEqual(os.path.dirname(second.downloaded_file), os.path.join(self.tmp_dir.name, "second"))
+        self.assertTrue(first_progress and second_progress)
+        self.assertEqual(self.engine.pool.stats(), {'created': 1, 'reused': 1, 'idle': 1})
+
+    def test_failed_session_is_discarded(self):
+        """測試失敗的工作階段不放回實例池"""
+        task = DownloadTask(f"{self.server.base_url}/missing.mp4", DOWNLOAD_TYPE_VIDEO,
+                            self.tmp_dir.name, "最高畫質", engine=self.engine)
+
+        self.assertFalse(task.execute())
+        self.assertEqual(self.engine.pool.stats()['idle'], 0)
+
+
+class TestPrefetchedDownload(unittest.TestCase):
+    """以預先解析的資訊下載失敗時的重新解析條件"""
+
+    def _download(self, error):
+        from yt_dlp.utils import DownloadError
+
+        ydl = mock.Mock()
+        ydl.sanitize_info.side_effect = lambda info, **kwargs: info
+        ydl.process_ie_result.side_effect = DownloadError(error)
+        ydl.extract_info.return_value = {'id': 'fresh'}
+        ydl.prepare_filename.return_value = "/tmp/fresh.mp4"
+        request = DownloadRequest(url="https://example.com/v", download_type=DOWNLOAD_TYPE_VIDEO,
+                                  output_path="/tmp", format_option="最高畫質")
+        session = YtDlpSession(SimpleNamespace(ydl=ydl, sockets=set()), request, None)
+        return ydl, session.download({'id': 'prefetched'})
+
+    def test_expired_url_is_re_extracted(self):
+        """測試簽章網址過期（403/410）時重新解析後下載"""
+        ydl, (info, _path) = self._download("ERROR: unable to download video data: HTTP Error 403: Forbidden")
+        self.assertEqual(info, {'id': 'fresh'})
+        ydl.extract_info.assert_called_once_with("https://example.com/v", download=True)
+
+    def test_other_errors_are_not_retried(self):
+        """測試其他錯誤直接回報，不重新解析與下載"""
+        from yt_dlp.utils import DownloadError
+
+        for error in ("ERROR: [Errno 28] No space left on device", "ERROR: Postprocessing: Conversion failed!"):
+            with self.assertRaises(DownloadError):
+                self._download(error)
+
+
+class TestEngineFactory(unittest.TestCase):
+    """引擎建立測試"""
+
+    def test_create_engine_by_name(self):
+        """測試依名稱建立引擎"""
+        self.assertIsInstance(create_engine("yt-dlp"), YtDlpEngine)
+        self.assertIsInstance(create_engine("fake", size=10), FakeEngine)
+        with self.assertRaises(ValueError):
+            create_engine("unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+輸出檔名保留測試
+"""
+
+import errno
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.naming import NameIndex
+
+
+class TestNameIndex(unittest.TestCase):
+    """檔名保留索引測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.tmp_dir.name, "work")
+        self.output = os.path.join(self.tmp_dir.name, "output")
+        os.makedirs(self.source_dir)
+        os.makedirs(self.output)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _source(self, index, data=b"data"):
+        path = os.path.join(self.source_dir, f"src-{index}.mp4")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_concurrent_moves_get_unique_names(self):
+        """測試多個執行緒同時移入同名檔案時不互相覆寫"""
+        names = NameIndex()
+        sources = [self._source(i, data=str(i).encode()) for i in range(40)]
+        barrier = threading.Barrier(len(sources))
+        results = []
+
+        def worker(path):
+            barrier.wait()
+            results.append(names.move(path, self.output, "影片.mp4"))
+
+        threads = [threading.Thread(target=worker, args=(path,)) for path in sources]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(results)), 40)
+        self.assertEqual(len(os.listdir(self.output)), 40)
+        contents = set()
+        for path in results:
+            with open(path, "rb") as f:
+                contents.add(f.read())
+        self.assertEqual(len(contents), 40)
+
+    def test_suffix_counter_avoids_probing(self):
+        """測試同名檔案很多時直接使用下一個後綴，不逐一探測檔案系統"""
+        for i in range(100):
+            open(os.path.join(self.output, f"clip_{i}.mp4" if i else "clip.mp4"), "wb").close()
+        names = NameIndex()
+        names.move(self._source(0), self.output, "clip.mp4")
+
+        with mock.patch("core.naming.os.link", wraps=os.link) as link:
+            target = names.move(self._source(1), self.output, "clip.mp4")
+        self.assertEqual(os.path.basename(target), "clip_101.mp4")
+        self.assertEqual(link.call_count, 1)
+
+    def test_external_file_skipped(self):
+        """測試索引建立後其他程式建立的同名檔案不會被覆寫"""
+        names = NameIndex()
+        first = names.move(self._source(0), self.output, "a.mp4")
+        with open(os.path.join(self.output, "a_1.mp4"), "wb") as f:
+            f.write(b"external")
+
+        second = names.move(self._source(1), self.output, "a.mp4")
+        self.assertEqual(os.path.basename(first), "a.mp4")
+        self.assertEqual(os.path.basename(second), "a_2.mp4")
+        with open(os.path.join(self.output, "a_1.mp4"), "rb") as f:
+            self.assertEqual(f.read(), b"external")
+
+    def test_without_hardlinks_does_not_overwrite(self):
+        """測試不支援硬連結（EPERM）時仍不覆寫其他程式建立的同名檔案"""
+        names = NameIndex()
+        names.move(self._source(0), self.output, "c.mp4")
+        with open(os.path.join(self.output, "c_1.mp4"), "wb") as f:
+            f.write(b"external")
+
+        def _no_link(src, dst):
+            raise PermissionError(errno.EPERM, os.strerror(errno.EPERM))
+
+        with mock.patch("core.naming.os.link", side_effect=_no_link):
+            source = self._source(1, data=b"mine")
+            target = names.move(source, self.output, "c.mp4")
+        self.assertEqual(os.path.basename(target), "c_2.mp4")
+        self.assertFalse(os.path.exists(source))
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"mine")
+        with open(os.path.join(self.output, "c_1.mp4"), "rb") as f:
+            self.assertEqual(f.read(), b"external")
+
+    def test_release_frees_name(self):
+        """測試放棄保留後檔名可再使用"""
+        names = NameIndex()
+        reserved = names.reserve(self.output, "b.mp4")
+        self.assertEqual(os.path.basename(names.reserve(self.output, "b.mp4")), "b_1.mp4")
+        names.release(reserved)
+        self.assertEqual(names.reserve(self.output, "b.mp4"), reserved)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+影片資訊預先解析測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.batch_downloader import BatchDownloadManager, TaskStatus
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadManager
+from core.engine import DownloadRequest
+from core.fake_engine import FakeEngine
+from core.prefetch import MetadataPrefetcher, signed_url_expiry
+
+
+class _CountingEngine(FakeEngine):
+    """記錄解析次數與同時解析數的模擬引擎"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock = threading.Lock()
+        self.extracts = 0
+        self.active = 0
+        self.peak = 0
+
+    def open(self, request):
+        session = super().open(request)
+        original = session.extract
+
+        def extract():
+            with self.lock:
+                self.extracts += 1
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            try:
+                return original()
+            finally:
+                with self.lock:
+                    self.active -= 1
+
+        session.extract = extract
+        return session
+
+
+def _request(url):
+    return DownloadRequest(url=url, download_type=DOWNLOAD_TYPE_VIDEO, output_path="/tmp", format_option="最高畫質")
+
+
+class TestMetadataPrefetcher(unittest.TestCase):
+    """預先解析的名額、網站上限與過期測試"""
+
+    def setUp(self):
+        self.engine = _CountingEngine(latency=0.05)
+        self.prefetch = MetadataPrefetcher(self.engine, lookahead=3, per_site=1, ttl=60)
+        self.addCleanup(self.prefetch.close)
+
+    def test_take_and_lookahead_limit(self):
+        """測試取出解析結果，且同時預先解析的任務數不超過 lookahead"""
+        for index in range(4):
+            self.prefetch.submit(index, _request(f"https://site-{index}.test/video-{index}"))
+        self.assertEqual(self.prefetch.pending(), 3)
+        self.assertEqual(self.prefetch.take(0)["id"], "video-0")
+        self.assertIsNone(self.prefetch.take(3))
+        self.assertEqual(self.prefetch.snapshot()["hits"], 1)
+        self.assertEqual(self.prefetch.snapshot()["misses"], 1)
+
+    def test_per_site_limit(self):
+        """測試同一網站同時只解析一個"""
+        for index in range(3):
+            self.prefetch.submit(index, _request(f"https://same.test/video-{index}"))
+        for index in range(3):
+            self.assertIsNotNone(self.prefetch.take(index))
+        self.assertEqual(self.engine.peak, 1)
+
+    def test_expiry(self):
+        """測試超過有效時間的結果不被使用，expire 會空出名額"""
+        prefetch = MetadataPrefetcher(self.engine, lookahead=2, per_site=2, ttl=0.01)
+        self.addCleanup(prefetch.close)
+        prefetch.submit("a", _request("https://site.test/a"))
+        prefetch.submit("b", _request("https://site.test/b"))
+        time.sleep(0.3)
+        self.assertIsNone(prefetch.take("a"))
+        prefetch.expire()
+        self.assertEqual(prefetch.pending(), 0)
+        self.assertEqual(prefetch.snapshot()["expired"], 2)
+
+    def test_take_timeout_interrupts_extraction(self):
+        """測試取用逾時時中斷進行中的解析，不與下載時的解析同時請求網站"""
+        engine = _CountingEngine(latency=5)
+        prefetch = MetadataPrefetcher(engine, lookahead=1, wait=0.1)
+        self.addCleanup(prefetch.close)
+        prefetch.submit("a", _request("https://site.test/a"))
+        while not engine.extracts:
+            time.sleep(0.01)
+        self.assertIsNone(prefetch.take("a"))
+        deadline = time.monotonic() + 2
+        while engine.active and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(engine.active, 0)
+        self.assertEqual(prefetch.snapshot()["failed"], 1)
+
+    def test_signed_url_expiry(self):
+        """測試由格式網址的 expire 參數取得到期時間"""
+        info = {"requested_formats": [
+            {"url": "https://cdn.test/v?expire=2000&sig=x"},
+            {"url": "https://cdn.test/a?expire=1500"},
+        ]}
+        self.assertEqual(signed_url_expiry(info), 1500.0)
+        self.assertIsNone(signed_url_expiry({"url": "https://cdn.test/v"}))
+
+
+class TestBatchPrefetch(unittest.TestCase):
+    """批次下載搭配預先解析（模擬引擎）"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_downloads_use_prefetched_info(self):
+        """測試下載時使用預先解析的結果（每個網址只解析一次），並補上預估大小"""
+        engine = _CountingEngine(size=64 * 1024, speed=512 * 1024, latency=0.05, progress_steps=2)
+        prefetch = MetadataPrefetcher(lookahead=2)
+        manager = BatchDownloadManager(max_retries=0, download_manager=DownloadManager(engine=engine),
+                                       prefetch=prefetch)
+        self.addCleanup(prefetch.close)
+        done = threading.Event()
+        manager.batch_complete_callback = lambda _summary: done.set()
+        for index in range(4):
+            manager.add_url(f"https://fake.test/video-{index}", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager.start_batch_download()
+        self.assertTrue(done.wait(10))
+
+        self.assertTrue(all(task.status == TaskStatus.COMPLETED for task in manager.tasks))
+        self.assertIs(prefetch.engine, engine)
+        self.assertEqual(engine.extracts, 4)
+        self.assertEqual(prefetch.snapshot()["hits"], 3)
+        self.assertEqual([task.estimated_size for task in manager.tasks[1:]], [64 * 1024] * 3)
+        self.assertEqual(prefetch.pending(), 0)
+
+    def test_clear_tasks_drops_prefetch(self):
+        """測試清除任務時丟棄預先解析，舊任務的索引不影響之後的任務"""
+        engine = _CountingEngine(latency=0.05)
+        prefetch = MetadataPrefetcher(engine, lookahead=2)
+        self.addCleanup(prefetch.close)
+        manager = BatchDownloadManager(download_manager=DownloadManager(engine=engine), prefetch=prefetch)
+        manager.add_url("https://fake.test/old", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        prefetch.submit(0, _request("https://fake.test/old"))
+        manager.clear_tasks()
+        self.assertEqual(prefetch.pending(), 0)
+
+        prefetch.submit(5, _request("https://fake.test/stale"))
+        manager.add_url("https://fake.test/new", DOWNLOAD_TYPE_VIDEO, "最高畫質", self.tmp_dir.name)
+        manager._prefetch_ahead()
+        self.assertEqual(prefetch.handles(), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+行程隔離執行模式測試
+"""
+
+import unittest
+import sys
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.bandwidth import BandwidthBudget
+from core.downloader import DownloadManager
+from core.fake_engine import FakeEngine
+from core.process_executor import ProcessDownloadTask
+
+
+class TestProcessExecution(unittest.TestCase):
+    """行程隔離執行模式測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manager = DownloadManager(execution_mode="process", max_processes=1)
+        self.errors = []
+
+    def tearDown(self):
+        self.manager.shutdown()
+        self.tmp_dir.cleanup()
+
+    def _create_task(self, url):
+        return self.manager.create_task(
+            url=url,
+            download_type="video",
+            output_path=self.tmp_dir.name,
+            format_option="最高畫質",
+            error_callback=self.errors.append,
+        )
+
+    def test_error_relayed_from_worker_process(self):
+        """測試工作行程中的錯誤會傳回主行程，且行程可重複使用"""
+        task = self._create_task("not_a_url")
+        self.assertIsInstance(task, ProcessDownloadTask)
+        self.assertFalse(task.execute())
+        self.assertEqual(len(self.errors), 1)
+
+        self.assertFalse(self._create_task("still_not_a_url").execute())
+        self.assertEqual(len(self.errors), 2)
+
+    def test_cancel_kills_hung_extraction(self):
+        """測試解析階段卡住時取消會終止工作行程"""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+        try:
+            task = self._create_task(f"http://127.0.0.1:{port}/video.mp4")
+            result = {}
+            thread = threading.Thread(target=lambda: result.update(ok=task.execute()))
+            thread.start()
+
+            time.sleep(2)
+            cancelled_at = time.monotonic()
+            task.cancel()
+            thread.join(5)
+
+            self.assertFalse(thread.is_alive())
+            self.assertLess(time.monotonic() - cancelled_at, 3)
+            self.assertFalse(result["ok"])
+        finally:
+            server.close()
+
+    def test_bandwidth_allocated_by_parent_budget(self):
+        """測試工作行程依主行程預算分配的速率限速，結束後移除額度"""
+        budget = BandwidthBudget(rate=100 * 1024)
+        manager = DownloadManager(execution_mode="process", max_processes=1, bandwidth=budget)
+        self.addCleanup(manager.shutdown)
+        started = []
+        with mock.patch.dict(os.environ, {"DOWNLOAD_ENGINE": "fake"}):
+            task = manager.create_task(
+                url="https://fake.test/video?size=40960",
+                download_type="video",
+                output_path=self.tmp_dir.name,
+                format_option="最高畫質",
+                progress_callback=lambda data: started.append(time.monotonic()),
+            )
+            self.assertTrue(task.execute())
+        self.assertGreaterEqual(time.monotonic() - started[0], 0.25)
+        self.assertEqual(budget._shares, [])
+
+
+    def test_rejects_settings_not_sent_to_worker(self):
+        """測試指定無法傳給工作行程的引擎或儲存後端時直接拒絕，而非默默忽略"""
+        manager = DownloadManager(execution_mode="process", max_processes=1, engine=FakeEngine())
+        self.addCleanup(manager.shutdown)
+        with self.assertRaises(ValueError):
+            manager.create_task(url="https://fake.test/video", download_type="video",
+                                output_path=self.tmp_dir.name, format_option="最高畫質")
+        self.assertEqual(manager.active_tasks, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+下載佇列排程測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from queue import Empty
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.batch_downloader import BatchDownloadManager
+from core.constants import PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, SCHEDULER_AGING_SECONDS
+from core.scheduler import PriorityTaskQueue, estimate_seconds
+from core.task_store import SQLiteTaskStore
+from core.worker import build_initial_state, build_job_payload
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPriorityTaskQueue(unittest.TestCase):
+    """行程內優先權佇列測試"""
+
+    def setUp(self):
+        self.clock = _Clock()
+
+    def _drain(self, queue):
+        items = []
+        while True:
+            try:
+                items.append(queue.get_nowait())
+            except Empty:
+                return items
+
+    def test_priority_then_arrival_order(self):
+        """測試優先權高者先出，同優先權依加入順序"""
+        queue = PriorityTaskQueue(clock=self.clock)
+        queue.put("batch-1", priority=PRIORITY_BATCH)
+        queue.put("normal-1")
+        queue.put("batch-2", priority=PRIORITY_BATCH)
+        queue.put("interactive", priority=PRIORITY_INTERACTIVE)
+        queue.put("normal-2")
+        self.assertEqual(self._drain(queue), ["interactive", "normal-1", "normal-2", "batch-1", "batch-2"])
+
+    def test_aging_prevents_starvation(self):
+        """測試等待夠久的低優先權項目排在新加入的高優先權項目之前"""
+        queue = PriorityTaskQueue(clock=self.clock)
+        queue.put("old-low", priority=PRIORITY_NORMAL)
+        self.clock.now += SCHEDULER_AGING_SECONDS + 1
+        queue.put("new-high", priority=PRIORITY_NORMAL + 1)
+        self.assertEqual(self._drain(queue), ["old-low", "new-high"])
+
+    def test_shortest_job_first(self):
+        """測試短任務優先，且延後量有上限"""
+        queue = PriorityTaskQueue(sjf=True, clock=self.clock)
+        queue.put("long", cost_seconds=estimate_seconds(duration=3 * 3600))
+        queue.put("unknown")
+        queue.put("short", cost_seconds=estimate_seconds(duration=60))
+        self.assertEqual(self._drain(queue), ["unknown", "short", "long"])
+
+    def test_reprioritize_move_and_remove(self):
+        """測試以 handle 調整優先權、移到最前面與移除"""
+        queue = PriorityTaskQueue(clock=self.clock)
+        for index in range(4):
+            queue.put(f"task-{index}", handle=index)
+        self.assertTrue(queue.move_to_front(3))
+        self.assertTrue(queue.reprioritize(2, PRIORITY_INTERACTIVE))
+        self.assertTrue(queue.remove(0))
+        self.assertFalse(queue.reprioritize(0, PRIORITY_INTERACTIVE))
+        self.assertEqual([entry["handle"] for entry in queue.snapshot()], [2, 3, 1])
+        self.assertEqual(queue.qsize(), 3)
+        self.assertEqual(self._drain(queue), ["task-2", "task-3", "task-1"])
+        self.assertFalse(queue.move_to_front(1))
+
+    def test_move_to_front_survives_later_updates(self):
+        """測試移到最前面後再更新預估秒數或優先權，項目仍在最前面"""
+        queue = PriorityTaskQueue(sjf=True, clock=self.clock)
+        for index in range(3):
+            queue.put(f"task-{index}", handle=index)
+        self.assertTrue(queue.move_to_front(2))
+        self.assertTrue(queue.set_cost(2, estimate_seconds(duration=3 * 3600)))
+        self.assertTrue(queue.reprioritize(2, PRIORITY_BATCH))
+        self.assertEqual(self._drain(queue), ["task-2", "task-0", "task-1"])
+
+    def test_size_counter_after_invalidations(self):
+        """測試取代、調整、移除與取出後 qsize/empty 與實際有效項目一致"""
+        queue = PriorityTaskQueue(clock=self.clock)
+        for index in range(200):
+            queue.put(f"task-{index}", handle=index)
+        queue.put("task-0-again", handle=0)
+        self.assertEqual(queue.qsize(), 200)
+
+        for index in range(0, 200, 2):
+            queue.reprioritize(index, PRIORITY_INTERACTIVE)
+            queue.set_cost(index, 5.0)
+        self.assertTrue(queue.move_to_front(199))
+        self.assertEqual(queue.qsize(), 200)
+        for index in range(100, 199):
+            queue.remove(index)
+        self.assertEqual(queue.qsize(), 101)
+        self.assertEqual(queue.get(timeout=0), "task-199")
+        self.assertEqual(queue.qsize(), len(queue.snapshot()))
+
+        self.assertEqual(len(self._drain(queue)), 100)
+        self.assertEqual(queue.qsize(), 0)
+        self.assertTrue(queue.empty())
+        self.assertFalse(queue.move_to_front(0))
+
+    def test_estimate_seconds_for_clip(self):
+        """測試片段下載只計算範圍內的比例"""
+        full = estimate_seconds(estimated_size=100 * 1024 * 1024, duration=600)
+        clip = estimate_seconds(estimated_size=100 * 1024 * 1024, duration=600, start_time=0, end_time=60)
+        self.assertAlmostEqual(clip, full / 10)
+        self.assertIsNone(estimate_seconds())
+
+
+class TestStoreScheduling(unittest.TestCase):
+    """共享佇列依排序鍵領取測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "tasks.db")
+        self.store = SQLiteTaskStore(self.db_path, sjf=True)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _submit(self, task_id, **options):
+        payload = build_job_payload(f"https://example.com/{task_id}", "video", "最高畫質",
+                                    self.tmp_dir.name, **options)
+        self.store.create_task(task_id, build_initial_state(task_id, payload))
+        self.store.enqueue_job(task_id, payload)
+
+    def _claim_all(self):
+        claimed = []
+        while True:
+            job = self.store.claim_job("w")
+            if job is None:
+                return claimed
+            claimed.append(job.task_id)
+
+    def test_claim_order(self):
+        """測試依優先權與預估長度領取"""
+        self._submit("batch-long", priority=PRIORITY_BATCH, duration=7200)
+        self._submit("batch-short", priority=PRIORITY_BATCH, duration=30)
+        self._submit("interactive", priority=PRIORITY_INTERACTIVE)
+        self.assertEqual(self._claim_all(), ["interactive", "batch-short", "batch-long"])
+
+    def test_reprioritize_and_move(self):
+        """測試調整優先權與移到最前面，已領取的工作無法調整"""
+        for task_id in ("a", "b", "c"):
+            self._submit(task_id)
+        self.assertTrue(self.store.reprioritize_job("c", PRIORITY_INTERACTIVE))
+        self.assertTrue(self.store.move_job_to_front("b"))
+        self.assertEqual([job["task_id"] for job in self.store.list_queued_jobs()], ["b", "c", "a"])
+        self.assertEqual(self.store.get_task("c")["priority"], PRIORITY_INTERACTIVE)
+
+        job = self.store.claim_job("w")
+        self.assertEqual(job.task_id, "b")
+        self.assertFalse(self.store.reprioritize_job("b", PRIORITY_BATCH))
+        self.assertFalse(self.store.move_job_to_front("missing"))
+        self.assertEqual(self._claim_all(), ["c", "a"])
+
+
+class TestBatchPriority(unittest.TestCase):
+    """批次下載佇列調整測試"""
+
+    def test_set_priority_and_move_to_front(self):
+        """測試批次任務的優先權調整與排隊順序"""
+        manager = BatchDownloadManager()
+        for index in range(3):
+            manager.add_url(f"https://example.com/{index}", "video", "最高畫質", "/tmp")
+        self.assertTrue(manager.set_priority(2, PRIORITY_INTERACTIVE))
+        self.assertTrue(manager.move_to_front(1))
+        self.assertEqual([task.index for task in manager.get_queue_order()], [1, 2, 0])
+        self.assertEqual(manager.tasks[2].priority, PRIORITY_INTERACTIVE)
+        self.assertFalse(manager.set_priority(5, PRIORITY_INTERACTIVE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+下載暫存區測試
+"""
+
+import unittest
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadTask
+from core.fake_engine import FakeEngine
+from core.staging import StagingArea, finalize
+
+KIB = 1024
+
+
+class TestStagingArea(unittest.TestCase):
+    """暫存區容量與檔案搬移測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.staging_root = os.path.join(self.tmp_dir.name, "staging")
+        self.output = os.path.join(self.tmp_dir.name, "output")
+        os.makedirs(self.output)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _staged_file(self, area, name="video.mp4", data=b"data"):
+        slot = area.open_slot()
+        path = os.path.join(slot.path, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return slot, path
+
+    def test_reserve_waits_for_capacity(self):
+        """測試超過容量上限時等待其他任務釋放"""
+        area = StagingArea(self.staging_root, max_bytes=100)
+        first = area.open_slot()
+        self.assertTrue(first.reserve(40))
+
+        second = area.open_slot()
+        reserved = threading.Event()
+        waiter = threading.Thread(target=lambda: second.reserve(40) and reserved.set())
+        waiter.start()
+        self.assertFalse(reserved.wait(0.2))
+
+        first.release()
+        self.assertTrue(reserved.wait(2))
+        waiter.join()
+        self.assertFalse(os.path.exists(first.path))
+        self.assertEqual(area.reserved, 80)
+
+    def test_oversized_file_allowed_when_idle(self):
+        """測試暫存區沒有其他預留時放行超過上限的檔案"""
+        area = StagingArea(self.staging_root, max_bytes=100)
+        slot = area.open_slot()
+        self.assertTrue(slot.reserve(500))
+        slot.release()
+        self.assertEqual(area.reserved, 0)
+
+    def test_cancelled_wait(self):
+        """測試等待容量期間取消"""
+        area = StagingArea(self.staging_root, max_bytes=100)
+        area.open_slot().reserve(40)
+        cancelled = threading.Event()
+        cancelled.set()
+        self.assertFalse(area.open_slot().reserve(40, cancelled))
+
+    def test_finalize_does_not_overwrite(self):
+        """測試目標檔名已存在時加上後綴"""
+        with open(os.path.join(self.output, "video.mp4"), "wb") as f:
+            f.write(b"old")
+        _slot, path = self._staged_file(StagingArea(self.staging_root))
+
+        final = finalize(path, self.output)
+        self.assertEqual(final, os.path.join(self.output, "video_1.mp4"))
+        self.assertFalse(os.path.exists(path))
+        with open(os.path.join(self.output, "video.mp4"), "rb") as f:
+            self.assertEqual(f.read(), b"old")
+
+    def test_finalize_across_filesystems(self):
+        """測試跨檔案系統時先複製為隱藏暫存檔再改名"""
+        _slot, path = self._staged_file(StagingArea(self.staging_root), data=b"x" * KIB)
+
+        with mock.patch("core.staging.same_filesystem", return_value=False), \
+                mock.patch("core.staging.shutil.copyfile", wraps=shutil.copyfile) as copyfile:
+            final = finalize(path, self.output)
+
+        copy_target = copyfile.call_args[0][1]
+        self.assertTrue(os.path.basename(copy_target).startswith(".video.mp4."))
+        self.assertEqual(os.listdir(self.output), ["video.mp4"])
+        self.assertFalse(os.path.exists(path))
+        with open(final, "rb") as f:
+            self.assertEqual(f.read(), b"x" * KIB)
+
+    def test_cleanup_orphans(self):
+        """測試清除已結束行程遺留的工作目錄"""
+        child = subprocess.Popen([sys.executable, "-c", "pass"])
+        child.wait()
+        orphan = os.path.join(self.staging_root, f"{child.pid}-dead")
+        os.makedirs(orphan)
+
+        area = StagingArea(self.staging_root)
+        self.assertFalse(os.path.exists(orphan))
+        area.open_slot()
+        self.assertEqual(len(os.listdir(self.staging_root)), 1)
+
+
+class TestStagedDownload(unittest.TestCase):
+    """下載任務經由暫存區輸出測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.staging = StagingArea(os.path.join(self.tmp_dir.name, "staging"))
+        self.output = os.path.join(self.tmp_dir.name, "output")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_output_appears_only_when_complete(self):
+        """測試下載期間輸出目錄沒有檔案，完成後才出現"""
+        seen_during_download = []
+
+        def on_progress(data):
+            seen_during_download.extend(os.listdir(self.output))
+
+        task = DownloadTask("https://fake.test/clip", DOWNLOAD_TYPE_VIDEO, self.output, "最高畫質",
+                            progress_callback=on_progress,
+                            engine=FakeEngine(size=64 * KIB, write_files=True), staging=self.staging)
+
+        self.assertTrue(task.execute())
+        self.assertEqual(seen_during_download, [])
+        self.assertEqual(task.downloaded_file, os.path.join(self.output, "fake-clip.mp4"))
+        self.assertEqual(os.path.getsize(task.downloaded_file), 64 * KIB)
+        self.assertIn("finalize", task.timings)
+        self.assertEqual(os.listdir(self.staging.root), [])
+        self.assertEqual(self.staging.reserved, 0)
+
+    def test_failed_download_leaves_nothing(self):
+        """測試失敗時清除暫存檔且輸出目錄沒有殘留"""
+        engine = FakeEngine(size=64 * KIB, write_files=True, failure_rate=1, fail_phase="postprocess")
+        task = DownloadTask("https://fake.test/broken", DOWNLOAD_TYPE_VIDEO, self.output, "最高畫質",
+                            engine=engine, staging=self.staging)
+
+        self.assertFalse(task.execute())
+        self.assertEqual(os.listdir(self.output), [])
+        self.assertEqual(os.listdir(self.staging.root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+啟動時間與延遲匯入測試
+"""
+
+import unittest
+import sys
+import os
+import subprocess
+import time
+
+# 添加 src 目錄到路徑
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+# 冷啟動耗時上限（秒），較慢的 CI 機器可用環境變數調整
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+
+
+def _import_in_subprocess(module):
+    """在新的直譯器中匯入模組，回傳 (耗時秒數, 已載入的模組集合)"""
+    code = f"import sys; import {module}; print(' '.join(sys.modules))"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return elapsed, set(result.stdout.split())
+
+
+class TestLazyImports(unittest.TestCase):
+    """延遲匯入測試"""
+
+    def test_entry_points_do_not_load_heavy_modules(self):
+        """測試入口模組匯入時不會載入 yt-dlp 與 OpenCC"""
+        for module in ("utils", "core", "core.worker", "core.batch_downloader", "ui.main_window"):
+            with self.subTest(module=module):
+                _, loaded = _import_in_subprocess(module)
+                self.assertNotIn("yt_dlp", loaded)
+                self.assertNotIn("opencc", loaded)
+
+    def test_package_exports_resolve_on_access(self):
+        """測試套件的延遲匯出仍可正常取用"""
+        import core
+        import utils
+
+        self.assertEqual(core.DownloadManager.__name__, "DownloadManager")
+        self.assertTrue(callable(utils.sanitize_filename))
+        with self.assertRaises(AttributeError):
+            utils.not_exported
+
+    def test_startup_within_budget(self):
+        """測試佇列執行者的冷啟動耗時在預算內"""
+        elapsed = min(_import_in_subprocess("core.worker")[0] for _ in range(3))
+        self.assertLess(elapsed, STARTUP_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
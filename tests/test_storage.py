@@ -0,0 +1,203 @@
+"""
+下載結果儲存後端測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadTask
+from core.fake_engine import FakeEngine
+from core.storage import LocalStorage, S3Storage, create_storage
+
+KIB = 1024
+
+
+class MemoryS3Client:
+    """以記憶體模擬 S3 API 中本模組用到的部分"""
+
+    def __init__(self, part_delay: float = 0):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.part_delay = part_delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.part_delay)
+        self.uploads[UploadId][PartNumber] = Body
+        with self._lock:
+            self.in_flight -= 1
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(Key)
+
+    def copy(self, CopySource, Bucket, Key):
+        self.objects[Key] = self.objects[CopySource["Key"]]
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+
+class TestLocalStorage(unittest.TestCase):
+    """本機儲存測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp_dir.name, "video.mp4")
+        with open(self.source, "wb") as f:
+            f.write(b"data")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_default_keeps_file_in_place(self):
+        """測試未指定根目錄時檔案留在原處，即使清理策略為刪除"""
+        location = LocalStorage(cleanup="delete").store(self.source)
+        self.assertEqual(location, os.path.abspath(self.source))
+        self.assertTrue(os.path.exists(self.source))
+
+    def test_copy_to_root_and_cleanup(self):
+        """測試複製到指定目錄並依策略刪除原檔"""
+        root = os.path.join(self.tmp_dir.name, "archive")
+        location = LocalStorage(root, cleanup="delete").store(self.source)
+        self.assertEqual(location, os.path.join(root, "video.mp4"))
+        self.assertFalse(os.path.exists(self.source))
+
+    def test_copy_to_root_keeps_existing_file(self):
+        """測試 root 中已有同名檔案時改用新檔名，不覆寫既有檔案"""
+        root = os.path.join(self.tmp_dir.name, "archive")
+        os.makedirs(root)
+        with open(os.path.join(root, "video.mp4"), "wb") as f:
+            f.write(b"earlier")
+
+        location = LocalStorage(root).store(self.source)
+        self.assertEqual(location, os.path.join(root, "video_1.mp4"))
+        with open(os.path.join(root, "video.mp4"), "rb") as f:
+            self.assertEqual(f.read(), b"earlier")
+        with open(location, "rb") as f:
+            self.assertEqual(f.read(), b"data")
+        self.assertEqual(sorted(os.listdir(root)), ["video.mp4", "video_1.mp4"])
+
+
+class TestS3Storage(unittest.TestCase):
+    """S3 相容儲存測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.client = MemoryS3Client()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_small_file_single_put(self):
+        """測試小檔案以單次上傳"""
+        storage = S3Storage("bucket", prefix="media/", part_size=64 * KIB, client=self.client)
+        location = storage.store(self._write("a.mp4", b"x" * KIB))
+        self.assertEqual(location, "s3://bucket/media/a.mp4")
+        self.assertEqual(self.client.objects["media/a.mp4"], b"x" * KIB)
+
+    def test_multipart_upload_bounds_parts_in_memory(self):
+        """測試大檔案分段上傳，同時上傳的分段數不超過上限"""
+        data = os.urandom(10 * 64 * KIB + 123)
+        self.client.part_delay = 0.01
+        storage = S3Storage("bucket", part_size=64 * KIB, max_concurrency=3, client=self.client)
+        storage.store(self._write("b.mp4", data))
+
+        self.assertEqual(self.client.objects["b.mp4"], data)
+        self.assertLessEqual(self.client.max_in_flight, 3)
+        self.assertGreater(self.client.max_in_flight, 1)
+
+    def test_eager_upload_while_downloading(self):
+        """測試下載期間先行上傳已寫入的分段，完成後補傳剩餘部分"""
+        storage = S3Storage("bucket", part_size=64 * KIB, eager_upload=True, client=self.client)
+        final_path = os.path.join(self.tmp_dir.name, "c.mp4")
+        chunks = [os.urandom(32 * KIB) for _ in range(9)]
+
+        eager = storage.begin_upload(final_path, "c.mp4")
+        eager.poll_interval = 0.01
+        with open(final_path + ".part", "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                f.flush()
+                time.sleep(0.03)
+        deadline = time.monotonic() + 2
+        while eager.uploaded_bytes < 4 * 64 * KIB and time.monotonic() < deadline:
+            time.sleep(0.01)
+        os.rename(final_path + ".part", final_path)
+
+        self.assertEqual(eager.uploaded_bytes, 4 * 64 * KIB)
+        location = storage.store(final_path, "轉換後.mp4", eager=eager)
+        self.assertEqual(location, "s3://bucket/轉換後.mp4")
+        self.assertEqual(self.client.objects, {"轉換後.mp4": b"".join(chunks)})
+
+    def test_eager_upload_discarded_when_file_rewritten(self):
+        """測試後處理改寫檔案時放棄先行上傳的分段並完整上傳"""
+        storage = S3Storage("bucket", part_size=64 * KIB, eager_upload=True, client=self.client)
+        final_path = self._write("d.mp4.part", os.urandom(128 * KIB))
+        final_path = final_path[:-len(".part")]
+
+        eager = storage.begin_upload(final_path, "d.mp4")
+        eager.poll_interval = 0.01
+        deadline = time.monotonic() + 2
+        while eager.uploaded_bytes == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        merged = self._write("d.mp4", os.urandom(96 * KIB))
+
+        storage.store(merged, eager=eager)
+        self.assertEqual(self.client.aborted, ["d.mp4"])
+        with open(merged, "rb") as f:
+            self.assertEqual(self.client.objects["d.mp4"], f.read())
+
+    def test_download_task_uploads_result(self):
+        """測試下載任務完成後上傳並刪除本機檔案"""
+        storage = S3Storage("bucket", part_size=64 * KIB, cleanup="delete", client=self.client)
+        task = DownloadTask("https://fake.test/clip", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            engine=FakeEngine(size=200 * KIB, write_files=True), storage=storage)
+
+        self.assertTrue(task.execute())
+        self.assertEqual(task.storage_uri, "s3://bucket/fake-clip.mp4")
+        self.assertEqual(len(self.client.objects["fake-clip.mp4"]), 200 * KIB)
+        self.assertFalse(os.path.exists(task.downloaded_file))
+        self.assertIn("upload", task.timings)
+
+    def test_s3_requires_bucket(self):
+        """測試未設定儲存桶時無法建立 S3 後端"""
+        with self.assertRaises(ValueError):
+            create_storage("s3", bucket="")
+
+
+if __name__ == '__main__':
+    unittest.main()
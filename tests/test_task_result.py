@@ -0,0 +1,79 @@
+"""
+精簡任務結果測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadTask
+from core.fake_engine import FakeEngine
+from core.task_result import TaskResult
+
+
+class TestTaskResult(unittest.TestCase):
+    """TaskResult 測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_from_info_keeps_used_fields_only(self):
+        """測試只保留用到的欄位，並合併選用格式的 ID"""
+        info = {
+            'id': 'abc', 'title': '影片', 'duration': 12.5, 'ext': 'mp4', 'filesize_approx': 2048,
+            'requested_formats': [{'format_id': '137'}, {'format_id': '140'}],
+            'formats': [{'format_id': str(i), 'fragments': list(range(100))} for i in range(50)],
+            'thumbnails': [{'url': 'https://example.com/t.jpg'}],
+        }
+        result = TaskResult.from_info(info)
+
+        self.assertEqual(result['format_id'], '137+140')
+        self.assertEqual(result.get('filesize'), 2048)
+        self.assertIsNone(result.raw)
+        self.assertIsNone(result.get('formats'))
+        self.assertNotIn('bandwidth_saved', result)
+        self.assertFalse(hasattr(result, '__dict__'))
+        with self.assertRaises(KeyError):
+            result['thumbnails']
+
+    def test_round_trip(self):
+        """測試序列化後可重建（工作行程傳回結果）"""
+        result = TaskResult.from_info({'id': 'x', 'title': 't', 'storage_uri': 's3://b/k'}, keep_raw=True)
+        rebuilt = TaskResult(**result.to_dict())
+        self.assertEqual(rebuilt.to_dict(), result.to_dict())
+        self.assertIsNone(rebuilt.raw)
+
+    def test_task_drops_raw_info(self):
+        """測試任務完成後不保留原始 info dict，回呼收到精簡結果"""
+        completed = []
+        task = DownloadTask("https://fake.test/long", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            complete_callback=lambda path, result: completed.append(result),
+                            engine=FakeEngine(size=4096, write_files=True, info_formats=10))
+
+        self.assertTrue(task.execute())
+        self.assertIsNone(task.info)
+        self.assertIs(completed[0], task.result)
+        self.assertEqual(task.result.filepath, task.downloaded_file)
+        self.assertEqual(task.result.filesize, 4096)
+        self.assertEqual(task.result.format_id, 'hls-9')
+
+    def test_keep_info(self):
+        """測試明確要求時保留原始 info dict"""
+        task = DownloadTask("https://fake.test/long", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            engine=FakeEngine(info_formats=3), keep_info=True)
+
+        self.assertTrue(task.execute())
+        self.assertEqual(len(task.info['formats']), 3)
+        self.assertIs(task.result.raw, task.info)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,311 @@
+"""
+任務儲存後端測試
+
+同一組行為測試分別對 SQLite 與 Redis 後端執行；Redis 使用 fakeredis（需支援 Lua，
+`pip install "fakeredis[lua]"`），或設定 TEST_REDIS_URL 指向實際的 Redis。
+"""
+
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from importlib.util import find_spec
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.constants import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from core.task_store import RedisTaskStore, SQLiteTaskStore, create_task_store
+
+# fakeredis 以 lupa 執行 Lua 腳本
+if find_spec("fakeredis") and find_spec("lupa"):
+    import fakeredis
+else:
+    fakeredis = None
+
+REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+class _TaskStoreContract:
+    """兩種後端共同的行為（子類別實作 make_store，同一測試中建立的實例共享資料）"""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+
+    def _claim_all(self, worker_id="w"):
+        claimed = []
+        while True:
+            job = self.store.claim_job(worker_id)
+            if job is None:
+                return claimed
+            claimed.append(job.task_id)
+
+    def test_task_state_roundtrip(self):
+        """測試任務狀態建立、更新與讀取"""
+        self.store.create_task("t1", {"id": "t1", "status": "pending", "progress": 0.0})
+        self.assertTrue(self.store.update_task("t1", status="downloading", progress=42.5))
+
+        state = self.store.get_task("t1")
+        self.assertEqual(state["status"], "downloading")
+        self.assertEqual(state["progress"], 42.5)
+        self.assertIsNone(self.store.get_task("missing"))
+        self.assertFalse(self.store.update_task("missing", status="failed"))
+
+    def test_state_shared_between_instances(self):
+        """測試不同實例（模擬不同 worker）可看到同一份狀態"""
+        other = self.make_store()
+        try:
+            self.store.create_task("t1", {"status": "pending"})
+            other.update_task("t1", status="completed")
+            self.assertEqual(self.store.get_task("t1")["status"], "completed")
+        finally:
+            other.close()
+
+    def test_claim_job_fifo(self):
+        """測試佇列依加入順序領取"""
+        self.store.enqueue_job("a", {"url": "https://example.com/a"})
+        self.store.enqueue_job("b", {"url": "https://example.com/b"})
+
+        first = self.store.claim_job()
+        self.assertEqual(first.task_id, "a")
+        self.assertEqual(first.payload, {"url": "https://example.com/a"})
+        self.assertEqual(self.store.claim_job().task_id, "b")
+        self.assertIsNone(self.store.claim_job())
+
+    def test_claim_job_is_exclusive(self):
+        """測試多執行緒同時領取時每個工作只會被領取一次"""
+        for i in range(50):
+            self.store.enqueue_job(f"t{i}", {})
+
+        claimed = []
+        lock = threading.Lock()
+
+        def _worker():
+            store = self.make_store()
+            try:
+                while True:
+                    job = store.claim_job()
+                    if job is None:
+                        return
+                    with lock:
+                        claimed.append(job.task_id)
+            finally:
+                store.close()
+
+        threads = [threading.Thread(target=_worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed), sorted(f"t{i}" for i in range(50)))
+
+    def test_heartbeat_requires_lease_owner(self):
+        """測試只有持有租約的執行者能延長租約"""
+        self.store.enqueue_job("t1", {})
+        job = self.store.claim_job("worker-a", lease_seconds=30)
+
+        self.assertTrue(self.store.heartbeat(job.job_id, "worker-a"))
+        self.assertFalse(self.store.heartbeat(job.job_id, "worker-b"))
+
+        self.store.complete_job(job.job_id, "worker-a")
+        self.assertFalse(self.store.heartbeat(job.job_id, "worker-a"))
+        self.assertIsNone(self.store.claim_job("worker-a"))
+
+    def test_reclaim_expired_lease(self):
+        """測試租約過期的工作會重新排入佇列並累計嘗試次數"""
+        self.store.enqueue_job("t1", {"url": "https://example.com"})
+        first = self.store.claim_job("worker-a", lease_seconds=-1)
+
+        self.assertIsNone(self.store.claim_job("worker-b"))
+        self.assertEqual(self.store.reclaim_expired(), ["t1"])
+        self.assertFalse(self.store.heartbeat(first.job_id, "worker-a"))
+
+        second = self.store.claim_job("worker-b")
+        self.assertEqual(second.task_id, "t1")
+        self.assertEqual(second.attempts, 2)
+
+    def test_reclaim_gives_up_after_max_attempts(self):
+        """測試超過嘗試上限時放棄工作並標記任務失敗"""
+        self.store.create_task("t1", {"status": "downloading"})
+        self.store.enqueue_job("t1", {})
+        self.store.claim_job("worker-a", lease_seconds=-1)
+
+        self.assertEqual(self.store.reclaim_expired(max_attempts=1), [])
+        self.assertIsNone(self.store.claim_job("worker-b"))
+        self.assertEqual(self.store.get_task("t1")["status"], "failed")
+
+    def test_release_job_requeues_immediately(self):
+        """測試交還的工作可立即被其他執行者領取，且只有持有者能交還"""
+        self.store.enqueue_job("t1", {})
+        job = self.store.claim_job("worker-a")
+        self.store.release_job(job.job_id, "worker-b")
+        self.assertIsNone(self.store.claim_job("worker-b"))
+
+        self.store.release_job(job.job_id, "worker-a")
+        self.assertEqual(self.store.claim_job("worker-b").task_id, "t1")
+
+    def test_release_with_delay(self):
+        """測試延後交還的工作排到之後加入的工作後面"""
+        self.store.enqueue_job("parked", {})
+        self.store.enqueue_job("next", {})
+        job = self.store.claim_job("w")
+        self.store.release_job(job.job_id, "w", delay=60)
+        job = self.store.claim_job("w")
+        self.assertEqual(job.task_id, "next")
+        self.store.release_job(job.job_id, "w")
+
+        self.store.enqueue_job("later", {})
+        parked = self.store.claim_job("w")
+        self.assertEqual(parked.task_id, "next")
+        self.store.complete_job(parked.job_id, "w")
+        self.assertEqual(self._claim_all(), ["later", "parked"])
+
+    def test_release_unexecuted_keeps_attempts(self):
+        """測試未執行即交還的工作不累計嘗試次數"""
+        self.store.enqueue_job("t1", {})
+        for _ in range(3):
+            job = self.store.claim_job("w")
+            self.assertEqual(job.attempts, 1)
+            self.store.release_job(job.job_id, "w", delay=10, executed=False)
+        job = self.store.claim_job("w")
+        self.store.release_job(job.job_id, "w")
+        self.assertEqual(self.store.claim_job("w").attempts, 2)
+
+    def test_priority_reprioritize_and_move(self):
+        """測試依優先權領取、調整優先權、移到最前面與列出佇列"""
+        self.store.create_task("c", {"status": "pending"})
+        self.store.enqueue_job("a", {"priority": PRIORITY_BATCH})
+        self.store.enqueue_job("b", {})
+        self.store.enqueue_job("c", {})
+        self.assertTrue(self.store.reprioritize_job("c", PRIORITY_INTERACTIVE))
+        self.assertEqual(self.store.get_task("c")["priority"], PRIORITY_INTERACTIVE)
+        self.assertTrue(self.store.move_job_to_front("a"))
+
+        queued = self.store.list_queued_jobs()
+        self.assertEqual([job["task_id"] for job in queued], ["a", "c", "b"])
+        self.assertEqual([job["position"] for job in queued], [1, 2, 3])
+        self.assertEqual(queued[1]["priority"], PRIORITY_INTERACTIVE)
+
+        self.assertEqual(self.store.claim_job("w").task_id, "a")
+        self.assertFalse(self.store.reprioritize_job("a", PRIORITY_BATCH))
+        self.assertFalse(self.store.move_job_to_front("missing"))
+        self.assertEqual(self._claim_all(), ["c", "b"])
+
+    def test_fair_claim_between_clients(self):
+        """測試依用戶端權重輪流領取，完成的工作釋出名額"""
+        for index in range(4):
+            self.store.enqueue_job(f"a-{index}", {"client_id": "a", "client_weight": 2.0})
+        for index in range(2):
+            self.store.enqueue_job(f"b-{index}", {"client_id": "b"})
+
+        jobs = [self.store.claim_job("w") for _ in range(3)]
+        self.assertEqual(sorted(job.task_id[0] for job in jobs), ["a", "a", "b"])
+        self.assertEqual(self.store.count_client_jobs("a"), 4)
+        self.assertEqual(self.store.count_client_jobs("b"), 2)
+
+        for job in jobs:
+            self.store.complete_job(job.job_id, "w")
+        self.assertEqual(self.store.count_client_jobs("a"), 2)
+        self.assertEqual(self.store.count_client_jobs("b"), 1)
+        self.assertEqual(self.store.count_client_jobs("missing"), 0)
+
+    def test_prune_finished(self):
+        """測試只清除結束超過保留時間的任務與其殘留工作"""
+        self.store.create_task("done", {"status": "completed"})
+        self.store.create_task("cancelled", {"status": "pending"})
+        self.store.update_task("cancelled", status="cancelled")
+        self.store.create_task("rerun", {"status": "failed"})
+        self.store.update_task("rerun", status="downloading")
+        self.store.enqueue_job("cancelled", {})
+        self.store.enqueue_job("rerun", {})
+        time.sleep(0.3)
+        self.store.create_task("recent", {"status": "pending"})
+        self.store.update_task("recent", status="failed")
+
+        self.assertEqual(self.store.prune_finished(ttl=0.2), 2)
+        self.assertIsNone(self.store.get_task("done"))
+        self.assertIsNone(self.store.get_task("cancelled"))
+        self.assertEqual(self.store.get_task("rerun")["status"], "downloading")
+        self.assertEqual(self.store.get_task("recent")["status"], "failed")
+        self.assertEqual(self._claim_all(), ["rerun"])
+        self.assertEqual(self.store.prune_finished(ttl=0.2), 0)
+
+    def test_client_usage(self):
+        """測試累計用戶端每日下載量"""
+        self.store.add_client_usage("a", "2024-01-01", 100)
+        self.store.add_client_usage("a", "2024-01-01", 50)
+        self.store.add_client_usage("a", "2024-01-02", 7)
+        self.assertEqual(self.store.get_client_usage("a", "2024-01-01"), 150)
+        self.assertEqual(self.store.get_client_usage("a", "2024-01-02"), 7)
+        self.assertEqual(self.store.get_client_usage("b", "2024-01-01"), 0)
+
+
+class TestSQLiteTaskStore(_TaskStoreContract, unittest.TestCase):
+    """SQLite 儲存後端測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "tasks.db")
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmp_dir.cleanup()
+
+    def make_store(self):
+        return SQLiteTaskStore(self.db_path)
+
+    def test_close_closes_connections_of_all_threads(self):
+        """測試 close 一併關閉其他執行緒建立的連線"""
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(self.store._connect()))
+        thread.start()
+        thread.join()
+        connections.append(self.store._connect())
+
+        self.store.close()
+        for conn in connections:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        self.assertIsNone(self.store.get_task("missing"))
+
+    def test_factory_rejects_unknown_backend(self):
+        """測試不支援的後端名稱"""
+        with self.assertRaises(ValueError):
+            create_task_store("unknown")
+
+
+@unittest.skipUnless(fakeredis or REDIS_URL, "需要 fakeredis[lua] 或 TEST_REDIS_URL")
+class TestRedisTaskStore(_TaskStoreContract, unittest.TestCase):
+    """Redis 儲存後端測試（Lua 腳本）"""
+
+    def setUp(self):
+        self.prefix = f"test-{uuid.uuid4().hex[:8]}"
+        self.server = fakeredis.FakeServer() if fakeredis and not REDIS_URL else None
+        super().setUp()
+
+    def tearDown(self):
+        keys = list(self.store.client.scan_iter(f"{self.prefix}:*"))
+        if keys:
+            self.store.client.delete(*keys)
+        super().tearDown()
+
+    def make_store(self):
+        if self.server is not None:
+            return RedisTaskStore(prefix=self.prefix, client=fakeredis.FakeRedis(server=self.server))
+        return RedisTaskStore(REDIS_URL, prefix=self.prefix)
+
+
+if __name__ == '__main__':
+    unittest.main()
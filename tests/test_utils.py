@@ -12,6 +12,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from utils.validators import validate_url
 from utils.file_utils import sanitize_filename
 from utils.system_utils import format_size, format_time
+from utils.time_utils import parse_timestamp
 
 
 class TestValidators(unittest.TestCase):
@@ -55,5 +56,18 @@ class TestSystemUtils(unittest.TestCase):
         self.assertEqual(format_time(3661), "1 小時 1 分")
 
 
+class TestTimeUtils(unittest.TestCase):
+    """時間工具測試"""
+
+    def test_parse_timestamp(self):
+        """測試解析秒數與時:分:秒格式"""
+        self.assertEqual(parse_timestamp(90), 90.0)
+        self.assertEqual(parse_timestamp("1:30"), 90.0)
+        self.assertEqual(parse_timestamp("01:02:03.5"), 3723.5)
+        for invalid in ("", "1::2", "abc", "-5"):
+            with self.assertRaises(ValueError):
+                parse_timestamp(invalid)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
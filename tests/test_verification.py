@@ -0,0 +1,127 @@
+"""
+下載結果驗證測試
+"""
+
+import unittest
+import sys
+import os
+import hashlib
+import stat
+import tempfile
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.downloader import DownloadTask
+from core.fake_engine import FakeEngine
+from core.storage import S3Storage
+from core.verification import (
+    VERIFY_FAILED,
+    VERIFY_PASSED,
+    StreamingChecksum,
+    check_container,
+    finalize_checksum,
+)
+from utils.capabilities import Capabilities
+from tests.test_storage import MemoryS3Client
+
+FAKE_FFPROBE = """#!/bin/sh
+echo '{"streams": [{"codec_type": "video"}, {"codec_type": "audio"}], "format": {"duration": "%s"}}'
+"""
+
+
+class MediaFakeEngine(FakeEngine):
+    """輸出視為媒體檔案的模擬引擎，讓驗證流程實際呼叫 ffprobe"""
+
+    produces_media = True
+
+
+@unittest.skipIf(os.name == 'nt', "測試用假 ffprobe 為 shell script")
+class TestContainerCheck(unittest.TestCase):
+    """容器檢查測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.media = os.path.join(self.tmp_dir.name, "video.mp4")
+        with open(self.media, "wb") as f:
+            f.write(b"\0" * 4096)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _ffprobe(self, duration):
+        path = os.path.join(self.tmp_dir.name, "ffprobe")
+        with open(path, "w") as f:
+            f.write(FAKE_FFPROBE % duration)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def test_duration_within_tolerance_passes(self):
+        """測試長度在容許誤差內且串流齊全時通過"""
+        info = {'duration': 600, 'vcodec': 'avc1', 'acodec': 'mp4a'}
+        result = check_container(self.media, info, DOWNLOAD_TYPE_VIDEO, self._ffprobe("598.5"))
+        self.assertEqual(result.status, VERIFY_PASSED)
+        self.assertEqual(result.streams, ["video", "audio"])
+
+    def test_truncated_output_fails(self):
+        """測試長度明顯短於預期時判定失敗"""
+        info = {'duration': 600, 'vcodec': 'avc1', 'acodec': 'mp4a'}
+        result = check_container(self.media, info, DOWNLOAD_TYPE_VIDEO, self._ffprobe("312.0"))
+        self.assertEqual(result.status, VERIFY_FAILED)
+        self.assertIn("312.0", result.errors[0])
+
+    def test_strict_mode_fails_task_and_removes_file(self):
+        """測試 strict 模式下驗證失敗時任務失敗並刪除損毀的檔案"""
+        errors = []
+        capabilities = Capabilities(ffprobe_path=self._ffprobe("10.0"), ffprobe_version="6.1")
+        task = DownloadTask("https://fake.test/v", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            error_callback=errors.append,
+                            engine=MediaFakeEngine(size=4096, duration=60, write_files=True))
+        task.verify_mode = "strict"
+
+        with mock.patch("core.downloader.get_capabilities", return_value=capabilities):
+            self.assertFalse(task.execute())
+        self.assertIn("驗證失敗", errors[0])
+        self.assertEqual(task.verification['status'], VERIFY_FAILED)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir.name, "fake-v.mp4")))
+
+
+class TestChecksum(unittest.TestCase):
+    """串流雜湊測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_checksum_computed_during_upload_without_second_read(self):
+        """測試上傳時同步計算雜湊，不再重讀檔案"""
+        data = os.urandom(300 * 1024)
+        path = os.path.join(self.tmp_dir.name, "a.mp4")
+        with open(path, "wb") as f:
+            f.write(data)
+        checksum = StreamingChecksum("sha256")
+        S3Storage("bucket", part_size=64 * 1024, client=MemoryS3Client()).store(path, checksum=checksum)
+
+        result = check_container(path, {}, DOWNLOAD_TYPE_VIDEO, None)
+        with mock.patch.object(checksum, "update_from_file") as reread:
+            finalize_checksum(result, checksum, path)
+        reread.assert_not_called()
+        self.assertEqual(result.checksum, hashlib.sha256(data).hexdigest())
+
+    def test_task_records_checksum(self):
+        """測試留在本機的輸出讀取一次計算雜湊並記錄於任務"""
+        task = DownloadTask("https://fake.test/v", DOWNLOAD_TYPE_VIDEO, self.tmp_dir.name, "最高畫質",
+                            engine=FakeEngine(size=8192, write_files=True))
+
+        self.assertTrue(task.execute())
+        self.assertEqual(task.verification['checksum'], hashlib.new(
+            task.verification['algorithm'], b"\0" * 8192).hexdigest())
+        self.assertEqual(task.result['verification']['size'], 8192)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+共享佇列下載執行者測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import time
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.task_store import SQLiteTaskStore
+from core.worker import DownloadWorker, build_initial_state, build_job_payload
+
+
+class _StubTask:
+    """模擬下載任務，依 URL 決定成功或失敗"""
+
+    def __init__(self, url, output_path, progress_callback, complete_callback, error_callback, **_):
+        self.url = url
+        self.output_path = output_path
+        self.progress_callback = progress_callback
+        self.complete_callback = complete_callback
+        self.error_callback = error_callback
+
+    def execute(self):
+        self.progress_callback({'status': 'downloading', 'downloaded': 50, 'total': 100,
+                                'percentage': 50.0, 'speed': 10, 'eta': 5})
+        if "fail" in self.url:
+            self.error_callback("模擬失敗")
+            return False
+        self.complete_callback(os.path.join(self.output_path, "video.mp4"), {})
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return getattr(self, "cancelled", False)
+
+
+class _StubManager:
+    """模擬下載管理器"""
+
+    def create_task(self, **kwargs):
+        return _StubTask(**kwargs)
+
+    def remove_task(self, task):
+        pass
+
+
+class TestDownloadWorker(unittest.TestCase):
+    """下載執行者測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = SQLiteTaskStore(os.path.join(self.tmp_dir.name, "tasks.db"))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp_dir.cleanup()
+
+    def _submit(self, task_id, url):
+        payload = build_job_payload(url, "video", "最高畫質", self.tmp_dir.name)
+        self.store.create_task(task_id, build_initial_state(task_id, payload))
+        self.store.enqueue_job(task_id, payload)
+
+    def _wait_for_terminal(self, task_ids, timeout=5.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            states = [self.store.get_task(task_id)["status"] for task_id in task_ids]
+            if all(status in {"completed", "failed"} for status in states):
+                return states
+            time.sleep(0.05)
+        self.fail("工作未在時限內完成")
+
+    def test_workers_drain_shared_queue(self):
+        """測試多個執行者共同消化佇列並回報結果"""
+        self._submit("ok", "https://example.com/ok")
+        self._submit("bad", "https://example.com/fail")
+
+        workers = [
+            DownloadWorker(self.store, worker_id=f"w{i}", poll_interval=0.05, download_manager=_StubManager())
+            for i in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            states = self._wait_for_terminal(["ok", "bad"])
+        finally:
+            for worker in workers:
+                worker.stop()
+                worker.join(2)
+
+        self.assertEqual(states, ["completed", "failed"])
+        self.assertTrue(self.store.get_task("ok")["file_path"].endswith("video.mp4"))
+        self.assertEqual(self.store.get_task("bad")["message"], "模擬失敗")
+        self.assertIsNone(self.store.claim_job("checker"))
+
+    def test_cancel_request_skips_queued_job(self):
+        """測試已要求取消的排隊工作不會被執行"""
+        self._submit("queued", "https://example.com/ok")
+        self.store.update_task("queued", cancel_requested=True)
+
+        worker = DownloadWorker(self.store, worker_id="w", download_manager=_StubManager())
+        self.assertFalse(worker.execute_job(self.store.claim_job("w")))
+        self.assertEqual(self.store.get_task("queued")["status"], "cancelled")
+
+
+if __name__ == '__main__':
+    unittest.main()
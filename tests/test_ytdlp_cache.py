@@ -0,0 +1,84 @@
+"""
+共享 yt-dlp 快取測試
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from unittest import mock
+
+# 添加 src 目錄到路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import yt_dlp
+
+from core.constants import DOWNLOAD_TYPE_VIDEO
+from core.engine import DownloadRequest, YtDlpEngine
+from core.ytdlp_cache import describe_cache, get_cache_dir, install_shared_cache, stats
+
+
+class TestSharedCache(unittest.TestCase):
+    """共享快取讀寫與統計測試"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ydl = yt_dlp.YoutubeDL({'cachedir': self.tmp_dir.name, 'quiet': True})
+        install_shared_cache(self.ydl)
+        stats.reset()
+
+    def tearDown(self):
+        self.ydl.close()
+        self.tmp_dir.cleanup()
+
+    def test_hit_and_miss_counted(self):
+        """測試命中與未命中分別計數"""
+        self.assertIsNone(self.ydl.cache.load("youtube-sigfuncs", "player"))
+        self.ydl.cache.store("youtube-sigfuncs", "player", [1, 2, 3])
+        self.assertEqual(self.ydl.cache.load("youtube-sigfuncs", "player"), [1, 2, 3])
+
+        summary = describe_cache(self.tmp_dir.name)
+        self.assertEqual((summary['hits'], summary['misses'], summary['stores']), (1, 1, 1))
+        self.assertEqual(summary['files'], 1)
+        self.assertEqual(summary['hit_rate'], 0.5)
+
+    def test_concurrent_writers_never_expose_partial_files(self):
+        """測試多執行緒同時寫入與讀取時不會讀到不完整的檔案"""
+        payload = {"code": "x" * 100000}
+        errors = []
+
+        def worker():
+            ydl = yt_dlp.YoutubeDL({'cachedir': self.tmp_dir.name, 'quiet': True})
+            install_shared_cache(ydl)
+            with mock.patch.object(ydl, 'report_warning', side_effect=errors.append):
+                for _ in range(20):
+                    ydl.cache.store("youtube-nsig", "player", payload)
+                    data = ydl.cache.load("youtube-nsig", "player")
+                    if data not in (None, payload):
+                        errors.append("partial read")
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir.name, "youtube-nsig")), ["player.json"])
+
+
+class TestCacheConfiguration(unittest.TestCase):
+    """快取目錄設定測試"""
+
+    def test_engine_uses_configured_cache_dir(self):
+        """測試引擎以環境變數指定的共享目錄建立選項"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with mock.patch.dict(os.environ, {"YTDLP_CACHE_DIR": tmp_dir}):
+                self.assertEqual(get_cache_dir(), tmp_dir)
+                request = DownloadRequest("https://example.com/v", DOWNLOAD_TYPE_VIDEO, tmp_dir, "最高畫質")
+                self.assertEqual(YtDlpEngine(pool_size=0).build_options(request)['cachedir'], tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()